@@ -0,0 +1,121 @@
+"""
+اختبار تكلفة توجيه استجابات الأزرار
+يبني بيانات زر لكل نمط مسجل في موجهات البوت، ويقيس زمن المطابقة بالموجه
+مقارنة بالمرور على الأنماط بالترتيب كما في سلسلة if/elif، وزمن التوجيه الكامل لمعالج فارغ
+بما فيه فك ترميز البيانات المرمزة والتحقق من توقيعها
+
+التشغيل: python -m benchmarks.bench_callback_router
+"""
+
+import argparse
+import inspect
+import re
+import timeit
+
+from benchmarks.common import print_table
+
+_PARAM_RE = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+# قيم الحقول في بيانات الأزرار المرمزة
+_PACKED_VALUES = {'I': 123456, 'H': 10, 's': 'morning_task_0'}
+
+
+def _sample_data(pattern):
+    """بيانات زر تطابق النمط"""
+    from study_bot.bot.callback_codec import ACTIONS, PACKED_PREFIX, encode_callback, is_packed
+
+    if is_packed(pattern):
+        action = pattern[len(PACKED_PREFIX):]
+        fields = {name: _PACKED_VALUES[field_type] for name, field_type in ACTIONS[action][1]}
+        return encode_callback(action, **fields)
+
+    return _PARAM_RE.sub(lambda m: '4242' if m.group(2) == 'int' else 'morning', pattern)
+
+
+def _linear_matcher(routes):
+    """المطابقة بالمرور على الأنماط بالترتيب، كما في سلسلة if/elif"""
+    checks = []
+    for route in routes:
+        if 'regex' in route:
+            checks.append((route['regex'].match, route))
+        else:
+            checks.append((route['pattern'].__eq__, route))
+
+    def match(callback_data):
+        for check, route in checks:
+            if check(callback_data):
+                return route
+        return None
+
+    return match
+
+
+def _noop_handler(names):
+    """معالج فارغ يطلب المعاملات المحددة بالاسم"""
+    def handler(**kwargs):
+        return None
+
+    handler.__signature__ = inspect.Signature(
+        [inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY) for name in names]
+    )
+    return handler
+
+
+def _mirror_router(router):
+    """نسخة من الموجه بنفس الأنماط ومعالجات فارغة تطلب معاملات النمط فقط"""
+    from study_bot.bot.callback_router import CallbackRouter
+
+    mirror = CallbackRouter(router.name)
+    for route in router._routes:
+        names = list(route['converters'])
+        if route['pattern'].startswith('~'):
+            names = ['callback_data']
+        mirror.add_route(route['pattern'], _noop_handler(names))
+    return mirror
+
+
+def _per_call_ns(func, samples, number):
+    """متوسط زمن الاستدعاء الواحد بالنانو ثانية على كل العينات"""
+    def run():
+        for data in samples:
+            func(data)
+
+    return min(timeit.repeat(run, number=number, repeat=3)) / (number * len(samples)) * 1e9
+
+
+def measure_router(router, number):
+    """قياس موجه واحد"""
+    samples = [_sample_data(route['pattern']) for route in router._routes]
+    plain = [data for data in samples if not data.startswith('~')]
+    linear = _linear_matcher([route for route in router._routes if not route['pattern'].startswith('~')])
+    mirror = _mirror_router(router)
+
+    # التحقق من أن كل عينة تصل لمعالجها قبل القياس
+    for data in plain:
+        assert router.match(data)[0] is not None, data
+
+    return {
+        'router': router.name,
+        'routes': len(router._routes),
+        'match_ns': _per_call_ns(router.match, plain, number),
+        'if_elif_ns': _per_call_ns(linear, plain, number),
+        'if_elif_last_ns': _per_call_ns(linear, plain[-1:], number * len(plain)),
+        'dispatch_ns': _per_call_ns(mirror.dispatch, samples, number)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار تكلفة توجيه استجابات الأزرار")
+    parser.add_argument('--number', type=int, default=2000, help="عدد مرات تكرار كل العينات")
+    args = parser.parse_args()
+
+    from study_bot.bot.handlers.callbacks import private_router, group_router
+    from study_bot.group_handlers import group_callback_router
+
+    rows = [measure_router(router, args.number) for router in (private_router, group_router, group_callback_router)]
+    print_table("زمن التوجيه لكل ضغطة زر (نانو ثانية)", rows)
+    print("\nif_elif_last_ns: آخر نمط في السلسلة، وdispatch_ns يشمل فك ترميز البيانات المرمزة")
+
+
+if __name__ == "__main__":
+    main()
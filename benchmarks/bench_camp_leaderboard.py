@@ -0,0 +1,155 @@
+"""
+اختبار لوحة ترتيب المعسكرات مع عدد كبير من المشاركين
+ينشئ معسكرًا فيه N مشارك ويبني لوحته من قاعدة البيانات، ثم يقيس زمن الترتيب وأفضل المشاركين
+ومن حول المشارك وتعديل النقاط في اللوحة، مقارنة بتحميل كل المشاركين مرتبين عند كل طلب
+كما كان قبل اللوحة (ترتيب المشارك بالمرور على القائمة، وتقرير المعسكر بالترتيب في بايثون ثم جلب كل مستخدم)
+
+التشغيل: python -m benchmarks.bench_camp_leaderboard --participants 50000
+"""
+
+import argparse
+import random
+import time
+import timeit
+from datetime import datetime, timedelta
+
+from benchmarks.common import bulk_insert, create_app, measure, print_table
+
+MAX_POINTS = 1000
+
+
+def create_camp(participants, seed):
+    """إنشاء مجموعة ومعسكر والمستخدمين والمشاركين بنقاط عشوائية"""
+    from study_bot.models import db, CampParticipant, CustomCamp, Group, User
+
+    group = Group(telegram_id=-1000001, title="مجموعة الاختبار", is_active=True)
+    db.session.add(group)
+    db.session.flush()
+    now = datetime.now()
+    camp = CustomCamp(
+        group_id=group.id, name="معسكر الاختبار", created_by=1,
+        start_date=now, end_date=now + timedelta(days=30), is_active=True
+    )
+    db.session.add(camp)
+    db.session.commit()
+
+    bulk_insert(User, (
+        {'telegram_id': 1000 + i, 'first_name': f"مستخدم {i}", 'is_active': True}
+        for i in range(participants)
+    ))
+    user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+
+    rng = random.Random(seed)
+    bulk_insert(CampParticipant, (
+        {'camp_id': camp.id, 'user_id': user_id, 'is_active': True, 'total_points': rng.randrange(MAX_POINTS)}
+        for user_id in user_ids
+    ))
+    return camp.id
+
+
+def old_rank(camp_id, participant_id):
+    """الطريقة السابقة: تحميل كل المشاركين مرتبين بالنقاط والبحث عن المشارك"""
+    from study_bot.models import CampParticipant
+
+    participants = CampParticipant.query.filter_by(
+        camp_id=camp_id,
+        is_active=True
+    ).order_by(CampParticipant.total_points.desc()).all()
+
+    for i, participant in enumerate(participants):
+        if participant.id == participant_id:
+            return i + 1
+    return 0
+
+
+def old_report_top(camp_id, limit=5):
+    """الطريقة السابقة لتقرير المعسكر: ترتيب كل المشاركين في بايثون ثم جلب مستخدم كل واحد من الأفضل"""
+    from study_bot.models import db, CampParticipant, User
+
+    participants = CampParticipant.query.filter_by(camp_id=camp_id, is_active=True).all()
+    participants.sort(key=lambda participant: participant.total_points, reverse=True)
+    return [(db.session.get(User, participant.user_id), participant.total_points) for participant in participants[:limit]]
+
+
+def _per_call_us(func, samples, number):
+    """متوسط زمن الاستدعاء الواحد بالميكرو ثانية على كل العينات"""
+    def run():
+        for sample in samples:
+            func(sample)
+
+    return min(timeit.repeat(run, number=number, repeat=3)) / (number * len(samples)) * 1e6
+
+
+def _timed_us(func, samples):
+    """متوسط زمن الاستدعاء الواحد بالميكرو ثانية لعمليات بطيئة تنفذ مرة لكل عينة"""
+    started = time.perf_counter()
+    for sample in samples:
+        func(sample)
+    return (time.perf_counter() - started) / len(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار لوحة ترتيب المعسكرات")
+    parser.add_argument('--participants', type=int, default=50000, help="عدد المشاركين في المعسكر")
+    parser.add_argument('--samples', type=int, default=1000, help="عدد المشاركين في قياس عمليات اللوحة")
+    parser.add_argument('--old-samples', type=int, default=10, help="عدد الطلبات في قياس الطريقة السابقة (0 للتخطي)")
+    parser.add_argument('--seed', type=int, default=1, help="بذرة النقاط العشوائية")
+    args = parser.parse_args()
+
+    from study_bot import camp_leaderboard
+    from study_bot.models import db, CampParticipant
+
+    app = create_app()
+    results = []
+    rows = []
+    with app.app_context():
+        with measure(results, f"insert {args.participants} participants"):
+            camp_id = create_camp(args.participants, args.seed)
+
+        with measure(results, "build board from database"):
+            board = camp_leaderboard._load_board(camp_id)
+
+        # اللوحة تطابق الترتيب الكامل بالنقاط تنازليًا ثم بالمعرف
+        entries = db.session.execute(
+            db.select(CampParticipant.id, CampParticipant.total_points).where(CampParticipant.camp_id == camp_id)
+        ).all()
+        ordered = sorted(entries, key=lambda row: (-row.total_points, row.id))
+        rng = random.Random(args.seed)
+        members = [row.id for row in rng.sample(entries, min(args.samples, len(entries)))]
+        for member in members[:100]:
+            rank = board.rank(member)
+            assert ordered[rank - 1].id == member, member
+        assert [member for member, _, _ in board.top(5)] == [row.id for row in ordered[:5]]
+
+        number = 5
+        rows.append({'operation': 'rank', 'method': 'Leaderboard', 'per_call_us': _per_call_us(board.rank, members, number)})
+        rows.append({'operation': 'top(5)', 'method': 'Leaderboard', 'per_call_us': _per_call_us(
+            lambda member: board.top(5), members, number
+        )})
+        rows.append({'operation': 'around(2)', 'method': 'Leaderboard', 'per_call_us': _per_call_us(
+            lambda member: board.around(member, 2), members, number
+        )})
+        # كل تعديل بنقاط جديدة، فيقاس مرة واحدة وليس بالتكرار
+        updates = [(member, rng.randrange(MAX_POINTS)) for member in members]
+        rows.append({'operation': 'set score', 'method': 'Leaderboard', 'per_call_us': _timed_us(
+            lambda update: board.set(*update), updates
+        )})
+        rows.append({'operation': 'rank', 'method': 'sort in memory', 'per_call_us': _timed_us(
+            lambda member: sorted(entries, key=lambda row: (-row.total_points, row.id)), members[:args.old_samples or 1]
+        )})
+
+        if args.old_samples:
+            old_members = members[:args.old_samples]
+            rows.append({'operation': 'rank', 'method': 'query all + scan', 'per_call_us': _timed_us(
+                lambda member: (old_rank(camp_id, member), db.session.expunge_all()), old_members
+            )})
+            rows.append({'operation': 'top(5)', 'method': 'query all + sort + get', 'per_call_us': _timed_us(
+                lambda member: (old_report_top(camp_id), db.session.expunge_all()), old_members
+            )})
+
+    print_table(f"لوحة ترتيب معسكر فيه {args.participants} مشارك (ميكرو ثانية لكل طلب)", rows)
+    print_table("زمن البناء", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+اختبار مخزن حالة المحادثات مع عدد كبير من المحادثات الجارية
+يحفظ N محادثة ببيانات تشبه معالج إنشاء المعسكر في كل خلفية، ويقيس الذاكرة وزمن القراءة والحفظ
+وتوجيه رسالة لمعالج الخطوة وحذف المحادثات المنتهية،
+مقارنة بقاموس لكل مستخدم في ذاكرة الوحدة كما كان قبل المخزن
+
+التشغيل: python -m benchmarks.bench_conversation_state --sessions 100000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import bulk_insert, create_app, measure, print_table
+
+FLOW = 'camp_wizard'
+STEP = 'waiting_description'
+
+
+def _wizard_data(i):
+    """بيانات الخطوات السابقة لمعالج إنشاء المعسكر"""
+    return {
+        'group_id': -1000000000000 - i % 1000,
+        'name': f"معسكر المراجعة النهائية {i}",
+        'start_date': datetime(2026, 1, 1) + timedelta(days=i % 60),
+        'duration_days': 7 + i % 30,
+        'max_participants': 0
+    }
+
+
+def _per_call_us(func, user_ids):
+    """متوسط زمن الاستدعاء الواحد بالميكرو ثانية"""
+    started = time.perf_counter()
+    for user_id in user_ids:
+        func(user_id)
+    return (time.perf_counter() - started) / len(user_ids) * 1e6
+
+
+def _router():
+    """موجه بخطوة واحدة تحفظ النص وتبقى في نفس الخطوة"""
+    from study_bot.conversation_state import ConversationRouter
+
+    router = ConversationRouter(FLOW)
+
+    @router.step(STEP)
+    def description(conversation, text):
+        conversation.advance(STEP, description=text)
+
+    return router
+
+
+def _measure_operations(backend, row, user_ids):
+    """قياس القراءة والحفظ والتوجيه على عينة من المستخدمين"""
+    from study_bot.conversation_state import set_state_backend
+
+    conversations = {}
+    row['get_us'] = _per_call_us(lambda user_id: conversations.__setitem__(user_id, backend.get(user_id)), user_ids)
+    assert all(conversation is not None for conversation in conversations.values())
+    row['save_us'] = _per_call_us(lambda user_id: backend.save(conversations[user_id]), user_ids)
+
+    set_state_backend(backend)
+    router = _router()
+    row['dispatch_us'] = _per_call_us(lambda user_id: router.dispatch(user_id, "مراجعة يومية"), user_ids)
+    assert backend.get(user_ids[0]).data['description'] == "مراجعة يومية"
+
+
+def run_dict(sessions, results):
+    """الطريقة السابقة: قاموس بيانات لكل مستخدم في ذاكرة الوحدة"""
+    states = {}
+    with measure(results, f"dict: {sessions} sessions"):
+        for i in range(sessions):
+            states[1000 + i] = {'state': STEP, 'data': _wizard_data(i)}
+
+    rss = results[-1]['rss_delta_mb']
+    return {
+        'backend': 'module dict',
+        'sessions': len(states),
+        'rss_mb': rss,
+        'bytes_per_session': rss * 2 ** 20 / sessions,
+        'get_us': _per_call_us(states.get, list(states)[:1000]),
+        'save_us': '-',
+        'dispatch_us': '-',
+        'purge_s': '-'
+    }
+
+
+def run_memory(sessions, sample, results):
+    """خلفية الذاكرة: LRU مع مدة صلاحية"""
+    from study_bot.conversation_state import Conversation, MemoryStateBackend
+
+    backend = MemoryStateBackend(max_sessions=sessions)
+    with measure(results, f"memory: save {sessions} sessions"):
+        for i in range(sessions):
+            backend.save(Conversation(1000 + i, FLOW, STEP, _wizard_data(i)))
+
+    rss = results[-1]['rss_delta_mb']
+    row = {
+        'backend': 'memory',
+        'sessions': backend.count(),
+        'rss_mb': rss,
+        'bytes_per_session': rss * 2 ** 20 / sessions
+    }
+    _measure_operations(backend, row, sample)
+
+    # كل المحادثات منتهية الصلاحية، فيحذفها التنظيف كلها
+    backend.ttl = -1
+    for user_id in list(backend._items):
+        backend.save(Conversation(user_id, FLOW, STEP))
+    started = time.perf_counter()
+    purged = backend.purge_expired()
+    row['purge_s'] = time.perf_counter() - started
+    assert purged == sessions and backend.count() == 0, purged
+    return row
+
+
+def run_database(sessions, sample, results):
+    """خلفية قاعدة البيانات: صف لكل مستخدم بالمفتاح الأساسي"""
+    from study_bot.conversation_state import DatabaseStateBackend, _encode
+    from study_bot.models import db, ConversationState
+
+    app = create_app()
+    backend = DatabaseStateBackend()
+    with app.app_context():
+        now = time.time()
+        with measure(results, f"database: insert {sessions} sessions"):
+            bulk_insert(ConversationState, (
+                {
+                    'user_id': 1000 + i,
+                    'flow': FLOW,
+                    'step': STEP,
+                    'data': _encode(_wizard_data(i)),
+                    'expires_at': now + backend.ttl,
+                    'updated_at': now
+                }
+                for i in range(sessions)
+            ))
+
+        # الحالة في الجدول وليست في ذاكرة العملية
+        row = {
+            'backend': 'database',
+            'sessions': backend.count(),
+            'rss_mb': '-',
+            'bytes_per_session': '-'
+        }
+        _measure_operations(backend, row, sample)
+
+        # انتهاء صلاحية كل المحادثات دون انتظار
+        db.session.execute(db.update(ConversationState).values(expires_at=now - 1))
+        db.session.commit()
+        started = time.perf_counter()
+        purged = backend.purge_expired()
+        row['purge_s'] = time.perf_counter() - started
+        assert purged == sessions, purged
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار مخزن حالة المحادثات")
+    parser.add_argument('--sessions', type=int, default=100000, help="عدد المحادثات الجارية")
+    parser.add_argument('--sample', type=int, default=2000, help="عدد المستخدمين في قياس القراءة والحفظ والتوجيه")
+    parser.add_argument('--skip-database', action='store_true', help="تخطي خلفية قاعدة البيانات")
+    args = parser.parse_args()
+
+    sample = random.Random(1).sample(range(1000, 1000 + args.sessions), min(args.sample, args.sessions))
+    results = []
+    rows = [run_dict(args.sessions, results), run_memory(args.sessions, sample, results)]
+    if not args.skip_database:
+        rows.append(run_database(args.sessions, sample, results))
+
+    print_table(f"حالة {args.sessions} محادثة جارية (الأزمنة بالميكرو ثانية لكل طلب)", rows)
+    print_table("زمن الإنشاء", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+اختبار مخزن المهام المؤجلة مع عدد كبير من المهام المعلقة
+يحفظ N مهمة مؤجلة ويحملها كما عند إعادة التشغيل ويشغل سلسلة المهام، ثم يقيس عدد السلاسل والذاكرة
+وزمن إلغاء مهام المستخدمين وتنفيذ المهام المستحقة،
+مقارنة بمؤقت threading.Timer لكل مهمة كما كان قبل المخزن
+
+التشغيل: python -m benchmarks.bench_delayed_jobs --jobs 100000
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.common import bulk_insert, create_app, measure, print_table, rss_mb
+
+# المهام المعلقة بعد ساعة، حتى لا تنفذ أثناء الاختبار
+PENDING_DELAY = 3600
+
+
+def run_store(app, args, results):
+    """قياس المخزن: التحميل عند بدء التشغيل والذاكرة والسلاسل والإلغاء والتنفيذ"""
+    from study_bot import delayed_jobs
+    from study_bot.models import db, DelayedJob
+
+    executed = []
+    delayed_jobs._get_handler = lambda job_type: lambda **payload: executed.append(payload)
+
+    with app.app_context():
+        now = time.time()
+        with measure(results, f"insert {args.jobs} jobs"):
+            bulk_insert(DelayedJob, [
+                {
+                    'job_type': 'task_reminder',
+                    'chat_id': 1000 + i % args.chats,
+                    'payload': json.dumps({'chat_id': 1000 + i % args.chats, 'task_id': i}),
+                    'run_at': now + PENDING_DELAY + i % 600,
+                    'created_at': now
+                }
+                for i in range(args.jobs)
+            ])
+
+    threads_before = threading.active_count()
+    rss_before = rss_mb()
+
+    # تحميل المهام المحفوظة كما عند إعادة التشغيل، ثم انتظار بدء انتظار السلسلة
+    with measure(results, "load on startup"):
+        delayed_jobs.init_delayed_jobs(app)
+        while delayed_jobs.get_delayed_jobs_stats()['pending'] < args.jobs:
+            time.sleep(0.01)
+
+    store = {
+        'mode': 'delayed job store',
+        'pending': delayed_jobs.get_delayed_jobs_stats()['pending'],
+        'threads': threading.active_count() - threads_before,
+        'rss_mb': rss_mb() - rss_before
+    }
+
+    with app.app_context():
+        with measure(results, f"schedule {args.sample} jobs"):
+            for i in range(args.sample):
+                delayed_jobs.schedule_job('task_reminder', 1000 + i % args.chats, {'task_id': -i}, PENDING_DELAY)
+
+        with measure(results, f"cancel jobs of {args.cancel} users"):
+            for chat_id in range(1000, 1000 + args.cancel):
+                delayed_jobs.cancel_jobs(chat_id, 'task_reminder')
+
+        # مهام مستحقة الآن تنفذها السلسلة من بين المهام المعلقة
+        executed.clear()
+        with measure(results, f"run {args.sample} due jobs"):
+            for i in range(args.sample):
+                delayed_jobs.schedule_job('task_reminder', -1 - i, {'task_id': i}, 0)
+            while len(executed) < args.sample:
+                time.sleep(0.01)
+
+        remaining = db.session.query(DelayedJob).count()
+
+    delayed_jobs.shutdown_delayed_jobs()
+    store['rows_after'] = remaining
+    return store
+
+
+def run_timers(count):
+    """قياس الطريقة السابقة: مؤقت وسلسلة لكل مهمة"""
+    threads_before = threading.active_count()
+    rss_before = rss_mb()
+
+    timers = []
+    try:
+        for _ in range(count):
+            timer = threading.Timer(PENDING_DELAY, lambda: None)
+            timer.daemon = True
+            timer.start()
+            timers.append(timer)
+    except RuntimeError:
+        # حد نظام التشغيل لعدد السلاسل
+        pass
+
+    row = {
+        'mode': 'threading.Timer per job',
+        'pending': len(timers),
+        'threads': threading.active_count() - threads_before,
+        'rss_mb': rss_mb() - rss_before,
+        'rows_after': '-'
+    }
+
+    for timer in timers:
+        timer.cancel()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار مخزن المهام المؤجلة")
+    parser.add_argument('--jobs', type=int, default=100000, help="عدد المهام المعلقة")
+    parser.add_argument('--chats', type=int, default=10000, help="عدد المستخدمين الذين تتوزع عليهم المهام")
+    parser.add_argument('--sample', type=int, default=1000, help="عدد المهام في قياس الإضافة والتنفيذ")
+    parser.add_argument('--cancel', type=int, default=1000, help="عدد المستخدمين في قياس الإلغاء")
+    parser.add_argument('--timers', type=int, default=10000, help="عدد المؤقتات في قياس الطريقة السابقة (0 للتخطي)")
+    args = parser.parse_args()
+
+    app = create_app()
+    results = []
+    rows = [run_store(app, args, results)]
+    if args.timers:
+        rows.append(run_timers(args.timers))
+
+    print_table(f"المهام المعلقة: {args.jobs} مهمة لـ {args.chats} مستخدم", rows)
+    print_table("زمن العمليات", results)
+
+
+if __name__ == "__main__":
+    main()
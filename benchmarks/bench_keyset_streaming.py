@@ -0,0 +1,97 @@
+"""
+اختبار ذاكرة القراءة المتدرجة للجداول الكبيرة
+ينشئ N مستخدمًا ثم يقرأهم كلهم في عملية منفصلة لكل طريقة: تحميل الجدول كاملاً بـ .all()
+أو القراءة على دفعات بـ iter_rows (كائنات كاملة أو أعمدة محددة)،
+ويسجل الذاكرة المستخدمة عند كل ربع من الصفوف ليظهر أنها ثابتة مع القراءة المتدرجة
+
+التشغيل: python -m benchmarks.bench_keyset_streaming --users 1000000
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.common import bulk_insert, create_app, print_table, rss_mb
+
+MODES = ('all()', 'iter_rows(User)', 'iter_rows(columns)')
+
+
+def create_users(count):
+    """إنشاء المستخدمين على دفعات"""
+    from study_bot.models import User
+
+    bulk_insert(User, (
+        {
+            'telegram_id': 1000 + i,
+            'first_name': f"مستخدم {i}",
+            'username': f"user_{i}",
+            'is_active': True,
+            'points': i % 500
+        }
+        for i in range(count)
+    ))
+
+
+def _read(mode, database_url, total, output):
+    """قراءة كل المستخدمين بإحدى الطرق في عملية منفصلة، وتسجيل الذاكرة عند كل ربع"""
+    from study_bot.models import db, User, iter_rows
+
+    app = create_app(database_url)
+    with app.app_context():
+        checkpoints = {total * q // 4: f"rss_{q * 25}%" for q in range(1, 5)}
+        rss_start = rss_mb()
+        result = {'mode': mode}
+        started = time.perf_counter()
+
+        if mode == 'all()':
+            rows = User.query.filter(User.is_active == True).all()
+        elif mode == 'iter_rows(User)':
+            rows = iter_rows(User, where=User.is_active == True)
+        else:
+            rows = iter_rows(User.id, User.telegram_id, User.points, where=User.is_active == True)
+
+        count = 0
+        points = 0
+        for row in rows:
+            count += 1
+            points += row.points
+            if count in checkpoints:
+                result[checkpoints[count]] = rss_mb() - rss_start
+
+        result['rows'] = count
+        result['seconds'] = time.perf_counter() - started
+        output.put(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار ذاكرة القراءة المتدرجة للجداول الكبيرة")
+    parser.add_argument('--users', type=int, default=1000000, help="عدد المستخدمين")
+    parser.add_argument('--skip-all', action='store_true', help="تخطي تحميل الجدول كاملاً (يحتاج ذاكرة كبيرة)")
+    args = parser.parse_args()
+
+    from study_bot.models import db
+
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        create_users(args.users)
+        database_url = str(db.engine.url)
+    print(f"تم إنشاء {args.users} مستخدم في {time.perf_counter() - started:.1f} ثانية")
+
+    # عملية جديدة لكل طريقة حتى لا تتأثر القياسات بذاكرة الطريقة السابقة
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for mode in MODES:
+        if mode == 'all()' and args.skip_all:
+            continue
+        output = context.Queue()
+        process = context.Process(target=_read, args=(mode, database_url, args.users, output))
+        process.start()
+        rows.append(output.get())
+        process.join()
+
+    print_table(f"قراءة {args.users} مستخدم: زيادة الذاكرة (ميجابايت) عند كل ربع من الصفوف", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+اختبار تكلفة بناء رسائل المهام لعدد كبير من المجموعات
+يبني جسم طلب رسالة مهمة لكل مجموعة من N مجموعة بالقالب المبني مسبقًا (تعويض معرف المحادثة وبيانات الزر فقط)،
+مقارنة ببناء النص ولوحة المفاتيح وترميز JSON لكل رسالة كما كان قبل القوالب،
+ويقيس ترميز بيانات الزر الموقعة منفصلًا لأنها تبنى لكل مجموعة في الحالتين
+
+التشغيل: python -m benchmarks.bench_message_templates --groups 10000
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.common import print_table
+
+TASK_TEXT = "🕌 حان وقت صلاة الفجر، لنبدأ يومنا بالصلاة والمذاكرة"
+TASK_TYPE = 'morning_task_0'
+POINTS = 5
+DEADLINE_MINUTES = 15
+
+
+def build_payload(chat_id, callback_data):
+    """بناء الرسالة كاملة لكل مجموعة: النص ولوحة المفاتيح ثم ترميز JSON"""
+    deadline_text = f"⏰ يمكنك الانضمام خلال {DEADLINE_MINUTES} دقائق فقط"
+    points_text = f"🏆 ستحصل على {POINTS} نقاط عند المشاركة"
+    payload = {
+        'chat_id': chat_id,
+        'text': f"{TASK_TEXT}\n\n{deadline_text}\n{points_text}",
+        'parse_mode': 'HTML',
+        'disable_web_page_preview': True,
+        'reply_markup': {
+            'inline_keyboard': [[{'text': "✅ انضم للمهمة", 'callback_data': callback_data}]]
+        }
+    }
+    return json.dumps(payload).encode('utf-8')
+
+
+def _timed(name, groups, build):
+    """زمن بناء رسائل كل المجموعات"""
+    started = time.perf_counter()
+    size = 0
+    for i in range(groups):
+        size += build(i)
+    elapsed = time.perf_counter() - started
+    return {
+        'method': name,
+        'total_ms': elapsed * 1000,
+        'per_message_us': elapsed / groups * 1e6,
+        'avg_bytes': size // groups
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار تكلفة بناء رسائل المهام")
+    parser.add_argument('--groups', type=int, default=10000, help="عدد المجموعات")
+    args = parser.parse_args()
+
+    from study_bot.bot.callback_codec import decode_callback
+    from study_bot.group_tasks import get_task_template, task_join_callback
+    from study_bot.message_templates import clear_templates
+
+    chat_ids = [-1000000000000 - i for i in range(args.groups)]
+    expires_at = time.time() + DEADLINE_MINUTES * 60
+    callbacks = [task_join_callback(TASK_TYPE, 1000 + i, POINTS, expires_at=expires_at) for i in range(args.groups)]
+
+    clear_templates()
+    template = get_task_template(TASK_TEXT, TASK_TYPE, POINTS, DEADLINE_MINUTES)
+
+    # الطريقتان تبنيان نفس الرسالة
+    rendered = json.loads(template.render(chat_id=chat_ids[0], callback_data=callbacks[0]).body)
+    assert rendered == json.loads(build_payload(chat_ids[0], callbacks[0])), rendered
+    assert decode_callback(rendered['reply_markup']['inline_keyboard'][0][0]['callback_data'])[0] == 'task_join'
+
+    rows = [
+        _timed('build + json.dumps', args.groups, lambda i: len(build_payload(chat_ids[i], callbacks[i]))),
+        _timed('template.render', args.groups, lambda i: len(
+            template.render(chat_id=chat_ids[i], callback_data=callbacks[i]).body
+        )),
+        _timed('callback_data encoding', args.groups, lambda i: len(
+            task_join_callback(TASK_TYPE, 1000 + i, POINTS, expires_at=expires_at)
+        )),
+    ]
+
+    print_table(f"بناء رسالة مهمة لكل مجموعة: {args.groups} مجموعة", rows)
+
+
+if __name__ == "__main__":
+    main()
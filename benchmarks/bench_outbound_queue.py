@@ -0,0 +1,82 @@
+"""
+اختبار أداء طابور الرسائل الصادرة
+يرسل رسالة لكل مجموعة من N مجموعة وهمية إلى خادم محلي يحاكي واجهة تيليجرام،
+ويقيس زمن إضافة الرسائل للطابور (ما ينتظره المستدعي) والزمن حتى وصول آخر رسالة،
+مقارنة بالإرسال المتتابع المباشر الذي كان مستخدمًا قبل الطابور
+
+التشغيل: python -m benchmarks.bench_outbound_queue --groups 5000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import create_app, fake_telegram_api, print_table
+
+
+def run_sequential(groups, server):
+    """الإرسال المتتابع: كل رسالة تنتظر رد الخادم قبل التالية"""
+    from study_bot.telegram_client import get_client
+
+    started = time.perf_counter()
+    for i in range(groups):
+        get_client().call('sendMessage', {'chat_id': -1000000 - i, 'text': f"مهمة المجموعة {i}"})
+    elapsed = time.perf_counter() - started
+
+    return {'mode': 'sequential', 'caller_seconds': elapsed, 'last_delivery_seconds': elapsed, 'sent': server.requests}
+
+
+def run_queue(app, groups, workers, rate, server):
+    """الإرسال عبر الطابور مع مجموعة العمال وحد الإرسال العام"""
+    from study_bot import outbound_queue
+
+    # حد الإرسال العام كما في الإعدادات، أو أعلى منه لقياس تكلفة الطابور نفسه
+    outbound_queue._global_bucket = outbound_queue.TokenBucket(rate, rate)
+    outbound_queue.init_outbound_queue(app, workers=workers)
+
+    started = time.perf_counter()
+    for i in range(groups):
+        outbound_queue.enqueue_message(-1000000 - i, f"مهمة المجموعة {i}")
+    caller_seconds = time.perf_counter() - started
+
+    while True:
+        stats = outbound_queue.get_queue_stats()
+        if stats['sent'] + stats['failed'] >= groups:
+            break
+        time.sleep(0.01)
+    last_delivery = server.last_request_at - started
+
+    outbound_queue.shutdown_outbound_queue(timeout=5)
+
+    return {
+        'mode': f'queue ({workers} workers, {rate}/s)',
+        'caller_seconds': caller_seconds,
+        'last_delivery_seconds': last_delivery,
+        'sent': stats['sent']
+    }
+
+
+def main():
+    from study_bot.config import OUTBOUND_WORKERS, TELEGRAM_GLOBAL_RATE
+
+    parser = argparse.ArgumentParser(description="اختبار أداء طابور الرسائل الصادرة")
+    parser.add_argument('--groups', type=int, default=5000, help="عدد المجموعات")
+    parser.add_argument('--workers', type=int, default=OUTBOUND_WORKERS, help="عدد عمال الإرسال")
+    parser.add_argument('--rate', type=float, default=TELEGRAM_GLOBAL_RATE, help="الحد العام للرسائل في الثانية")
+    parser.add_argument('--latency', type=float, default=0.05, help="زمن استجابة الخادم المحاكي (بالثواني)")
+    parser.add_argument('--skip-sequential', action='store_true', help="تخطي قياس الإرسال المتتابع")
+    args = parser.parse_args()
+
+    app = create_app()
+    rows = []
+
+    with fake_telegram_api(latency=args.latency) as server:
+        if not args.skip_sequential:
+            rows.append(run_sequential(args.groups, server))
+        rows.append(run_queue(app, args.groups, args.workers, args.rate, server))
+
+    print_table(f"إرسال رسالة لكل مجموعة: {args.groups} مجموعة، زمن الاستجابة {args.latency} ثانية", rows)
+    print(f"\nالحد الأدنى النظري مع الحد العام: {args.groups / args.rate:.1f} ثانية")
+
+
+if __name__ == "__main__":
+    main()
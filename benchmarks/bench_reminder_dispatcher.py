@@ -0,0 +1,157 @@
+"""
+اختبار تكلفة جدولة التذكيرات لعدد كبير من المجموعات
+يشغل حلقة موزع التذكيرات الحقيقية على ساعة محاكاة ليوم كامل مع N مجموعة مفعل لها الجدولان،
+ويقيس عدد مرات الاستيقاظ والاستعلامات وزمن المعالجة الفعلي (دون فترات الانتظار)،
+مقارنة بالفحص كل دقيقة الذي يقرأ جميع المجموعات في كل مرة
+
+التشغيل: python -m benchmarks.bench_reminder_dispatcher --groups 10000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from benchmarks.common import bulk_insert, create_app, print_table
+
+
+class SimulatedClock:
+    """ساعة محاكاة تتقدم بدلاً من انتظار الموزع"""
+
+    def __init__(self, start, end):
+        self.now = start
+        self.end = end
+        self.wakeups = 0
+
+    def wait(self, seconds):
+        from study_bot import reminder_dispatcher
+
+        self.wakeups += 1
+        self.now += timedelta(seconds=seconds)
+        if self.now >= self.end:
+            reminder_dispatcher._dispatcher_running = False
+        return False
+
+
+class QueryCounter:
+    """عداد استعلامات قاعدة البيانات"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def create_groups(count):
+    """إنشاء المجموعات مع تفعيل الجدولين"""
+    from study_bot.models import Group
+
+    bulk_insert(Group, [
+        {
+            'telegram_id': -1000000 - i,
+            'title': f"مجموعة {i}",
+            'is_active': True,
+            'morning_schedule_enabled': True,
+            'evening_schedule_enabled': True
+        }
+        for i in range(count)
+    ])
+
+
+def run_dispatcher_day(app, queries):
+    """تشغيل حلقة الموزع ليوم محاكى وإرجاع النتائج"""
+    from study_bot import outbound_queue, reminder_dispatcher
+    from study_bot.config import SCHEDULER_TIMEZONE
+
+    start = datetime.now(SCHEDULER_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    clock = SimulatedClock(start, start + timedelta(days=1))
+
+    reminder_dispatcher._now = lambda: clock.now
+    reminder_dispatcher._wakeup_event.wait = clock.wait
+    reminder_dispatcher._dispatcher_running = True
+
+    # الرسائل تضاف للطابور دون عمال، ويفرغ بعد كل موعد لأن الإرسال خارج هذا القياس
+    outbound_queue._queue_accepting = True
+    fire_slot = reminder_dispatcher.fire_slot
+    fanout_seconds = []
+
+    def timed_fire_slot(schedule_type, time_str):
+        started = time.perf_counter()
+        count = fire_slot(schedule_type, time_str)
+        fanout_seconds.append(time.perf_counter() - started)
+        with outbound_queue._queue_cond:
+            outbound_queue._pending.clear()
+        return count
+
+    reminder_dispatcher.fire_slot = timed_fire_slot
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    reminder_dispatcher.dispatcher_thread_func(app)
+    elapsed = time.perf_counter() - started
+
+    stats = reminder_dispatcher.get_reminder_dispatcher_stats()
+    return {
+        'mode': 'heap dispatcher',
+        'wakeups': clock.wakeups,
+        'slots_fired': stats['slots_fired'],
+        'tasks_enqueued': stats['tasks_enqueued'],
+        'queries': queries.count - queries_before,
+        'busy_seconds': elapsed,
+        'idle_seconds': elapsed - sum(fanout_seconds),
+        'max_slot_seconds': max(fanout_seconds, default=0.0)
+    }
+
+
+def run_minute_poll(app, queries, ticks):
+    """الفحص كل دقيقة: قراءة جميع المجموعات المفعل لها الجدول في كل مرة، مقدرًا ليوم كامل من عينة"""
+    from study_bot.models import db, Group
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    with app.app_context():
+        for _ in range(ticks):
+            for flag in (Group.morning_schedule_enabled, Group.evening_schedule_enabled):
+                db.session.query(Group.id, Group.telegram_id).filter(Group.is_active == True, flag == True).all()
+            db.session.remove()
+    per_tick = (time.perf_counter() - started) / ticks
+
+    return {
+        'mode': f'minute poll (from {ticks} ticks)',
+        'wakeups': 1440,
+        'slots_fired': '-',
+        'tasks_enqueued': '-',
+        'queries': (queries.count - queries_before) // ticks * 1440,
+        'busy_seconds': per_tick * 1440,
+        'idle_seconds': per_tick * 1440,
+        'max_slot_seconds': '-'
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار تكلفة جدولة التذكيرات")
+    parser.add_argument('--groups', type=int, default=10000, help="عدد المجموعات")
+    parser.add_argument('--poll-ticks', type=int, default=30, help="عدد دورات الفحص كل دقيقة المقاسة")
+    args = parser.parse_args()
+
+    from study_bot.models import db
+
+    app = create_app()
+    with app.app_context():
+        create_groups(args.groups)
+        queries = QueryCounter(db.engine)
+
+    rows = [
+        run_dispatcher_day(app, queries),
+        run_minute_poll(app, queries, args.poll_ticks)
+    ]
+
+    print_table(f"تكلفة جدولة التذكيرات ليوم كامل: {args.groups} مجموعة", rows)
+    print("\nidle_seconds: زمن المعالجة خارج إرسال المواعيد نفسها (الاستيقاظ وحساب الموعد التالي والعلامة المائية)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+اختبار زمن تحديث سلاسل الإنجاز اليومي مع عدد كبير من المستخدمين
+ينشئ N مستخدمًا موزعين بين سلسلة مستمرة ومنقطعة ومحدثة اليوم ومعادة للصفر من قبل،
+ويقيس زمن التحديث باستعلام واحد ثم إعادة تشغيله في نفس اليوم (لا يغير أي صف)،
+مقارنة بالقراءة على دفعات وتحديث كل دفعة بقائمة المعرفات كما كان قبل الاستعلام الواحد
+
+التشغيل: python -m benchmarks.bench_streak_rollover --users 100000 1000000
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select, update
+
+from benchmarks.common import bulk_insert, create_app, print_table
+
+# نوع المستخدم حسب باقي قسمة ترتيبه على 4
+CONTINUED, BROKEN, UPDATED_TODAY, ALREADY_RESET = range(4)
+
+
+def create_users(count, now):
+    """إنشاء المستخدمين بأنواع السلاسل الأربعة بالتساوي"""
+    from study_bot.models import User
+
+    last_update = {
+        CONTINUED: now - timedelta(days=1),
+        BROKEN: now - timedelta(days=3),
+        UPDATED_TODAY: now,
+        ALREADY_RESET: now - timedelta(days=10)
+    }
+    bulk_insert(User, (
+        {
+            'telegram_id': 1000 + i,
+            'first_name': f"مستخدم {i}",
+            'is_active': True,
+            'streak_days': 0 if i % 4 == ALREADY_RESET else i % 30 + 1,
+            'streak_start_date': None if i % 4 == ALREADY_RESET else (now - timedelta(days=i % 30 + 1)).date(),
+            'last_streak_update': last_update[i % 4]
+        }
+        for i in range(count)
+    ))
+
+
+def chunked_rollover(today, now):
+    """الطريقة السابقة: قراءة المستخدمين على دفعات وتحديث كل دفعة بقائمة معرفاتها"""
+    from study_bot.models import db, User, iter_chunks
+
+    yesterday = today - timedelta(days=1)
+    updated = 0
+    for chunk in iter_chunks(
+        User.id, User.last_streak_update,
+        where=[User.is_active == True, User.last_streak_update.isnot(None)]
+    ):
+        continued = [row.id for row in chunk if row.last_streak_update.date() == yesterday]
+        broken = [row.id for row in chunk if row.last_streak_update.date() < yesterday]
+        if continued:
+            updated += db.session.execute(
+                update(User).where(User.id.in_(continued))
+                .values(streak_days=User.streak_days + 1, last_streak_update=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        if broken:
+            updated += db.session.execute(
+                update(User).where(User.id.in_(broken))
+                .values(streak_days=0, streak_start_date=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+    db.session.commit()
+    return updated
+
+
+def single_update_rollover(today, now):
+    """الطريقة الحالية: استعلام تحديث واحد لكل المستخدمين"""
+    from study_bot.models import db
+    from study_bot.scheduler import _rollover_streaks
+
+    updated = _rollover_streaks(today, now)
+    db.session.commit()
+    return updated
+
+
+def _check(count):
+    """التحقق من نتيجة التحديث: السلاسل المستمرة زادت والمنقطعة صفر والباقي لم يتغير"""
+    from study_bot.models import db, User
+
+    zero = db.session.scalar(select(func.count()).select_from(User).where(User.streak_days == 0))
+    expected_zero = sum(1 for i in range(count) if i % 4 in (BROKEN, ALREADY_RESET))
+    total = db.session.scalar(select(func.sum(User.streak_days)))
+    expected_total = sum(i % 30 + 1 + (i % 4 == CONTINUED) for i in range(count) if i % 4 in (CONTINUED, UPDATED_TODAY))
+    assert (zero, total) == (expected_zero, expected_total), (zero, total, expected_zero, expected_total)
+
+
+def run(name, rollover, count, now):
+    """قياس طريقة واحدة على قاعدة بيانات جديدة: التشغيل الأول ثم إعادة التشغيل في نفس اليوم"""
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        create_users(count, now)
+        insert_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        updated = rollover(now.date(), now)
+        first_seconds = time.perf_counter() - started
+        _check(count)
+
+        started = time.perf_counter()
+        rerun_updated = rollover(now.date(), now)
+        rerun_seconds = time.perf_counter() - started
+        _check(count)
+
+    return {
+        'users': count,
+        'method': name,
+        'insert_s': insert_seconds,
+        'updated': updated,
+        'rollover_s': first_seconds,
+        'rerun_updated': rerun_updated,
+        'rerun_s': rerun_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار زمن تحديث سلاسل الإنجاز اليومي")
+    parser.add_argument('--users', type=int, nargs='+', default=[100000, 1000000], help="أعداد المستخدمين")
+    parser.add_argument('--skip-chunked', action='store_true', help="تخطي قياس الطريقة السابقة")
+    args = parser.parse_args()
+
+    from study_bot.config import get_current_time
+
+    # التواريخ تحفظ بدون منطقة زمنية، وتبعد عن منتصف الليل حتى لا يتغير اليوم أثناء الاختبار
+    now = get_current_time().replace(tzinfo=None, hour=12)
+
+    rows = []
+    for count in args.users:
+        rows.append(run('single UPDATE', single_update_rollover, count, now))
+        if not args.skip_chunked:
+            rows.append(run('chunked IN lists', chunked_rollover, count, now))
+
+    print_table("تحديث سلاسل الإنجاز اليومي (بالثواني)", rows)
+
+
+if __name__ == "__main__":
+    main()
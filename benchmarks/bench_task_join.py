@@ -0,0 +1,141 @@
+"""
+اختبار زمن الانضمام للمهام مع الضغطات المتزامنة
+ينضم N مستخدم لنفس المهمة من عدة عمال في نفس الوقت، وكل مستخدم يضغط الزر مرتين،
+ويقيس زمن كل انضمام (p50/p95/p99) ويتحقق من أن كل مستخدم سجل مرة واحدة وأن النقاط صحيحة
+
+قاعدة SQLite تسمح بكاتب واحد في كل مرة، فالأرقام الواقعية تكون على PostgreSQL:
+BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_task_join --users 2000 --workers 16
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+
+from benchmarks.common import bulk_insert, create_app, percentile, print_table
+
+TASK_POINTS = 5
+
+
+def create_fixtures(users):
+    """إنشاء مجموعة ومهمة واحدة والمستخدمين"""
+    from study_bot.models import db, Group, GroupTaskTracker, User
+
+    group = Group(telegram_id=-1000001, title="مجموعة الاختبار", is_active=True)
+    db.session.add(group)
+    db.session.flush()
+    task = GroupTaskTracker(group_id=group.id, task_type='morning_task_0', points=TASK_POINTS, is_sent=True)
+    db.session.add(task)
+    db.session.commit()
+
+    bulk_insert(User, [
+        {'telegram_id': 1000 + i, 'first_name': f"مستخدم {i}", 'points': 0, 'total_tasks_completed': 0}
+        for i in range(users)
+    ])
+    rows = db.session.execute(select(User.id, User.telegram_id)).all()
+    return task.id, [SimpleNamespace(id=row.id, telegram_id=row.telegram_id) for row in rows]
+
+
+def _worker(app, task_id, clicks, latencies, outcomes, lock):
+    """تنفيذ الضغطات من الطابور وتسجيل زمن كل منها"""
+    from study_bot.models import db, GroupTaskTracker
+
+    with app.app_context():
+        task = db.session.get(GroupTaskTracker, task_id)
+        task_view = SimpleNamespace(id=task.id, group_id=task.group_id, points=task.points)
+        db.session.remove()
+
+        while True:
+            try:
+                user = clicks.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.perf_counter()
+            try:
+                points = GroupTaskTracker.join(task_view, user)
+                outcome = 'joined' if points is not None else 'duplicate'
+            except Exception:
+                outcome = 'error'
+            finally:
+                db.session.remove()
+            elapsed = time.perf_counter() - started
+
+            with lock:
+                latencies.append(elapsed * 1000)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار زمن الانضمام للمهام مع الضغطات المتزامنة")
+    parser.add_argument('--users', type=int, default=2000, help="عدد المستخدمين")
+    parser.add_argument('--workers', type=int, default=16, help="عدد العمال المتزامنين")
+    parser.add_argument('--clicks', type=int, default=2, help="عدد ضغطات كل مستخدم")
+    parser.add_argument('--p99-target-ms', type=float, default=100, help="الحد المقبول لزمن p99 (بالملي ثانية)")
+    args = parser.parse_args()
+
+    from study_bot.models import db, GroupTaskParticipation, User
+
+    app = create_app()
+    with app.app_context():
+        task_id, users = create_fixtures(args.users)
+
+    # ضغطات المستخدم الواحد متباعدة في الطابور حتى تصل من عمال مختلفين
+    clicks = queue.Queue()
+    for _ in range(args.clicks):
+        for user in users:
+            clicks.put(user)
+
+    latencies = []
+    outcomes = {}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_worker, args=(app, task_id, clicks, latencies, outcomes, lock))
+        for _ in range(args.workers)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        participations = db.session.scalar(
+            select(func.count()).select_from(GroupTaskParticipation).where(GroupTaskParticipation.task_id == task_id)
+        )
+        total_points = db.session.scalar(select(func.sum(User.points)))
+
+    p99 = percentile(latencies, 99)
+    print_table(f"الانضمام لمهمة واحدة: {args.users} مستخدم × {args.clicks} ضغطة، {args.workers} عامل", [{
+        'clicks': len(latencies),
+        'joined': outcomes.get('joined', 0),
+        'duplicate': outcomes.get('duplicate', 0),
+        'error': outcomes.get('error', 0),
+        'per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': p99
+    }])
+
+    print(f"\nالمشاركات المسجلة: {participations} (المتوقع {args.users})")
+    print(f"مجموع النقاط: {total_points} (المتوقع {args.users * TASK_POINTS})")
+
+    failures = []
+    if participations != args.users or total_points != args.users * TASK_POINTS or outcomes.get('error'):
+        failures.append("نتيجة الانضمام غير صحيحة")
+    if p99 > args.p99_target_ms:
+        failures.append(f"زمن p99 ({p99:.1f} ملي ثانية) أعلى من الحد ({args.p99_target_ms} ملي ثانية)")
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+اختبار زمن الرد على التحديثات في وضعي الاستطلاع والويب هوك
+يرسل N تحديثًا بمعدل ثابت، إما عبر getUpdates من الخادم المحاكي (الاستطلاع)
+أو بطلبات HTTP لمسار الويب هوك على خادم محلي للتطبيق، ويعالج كل تحديث معالج يرد برسالة واحدة،
+ثم يقيس الزمن من إرسال التحديث حتى وصول الرد للخادم المحاكي
+
+التشغيل: python -m benchmarks.bench_update_latency --updates 2000 --rate 200
+"""
+
+import argparse
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.common import create_app, fake_telegram_api, percentile, print_table
+
+BENCH_SECRET = 'bench-secret'
+
+
+def _echo_update(update):
+    """معالج التحديثات في الاختبار: رد واحد يحمل معرف التحديث"""
+    from study_bot.telegram_client import get_client
+
+    message = update['message']
+    get_client().call('sendMessage', {'chat_id': message['chat']['id'], 'text': str(update['update_id'])})
+
+
+def _make_update(update_id, chats):
+    """تحديث رسالة نصية في إحدى المحادثات"""
+    chat_id = -1000000 - update_id % chats
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'chat': {'id': chat_id, 'type': 'supergroup'},
+            'from': {'id': update_id % 5000 + 1, 'first_name': 'bench'},
+            'text': '/ping'
+        }
+    }
+
+
+def _produce(args, first_id, deliver):
+    """إرسال التحديثات بالمعدل المحدد وإرجاع وقت إرسال كل تحديث"""
+    sent_at = {}
+    interval = 1.0 / args.rate
+    started = time.perf_counter()
+
+    for i in range(args.updates):
+        update_id = first_id + i
+        # الالتزام بالمعدل دون تراكم التأخير
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent_at[update_id] = time.perf_counter()
+        deliver(_make_update(update_id, args.chats))
+
+    return sent_at
+
+
+def _wait_replies(replies, sent_at, timeout=60):
+    """انتظار الرد على جميع التحديثات"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and any(update_id not in replies for update_id in sent_at):
+        time.sleep(0.05)
+
+
+def _summary(mode, sent_at, replies):
+    """ملخص زمن الرد بالملي ثانية"""
+    latencies = [(replies[update_id] - sent) * 1000 for update_id, sent in sent_at.items() if update_id in replies]
+    return {
+        'mode': mode,
+        'updates': len(sent_at),
+        'replied': len(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies, default=0.0)
+    }
+
+
+def run_polling(app, args, server, replies, first_id):
+    """وضع الاستطلاع: حلقة البوت تطلب التحديثات من الخادم المحاكي وتوزعها على العمال"""
+    import study_bot.bot as bot
+
+    bot._last_update_id = first_id - 1
+    bot._bot_running = True
+    thread = threading.Thread(target=bot.bot_thread_func, args=(app,), name='bench-polling', daemon=True)
+    thread.start()
+
+    sent_at = _produce(args, first_id, server.push_update)
+    _wait_replies(replies, sent_at)
+
+    bot._bot_running = False
+    thread.join(timeout=10)
+    return _summary('polling', sent_at, replies)
+
+
+def run_webhook(app, args, replies, first_id):
+    """وضع الويب هوك: طلبات HTTP لمسار الويب هوك على خادم محلي للتطبيق"""
+    from study_bot.bot import webhook
+    from study_bot.config import WEBHOOK_PATH
+
+    webhook.WEBHOOK_SECRET_TOKEN = BENCH_SECRET
+    http_server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, name='bench-webhook', daemon=True).start()
+
+    url = f'http://127.0.0.1:{http_server.server_port}{WEBHOOK_PATH}'
+    session = requests.Session()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': BENCH_SECRET}
+
+    def deliver(update):
+        response = session.post(url, json=update, headers=headers, timeout=10)
+        response.raise_for_status()
+
+    sent_at = _produce(args, first_id, deliver)
+    _wait_replies(replies, sent_at)
+
+    http_server.shutdown()
+    session.close()
+    return _summary('webhook', sent_at, replies)
+
+
+def main():
+    from study_bot.config import UPDATE_WORKERS
+
+    parser = argparse.ArgumentParser(description="اختبار زمن الرد على التحديثات في وضعي الاستطلاع والويب هوك")
+    parser.add_argument('--updates', type=int, default=2000, help="عدد التحديثات في كل وضع")
+    parser.add_argument('--rate', type=float, default=200, help="معدل التحديثات في الثانية")
+    parser.add_argument('--chats', type=int, default=500, help="عدد المحادثات")
+    parser.add_argument('--workers', type=int, default=UPDATE_WORKERS, help="عدد عمال معالجة التحديثات")
+    parser.add_argument('--latency', type=float, default=0.02, help="زمن استجابة الخادم المحاكي لإرسال الرد (بالثواني)")
+    args = parser.parse_args()
+
+    import study_bot.bot as bot
+    from study_bot.bot.dispatcher import init_dispatcher, shutdown_dispatcher
+    from study_bot.bot.webhook import webhook_bp
+
+    app = create_app()
+    app.register_blueprint(webhook_bp)
+
+    # العمال يستوردون process_update عند بدئهم، فيستبدل قبل تشغيلهم
+    bot.process_update = _echo_update
+
+    replies = {}
+
+    def on_request(method, data):
+        if method == 'sendMessage':
+            replies[int(data['text'])] = time.perf_counter()
+
+    rows = []
+    with fake_telegram_api(latency=args.latency, on_request=on_request) as server:
+        init_dispatcher(app, workers=args.workers)
+        rows.append(run_polling(app, args, server, replies, first_id=1))
+        rows.append(run_webhook(app, args, replies, first_id=args.updates + 1))
+        shutdown_dispatcher(timeout=10)
+
+    print_table(
+        f"زمن الرد: {args.updates} تحديث بمعدل {args.rate}/ثانية على {args.chats} محادثة و{args.workers} عامل",
+        rows
+    )
+
+
+if __name__ == "__main__":
+    main()
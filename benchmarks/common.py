@@ -0,0 +1,221 @@
+"""
+أدوات مشتركة لاختبارات الأداء
+تحتوي على تطبيق Flask بقاعدة بيانات مؤقتة، وخادم محلي يحاكي واجهة تيليجرام،
+وقياس الوقت والذاكرة وطباعة النتائج
+"""
+
+import gc
+import itertools
+import json
+import logging
+import os
+import resource
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import Flask
+
+# قاعدة البيانات: BENCH_DATABASE_URL (مثل PostgreSQL) أو ملف SQLite مؤقت
+BENCH_DATABASE_URL = os.environ.get('BENCH_DATABASE_URL')
+
+
+def create_app(database_url=None):
+    """إنشاء تطبيق بقاعدة بيانات مطبق عليها المخطط والترحيلات، وdatabase_url لفتح قاعدة بيانات اختبار سابق"""
+    from study_bot.models import db
+    from study_bot.migrations import run_migrations
+
+    # سجلات كل طلب تغير النتائج، فتظهر التحذيرات والأخطاء فقط
+    for name in (None, 'study_bot', 'werkzeug'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    app = Flask('benchmarks')
+    if database_url or BENCH_DATABASE_URL:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url or BENCH_DATABASE_URL
+    else:
+        # ملف وليس ذاكرة حتى تشترك فيه اتصالات العمال
+        path = os.path.join(tempfile.mkdtemp(prefix='study_bot_bench_'), 'bench.db')
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        run_migrations(db, check_plans=False)
+    return app
+
+
+def bulk_insert(model, rows, chunk_size=10000):
+    """إدراج صفوف كثيرة على دفعات، وrows قائمة أو مولد حتى لا تبنى كل الصفوف في الذاكرة"""
+    from study_bot.models import db
+
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        db.session.execute(model.__table__.insert(), chunk)
+        db.session.commit()
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """معالج طلبات الخادم المحاكي: يرد بنجاح بعد زمن الاستجابة المحدد، ويخدم getUpdates من طابور التحديثات"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # بدون هذا يتأخر الرد المكتوب على دفعتين حتى 40 ملي ثانية مع الاتصالات الدائمة
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        server = self.server
+        method = self.path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        data = json.loads(body or b'{}')
+
+        if method == 'getUpdates':
+            self._reply({'ok': True, 'result': server.wait_updates(data.get('offset', 0), data.get('timeout', 0))})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        with server.lock:
+            server.requests += 1
+            message_id = server.requests
+            server.last_request_at = time.perf_counter()
+            if server.on_request:
+                server.on_request(method, data)
+
+        self._reply({
+            'ok': True,
+            'result': {'message_id': message_id, 'chat': {'id': data.get('chat_id')}, 'text': data.get('text')}
+        })
+
+    def _reply(self, result):
+        payload = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    """خادم محلي يحاكي واجهة تيليجرام"""
+
+    daemon_threads = True
+
+    # أقصى مدة لانتظار getUpdates حتى لا يتأخر إيقاف الاختبار
+    max_poll_seconds = 1.0
+
+    def __init__(self, latency=0.0, on_request=None):
+        super().__init__(('127.0.0.1', 0), FakeTelegramHandler)
+        self.latency = latency
+        self.on_request = on_request
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.last_request_at = None
+        self._updates = []
+        self._updates_cond = threading.Condition()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def push_update(self, update):
+        """إضافة تحديث يستلمه البوت في الطلب التالي لـ getUpdates"""
+        with self._updates_cond:
+            self._updates.append(update)
+            self._updates_cond.notify_all()
+
+    def wait_updates(self, offset, timeout):
+        """التحديثات التي معرفها لا يقل عن offset، مع الانتظار حتى تصل (الاستطلاع الطويل)"""
+        deadline = time.monotonic() + min(timeout, self.max_poll_seconds)
+        with self._updates_cond:
+            # تيليجرام يحذف التحديثات التي أكدها offset
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._updates_cond.wait(deadline - time.monotonic())
+            return list(self._updates[:100])
+
+
+@contextmanager
+def fake_telegram_api(latency=0.0, on_request=None):
+    """تشغيل خادم محلي يحاكي واجهة تيليجرام، واستبدال العميل المشترك بعميل يتصل به"""
+    from study_bot import telegram_client
+
+    server = FakeTelegramServer(latency, on_request)
+    thread = threading.Thread(target=server.serve_forever, name='fake-telegram-api', daemon=True)
+    thread.start()
+
+    telegram_client.close_client()
+    telegram_client._client = telegram_client.TelegramClient(token='bench', api_url=server.url)
+    try:
+        yield server
+    finally:
+        telegram_client.close_client()
+        server.shutdown()
+        server.server_close()
+
+
+def rss_mb():
+    """الذاكرة المستخدمة حاليًا للعملية (بالميجابايت)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        # بدون /proc (مثل macOS) تستخدم الذروة بدلاً من القيمة الحالية
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def measure(results, name):
+    """قياس الزمن وتغير الذاكرة لجزء من الاختبار وإضافتهما للنتائج"""
+    gc.collect()
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    yield
+    results.append({
+        'name': name,
+        'seconds': time.perf_counter() - started,
+        'rss_delta_mb': rss_mb() - rss_before
+    })
+
+
+def percentile(values, p):
+    """النسبة المئوية p من القيم (0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_table(title, rows):
+    """طباعة النتائج في جدول نصي"""
+    print(f"\n{title}")
+    if not rows:
+        return
+
+    columns = list(rows[0])
+    cells = [[_format(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(cell[i]) for cell in cells)) for i, column in enumerate(columns)]
+
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    print('  '.join('-' * width for width in widths))
+    for cell in cells:
+        print('  '.join(value.ljust(width) for value, width in zip(cell, widths)))
+
+
+def _format(value):
+    """تنسيق قيمة في الجدول"""
+    if isinstance(value, float):
+        return f"{value:.4f}" if abs(value) < 10 else f"{value:.1f}"
+    return str(value)
@@ -32,25 +32,15 @@ debug_logger = logging.getLogger('bot_debug')
 
 def setup_webhook():
     """إعداد ويب هوك تليجرام للبوت"""
-    webhook_url = os.environ.get('WEBHOOK_URL')
-    if not webhook_url:
-        debug_logger.warning("لم يتم تعيين عنوان WEBHOOK_URL")
-        return False
-    
-    url = f"{TELEGRAM_API_URL}/setWebhook"
-    payload = {
-        'url': webhook_url
-    }
-    
     try:
-        response = requests.post(url, json=payload)
-        result = response.json()
+        # استخدام نفس الإعداد الذي يستخدمه البوت في وضع الويب هوك
+        from study_bot.bot.webhook import set_webhook
         
-        if response.status_code == 200 and result.get('ok'):
-            debug_logger.info(f"تم إعداد ويب هوك بنجاح: {webhook_url}")
+        if set_webhook():
+            debug_logger.info("تم إعداد ويب هوك بنجاح")
             return True
         else:
-            debug_logger.error(f"فشل إعداد ويب هوك: {result}")
+            debug_logger.error("فشل إعداد ويب هوك")
             return False
     except Exception as e:
         debug_logger.error(f"استثناء أثناء إعداد ويب هوك: {e}")
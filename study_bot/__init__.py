@@ -34,6 +34,38 @@ def create_app():
     # تهيئة نظام التسجيل المفصل
     os.makedirs('logs', exist_ok=True)
     
+    # تحميل مجموعة الرسائل التحفيزية
+    from study_bot.motivation_pool import init_motivation_pool
+    init_motivation_pool(app)
+    
+    # بناء لوحات ترتيب المعسكرات
+    from study_bot.camp_leaderboard import init_camp_leaderboards
+    init_camp_leaderboards(app)
+    
+    # تسجيل أحداث حذف إحصائيات المعسكرات المحفوظة عند تغير مهامها أو مشاركيها
+    from study_bot.camp_analytics import init_camp_analytics
+    init_camp_analytics()
+    
+    # تهيئة كاتب سجل الرسائل
+    from study_bot.message_log_writer import init_message_log_writer
+    init_message_log_writer(app)
+    
+    # تهيئة مجمع العدادات
+    from study_bot.stats_aggregator import init_stats_aggregator
+    init_stats_aggregator(app)
+    
+    # تهيئة طابور الرسائل الصادرة
+    from study_bot.outbound_queue import init_outbound_queue
+    init_outbound_queue(app)
+    
+    # تهيئة المهام المؤجلة
+    from study_bot.delayed_jobs import init_delayed_jobs
+    init_delayed_jobs(app)
+    
+    # تهيئة الرسائل الجماعية واستكمال المتوقف منها
+    from study_bot.broadcasts import init_broadcasts
+    init_broadcasts(app)
+    
     # تهيئة البوت
     from study_bot.bot import init_bot
     bot = init_bot(app)
@@ -70,6 +102,49 @@ def create_app():
             shutdown_scheduler()
         except Exception as e:
             logger.error(f"خطأ أثناء إيقاف المجدول: {e}")
+        
+        # إيقاف المهام المؤجلة (تبقى محفوظة لإعادة التشغيل)
+        try:
+            from study_bot.delayed_jobs import shutdown_delayed_jobs
+            shutdown_delayed_jobs()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إيقاف المهام المؤجلة: {e}")
+        
+        # إيقاف الرسائل الجماعية (تستكمل من نقطة الاستكمال عند إعادة التشغيل)
+        try:
+            from study_bot.broadcasts import shutdown_broadcasts
+            shutdown_broadcasts()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إيقاف الرسائل الجماعية: {e}")
+        
+        # إرسال الرسائل المتبقية في الطابور وحفظ ما لم يرسل خلال المهلة لإعادة التشغيل
+        try:
+            from study_bot.outbound_queue import shutdown_outbound_queue
+            shutdown_outbound_queue()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إيقاف طابور الرسائل الصادرة: {e}")
+        
+        # كتابة سجلات الرسائل المتبقية
+        try:
+            from study_bot.message_log_writer import shutdown_message_log_writer
+            shutdown_message_log_writer()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إيقاف كاتب سجل الرسائل: {e}")
+        
+        # كتابة فروق العدادات المتبقية
+        try:
+            from study_bot.stats_aggregator import shutdown_stats_aggregator
+            shutdown_stats_aggregator()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إيقاف مجمع العدادات: {e}")
+        
+        # إغلاق اتصالات عميل تيليجرام
+        try:
+            from study_bot.telegram_client import get_client_stats, close_client
+            logger.info(f"إحصائيات اتصالات تيليجرام: {get_client_stats()}")
+            close_client()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إغلاق عميل تيليجرام: {e}")
     
     # تسجيل دالة التنظيف ليتم استدعاؤها عند إيقاف التطبيق
     atexit.register(cleanup_resources)
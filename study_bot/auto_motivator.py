@@ -10,7 +10,7 @@ import random
 from datetime import datetime
 
 from study_bot.config import logger, MOTIVATIONAL_MESSAGES, get_current_time
-from study_bot.models import db, User, Group
+from study_bot.models import db, User, Group, iter_rows
 from study_bot.bot import send_message
 
 # وقت التأخير بالثواني قبل إرسال الرسالة التحفيزية
@@ -25,12 +25,6 @@ def send_activation_motivation():
         # انتظار الوقت المحدد
         time.sleep(ACTIVATION_MOTIVATION_DELAY)
         
-        # الحصول على المجموعات النشطة
-        groups = Group.query.filter_by(is_active=True).all()
-        if not groups:
-            logger.warning("لا توجد مجموعات نشطة لإرسال رسائل تحفيزية")
-            return
-        
         # إعداد الرسالة التحفيزية
         current_time = get_current_time()
         motivation_message = random.choice(MOTIVATIONAL_MESSAGES)
@@ -44,8 +38,11 @@ def send_activation_motivation():
 استخدم أمر /help للحصول على قائمة الأوامر المتاحة.
 """
         
+        # قراءة المجموعات النشطة على دفعات بالأعمدة المطلوبة فقط
         sent_count = 0
-        for group in groups:
+        groups_count = 0
+        for group in iter_rows(Group.telegram_id, Group.title, where=Group.is_active == True):
+            groups_count += 1
             try:
                 result = send_message(group.telegram_id, message_text)
                 if result:
@@ -57,7 +54,11 @@ def send_activation_motivation():
                 logger.error(f"خطأ أثناء إرسال رسالة تفعيل تحفيزية: {e}")
                 continue
         
-        logger.info(f"تم إرسال رسائل تفعيل تحفيزية إلى {sent_count} مجموعة من أصل {len(groups)} مجموعة نشطة")
+        if not groups_count:
+            logger.warning("لا توجد مجموعات نشطة لإرسال رسائل تحفيزية")
+            return
+        
+        logger.info(f"تم إرسال رسائل تفعيل تحفيزية إلى {sent_count} مجموعة من أصل {groups_count} مجموعة نشطة")
         return True
     except Exception as e:
         logger.error(f"خطأ في دالة إرسال الرسائل التحفيزية بعد التفعيل: {e}")
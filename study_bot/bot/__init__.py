@@ -9,11 +9,13 @@ import threading
 import time
 import logging
 from datetime import datetime
-import requests
 from flask import Flask, current_app
 
-from study_bot.config import logger, SCHEDULER_TIMEZONE, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, get_current_time
-from study_bot.models import db, User, MessageLog
+from study_bot.config import logger, SCHEDULER_TIMEZONE, BOT_UPDATE_MODE, get_current_time
+from study_bot.models import db, User
+from study_bot.telegram_client import get_client
+from study_bot.message_log_writer import log_row
+from study_bot.identity_cache import get_user, touch_user_activity
 from study_bot.bot_commands_debug import log_update, log_error, log_command, log_callback_query, test_bot_token, log_message_processing
 
 # المتغيرات العامة
@@ -40,6 +42,18 @@ def init_bot(app):
     
     logger.info(f"تم التحقق من توكن البوت بنجاح: {bot_info.get('username')} (ID: {bot_info.get('id')})")
     
+    # تشغيل موزع التحديثات لمعالجة المحادثات المختلفة بالتوازي
+    from study_bot.bot.dispatcher import init_dispatcher
+    init_dispatcher(app)
+    
+    # وضع الويب هوك، مع العودة لوضع الاستطلاع في حالة فشل الإعداد
+    if BOT_UPDATE_MODE == 'webhook':
+        from study_bot.bot.webhook import start_webhook
+        if start_webhook():
+            _bot_running = True
+            return None
+        logger.warning("فشل تفعيل الويب هوك، سيتم استخدام وضع الاستطلاع")
+    
     # بدء تشغيل سلسلة البوت
     _bot_running = True
     _bot_thread = threading.Thread(target=bot_thread_func, args=(app,))
@@ -59,7 +73,14 @@ def stop_bot():
     
     logger.info("إيقاف البوت")
     _bot_running = False
-    time.sleep(UPDATE_INTERVAL + 1)  # انتظار انتهاء الدورة الحالية
+    
+    from study_bot.bot.webhook import stop_webhook
+    if not stop_webhook():
+        time.sleep(UPDATE_INTERVAL + 1)  # انتظار انتهاء الدورة الحالية
+    
+    # إيقاف عمال معالجة التحديثات
+    from study_bot.bot.dispatcher import shutdown_dispatcher
+    shutdown_dispatcher()
     
     logger.info("تم إيقاف البوت")
     return True
@@ -71,6 +92,10 @@ def bot_thread_func(app):
     with app.app_context():
         logger.info("بدء حلقة البوت")
         
+        # حذف أي ويب هوك سابق لأن تيليجرام يرفض getUpdates أثناء تفعيله
+        from study_bot.bot.webhook import delete_webhook
+        delete_webhook()
+        
         try:
             while _bot_running:
                 try:
@@ -78,11 +103,11 @@ def bot_thread_func(app):
                     updates = get_updates()
                     
                     if updates:
-                        # معالجة التحديثات
+                        # معالجة التحديثات وطلب الدفعة التالية مباشرة
                         process_updates(updates)
-                    
-                    # انتظار الفترة الزمنية المحددة
-                    time.sleep(UPDATE_INTERVAL)
+                    else:
+                        # انتظار الفترة الزمنية المحددة
+                        time.sleep(UPDATE_INTERVAL)
                 except Exception as e:
                     logger.error(f"حدث خطأ أثناء حلقة البوت: {e}")
                     time.sleep(UPDATE_INTERVAL * 5)  # انتظار فترة أطول في حالة حدوث خطأ
@@ -94,20 +119,15 @@ def bot_thread_func(app):
 
 def get_updates():
     """الحصول على التحديثات من واجهة برمجة تطبيقات تيليجرام"""
-    global _last_update_id
-    
     try:
-        # بناء رابط الطلب مع توكن البوت
-        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
-        
         # بناء البيانات
         data = {
             "offset": _last_update_id + 1,
             "timeout": 30
         }
         
-        # إرسال الطلب
-        response = requests.post(url, json=data, timeout=60)
+        # إرسال الطلب عبر العميل المشترك
+        response = get_client().post("getUpdates", data)
         
         # التحقق من نجاح الطلب
         if response.status_code != 200:
@@ -121,59 +141,67 @@ def get_updates():
             logger.error(f"خطأ في الحصول على التحديثات: {result}")
             return []
         
-        updates = result["result"]
-        
-        # تحديث آخر معرف للتحديث
-        if updates:
-            _last_update_id = updates[-1]["update_id"]
-        
-        return updates
+        # لا يتقدم آخر معرف هنا، بل بعد تسليم كل تحديث في process_updates،
+        # حتى لا يؤكد الطلب التالي تحديثات لم تسلم للعمال بعد
+        return result["result"]
     except Exception as e:
         logger.error(f"حدث خطأ أثناء الحصول على التحديثات: {e}")
         return []
 
 def process_updates(updates):
-    """معالجة التحديثات"""
+    """معالجة التحديثات، بالتوازي بين المحادثات عند تشغيل موزع التحديثات"""
+    global _last_update_id
+    from study_bot.bot.dispatcher import is_dispatcher_running, dispatch_update
+    
     for update in updates:
-        try:
-            # معالجة التحديث بناءً على نوعه
-            if "message" in update:
-                try:
-                    handle_message(update["message"])
-                except Exception as e:
-                    logger.error(f"خطأ في معالجة رسالة: {e}")
-                    # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
-            elif "callback_query" in update:
+        # توزيع التحديث على العامل المسؤول عن محادثته (ينتظر عند امتلاء الطابور)
+        if not (is_dispatcher_running() and dispatch_update(update)):
+            process_update(update)
+        
+        # تحديث آخر معرف بعد تسليم التحديث للعامل أو معالجته
+        _last_update_id = update["update_id"]
+
+def process_update(update):
+    """معالجة تحديث واحد"""
+    try:
+        # معالجة التحديث بناءً على نوعه
+        if "message" in update:
+            try:
+                handle_message(update["message"])
+            except Exception as e:
+                logger.error(f"خطأ في معالجة رسالة: {e}")
+                # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
                 try:
-                    handle_callback_query(update["callback_query"])
-                except Exception as e:
-                    logger.error(f"خطأ في معالجة استجابة: {e}")
-                    # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
-            elif "chat_member" in update:
+                    db.session.rollback()
+                except:
+                    pass
+        elif "callback_query" in update:
+            try:
+                handle_callback_query(update["callback_query"])
+            except Exception as e:
+                logger.error(f"خطأ في معالجة استجابة: {e}")
+                # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
                 try:
-                    handle_chat_member(update["chat_member"])
-                except Exception as e:
-                    logger.error(f"خطأ في معالجة عضو دردشة: {e}")
-                    # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
-        except Exception as e:
-            logger.error(f"حدث خطأ عام أثناء معالجة التحديث: {e}")
-            # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
+                    db.session.rollback()
+                except:
+                    pass
+        elif "chat_member" in update:
             try:
-                db.session.rollback()
-            except:
-                pass
+                handle_chat_member(update["chat_member"])
+            except Exception as e:
+                logger.error(f"خطأ في معالجة عضو دردشة: {e}")
+                # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
+                try:
+                    db.session.rollback()
+                except:
+                    pass
+    except Exception as e:
+        logger.error(f"حدث خطأ عام أثناء معالجة التحديث: {e}")
+        # إعادة تعيين الجلسة في حالة حدوث خطأ في قاعدة البيانات
+        try:
+            db.session.rollback()
+        except:
+            pass
 
 def handle_message(message):
     """معالجة الرسائل الواردة"""
@@ -190,9 +218,9 @@ def handle_message(message):
         # معالجة المستخدم
         user = handle_user(message["from"])
         
-        # تحديث نشاط المستخدم
+        # تحديث نشاط المستخدم (مرة واحدة على الأكثر كل عدة دقائق)
         if user:
-            user.update_activity()
+            touch_user_activity(user)
         
         # التحقق من نوع الرسالة
         if "text" in message:
@@ -282,7 +310,7 @@ def handle_user(user_data):
     """معالجة بيانات المستخدم"""
     try:
         # البحث عن المستخدم
-        user = User.query.filter_by(telegram_id=user_data["id"]).first()
+        user = get_user(user_data["id"])
         
         # إضافة مستخدم جديد إذا لم يكن موجودًا
         if not user:
@@ -351,9 +379,6 @@ def handle_user(user_data):
 def send_message(chat_id, text, reply_markup=None, parse_mode="HTML"):
     """إرسال رسالة إلى مستخدم أو مجموعة"""
     try:
-        # بناء رابط الطلب مع التأكد من إضافة التوكن
-        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        
         # بناء البيانات
         data = {
             "chat_id": chat_id,
@@ -365,45 +390,28 @@ def send_message(chat_id, text, reply_markup=None, parse_mode="HTML"):
         if reply_markup:
             data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
         
-        # إرسال الطلب
-        response = requests.post(url, json=data, timeout=60)
+        # إرسال الطلب عبر العميل المشترك مع إعادة المحاولة عند تجاوز الحد أو أخطاء الخادم
+        result = get_client().call("sendMessage", data)
         
         # التحقق من نجاح الطلب
-        if response.status_code != 200:
-            logger.error(f"فشل إرسال الرسالة: {response.text}")
-            return None
-        
-        # تحليل الاستجابة
-        result = response.json()
-        
-        if not result["ok"]:
-            logger.error(f"خطأ في إرسال الرسالة: {result}")
+        if not result or not result.get("ok"):
+            logger.error(f"فشل إرسال الرسالة: {result}")
             return None
         
         # تسجيل الرسالة المرسلة
         sent_message = result["result"]
         
         try:
-            # إنشاء سجل للرسالة المرسلة
-            message_log = MessageLog(
-                chat_id=chat_id,
-                user_id=None,  # الرسائل المرسلة من البوت ليس لها معرف مستخدم
-                message_type="send",
+            # إضافة سجل للرسالة المرسلة ليكتب ضمن دفعة
+            log_row(
+                chat_id,
+                "send",
                 message_id=sent_message["message_id"],
                 content=text,
-                is_from_bot=True,
-                sent_at=datetime.now(SCHEDULER_TIMEZONE)
+                is_from_bot=True
             )
-            
-            db.session.add(message_log)
-            db.session.commit()
         except Exception as e:
             logger.error(f"حدث خطأ أثناء تسجيل الرسالة المرسلة: {e}")
-            # إعادة تعيين الجلسة في حالة حدوث خطأ لتجنب الخطأ في العمليات اللاحقة
-            try:
-                db.session.rollback()
-            except:
-                pass
         
         return sent_message
     except Exception as e:
@@ -413,9 +421,6 @@ def send_message(chat_id, text, reply_markup=None, parse_mode="HTML"):
 def edit_message(chat_id, message_id, text, reply_markup=None, parse_mode="HTML"):
     """تعديل رسالة موجودة"""
     try:
-        # بناء رابط الطلب مع التأكد من إضافة التوكن
-        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/editMessageText"
-        
         # بناء البيانات
         data = {
             "chat_id": chat_id,
@@ -428,54 +433,28 @@ def edit_message(chat_id, message_id, text, reply_markup=None, parse_mode="HTML"
         if reply_markup:
             data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
         
-        # إرسال الطلب
-        response = requests.post(url, json=data, timeout=60)
+        # إرسال الطلب عبر العميل المشترك مع إعادة المحاولة عند تجاوز الحد أو أخطاء الخادم
+        result = get_client().call("editMessageText", data)
         
         # التحقق من نجاح الطلب
-        if response.status_code != 200:
-            logger.error(f"فشل تعديل الرسالة: {response.text}")
-            return None
-        
-        # تحليل الاستجابة
-        result = response.json()
-        
-        if not result["ok"]:
-            logger.error(f"خطأ في تعديل الرسالة: {result}")
+        if not result or not result.get("ok"):
+            logger.error(f"فشل تعديل الرسالة: {result}")
             return None
         
         # تسجيل الرسالة المعدلة
         edited_message = result["result"]
         
         try:
-            # تحديث سجل الرسالة
-            message_log = MessageLog.query.filter_by(
-                chat_id=chat_id,
-                message_id=message_id
-            ).first()
-            
-            if message_log:
-                message_log.content = text
-                message_log.updated_at = datetime.now(SCHEDULER_TIMEZONE)
-                db.session.commit()
-            else:
-                # إنشاء سجل جديد إذا لم يكن موجودًا
-                new_log = MessageLog(
-                    chat_id=chat_id,
-                    user_id=None,
-                    message_type="edit",
-                    message_id=message_id,
-                    content=text,
-                    is_from_bot=True,
-                    sent_at=datetime.now(SCHEDULER_TIMEZONE)
-                )
-                db.session.add(new_log)
-                db.session.commit()
+            # إضافة سجل للتعديل بدلاً من البحث عن السجل الأصلي وتحديثه
+            log_row(
+                chat_id,
+                "edit",
+                message_id=message_id,
+                content=text,
+                is_from_bot=True
+            )
         except Exception as e:
             logger.error(f"حدث خطأ أثناء تسجيل الرسالة المعدلة: {e}")
-            try:
-                db.session.rollback()
-            except:
-                pass
         
         return edited_message
     except Exception as e:
@@ -494,18 +473,14 @@ def log_message(message, message_type="receive"):
         if not chat_id or not message_id:
             return
         
-        # إنشاء سجل للرسالة - استخدم عمود content بدلاً من message_text لتتوافق مع بنية الجدول
-        message_log = MessageLog(
-            chat_id=chat_id,
-            user_id=user_id,
-            message_type=message_type,
+        # إضافة سجل للرسالة ليكتب ضمن دفعة - استخدم عمود content بدلاً من message_text لتتوافق مع بنية الجدول
+        log_row(
+            chat_id,
+            message_type,
             message_id=message_id,
             content=message_text,
-            is_from_bot=False,
-            sent_at=datetime.now(SCHEDULER_TIMEZONE)
+            user_id=user_id,
+            is_from_bot=False
         )
-        
-        db.session.add(message_log)
-        db.session.commit()
     except Exception as e:
         logger.error(f"حدث خطأ أثناء تسجيل الرسالة: {e}")
\ No newline at end of file
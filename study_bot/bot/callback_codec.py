@@ -0,0 +1,156 @@
+"""
+وحدة ترميز بيانات الأزرار
+تحتوي على ترميز ثنائي مضغوط لبيانات الأزرار التفاعلية: رقم إصدار ونوع الإجراء ووقت الانتهاء
+ثم حقول الإجراء، مع توقيع HMAC مختصر، وكل ذلك بترميز base64url يتسع في حد تيليجرام (64 بايت)
+فيحمل الزر معرف المهمة ومهلتها ونقاطها، ويرفض الزر المزور أو المنتهي قبل أي استعلام
+"""
+
+import base64
+import hashlib
+import hmac
+import struct
+import threading
+import time
+
+from study_bot.config import CALLBACK_SECRET, CALLBACK_TAG_SIZE
+
+# الإصدار الحالي للترميز
+CALLBACK_VERSION = 1
+
+# بادئة تميز البيانات المرمزة عن النصوص القديمة مثل task_join:morning:12
+PACKED_PREFIX = '~'
+
+# حد تيليجرام لطول بيانات الزر (بالبايت)
+CALLBACK_DATA_LIMIT = 64
+
+# الإجراءات المدعومة: الاسم -> (الرمز، الحقول)
+# أنواع الحقول: I عدد صحيح موجب (4 بايت)، H عدد صحيح موجب صغير (2 بايت)، s نص قصير
+# لا يغير رمز إجراء ولا ترتيب حقوله بعد نشره، بل يضاف إجراء جديد أو يرفع رقم الإصدار
+ACTIONS = {
+    'task_join': (1, [('schedule_id', 'I'), ('points', 'H'), ('task_type', 's')]),
+    'camp_join': (2, [('camp_id', 'I')]),
+    'camp_task_join': (3, [('task_id', 'I'), ('points', 'H')]),
+    'camp_rank': (4, [('camp_id', 'I')])
+}
+
+_ACTION_NAMES = {code: name for name, (code, _) in ACTIONS.items()}
+
+# الرأس: الإصدار، رمز الإجراء، وقت الانتهاء (ثوانٍ منذ 1970، وصفر يعني بلا انتهاء)
+_HEADER = struct.Struct('>BBI')
+
+_stats = {
+    'encoded': 0,
+    'decoded': 0,
+    'malformed': 0,
+    'forged': 0,
+    'expired': 0
+}
+_stats_lock = threading.Lock()
+
+
+class InvalidCallback(Exception):
+    """بيانات زر غير صالحة، ونص الاستثناء هو ما يظهر للمستخدم"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _count(key):
+    """زيادة عداد إحصائيات"""
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _sign(body):
+    """حساب التوقيع المختصر"""
+    return hmac.new(CALLBACK_SECRET.encode(), body, hashlib.sha256).digest()[:CALLBACK_TAG_SIZE]
+
+
+def is_packed(callback_data):
+    """التحقق مما إذا كانت بيانات الزر مرمزة"""
+    return bool(callback_data) and callback_data.startswith(PACKED_PREFIX)
+
+
+def encode_callback(action, expires_at=None, **fields):
+    """ترميز بيانات زر لإجراء مسجل، وexpires_at وقت انتهاء صلاحية الزر (datetime أو ثوانٍ)"""
+    if action not in ACTIONS:
+        raise ValueError(f"إجراء غير معروف في بيانات الزر: {action}")
+
+    code, schema = ACTIONS[action]
+    if hasattr(expires_at, 'timestamp'):
+        expires_at = expires_at.timestamp()
+
+    body = bytearray(_HEADER.pack(CALLBACK_VERSION, code, int(expires_at or 0)))
+    for name, field_type in schema:
+        value = fields[name]
+        if field_type == 's':
+            encoded = str(value).encode('utf-8')
+            if len(encoded) > 255:
+                raise ValueError(f"الحقل {name} أطول من المسموح")
+            body += bytes([len(encoded)]) + encoded
+        else:
+            body += struct.pack('>' + field_type, int(value))
+
+    body = bytes(body)
+    data = PACKED_PREFIX + base64.urlsafe_b64encode(body + _sign(body)).decode('ascii').rstrip('=')
+    if len(data) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"بيانات الزر للإجراء {action} أطول من حد تيليجرام ({len(data)} بايت)")
+
+    _count('encoded')
+    return data
+
+
+def decode_callback(callback_data):
+    """فك ترميز بيانات زر والتحقق من توقيعها وصلاحيتها، وإرجاع (الإجراء، الحقول)"""
+    try:
+        raw = callback_data[len(PACKED_PREFIX):]
+        packed = base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4))
+    except (ValueError, TypeError):
+        _count('malformed')
+        raise InvalidCallback('malformed', "❌ زر غير صالح.")
+
+    body, tag = packed[:-CALLBACK_TAG_SIZE], packed[-CALLBACK_TAG_SIZE:]
+    if len(body) < _HEADER.size:
+        _count('malformed')
+        raise InvalidCallback('malformed', "❌ زر غير صالح.")
+
+    # التحقق من التوقيع قبل قراءة أي حقل
+    if not hmac.compare_digest(tag, _sign(body)):
+        _count('forged')
+        raise InvalidCallback('forged', "❌ زر غير صالح.")
+
+    version, code, expires_at = _HEADER.unpack_from(body)
+    action = _ACTION_NAMES.get(code)
+    if version != CALLBACK_VERSION or not action:
+        _count('malformed')
+        raise InvalidCallback('malformed', "⚠️ هذا الزر قديم، يرجى استخدام رسالة أحدث.")
+
+    if expires_at and time.time() > expires_at:
+        _count('expired')
+        raise InvalidCallback('expired', "⏰ انتهت المهلة المحددة لهذا الزر.")
+
+    fields = {}
+    offset = _HEADER.size
+    try:
+        for name, field_type in ACTIONS[action][1]:
+            if field_type == 's':
+                size = body[offset]
+                fields[name] = body[offset + 1:offset + 1 + size].decode('utf-8')
+                offset += 1 + size
+            else:
+                fields[name] = struct.unpack_from('>' + field_type, body, offset)[0]
+                offset += struct.calcsize('>' + field_type)
+    except (IndexError, struct.error, UnicodeDecodeError):
+        _count('malformed')
+        raise InvalidCallback('malformed', "❌ زر غير صالح.")
+
+    fields['expires_at'] = expires_at or None
+    _count('decoded')
+    return action, fields
+
+
+def get_codec_stats():
+    """الحصول على إحصائيات ترميز بيانات الأزرار"""
+    with _stats_lock:
+        return dict(_stats)
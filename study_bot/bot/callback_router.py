@@ -0,0 +1,183 @@
+"""
+وحدة موجه استجابات الأزرار
+تحتوي على موجه يسجل فيه كل معالج بنمط مثل task_join:{task_type}:{schedule_id:int}
+ويطابق بيانات الزر بقاموس للأنماط الثابتة وشجرة بادئات للأنماط ذات المعاملات
+ويمرر لكل معالج المعاملات التي يطلبها بالاسم فقط، فلا تحمل المجموعة أو المستخدم إلا عند الحاجة
+والبيانات المرمزة (انظر callback_codec) توجه باسم الإجراء بعد التحقق من توقيعها وصلاحيتها
+"""
+
+import inspect
+import re
+
+from study_bot.config import logger
+from study_bot.bot.callback_codec import PACKED_PREFIX, InvalidCallback, is_packed, decode_callback
+
+# أنواع المعاملات المدعومة في الأنماط: (التعبير النمطي، دالة التحويل)
+PARAM_TYPES = {
+    'str': (r'[^:]+', str),
+    'int': (r'-?\d+', int)
+}
+
+_PARAM_RE = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+
+class CallbackRejected(Exception):
+    """رفض الاستجابة برسالة تظهر للمستخدم (مثل عدم وجود المجموعة أو عدم الصلاحية)"""
+
+
+class CallbackRouter:
+    """موجه استجابات الأزرار"""
+
+    def __init__(self, name, answer=None, unknown_text="⚠️ خيار غير مدعوم"):
+        self.name = name
+        self.answer = answer
+        self.unknown_text = unknown_text
+        self._exact = {}
+        self._trie = {}
+        self._packed = {}
+        self._routes = []
+        self._dependencies = {}
+
+    def dependency(self, name):
+        """تسجيل دالة تحميل كسولة لمعامل يطلبه المعالج (مثل user أو group)"""
+        def decorator(loader):
+            self._dependencies[name] = loader
+            return loader
+        return decorator
+
+    def route(self, pattern, description=None):
+        """تسجيل معالج لنمط بيانات الزر"""
+        def decorator(func):
+            self.add_route(pattern, func, description)
+            return func
+        return decorator
+
+    def packed(self, action, description=None):
+        """تسجيل معالج لإجراء مرمز، ويستقبل حقول الإجراء كمعاملات"""
+        def decorator(func):
+            self.add_route(PACKED_PREFIX + action, func, description)
+            return func
+        return decorator
+
+    def add_route(self, pattern, func, description=None):
+        """تسجيل معالج لنمط بيانات الزر"""
+        route = {
+            'pattern': pattern,
+            'func': func,
+            'args': list(inspect.signature(func).parameters),
+            'description': description or (func.__doc__ or '').strip(),
+            'converters': {}
+        }
+        self._routes.append(route)
+
+        if is_packed(pattern):
+            self._packed[pattern[len(PACKED_PREFIX):]] = route
+            return
+
+        match = _PARAM_RE.search(pattern)
+        if not match:
+            self._exact[pattern] = route
+            return
+
+        # تحويل النمط إلى تعبير نمطي، وفهرسته بالجزء الثابت في بدايته
+        regex = ''
+        position = 0
+        for param in _PARAM_RE.finditer(pattern):
+            param_type = param.group(2) or 'str'
+            if param_type not in PARAM_TYPES:
+                raise ValueError(f"نوع معامل غير معروف في النمط {pattern}: {param_type}")
+
+            expression, converter = PARAM_TYPES[param_type]
+            regex += re.escape(pattern[position:param.start()]) + f'(?P<{param.group(1)}>{expression})'
+            route['converters'][param.group(1)] = converter
+            position = param.end()
+
+        route['regex'] = re.compile(regex + re.escape(pattern[position:]) + '$')
+
+        node = self._trie
+        for char in pattern[:match.start()]:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(route)
+
+    def match(self, callback_data):
+        """مطابقة بيانات الزر مع المعالج المسجل، وإرجاع (المسار، المعاملات) أو (None, None)"""
+        route = self._exact.get(callback_data)
+        if route:
+            return route, {}
+
+        # جمع المسارات على طول البادئة ثم تجربة الأطول أولاً
+        candidates = []
+        node = self._trie
+        for char in callback_data:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                candidates.append(node[None])
+
+        for routes in reversed(candidates):
+            for route in routes:
+                found = route['regex'].match(callback_data)
+                if found:
+                    params = {
+                        name: route['converters'][name](value)
+                        for name, value in found.groupdict().items()
+                    }
+                    return route, params
+
+        return None, None
+
+    def dispatch(self, callback_data, **context):
+        """تنفيذ المعالج المطابق لبيانات الزر مع تمرير المعاملات التي يطلبها"""
+        callback_query_id = context.get('callback_query_id')
+
+        if is_packed(callback_data):
+            # رفض الزر المزور أو المنتهي دون أي استعلام
+            try:
+                action, params = decode_callback(callback_data)
+            except InvalidCallback as e:
+                logger.warning(f"بيانات زر مرفوضة في {self.name} ({e.reason}): {callback_data}")
+                if self.answer:
+                    self.answer(callback_query_id, str(e), True)
+                return False
+            route = self._packed.get(action)
+        else:
+            route, params = self.match(callback_data)
+
+        if not route:
+            logger.warning(f"استجابة غير معروفة في {self.name}: {callback_data}")
+            if self.answer:
+                self.answer(callback_query_id, self.unknown_text.format(callback_data=callback_data))
+            return False
+
+        values = dict(context, callback_data=callback_data, **params)
+
+        try:
+            kwargs = {name: self._resolve(name, values) for name in route['args']}
+        except CallbackRejected as e:
+            if self.answer:
+                self.answer(callback_query_id, str(e), True)
+            return False
+
+        return route['func'](**kwargs)
+
+    def _resolve(self, name, values):
+        """الحصول على قيمة معامل، وتحميل التبعيات عند أول طلب فقط"""
+        if name not in values:
+            loader = self._dependencies.get(name)
+            if not loader:
+                raise TypeError(f"المعامل {name} غير متاح في {self.name}")
+            values[name] = loader(lambda key: self._resolve(key, values))
+        return values[name]
+
+    def list_routes(self):
+        """الحصول على قائمة المسارات المسجلة"""
+        return [
+            {
+                'pattern': route['pattern'],
+                'handler': f"{route['func'].__module__}.{route['func'].__name__}",
+                'args': route['args'],
+                'description': route['description']
+            }
+            for route in self._routes
+        ]
@@ -0,0 +1,173 @@
+"""
+وحدة توزيع التحديثات
+تحتوي على موزع يقسم التحديثات على مجموعة عمال حسب معرف المحادثة
+مع الحفاظ على ترتيب التحديثات داخل كل محادثة
+"""
+
+import queue
+import threading
+import time
+
+from study_bot.config import logger, UPDATE_WORKERS, UPDATE_SHARD_QUEUE_SIZE
+
+# المتغيرات العامة
+_shards = []
+_workers = []
+_dispatcher_running = False
+_dispatcher_accepting = False
+_stats_lock = threading.Lock()
+_processed_counts = []
+_rejected_count = 0
+
+
+def get_update_chat_id(update):
+    """الحصول على معرف المحادثة التي ينتمي إليها التحديث"""
+    if "message" in update:
+        return update["message"].get("chat", {}).get("id")
+
+    if "callback_query" in update:
+        callback_query = update["callback_query"]
+        message = callback_query.get("message")
+        if message:
+            return message.get("chat", {}).get("id")
+        return callback_query.get("from", {}).get("id")
+
+    for key in ("chat_member", "my_chat_member", "edited_message"):
+        if key in update:
+            return update[key].get("chat", {}).get("id")
+
+    return None
+
+
+def _get_shard_index(update):
+    """تحديد رقم العامل المسؤول عن التحديث"""
+    chat_id = get_update_chat_id(update)
+    if chat_id is None:
+        chat_id = update.get("update_id", 0)
+    return hash(chat_id) % len(_shards)
+
+
+def _worker_func(app, index):
+    """دالة عامل معالجة التحديثات"""
+    from study_bot.bot import process_update
+    from study_bot.models import db
+
+    shard = _shards[index]
+
+    # لكل عامل سياق تطبيق خاص به وبالتالي جلسة قاعدة بيانات خاصة به
+    with app.app_context():
+        while _dispatcher_running:
+            try:
+                update = shard.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                process_update(update)
+            except Exception as e:
+                logger.error(f"خطأ في معالجة التحديث {update.get('update_id')} في العامل {index}: {e}")
+            finally:
+                # بدء جلسة جديدة لكل تحديث حتى لا تبقى كائنات قديمة في الذاكرة
+                try:
+                    db.session.remove()
+                except Exception:
+                    pass
+
+                with _stats_lock:
+                    _processed_counts[index] += 1
+                shard.task_done()
+
+
+def init_dispatcher(app, workers=None):
+    """تهيئة موزع التحديثات وبدء العمال"""
+    global _dispatcher_running, _dispatcher_accepting
+
+    if _dispatcher_running:
+        logger.warning("موزع التحديثات يعمل بالفعل")
+        return False
+
+    count = workers or UPDATE_WORKERS
+    _shards[:] = [queue.Queue(maxsize=UPDATE_SHARD_QUEUE_SIZE) for _ in range(count)]
+    _processed_counts[:] = [0] * count
+    _dispatcher_running = True
+    _dispatcher_accepting = True
+
+    for index in range(count):
+        worker = threading.Thread(target=_worker_func, args=(app, index), name=f"update-worker-{index}")
+        worker.daemon = True
+        worker.start()
+        _workers.append(worker)
+
+    logger.info(f"تم بدء موزع التحديثات مع {count} عامل")
+    return True
+
+
+def _unfinished_count():
+    """عدد التحديثات المنتظرة أو قيد المعالجة في طوابير العمال"""
+    return sum(shard.unfinished_tasks for shard in _shards)
+
+
+def shutdown_dispatcher(timeout=30):
+    """إيقاف موزع التحديثات بعد معالجة التحديثات المنتظرة في طوابير العمال"""
+    global _dispatcher_running, _dispatcher_accepting
+
+    if not _dispatcher_running:
+        return False
+
+    # إيقاف استقبال التحديثات الجديدة ثم انتظار تفريغ الطوابير خلال المهلة،
+    # لأن تيليجرام يعتبر التحديثات المنتظرة مستلمة ولن يعيد إرسالها بعد إعادة التشغيل
+    _dispatcher_accepting = False
+    deadline = time.monotonic() + timeout
+    while _unfinished_count() and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    remaining = _unfinished_count()
+    _dispatcher_running = False
+    for worker in _workers:
+        worker.join(timeout=5)
+    _workers.clear()
+
+    if remaining:
+        logger.error(f"تم إيقاف موزع التحديثات مع {remaining} تحديث لم تكتمل معالجته")
+
+    logger.info("تم إيقاف موزع التحديثات")
+    return True
+
+
+def is_dispatcher_running():
+    """التحقق مما إذا كان موزع التحديثات يقبل تحديثات جديدة"""
+    return _dispatcher_accepting
+
+
+def dispatch_update(update, timeout=None):
+    """إضافة تحديث إلى طابور العامل المسؤول عن محادثته"""
+    # عند امتلاء الطابور ينتظر المستدعي (الضغط العكسي)، ومع تحديد مهلة يرجع False بعد انتهائها
+    global _rejected_count
+
+    if not _dispatcher_accepting:
+        return False
+
+    try:
+        _shards[_get_shard_index(update)].put(update, timeout=timeout)
+        return True
+    except queue.Full:
+        with _stats_lock:
+            _rejected_count += 1
+        logger.warning(f"طابور العامل ممتلئ، تم رفض التحديث {update.get('update_id')}")
+        return False
+
+
+def get_dispatcher_stats():
+    """الحصول على إحصائيات موزع التحديثات وعمق طابور كل عامل"""
+    with _stats_lock:
+        processed = list(_processed_counts)
+        rejected = _rejected_count
+
+    return {
+        'running': _dispatcher_running,
+        'accepting': _dispatcher_accepting,
+        'workers': len(_workers),
+        'queue_depth': [shard.qsize() for shard in _shards],
+        'processed': processed,
+        'rejected': rejected
+    }
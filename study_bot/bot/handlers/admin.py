@@ -55,26 +55,66 @@ def handle_broadcast_command(user_id, chat_id, message_text):
     
     broadcast_text = parts[1].strip()
     
-    # إرسال الرسالة لجميع المستخدمين النشطين
-    users = User.query.filter_by(is_active=True).all()
-    sent_count = 0
-    failed_count = 0
-    
-    # إضافة علامة تدل على أنها رسالة من المشرف
-    formatted_text = f"📢 <b>رسالة من المشرف:</b>\n\n{broadcast_text}"
-    
-    for user in users:
-        try:
-            result = send_message(user.telegram_id, formatted_text)
-            if result and result.get("ok", False):
-                sent_count += 1
-            else:
-                failed_count += 1
-        except Exception as e:
-            logger.error(f"خطأ في إرسال رسالة جماعية للمستخدم {user.telegram_id}: {e}")
-            failed_count += 1
-    
-    return send_message(chat_id, f"تم إرسال الرسالة بنجاح إلى {sent_count} مستخدم. فشل الإرسال لـ {failed_count} مستخدم.")
+    # الإرسال يتم في الخلفية، وتحدث رسالة التقدم هذه حتى اكتماله
+    from study_bot.broadcasts import start_broadcast
+    progress_message = send_message(chat_id, "⏳ جارٍ تجهيز الرسالة الجماعية...")
+    
+    try:
+        broadcast = start_broadcast(
+            broadcast_text,
+            created_by=chat_id,
+            progress_message_id=progress_message.get("message_id") if progress_message else None
+        )
+    except Exception as e:
+        logger.error(f"خطأ في بدء الرسالة الجماعية: {e}")
+        return send_message(chat_id, "حدث خطأ أثناء بدء الرسالة الجماعية.")
+    
+    return send_message(
+        chat_id,
+        f"تم بدء الرسالة الجماعية #{broadcast.id} إلى {broadcast.total} مستخدم.\n"
+        f"لمتابعة التقدم: /broadcast_status {broadcast.id}\n"
+        f"للإلغاء: /broadcast_cancel {broadcast.id}"
+    )
+
+def _parse_broadcast_id(message_text):
+    """استخراج رقم الرسالة الجماعية من الأمر"""
+    parts = message_text.split()
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+def handle_broadcast_status_command(user_id, chat_id, message_text):
+    """معالجة أمر /broadcast_status لعرض تقدم رسالة جماعية أو آخر الرسائل"""
+    if not is_admin(user_id):
+        return send_message(chat_id, "عذرًا، هذا الأمر متاح للمشرفين فقط.")
+    
+    from study_bot.broadcasts import get_broadcast_progress, list_broadcasts, format_progress
+    
+    broadcast_id = _parse_broadcast_id(message_text)
+    if broadcast_id is None:
+        progress_list = list_broadcasts(limit=3)
+    else:
+        progress = get_broadcast_progress(broadcast_id)
+        progress_list = [progress] if progress else []
+    
+    if not progress_list:
+        return send_message(chat_id, "لا توجد رسائل جماعية.")
+    
+    return send_message(chat_id, "\n\n".join(format_progress(progress) for progress in progress_list))
+
+def handle_broadcast_cancel_command(user_id, chat_id, message_text):
+    """معالجة أمر /broadcast_cancel لإلغاء رسالة جماعية جارية"""
+    if not is_admin(user_id):
+        return send_message(chat_id, "عذرًا، هذا الأمر متاح للمشرفين فقط.")
+    
+    broadcast_id = _parse_broadcast_id(message_text)
+    if broadcast_id is None:
+        return send_message(chat_id, "يرجى تحديد رقم الرسالة. الصيغة: /broadcast_cancel [الرقم]")
+    
+    from study_bot.broadcasts import cancel_broadcast
+    if cancel_broadcast(broadcast_id):
+        return send_message(chat_id, f"تم إلغاء الرسالة الجماعية #{broadcast_id}.")
+    return send_message(chat_id, f"الرسالة الجماعية #{broadcast_id} غير موجودة أو انتهى إرسالها.")
 
 def handle_stats_command(user_id, chat_id):
     """معالجة أمر /stats لعرض إحصائيات البوت"""
@@ -118,6 +158,10 @@ def handle_admin_message(message, user_id, chat_id, text):
         return handle_admin_command(user_id, chat_id)
     elif command == '/broadcast':
         return handle_broadcast_command(user_id, chat_id, text)
+    elif command == '/broadcast_status':
+        return handle_broadcast_status_command(user_id, chat_id, text)
+    elif command == '/broadcast_cancel':
+        return handle_broadcast_cancel_command(user_id, chat_id, text)
     elif command == '/stats':
         return handle_stats_command(user_id, chat_id)
     
@@ -64,6 +64,21 @@ def handle_group_help(chat_id):
 """
     return send_message(chat_id, help_text)
 
+def build_group_ranking(group, user, period='week', page=1):
+    """بناء نص صفحة ترتيب المجموعة وأزرارها مع ترتيب المستخدم"""
+    from study_bot.group_leaderboard import (
+        PERIODS, get_leaderboard_page, get_user_rank, format_leaderboard, leaderboard_keyboard
+    )
+    
+    if period not in PERIODS:
+        period = 'week'
+    
+    page_data = get_leaderboard_page(group.id, period, page)
+    user_rank = get_user_rank(group.id, user.id, period) if user else None
+    text = format_leaderboard(page_data, user_rank)
+    keyboard = leaderboard_keyboard(period, page_data['page'], page_data['pages'])
+    return text, keyboard, user_rank
+
 def handle_group_message(message, user_id, chat_id, text, chat_type):
     """معالجة رسالة في المجموعة"""
     # تحديث معلومات المستخدم
@@ -81,11 +96,12 @@ def handle_group_message(message, user_id, chat_id, text, chat_type):
 
     # تحديث معلومات المجموعة
     from study_bot.models import Group, db
+    from study_bot.identity_cache import get_group
     # الحصول على اسم المجموعة
     group_title = message.get("chat", {}).get("title", f"مجموعة {chat_id}")
     
     # التحقق من وجود المجموعة أو إنشائها
-    group = Group.query.filter_by(telegram_id=chat_id).first()
+    group = get_group(chat_id)
     if not group:
         group = Group(
             telegram_id=chat_id,
@@ -185,9 +201,10 @@ def handle_group_message(message, user_id, chat_id, text, chat_type):
             return send_message(chat_id, message, reply_markup=keyboard)
         
         elif command == '/ranking':
-            # عرض ترتيب المجموعة
-            message = "🏆 <b>ترتيب المجموعة</b>\n\nجاري تطوير هذه الميزة..."
-            return send_message(chat_id, message)
+            # عرض ترتيب المجموعة، والفترة اختيارية: /ranking day|week|all
+            period = command_text.split()[0].lower() if command_text else 'week'
+            message, keyboard, _ = build_group_ranking(group, user, period)
+            return send_message(chat_id, message, reply_markup=keyboard)
         
         elif command == '/active':
             # عرض المشاركين النشطين
@@ -81,6 +81,8 @@ def handle_help_command(user_id, chat_id):
 <b>معسكرات الدراسة:</b>
 المعسكرات هي جداول دراسية جماعية مؤقتة لفترة محددة.
 يمكن لمشرفي المجموعات إنشاء معسكرات مخصصة لأعضاء المجموعة.
+/camps - إدارة معسكرات مجموعاتك (للمشرفين)
+/cancel - إلغاء إنشاء معسكر أو مهمة جارية
 """
     return send_message(chat_id, help_text)
 
@@ -257,6 +259,16 @@ def handle_done_command(user_id, chat_id, command_args):
     }
     return send_message(chat_id, done_text, reply_markup=keyboard)
 
+def handle_cancel_command(user_id, chat_id):
+    """معالجة أمر /cancel لإلغاء المحادثة الجارية (مثل إنشاء معسكر)"""
+    from study_bot.conversation_state import get_conversation, end_conversation
+
+    if get_conversation(user_id) is None:
+        return send_message(chat_id, "لا توجد عملية جارية لإلغائها.", reply_markup=create_main_menu_keyboard())
+
+    end_conversation(user_id)
+    return send_message(chat_id, "❌ تم إلغاء العملية الجارية.", reply_markup=create_main_menu_keyboard())
+
 def handle_private_message(message):
     """معالجة رسالة في الخاص"""
     # تحديث معلومات المستخدم
@@ -299,8 +311,18 @@ def handle_private_message(message):
             return handle_report_command(user_id, chat_id)
         elif command == '/done':
             return handle_done_command(user_id, chat_id, command_args)
+        elif command == '/camps':
+            from study_bot.private_camp_manager import handle_admin_camps
+            return handle_admin_camps(user_id, chat_id)
+        elif command == '/cancel':
+            return handle_cancel_command(user_id, chat_id)
         else:
             return send_message(chat_id, f"عذرًا، الأمر <b>{command}</b> غير معروف. يمكنك استخدام /help لمعرفة الأوامر المتاحة.")
     
+    # خطوات إنشاء المعسكر أو إضافة مهمة إذا كانت للمستخدم محادثة جارية
+    from study_bot.private_camp_manager import handle_private_camp_message
+    if handle_private_camp_message(text, user_id, chat_id):
+        return True
+
     # معالجة الرسائل العادية
     return send_message(chat_id, "مرحباً! يمكنك استخدام الأوامر من القائمة أدناه:", reply_markup=create_main_menu_keyboard())
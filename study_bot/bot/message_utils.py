@@ -4,19 +4,15 @@
 """
 
 import json
-import requests
 import logging
 from datetime import datetime
 import random
-import os
+
+from study_bot.telegram_client import get_client
 
 # إعداد التسجيل إذا لم يكن موجودًا
 logger = logging.getLogger('study_bot')
 
-# الحصول على رمز الوصول لتيليجرام بوت
-TELEGRAM_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-API_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
-
 def send_message(chat_id, text, reply_markup=None, parse_mode=None, reply_to_message_id=None):
     """إرسال رسالة إلى مستخدم أو مجموعة"""
     payload = {
@@ -34,7 +30,7 @@ def send_message(chat_id, text, reply_markup=None, parse_mode=None, reply_to_mes
         payload['reply_to_message_id'] = reply_to_message_id
     
     try:
-        response = requests.post(f"{API_URL}/sendMessage", json=payload)
+        response = get_client().post("sendMessage", payload)
         data = response.json()
         
         if data.get('ok'):
@@ -61,7 +57,7 @@ def edit_message(chat_id, message_id, text, reply_markup=None, parse_mode=None):
         payload['parse_mode'] = parse_mode
     
     try:
-        response = requests.post(f"{API_URL}/editMessageText", json=payload)
+        response = get_client().post("editMessageText", payload)
         data = response.json()
         
         if data.get('ok'):
@@ -81,7 +77,7 @@ def delete_message(chat_id, message_id):
     }
     
     try:
-        response = requests.post(f"{API_URL}/deleteMessage", json=payload)
+        response = get_client().post("deleteMessage", payload)
         data = response.json()
         
         if data.get('ok'):
@@ -106,7 +102,7 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
         payload['show_alert'] = show_alert
     
     try:
-        response = requests.post(f"{API_URL}/answerCallbackQuery", json=payload)
+        response = get_client().post("answerCallbackQuery", payload)
         data = response.json()
         
         if data.get('ok'):
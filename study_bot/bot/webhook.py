@@ -0,0 +1,99 @@
+"""
+وحدة الويب هوك للبوت
+تحتوي على مسار استقبال تحديثات تيليجرام وتسليمها لموزع التحديثات
+"""
+
+import hmac
+
+from flask import Blueprint, request, jsonify, abort
+
+from study_bot.config import (
+    logger, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_ENQUEUE_TIMEOUT
+)
+from study_bot.telegram_client import get_client
+from study_bot.bot.dispatcher import dispatch_update
+
+# إنشاء blueprint لمسار الويب هوك
+webhook_bp = Blueprint('webhook', __name__)
+
+# المتغيرات العامة
+_webhook_running = False
+
+
+@webhook_bp.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    """استقبال تحديث من تيليجرام وإضافته لطابور المعالجة"""
+    # التحقق من الرمز السري المرسل من تيليجرام
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not WEBHOOK_SECRET_TOKEN or not hmac.compare_digest(secret, WEBHOOK_SECRET_TOKEN):
+        abort(403)
+
+    update = request.get_json(silent=True)
+    if not update or 'update_id' not in update:
+        return jsonify({'ok': False}), 400
+
+    # الرد فورًا، وإرجاع 503 عند امتلاء طابور العامل ليعيد تيليجرام الإرسال لاحقًا
+    if not dispatch_update(update, timeout=WEBHOOK_ENQUEUE_TIMEOUT):
+        return jsonify({'ok': False}), 503
+
+    return jsonify({'ok': True})
+
+
+def set_webhook():
+    """تسجيل عنوان الويب هوك لدى تيليجرام"""
+    if not WEBHOOK_URL or not WEBHOOK_SECRET_TOKEN:
+        logger.warning("لم يتم تعيين WEBHOOK_URL أو WEBHOOK_SECRET_TOKEN")
+        return False
+
+    data = {
+        'url': f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        'secret_token': WEBHOOK_SECRET_TOKEN,
+        'allowed_updates': ['message', 'callback_query', 'chat_member', 'my_chat_member']
+    }
+
+    result = get_client().call('setWebhook', data)
+    if result and result.get('ok'):
+        logger.info(f"تم إعداد الويب هوك بنجاح: {data['url']}")
+        return True
+
+    logger.error(f"فشل إعداد الويب هوك: {result}")
+    return False
+
+
+def delete_webhook():
+    """حذف الويب هوك للعودة إلى وضع الاستطلاع"""
+    result = get_client().call('deleteWebhook', {'drop_pending_updates': False})
+    return bool(result and result.get('ok'))
+
+
+def start_webhook():
+    """تفعيل وضع الويب هوك"""
+    global _webhook_running
+
+    if _webhook_running:
+        logger.warning("الويب هوك يعمل بالفعل")
+        return True
+
+    if not set_webhook():
+        return False
+
+    _webhook_running = True
+    logger.info("تم تفعيل وضع الويب هوك")
+    return True
+
+
+def stop_webhook():
+    """إيقاف وضع الويب هوك"""
+    global _webhook_running
+
+    if not _webhook_running:
+        return False
+
+    _webhook_running = False
+    logger.info("تم إيقاف وضع الويب هوك")
+    return True
+
+
+def is_webhook_running():
+    """التحقق مما إذا كان وضع الويب هوك مفعلًا"""
+    return _webhook_running
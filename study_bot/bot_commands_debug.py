@@ -11,7 +11,7 @@ import json
 import traceback
 from datetime import datetime
 
-from study_bot.config import logger, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, get_current_time
+from study_bot.config import logger, get_current_time
 
 # إنشاء مجلد السجلات إذا لم يكن موجودًا
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs')
@@ -96,13 +96,11 @@ def log_callback_query(user_id, chat_id, callback_data):
 
 def test_bot_token():
     """اختبار صلاحية توكن البوت مع واجهة برمجة تطبيقات تيليجرام"""
-    import requests
+    from study_bot.telegram_client import get_client
     
     try:
-        # إضافة توكن البوت إلى عنوان URL
-        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getMe"
-        logger.debug(f"محاولة التحقق من توكن البوت باستخدام: {url}")
-        response = requests.get(url)
+        logger.debug("محاولة التحقق من توكن البوت باستخدام getMe")
+        response = get_client().get("getMe")
         
         if response.status_code == 200:
             data = response.json()
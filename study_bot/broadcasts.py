@@ -0,0 +1,402 @@
+"""
+وحدة الرسائل الجماعية
+تحتوي على سلسلة ترسل الرسائل الجماعية في الخلفية: تقرأ المستخدمين النشطين على دفعات مرتبة بالمعرف
+(id > آخر معرف) وترسلها عبر طابور الرسائل الصادرة، ثم تحفظ نقطة الاستكمال والعدادات بعد كل دفعة
+فتستكمل الرسالة بعد إعادة التشغيل، ويعطل المستخدمون الذين حظروا البوت
+"""
+
+import threading
+import time
+
+from sqlalchemy import select, update, func
+
+from study_bot.config import (
+    logger, BROADCAST_BATCH_SIZE, BROADCAST_BATCH_TIMEOUT,
+    BROADCAST_LEASE_SECONDS, BROADCAST_PROGRESS_INTERVAL
+)
+
+# الفترة بين فحص الرسائل الجديدة أو المتوقفة التي أنشأتها عمليات أخرى (بالثواني)
+IDLE_POLL_SECONDS = 30
+
+# الحالات التي لم ينته إرسالها
+ACTIVE_STATUSES = ('pending', 'running')
+
+# المتغيرات العامة
+_runner_thread = None
+_runner_running = False
+_runner_cond = threading.Condition()
+_wake_pending = False
+
+# تقدم الرسالة الجارية في الذاكرة، ويشمل نتائج الدفعة التي لم تحفظ بعد
+_current = None
+_progress_lock = threading.Lock()
+
+_stats = {
+    'started': 0,
+    'resumed': 0,
+    'completed': 0,
+    'cancelled': 0,
+    'sent': 0,
+    'failed': 0,
+    'blocked': 0
+}
+
+
+def _wake():
+    """إيقاظ سلسلة الإرسال لبدء رسالة جديدة أو ملاحظة إلغاء"""
+    global _wake_pending
+    with _runner_cond:
+        _wake_pending = True
+        _runner_cond.notify()
+
+
+def format_broadcast_text(text):
+    """إضافة علامة تدل على أن الرسالة من المشرف"""
+    return f"📢 <b>رسالة من المشرف:</b>\n\n{text}"
+
+
+def format_progress(progress):
+    """نص تقدم الرسالة الجماعية لعرضه في محادثة المشرف"""
+    titles = {
+        'pending': "⏳ في الانتظار",
+        'running': "📤 جارٍ الإرسال",
+        'completed': "✅ اكتمل الإرسال",
+        'cancelled': "⛔ تم الإلغاء"
+    }
+    return (
+        f"<b>الرسالة الجماعية #{progress['id']}</b> - {titles.get(progress['status'], progress['status'])}\n\n"
+        f"التقدم: {progress['progress']}% من {progress['total']} مستخدم\n"
+        f"✅ تم الإرسال: {progress['sent']}\n"
+        f"❌ فشل الإرسال: {progress['failed']}\n"
+        f"🚫 حظروا البوت: {progress['blocked']}"
+    )
+
+
+def start_broadcast(text, created_by=None, progress_message_id=None):
+    """حفظ رسالة جماعية جديدة وإيقاظ سلسلة الإرسال، وإرجاع الرسالة"""
+    from study_bot.models import db, User, Broadcast
+
+    now = time.time()
+    total = db.session.scalar(select(func.count(User.id)).where(User.is_active == True))
+    broadcast = Broadcast(
+        text=text,
+        status='pending',
+        created_by=created_by,
+        progress_message_id=progress_message_id,
+        total=total or 0,
+        created_at=now,
+        updated_at=now
+    )
+    db.session.add(broadcast)
+    db.session.commit()
+
+    _stats['started'] += 1
+    logger.info(f"تم إنشاء الرسالة الجماعية {broadcast.id} إلى {broadcast.total} مستخدم")
+
+    _wake()
+    return broadcast
+
+
+def cancel_broadcast(broadcast_id):
+    """إلغاء رسالة جماعية لم ينته إرسالها، وتتوقف بعد الدفعة الحالية"""
+    from study_bot.models import db, Broadcast
+
+    try:
+        count = db.session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status.in_(ACTIVE_STATUSES))
+            .values(status='cancelled', finished_at=time.time())
+        ).rowcount
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"خطأ في إلغاء الرسالة الجماعية {broadcast_id}: {e}")
+        db.session.rollback()
+        return False
+
+    if count:
+        _stats['cancelled'] += 1
+        _wake()
+    return bool(count)
+
+
+def get_broadcast_progress(broadcast_id):
+    """الحصول على تقدم رسالة جماعية، مع نتائج الدفعة الجارية إن كانت تُرسل الآن"""
+    from study_bot.models import db, Broadcast
+
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    if not broadcast:
+        return None
+
+    progress = broadcast.to_dict()
+    with _progress_lock:
+        if _current and _current['id'] == broadcast_id and broadcast.status == 'running':
+            progress.update({key: _current[key] for key in ('sent', 'failed', 'blocked')})
+            done = progress['sent'] + progress['failed'] + progress['blocked']
+            progress['progress'] = round(min(100.0, 100.0 * done / progress['total']), 1) if progress['total'] else 100.0
+
+    return progress
+
+
+def list_broadcasts(limit=20):
+    """الحصول على تقدم آخر الرسائل الجماعية"""
+    from study_bot.models import db, Broadcast
+
+    ids = db.session.scalars(select(Broadcast.id).order_by(Broadcast.id.desc()).limit(limit)).all()
+    return [get_broadcast_progress(broadcast_id) for broadcast_id in ids]
+
+
+def _claim_next():
+    """حجز أقدم رسالة جماعية جديدة أو متوقفة (لم تحدث نقطة استكمالها خلال مدة الحجز)"""
+    from study_bot.models import db, Broadcast
+
+    stale_before = time.time() - BROADCAST_LEASE_SECONDS
+    candidates = db.session.execute(
+        select(Broadcast.id, Broadcast.status, Broadcast.updated_at)
+        .where(
+            (Broadcast.status == 'pending') |
+            ((Broadcast.status == 'running') & (Broadcast.updated_at < stale_before))
+        )
+        .order_by(Broadcast.id)
+        .limit(5)
+    ).all()
+
+    for broadcast_id, status, updated_at in candidates:
+        # الحجز مشروط بعدم تغير الرسالة منذ قراءتها حتى لا ترسلها عمليتان معًا
+        count = db.session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == status, Broadcast.updated_at == updated_at)
+            .values(status='running', updated_at=time.time())
+        ).rowcount
+        db.session.commit()
+
+        if count:
+            if status == 'running':
+                _stats['resumed'] += 1
+                logger.info(f"استكمال الرسالة الجماعية {broadcast_id}")
+            return db.session.get(Broadcast, broadcast_id)
+
+    db.session.rollback()
+    return None
+
+
+def _record_result(batch, chat_id, result):
+    """تسجيل نتيجة الإرسال لمستخدم واحد"""
+    if result and result.get('ok'):
+        key = 'sent'
+    elif result and result.get('error_code') == 403:
+        # حظر البوت أو حذف الحساب
+        key = 'blocked'
+        batch['blocked_ids'].append(chat_id)
+    else:
+        key = 'failed'
+
+    with _progress_lock:
+        batch[key] += 1
+        if _current is not None:
+            _current[key] += 1
+        _stats[key] += 1
+
+
+def _send_batch(template, chat_ids):
+    """إرسال دفعة عبر طابور الرسائل الصادرة وانتظار نتائجها، وإرجاع عدادات الدفعة"""
+    from study_bot.outbound_queue import enqueue, is_queue_running
+    from study_bot.telegram_client import get_client
+
+    batch = {'sent': 0, 'failed': 0, 'blocked': 0, 'blocked_ids': [], 'remaining': len(chat_ids)}
+    batch_cond = threading.Condition()
+
+    def make_callback(chat_id):
+        def callback(result):
+            _record_result(batch, chat_id, result)
+            with batch_cond:
+                batch['remaining'] -= 1
+                batch_cond.notify()
+        return callback
+
+    for chat_id in chat_ids:
+        body = template.render(chat_id=chat_id)
+        callback = make_callback(chat_id)
+        # عند توقف الطابور أو امتلائه يرسل مباشرة من هذه السلسلة
+        if not (is_queue_running() and enqueue('sendMessage', body, callback, raw=True)):
+            callback(get_client().call('sendMessage', body))
+
+    deadline = time.monotonic() + BROADCAST_BATCH_TIMEOUT
+    with batch_cond:
+        while batch['remaining'] > 0 and time.monotonic() < deadline:
+            batch_cond.wait(1)
+
+    if batch['remaining'] > 0:
+        logger.warning(f"لم تكتمل {batch['remaining']} رسالة من الدفعة خلال المهلة، المتابعة بالدفعة التالية")
+
+    return batch
+
+
+def _deactivate_blocked(telegram_ids):
+    """تعطيل المستخدمين الذين حظروا البوت"""
+    from study_bot.models import db, User
+    from study_bot.identity_cache import invalidate_user
+
+    db.session.execute(
+        update(User).where(User.telegram_id.in_(telegram_ids)).values(is_active=False)
+    )
+    for telegram_id in telegram_ids:
+        invalidate_user(telegram_id)
+
+
+def _report_progress(broadcast, progress, last_report):
+    """تحديث رسالة التقدم في محادثة المشرف، وإرجاع وقت آخر تحديث"""
+    from study_bot.bot import edit_message, send_message
+
+    final = progress['status'] != 'running'
+    if not broadcast.created_by or (not final and time.monotonic() - last_report < BROADCAST_PROGRESS_INTERVAL):
+        return last_report
+
+    text = format_progress(progress)
+    if broadcast.progress_message_id:
+        edit_message(broadcast.created_by, broadcast.progress_message_id, text)
+    elif final:
+        send_message(broadcast.created_by, text)
+
+    return time.monotonic()
+
+
+def _run_broadcast(broadcast):
+    """إرسال رسالة جماعية محجوزة من نقطة استكمالها حتى آخر مستخدم"""
+    global _current
+    from study_bot.models import db, User, Broadcast, iter_chunks
+    from study_bot.message_templates import MessageTemplate
+    from study_bot.stats_aggregator import increment, increment_daily
+
+    broadcast_id = broadcast.id
+    template = MessageTemplate(format_broadcast_text(broadcast.text))
+    counts = {'sent': broadcast.sent, 'failed': broadcast.failed, 'blocked': broadcast.blocked}
+    last_user_id = broadcast.last_user_id
+    last_report = 0
+
+    with _progress_lock:
+        _current = dict(counts, id=broadcast_id)
+
+    chunks = iter_chunks(
+        User.id, User.telegram_id,
+        where=User.is_active == True,
+        after=last_user_id,
+        chunk_size=BROADCAST_BATCH_SIZE
+    )
+
+    try:
+        while _runner_running:
+            rows = next(chunks, None)
+            # عدم إبقاء معاملة القراءة مفتوحة أثناء الإرسال
+            db.session.rollback()
+
+            if not rows:
+                status = 'completed'
+                values = {'status': status, 'finished_at': time.time()}
+            else:
+                batch = _send_batch(template, [telegram_id for _, telegram_id in rows])
+                if batch['blocked_ids']:
+                    _deactivate_blocked(batch['blocked_ids'])
+                if batch['sent']:
+                    increment('messages_sent', batch['sent'])
+                    increment_daily('messages_sent', batch['sent'])
+
+                for key in counts:
+                    counts[key] += batch[key]
+                last_user_id = rows[-1][0]
+                status = 'running'
+                values = dict(counts, last_user_id=last_user_id)
+
+            # حفظ نقطة الاستكمال، والشرط على الحالة يوقف الإرسال إذا ألغيت الرسالة
+            values['updated_at'] = time.time()
+            count = db.session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == 'running')
+                .values(**values)
+            ).rowcount
+            db.session.commit()
+
+            if not count:
+                status = 'cancelled'
+                logger.info(f"تم إيقاف الرسالة الجماعية {broadcast_id} بعد إلغائها")
+
+            progress = dict(counts, id=broadcast_id, status=status, total=broadcast.total)
+            done = sum(counts.values())
+            progress['progress'] = round(min(100.0, 100.0 * done / broadcast.total), 1) if broadcast.total else 100.0
+            last_report = _report_progress(broadcast, progress, last_report)
+
+            if status != 'running':
+                if status == 'completed':
+                    _stats['completed'] += 1
+                    logger.info(f"اكتملت الرسالة الجماعية {broadcast_id}: {counts}")
+                break
+    finally:
+        with _progress_lock:
+            _current = None
+
+
+def _runner_func(app):
+    """دالة سلسلة إرسال الرسائل الجماعية"""
+    global _wake_pending
+    from study_bot.models import db
+
+    with app.app_context():
+        while _runner_running:
+            try:
+                broadcast = _claim_next()
+                if broadcast:
+                    _run_broadcast(broadcast)
+                    continue
+            except Exception as e:
+                logger.error(f"خطأ في سلسلة الرسائل الجماعية: {e}")
+                db.session.rollback()
+                time.sleep(5)
+                continue
+
+            with _runner_cond:
+                if not _wake_pending and _runner_running:
+                    _runner_cond.wait(IDLE_POLL_SECONDS)
+                _wake_pending = False
+
+
+def init_broadcasts(app):
+    """بدء سلسلة الرسائل الجماعية، وتستكمل الرسائل التي توقفت قبل إعادة التشغيل"""
+    global _runner_thread, _runner_running
+
+    if _runner_running:
+        logger.warning("سلسلة الرسائل الجماعية تعمل بالفعل")
+        return False
+
+    _runner_running = True
+    _runner_thread = threading.Thread(target=_runner_func, args=(app,), name="broadcast-runner")
+    _runner_thread.daemon = True
+    _runner_thread.start()
+
+    logger.info("تم بدء سلسلة الرسائل الجماعية")
+    return True
+
+
+def shutdown_broadcasts(timeout=10):
+    """إيقاف سلسلة الرسائل الجماعية بعد الدفعة الحالية، وتبقى نقطة الاستكمال محفوظة"""
+    global _runner_thread, _runner_running
+
+    if not _runner_running:
+        return False
+
+    _runner_running = False
+    _wake()
+
+    if _runner_thread:
+        _runner_thread.join(timeout=timeout)
+        _runner_thread = None
+
+    logger.info("تم إيقاف سلسلة الرسائل الجماعية")
+    return True
+
+
+def get_broadcast_stats():
+    """الحصول على إحصائيات الرسائل الجماعية"""
+    with _progress_lock:
+        stats = dict(_stats)
+        stats['current'] = dict(_current) if _current else None
+    stats['running'] = _runner_running
+    return stats
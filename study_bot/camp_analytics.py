@@ -0,0 +1,193 @@
+"""
+وحدة إحصائيات المعسكرات
+تحسب جميع إحصائيات المعسكر ونسب إكمال المشاركين في استعلام تجميعي واحد (GROUP BY مع FILTER)
+وتحفظ النتيجة لكل معسكر حتى ترسل مهمة أو تضاف مشاركة أو يتغير المشاركون
+"""
+
+import threading
+import time
+
+from sqlalchemy import event, select, func, true, and_
+from sqlalchemy.orm import Session, object_session
+
+from study_bot.config import logger, get_local_time, CAMP_ANALYTICS_CACHE_SECONDS
+from study_bot.models import db, CampTask, CampParticipant, CampTaskParticipation
+
+# مفتاح المعسكرات المنتظر حذف إحصائياتها بعد الحفظ في معلومات الجلسة
+_PENDING_KEY = 'camp_analytics_changes'
+
+# المتغيرات العامة: معرف المعسكر -> (الإحصائيات، وقت الحساب)
+_cache = {}
+_cache_lock = threading.Lock()
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'invalidations': 0
+}
+
+
+def _compute(camp_id):
+    """حساب إحصائيات المعسكر ومشاركيه في استعلام واحد"""
+    # المهام المنهية دون إرسال (skip_reason) أو المحجوزة التي لم تسجل رسالتها بعد لا تحسب من المرسلة
+    delivered = and_(CampTask.is_sent == True, CampTask.message_id.isnot(None))
+    tasks = select(
+        func.count(CampTask.id).label('total_tasks'),
+        func.count(CampTask.id).filter(delivered).label('sent_tasks'),
+        func.count(CampTask.id).filter(CampTask.skip_reason.isnot(None)).label('skipped_tasks'),
+        func.coalesce(func.sum(CampTask.points).filter(delivered), 0).label('sent_points'),
+        func.min(CampTask.scheduled_time).filter(CampTask.is_sent == False).label('next_task_time')
+    ).where(CampTask.camp_id == camp_id).cte('camp_task_stats')
+
+    participants = select(
+        CampParticipant.id.label('participant_id'),
+        CampParticipant.user_id,
+        CampParticipant.total_points,
+        func.count(CampTaskParticipation.id).label('completed')
+    ).outerjoin(
+        CampTaskParticipation, CampTaskParticipation.participant_id == CampParticipant.id
+    ).where(
+        CampParticipant.camp_id == camp_id,
+        CampParticipant.is_active == True
+    ).group_by(CampParticipant.id, CampParticipant.user_id, CampParticipant.total_points).cte('camp_participant_stats')
+
+    # صف لكل مشارك مع إحصائيات المهام، أو صف واحد بلا مشارك إذا لم يكن في المعسكر مشاركون
+    rows = db.session.execute(
+        select(tasks, participants).select_from(tasks).outerjoin(participants, true())
+    ).all()
+
+    first = rows[0]
+    sent_tasks = first.sent_tasks or 0
+    analytics = {
+        'total_tasks': first.total_tasks or 0,
+        'sent_tasks': sent_tasks,
+        'skipped_tasks': first.skipped_tasks or 0,
+        'upcoming_tasks': (first.total_tasks or 0) - sent_tasks - (first.skipped_tasks or 0),
+        'next_task_time': first.next_task_time,
+        'total_participants': 0,
+        'total_points': 0,
+        'total_completions': 0,
+        'participants': {}
+    }
+
+    for row in rows:
+        if row.participant_id is None:
+            continue
+        completed = row.completed or 0
+        analytics['participants'][row.participant_id] = {
+            'user_id': row.user_id,
+            'points': row.total_points or 0,
+            'completed': completed,
+            'percentage': min(100, int(completed / sent_tasks * 100)) if sent_tasks else 0
+        }
+        analytics['total_points'] += row.total_points or 0
+        analytics['total_completions'] += completed
+
+    count = len(analytics['participants'])
+    analytics['total_participants'] = count
+    analytics['avg_points'] = analytics['total_points'] / count if count else 0
+    # نسبة الإكمال في المعسكر: المشاركات الفعلية من أقصى ما يمكن (كل مشارك في كل مهمة مرسلة)
+    possible = count * sent_tasks
+    analytics['completion_rate'] = min(100, int(analytics['total_completions'] / possible * 100)) if possible else 0
+    return analytics
+
+
+def get_camp_analytics(camp_id):
+    """الحصول على إحصائيات المعسكر من الذاكرة أو حسابها"""
+    with _cache_lock:
+        cached = _cache.get(camp_id)
+        if cached and time.monotonic() - cached[1] < CAMP_ANALYTICS_CACHE_SECONDS:
+            _stats['hits'] += 1
+            return cached[0]
+
+    analytics = _compute(camp_id)
+    with _cache_lock:
+        _cache[camp_id] = (analytics, time.monotonic())
+        _stats['misses'] += 1
+    return analytics
+
+
+def get_participant_progress(camp_id, participant_id):
+    """تقدم مشارك في المعسكر: {'points', 'completed', 'percentage'} أو None"""
+    return get_camp_analytics(camp_id)['participants'].get(participant_id)
+
+
+def get_camp_summary(camp):
+    """إحصائيات المعسكر مع المدة المتبقية ونسبة التقدم الزمني"""
+    analytics = get_camp_analytics(camp.id)
+
+    # تواريخ المعسكر محفوظة بالتوقيت المحلي بدون منطقة زمنية
+    now = get_local_time()
+    remaining_days = (camp.end_date - now).days + 1 if now < camp.end_date else 0
+    total_days = (camp.end_date - camp.start_date).days + 1
+    progress = int((total_days - remaining_days) / total_days * 100) if total_days > 0 else 0
+
+    summary = {key: value for key, value in analytics.items() if key != 'participants'}
+    summary.update(
+        remaining_days=remaining_days,
+        progress=min(100, max(0, progress)),
+        start_date=camp.start_date.strftime('%Y-%m-%d'),
+        end_date=camp.end_date.strftime('%Y-%m-%d')
+    )
+    return summary
+
+
+def invalidate_camp(camp_id):
+    """حذف إحصائيات المعسكر المحفوظة (بعد تحديث مباشر لا يمر بأحداث الجلسة)"""
+    with _cache_lock:
+        if _cache.pop(camp_id, None) is not None:
+            _stats['invalidations'] += 1
+
+
+def _mark(session, camp_id):
+    """تسجيل معسكر تغيرت بياناته في الجلسة الحالية"""
+    if session is not None and camp_id is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(camp_id)
+
+
+@event.listens_for(CampTask, 'after_insert')
+@event.listens_for(CampTask, 'after_update')
+@event.listens_for(CampTask, 'after_delete')
+@event.listens_for(CampParticipant, 'after_insert')
+@event.listens_for(CampParticipant, 'after_update')
+@event.listens_for(CampParticipant, 'after_delete')
+def _on_camp_change(mapper, connection, target):
+    """إرسال مهمة أو إضافتها، أو تغير المشاركين ونقاطهم"""
+    _mark(object_session(target), target.__dict__.get('camp_id'))
+
+
+@event.listens_for(CampTaskParticipation, 'after_insert')
+@event.listens_for(CampTaskParticipation, 'after_delete')
+def _on_participation_change(mapper, connection, target):
+    """إضافة مشاركة في مهمة، والمعسكر يعرف من المهمة"""
+    task_id = target.__dict__.get('task_id')
+    if task_id is not None:
+        _mark(object_session(target), connection.scalar(select(CampTask.camp_id).where(CampTask.id == task_id)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    """حذف إحصائيات المعسكرات التي تغيرت بعد نجاح المعاملة"""
+    for camp_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_camp(camp_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """تجاهل تغييرات المعاملة الملغاة"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_camp_analytics():
+    """تفعيل حذف إحصائيات المعسكرات المحفوظة عند تغير مهامها أو مشاركيها (تسجل الأحداث عند استيراد الوحدة)"""
+    with _cache_lock:
+        _cache.clear()
+    logger.info("تم تفعيل ذاكرة إحصائيات المعسكرات")
+
+
+def get_camp_analytics_stats():
+    """الحصول على إحصائيات ذاكرة إحصائيات المعسكرات"""
+    with _cache_lock:
+        stats = dict(_stats)
+        stats['camps'] = len(_cache)
+    return stats
@@ -0,0 +1,282 @@
+"""
+وحدة ترتيب المعسكرات
+تحتوي على لوحة ترتيب في الذاكرة لكل معسكر تبنى من قاعدة البيانات عند أول طلب وتحدث مع كل تعديل
+لنقاط المشاركين بعد حفظه، فيحسب ترتيب المشارك وأفضل المشاركين والمشاركين حوله في O(log n)
+بدلاً من تحميل جميع المشاركين وترتيبهم عند كل طلب
+"""
+
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from study_bot.config import logger, CAMP_LEADERBOARD_REFRESH_SECONDS
+from study_bot.models import db, CampParticipant
+
+# مفتاح التعديلات المنتظرة للحفظ في معلومات الجلسة
+_PENDING_KEY = 'camp_leaderboard_changes'
+
+# علامة تعديل لا تعرف قيمته (مثل تحديث النقاط بتعبير SQL) فتعاد قراءة لوحة المعسكر كاملة
+_RELOAD = object()
+
+# المتغيرات العامة
+_boards = {}
+_boards_lock = threading.RLock()
+
+_stats = {
+    'loads': 0,
+    'updates': 0,
+    'rank_queries': 0
+}
+
+
+class Leaderboard:
+    """لوحة ترتيب بالنقاط (تنازليًا) ثم بالمعرف (تصاعديًا) عند التساوي"""
+    # تعتمد على شجرة فينويك لعدد المشاركين عند كل قيمة نقاط، فتحسب عدد من يسبق المشارك
+    # وتجد صاحب الترتيب k في O(log S) حيث S أعلى نقاط، ويحفظ المتساوون في قائمة مرتبة بالمعرف
+
+    def __init__(self, entries=()):
+        self._scores = {}
+        self._buckets = {}
+        self._size = 1
+        self._tree = [0] * 2
+        self.loaded_at = time.monotonic()
+        for member, score in entries:
+            self.set(member, score)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    def _grow(self, score):
+        """توسيع الشجرة لتتسع لقيمة نقاط أعلى (مضاعفة الحجم وإعادة البناء)"""
+        size = self._size
+        while size <= score:
+            size *= 2
+        self._size = size
+        self._tree = [0] * (size + 1)
+        for bucket_score, members in self._buckets.items():
+            self._add(bucket_score, len(members))
+
+    def _add(self, score, delta):
+        """إضافة delta لعدد المشاركين عند قيمة النقاط"""
+        i = score + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_at_most(self, score):
+        """عدد المشاركين الذين نقاطهم لا تزيد عن score"""
+        i = min(score + 1, self._size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _score_at(self, position):
+        """قيمة النقاط لصاحب الموضع position في الترتيب التصاعدي (يبدأ من 1)"""
+        index = 0
+        step = self._size
+        while step:
+            if index + step <= self._size and self._tree[index + step] < position:
+                index += step
+                position -= self._tree[index]
+            step //= 2
+        return index, position
+
+    def set(self, member, score):
+        """إضافة مشارك أو تعديل نقاطه"""
+        score = max(0, int(score or 0))
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self.remove(member)
+
+        if score >= self._size:
+            self._grow(score)
+
+        self._scores[member] = score
+        bisect.insort(self._buckets.setdefault(score, []), member)
+        self._add(score, 1)
+
+    def remove(self, member):
+        """حذف مشارك"""
+        score = self._scores.pop(member, None)
+        if score is None:
+            return
+
+        members = self._buckets[score]
+        del members[bisect.bisect_left(members, member)]
+        if not members:
+            del self._buckets[score]
+        self._add(score, -1)
+
+    def score(self, member):
+        """نقاط المشارك أو None"""
+        return self._scores.get(member)
+
+    def rank(self, member):
+        """ترتيب المشارك (يبدأ من 1) أو None إذا لم يكن في اللوحة"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+
+        above = len(self._scores) - self._count_at_most(score)
+        return above + bisect.bisect_left(self._buckets[score], member) + 1
+
+    def at(self, rank):
+        """المشارك صاحب الترتيب rank مع نقاطه"""
+        if not 1 <= rank <= len(self._scores):
+            return None
+
+        # الترتيب تنازلي بالنقاط، فصاحب الترتيب rank هو صاحب الموضع المقابل في الترتيب التصاعدي
+        score, position = self._score_at(len(self._scores) - rank + 1)
+        members = self._buckets[score]
+        # داخل نفس النقاط يكون الأصغر معرفًا أولاً في الترتيب التنازلي
+        return members[len(members) - position], score
+
+    def top(self, limit):
+        """أفضل المشاركين: قائمة (المشارك، النقاط، الترتيب)"""
+        return [self.at(rank) + (rank,) for rank in range(1, min(limit, len(self._scores)) + 1)]
+
+    def around(self, member, width=2):
+        """المشاركون حول المشارك: width قبله وwidth بعده"""
+        rank = self.rank(member)
+        if rank is None:
+            return []
+
+        first = max(1, rank - width)
+        last = min(len(self._scores), rank + width)
+        return [self.at(r) + (r,) for r in range(first, last + 1)]
+
+
+def _load_board(camp_id):
+    """بناء لوحة ترتيب المعسكر من قاعدة البيانات"""
+    rows = db.session.execute(
+        select(CampParticipant.id, CampParticipant.total_points)
+        .where(CampParticipant.camp_id == camp_id, CampParticipant.is_active == True)
+    ).all()
+
+    board = Leaderboard(rows)
+    _stats['loads'] += 1
+    return board
+
+
+def get_leaderboard(camp_id):
+    """الحصول على لوحة ترتيب المعسكر، وإعادة بنائها دوريًا لالتقاط تعديلات العمليات الأخرى"""
+    with _boards_lock:
+        board = _boards.get(camp_id)
+        if board is None or time.monotonic() - board.loaded_at > CAMP_LEADERBOARD_REFRESH_SECONDS:
+            board = _load_board(camp_id)
+            _boards[camp_id] = board
+        return board
+
+
+def get_rank(camp_id, participant_id):
+    """ترتيب المشارك في المعسكر وعدد المشاركين: (الترتيب، العدد)"""
+    with _boards_lock:
+        board = get_leaderboard(camp_id)
+        _stats['rank_queries'] += 1
+        return board.rank(participant_id), len(board)
+
+
+def get_standing(camp_id, participant_id, width=1):
+    """ترتيب المشارك ونقاطه وعدد المشاركين ومن حوله من نفس حالة اللوحة: (الترتيب، العدد، النقاط، من حوله) أو None"""
+    with _boards_lock:
+        board = get_leaderboard(camp_id)
+        _stats['rank_queries'] += 1
+        rank = board.rank(participant_id)
+        if rank is None:
+            return None
+        return rank, len(board), board.score(participant_id), board.around(participant_id, width)
+
+
+def get_top(camp_id, limit=5):
+    """أفضل المشاركين في المعسكر: قائمة (معرف المشارك، النقاط، الترتيب)"""
+    with _boards_lock:
+        return get_leaderboard(camp_id).top(limit)
+
+
+def get_around(camp_id, participant_id, width=2):
+    """المشاركون حول مشارك في ترتيب المعسكر"""
+    with _boards_lock:
+        return get_leaderboard(camp_id).around(participant_id, width)
+
+
+def init_camp_leaderboards(app):
+    """بناء لوحات ترتيب المعسكرات النشطة عند بدء التشغيل"""
+    from study_bot.models import CustomCamp
+
+    with app.app_context():
+        try:
+            camp_ids = db.session.scalars(select(CustomCamp.id).where(CustomCamp.is_active == True)).all()
+            for camp_id in camp_ids:
+                get_leaderboard(camp_id)
+            logger.info(f"تم بناء لوحات ترتيب {len(camp_ids)} معسكر")
+        except Exception as e:
+            logger.error(f"خطأ في بناء لوحات ترتيب المعسكرات: {e}")
+            db.session.rollback()
+
+
+# تسجيل تعديلات المشاركين أثناء الحفظ، وتطبيقها على اللوحات بعد نجاح المعاملة فقط
+@event.listens_for(CampParticipant, 'after_insert')
+@event.listens_for(CampParticipant, 'after_update')
+@event.listens_for(CampParticipant, 'after_delete')
+def _on_participant_change(mapper, connection, target):
+    """تسجيل تعديل مشارك في الجلسة"""
+    session = object_session(target)
+    if session is None:
+        return
+
+    # القراءة من القيم المحملة مباشرة حتى لا يسبب الوصول لقيمة منتهية استعلامًا أثناء الحفظ
+    values = target.__dict__
+    if target in session.deleted or values.get('is_active') is False:
+        points = None
+    elif isinstance(values.get('total_points'), int):
+        points = values['total_points']
+    else:
+        points = _RELOAD
+
+    session.info.setdefault(_PENDING_KEY, []).append((values.get('camp_id'), values.get('id'), points))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    """تطبيق التعديلات المحفوظة على لوحات الترتيب المحملة"""
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+
+    with _boards_lock:
+        for camp_id, participant_id, points in changes:
+            board = _boards.get(camp_id)
+            if board is None:
+                continue
+            if points is _RELOAD:
+                del _boards[camp_id]
+            elif points is None:
+                board.remove(participant_id)
+            else:
+                board.set(participant_id, points)
+            _stats['updates'] += 1
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """تجاهل تعديلات المعاملة الملغاة"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_camp_leaderboard_stats():
+    """الحصول على إحصائيات لوحات ترتيب المعسكرات"""
+    with _boards_lock:
+        stats = dict(_stats)
+        stats['camps'] = len(_boards)
+        stats['participants'] = sum(len(board) for board in _boards.values())
+    return stats
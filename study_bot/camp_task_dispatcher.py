@@ -0,0 +1,332 @@
+"""
+وحدة موزع مهام المعسكرات
+تحتوي على موزع يحمل أقرب المهام المنتظرة من الفهرس الجزئي على (scheduled_time) في كومة
+وينتظر حتى موعد أقربها بالضبط، وينهي المهام المنتهية مهلتها أو التابعة لمعسكر غير نشط
+فتخرج من قائمة الانتظار بدلاً من إعادة قراءتها في كل فحص
+"""
+
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, object_session
+
+from study_bot.config import (
+    logger, get_local_time,
+    CAMP_TASK_WINDOW_SIZE, CAMP_TASK_CATCHUP_BATCH, CAMP_TASK_RELOAD_SECONDS, CAMP_TASK_RETRY_SECONDS,
+    CAMP_TASK_CLAIM_LEASE_SECONDS
+)
+from study_bot.models import db, Group, CustomCamp, CampTask
+
+MAX_SLEEP_SECONDS = 60  # أقصى مدة انتظار قبل إعادة فحص الوقت (لتجنب انحراف الساعة)
+
+# مفتاح المهام المضافة المنتظرة للحفظ في معلومات الجلسة
+_PENDING_KEY = 'camp_task_dispatcher_changes'
+
+# المتغيرات العامة
+_dispatcher_thread = None
+_dispatcher_running = False
+_wakeup_event = threading.Event()
+
+# كومة (موعد المهمة، معرف المهمة)، وhorizon آخر موعد محمل إذا امتلأت النافذة (None يعني كل المهام محملة)
+_heap = []
+_heap_lock = threading.Lock()
+_horizon = None
+_loaded_at = 0
+
+_stats = {
+    'sent': 0,
+    'failed': 0,
+    'expired': 0,
+    'orphaned': 0,
+    'outside_camp': 0,
+    'recovered': 0,
+    'reloads': 0,
+    'next_task': None
+}
+
+
+def _recover_claims():
+    """إعادة المهام المحجوزة التي لم تسجل رسالتها بعد انتهاء مدة الحجز لقائمة الانتظار، وإرجاع عددها"""
+    # توقف العملية بين الحجز والإرسال يترك المهمة محجوزة دون رسالة، فتعاد حتى ترسل أو تنهى عند انتهاء مهلتها
+    count = db.session.execute(
+        update(CampTask)
+        .where(
+            CampTask.is_sent == True,
+            CampTask.message_id.is_(None),
+            CampTask.skip_reason.is_(None),
+            CampTask.claimed_at < get_local_time() - timedelta(seconds=CAMP_TASK_CLAIM_LEASE_SECONDS)
+        )
+        .values(is_sent=False, claimed_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+
+    if count:
+        _stats['recovered'] += count
+        logger.warning(f"تمت إعادة {count} مهمة معسكر محجوزة لم ترسل إلى قائمة الانتظار")
+    return count
+
+
+def _reload():
+    """تحميل أقرب المهام المنتظرة من الفهرس الجزئي"""
+    global _heap, _horizon, _loaded_at
+
+    _recover_claims()
+    rows = db.session.execute(
+        select(CampTask.scheduled_time, CampTask.id)
+        .where(CampTask.is_sent == False)
+        .order_by(CampTask.scheduled_time)
+        .limit(CAMP_TASK_WINDOW_SIZE)
+    ).all()
+    db.session.rollback()
+
+    heap = [tuple(row) for row in rows]
+    heapq.heapify(heap)
+    with _heap_lock:
+        _heap = heap
+        _horizon = rows[-1].scheduled_time if len(rows) == CAMP_TASK_WINDOW_SIZE else None
+        _loaded_at = time.monotonic()
+        _stats['reloads'] += 1
+    return len(heap)
+
+
+def schedule_task(task_id, scheduled_time):
+    """إضافة مهمة للكومة وإيقاظ الموزع إذا أصبحت أقرب مهمة"""
+    with _heap_lock:
+        # المهام بعد آخر موعد محمل تحمل مع النافذة التالية
+        if _horizon is not None and scheduled_time > _horizon:
+            return
+        heapq.heappush(_heap, (scheduled_time, task_id))
+        is_next = _heap[0][1] == task_id
+    if is_next:
+        _wakeup_event.set()
+
+
+def _finish(task_ids, reason):
+    """إنهاء مهام دون إرسالها حتى تخرج من قائمة الانتظار"""
+    if not task_ids:
+        return 0
+
+    camp_ids = db.session.scalars(
+        update(CampTask)
+        .where(CampTask.id.in_(task_ids), CampTask.is_sent == False)
+        .values(is_sent=True, skip_reason=reason)
+        .returning(CampTask.camp_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+
+    # التحديث المباشر لا يمر بأحداث الجلسة
+    from study_bot.camp_analytics import invalidate_camp
+    for camp_id in set(camp_ids):
+        invalidate_camp(camp_id)
+
+    _stats[reason] += len(camp_ids)
+    logger.info(f"تم إنهاء {len(camp_ids)} مهمة معسكر دون إرسال ({reason})")
+    return len(camp_ids)
+
+
+def _dispatch(task_ids):
+    """إرسال المهام المستحقة بالترتيب، وإرجاع معرفات المهام التي فشل إرسالها"""
+    from study_bot.custom_camps_handler import send_camp_task
+
+    now = get_local_time()
+
+    # المهام مع معسكراتها ومجموعاتها في استعلام واحد، فلا يعيد send_camp_task قراءتها
+    rows = db.session.execute(
+        select(CampTask, CustomCamp, Group)
+        .outerjoin(CustomCamp, CustomCamp.id == CampTask.camp_id)
+        .outerjoin(Group, Group.id == CustomCamp.group_id)
+        .where(CampTask.id.in_(task_ids), CampTask.is_sent == False)
+        .order_by(CampTask.scheduled_time, CampTask.id)
+    ).all()
+
+    terminal = {'expired': [], 'orphaned': [], 'outside_camp': []}
+    due = []
+    for task, camp, group in rows:
+        if camp is None or group is None or not camp.is_active:
+            terminal['orphaned'].append(task.id)
+        elif not camp.start_date.date() <= task.scheduled_time.date() <= camp.end_date.date():
+            terminal['outside_camp'].append(task.id)
+        elif task.scheduled_time > now:
+            # موعد المهمة تغير بعد إضافتها للكومة، والموعد الجديد له عنصر آخر في الكومة
+            continue
+        elif now > task.scheduled_time + timedelta(minutes=task.deadline_minutes or 0):
+            # انتهت مهلة المشاركة قبل الإرسال (مثل توقف طويل للعملية)
+            terminal['expired'].append(task.id)
+        else:
+            due.append(task.id)
+
+    for reason, ids in terminal.items():
+        _finish(ids, reason)
+
+    failed = []
+    for task_id in due:
+        if send_camp_task(task_id):
+            _stats['sent'] += 1
+        else:
+            _stats['failed'] += 1
+            failed.append(task_id)
+    return failed
+
+
+def drain_due_tasks(limit=None):
+    """إرسال المهام المستحقة من قاعدة البيانات بالترتيب (أقدمها أولاً) بحد أقصى limit، وإرجاع عدد المهام المعالجة"""
+    _recover_claims()
+    task_ids = db.session.scalars(
+        select(CampTask.id)
+        .where(CampTask.is_sent == False, CampTask.scheduled_time <= get_local_time())
+        .order_by(CampTask.scheduled_time)
+        .limit(limit or CAMP_TASK_CATCHUP_BATCH)
+    ).all()
+
+    if task_ids:
+        _dispatch(task_ids)
+    return len(task_ids)
+
+
+def _pop_due(now):
+    """إخراج المهام المستحقة من الكومة بحد أقصى دفعة واحدة، أو إرجاع مدة الانتظار حتى أقربها"""
+    with _heap_lock:
+        if not _heap:
+            return [], None
+
+        delay = (_heap[0][0] - now).total_seconds()
+        if delay > 0:
+            _stats['next_task'] = _heap[0][0].isoformat()
+            return [], delay
+
+        due = []
+        while _heap and _heap[0][0] <= now and len(due) < CAMP_TASK_CATCHUP_BATCH:
+            due.append(heapq.heappop(_heap)[1])
+        return due, 0
+
+
+def _needs_reload():
+    """إعادة التحميل عند نفاد النافذة المحملة أو مرور مدة التحديث"""
+    with _heap_lock:
+        window_exhausted = not _heap and _horizon is not None
+        return window_exhausted or time.monotonic() - _loaded_at > CAMP_TASK_RELOAD_SECONDS
+
+
+def dispatcher_thread_func(app):
+    """دالة سلسلة موزع مهام المعسكرات"""
+    global _dispatcher_running
+
+    with app.app_context():
+        try:
+            try:
+                count = _reload()
+                overdue = sum(1 for scheduled_time, _ in _heap if scheduled_time <= get_local_time())
+                logger.info(f"بدء موزع مهام المعسكرات مع {count} مهمة منتظرة، منها {overdue} مستحقة")
+            except Exception as e:
+                # يعاد التحميل في أول دورة لأن وقت آخر تحميل لم يتغير
+                logger.error(f"خطأ في تحميل مهام المعسكرات المنتظرة عند البدء: {e}")
+                db.session.rollback()
+
+            while _dispatcher_running:
+                # خطأ عابر في قاعدة البيانات (مثل إعادة التحميل) لا يوقف الموزع، ويعاد المحاولة بعد الانتظار
+                try:
+                    if _needs_reload():
+                        _reload()
+
+                    due, delay = _pop_due(get_local_time())
+                    if not due:
+                        _wakeup_event.wait(min(delay, MAX_SLEEP_SECONDS) if delay is not None else MAX_SLEEP_SECONDS)
+                        _wakeup_event.clear()
+                        continue
+
+                    try:
+                        failed = _dispatch(due)
+                    except Exception as e:
+                        logger.error(f"خطأ في إرسال مهام المعسكرات المستحقة: {e}")
+                        db.session.rollback()
+                        failed = due
+
+                    # إعادة المحاولة لاحقًا، وتنهى المهمة عند انتهاء مهلتها
+                    retry_at = get_local_time() + timedelta(seconds=CAMP_TASK_RETRY_SECONDS)
+                    with _heap_lock:
+                        for task_id in failed:
+                            heapq.heappush(_heap, (retry_at, task_id))
+                except Exception as e:
+                    logger.error(f"خطأ في دورة موزع مهام المعسكرات: {e}")
+                    db.session.rollback()
+                    _wakeup_event.wait(CAMP_TASK_RETRY_SECONDS)
+                    _wakeup_event.clear()
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"حدث خطأ في سلسلة موزع مهام المعسكرات: {e}")
+        finally:
+            _dispatcher_running = False
+            logger.info("تم إنهاء موزع مهام المعسكرات")
+
+
+def init_camp_task_dispatcher(app):
+    """تهيئة موزع مهام المعسكرات وبدء سلسلته"""
+    global _dispatcher_thread, _dispatcher_running
+
+    if _dispatcher_running or _dispatcher_thread and _dispatcher_thread.is_alive():
+        logger.warning("موزع مهام المعسكرات يعمل بالفعل")
+        return _dispatcher_thread
+
+    _dispatcher_running = True
+    _wakeup_event.clear()
+    _dispatcher_thread = threading.Thread(target=dispatcher_thread_func, args=(app,))
+    _dispatcher_thread.daemon = True
+    _dispatcher_thread.start()
+
+    return _dispatcher_thread
+
+
+def shutdown_camp_task_dispatcher():
+    """إيقاف موزع مهام المعسكرات"""
+    global _dispatcher_running
+
+    if not _dispatcher_running:
+        return False
+
+    _dispatcher_running = False
+    _wakeup_event.set()
+    if _dispatcher_thread:
+        _dispatcher_thread.join(timeout=5)
+    return True
+
+
+# المهام الجديدة أو المعدل موعدها تضاف للكومة بعد حفظها
+@event.listens_for(CampTask, 'after_insert')
+@event.listens_for(CampTask, 'after_update')
+def _on_task_change(mapper, connection, target):
+    """تسجيل مهمة منتظرة أضيفت أو تغير موعدها"""
+    values = target.__dict__
+    if values.get('is_sent') or values.get('scheduled_time') is None:
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, []).append((values['id'], values['scheduled_time']))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    """إضافة المهام المحفوظة للكومة"""
+    for task_id, scheduled_time in session.info.pop(_PENDING_KEY, ()):
+        schedule_task(task_id, scheduled_time)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """تجاهل مهام المعاملة الملغاة"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_camp_task_dispatcher_stats():
+    """الحصول على إحصائيات موزع مهام المعسكرات"""
+    with _heap_lock:
+        stats = dict(_stats)
+        stats['pending'] = len(_heap)
+        stats['horizon'] = _horizon.isoformat() if _horizon else None
+    stats['running'] = _dispatcher_running
+    return stats
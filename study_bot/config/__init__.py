@@ -23,6 +23,111 @@ TELEGRAM_API_URL = "https://api.telegram.org"
 # اسم المستخدم للبوت
 TELEGRAM_BOT_USERNAME = "Study_schedule501_bot"
 
+# إعدادات عميل HTTP لتيليجرام
+TELEGRAM_POOL_CONNECTIONS = 4  # عدد مجمعات الاتصالات
+TELEGRAM_POOL_MAXSIZE = int(os.environ.get('TELEGRAM_POOL_MAXSIZE', 20))  # الحد الأقصى للاتصالات المفتوحة
+TELEGRAM_CONNECT_TIMEOUT = 5  # مهلة فتح الاتصال (بالثواني)
+TELEGRAM_READ_TIMEOUT = 15  # مهلة القراءة الافتراضية (بالثواني)
+TELEGRAM_MAX_RETRIES = 2  # عدد محاولات إعادة فتح الاتصال
+TELEGRAM_RETRY_BUDGET = 4  # الحد الأقصى لإعادة محاولة إرسال الطلب الواحد
+TELEGRAM_BACKOFF_BASE = 1.0  # المهلة الأساسية للتراجع الأسي (بالثواني)
+TELEGRAM_BACKOFF_MAX = 30  # الحد الأقصى لمهلة التراجع (بالثواني)
+# مهلة القراءة لكل دالة من دوال API
+TELEGRAM_METHOD_TIMEOUTS = {
+    "getUpdates": 40,
+    "getMe": 10,
+    "sendMessage": 15,
+    "editMessageText": 15,
+    "deleteMessage": 10,
+    "answerCallbackQuery": 5,
+    "setWebhook": 15,
+    "deleteWebhook": 15
+}
+
+# إعدادات طابور الرسائل الصادرة
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 8))  # عدد عمال الإرسال
+OUTBOUND_QUEUE_MAXSIZE = 50000  # الحد الأقصى للرسائل المنتظرة
+TELEGRAM_GLOBAL_RATE = 30  # الحد العام للرسائل في الثانية
+TELEGRAM_GROUP_RATE_PER_MINUTE = 20  # حد الرسائل لكل مجموعة في الدقيقة
+OUTBOUND_RESUME_MAX_AGE = 900  # الرسائل المحفوظة عند الإيقاف الأقدم من هذه المدة تحذف دون إرسال بعد إعادة التشغيل (بالثواني)
+
+# إعدادات استقبال التحديثات
+BOT_UPDATE_MODE = os.environ.get('BOT_UPDATE_MODE', 'polling')  # polling أو webhook
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')  # العنوان العام للتطبيق
+WEBHOOK_PATH = '/telegram/webhook'
+WEBHOOK_SECRET_TOKEN = os.environ.get('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_ENQUEUE_TIMEOUT = 2  # مهلة انتظار مكان في طابور العامل قبل الرد بـ 503 (بالثواني)
+
+# إعدادات موزع التحديثات
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 8))  # عدد عمال معالجة التحديثات
+UPDATE_SHARD_QUEUE_SIZE = 500  # الحد الأقصى للتحديثات المنتظرة لكل عامل
+
+# إعدادات سجل الرسائل
+MESSAGE_LOG_BATCH_SIZE = 200  # عدد السجلات التي تكتب في دفعة واحدة
+MESSAGE_LOG_FLUSH_INTERVAL = 2  # الفترة القصوى بين عمليات الكتابة (بالثواني)
+MESSAGE_LOG_BUFFER_MAXSIZE = 20000  # الحد الأقصى للسجلات في الذاكرة قبل تجاهل الجديد
+MESSAGE_LOG_HIGH_VOLUME_THRESHOLD = 60  # عدد الرسائل في الدقيقة الذي تعتبر بعده المجموعة كثيفة
+MESSAGE_LOG_SAMPLE_RATE = float(os.environ.get('MESSAGE_LOG_SAMPLE_RATE', 1.0))  # نسبة السجلات المحفوظة للمجموعات الكثيفة
+
+# إعدادات مجمع العدادات
+STATS_FLUSH_INTERVAL = 5  # الفترة بين كتابة فروق العدادات (بالثواني)، وهي أقصى ما قد يفقد عند توقف مفاجئ
+STATS_COUNTER_SHARDS = 16  # عدد أقسام العدادات في الذاكرة لتقليل التنافس على الأقفال
+
+# إعدادات المهام المؤجلة
+DELAYED_JOB_MAX_LATENESS = 3600  # المهام المتأخرة أكثر من هذه المدة بعد إعادة التشغيل تحذف دون تنفيذ (بالثواني)
+
+# إعدادات ترحيل قاعدة البيانات
+CHECK_QUERY_PLANS = os.environ.get('CHECK_QUERY_PLANS', 'true').lower() == 'true'  # فحص خطط تنفيذ الاستعلامات الأكثر استخدامًا بعد الترحيلات عند البدء
+
+# إعدادات ذاكرة المستخدمين والمجموعات المؤقتة
+IDENTITY_CACHE_TTL = 120  # مدة صلاحية السجل في الذاكرة (بالثواني)، وهي أقصى تأخير لرؤية تعديلات العمليات الأخرى
+IDENTITY_CACHE_MAXSIZE = 10000  # الحد الأقصى للسجلات لكل نوع قبل حذف الأقدم استخدامًا
+ACTIVITY_WRITE_INTERVAL_MINUTES = 5  # أقل فترة بين كتابتين لآخر نشاط نفس المستخدم
+
+# إعدادات بيانات الأزرار المضغوطة
+CALLBACK_SECRET = os.environ.get('CALLBACK_SECRET') or TELEGRAM_BOT_TOKEN or ''  # مفتاح توقيع بيانات الأزرار
+CALLBACK_TAG_SIZE = 8  # طول التوقيع المختصر داخل بيانات الزر (بالبايت)
+
+# إعدادات مجموعة الرسائل التحفيزية
+MOTIVATION_POOL_REFRESH_SECONDS = 600  # إعادة تحميل الرسائل من قاعدة البيانات دوريًا لالتقاط تعديلات العمليات الأخرى
+MOTIVATION_NO_REPEAT_WINDOW = 5  # عدد آخر الرسائل التي لا تتكرر في نفس المحادثة
+
+# إعدادات ترتيب المعسكرات
+CAMP_LEADERBOARD_REFRESH_SECONDS = 300  # إعادة بناء لوحة الترتيب من قاعدة البيانات دوريًا لالتقاط تعديلات العمليات الأخرى
+
+# إعدادات ترتيب المجموعات
+GROUP_LEADERBOARD_REFRESH_SECONDS = 300  # إعادة تحميل لوحة ترتيب الفترة من جدول النتائج دوريًا
+GROUP_LEADERBOARD_MAX_BOARDS = 500  # أقصى عدد للوحات المحفوظة في الذاكرة، ويحذف الأقدم استخدامًا
+LEADERBOARD_WEEK_START = 5  # يوم بداية الأسبوع في الترتيب الأسبوعي (0 الاثنين ... 5 السبت)
+
+# إعدادات حالة المحادثات
+CONVERSATION_STATE_BACKEND = os.environ.get('CONVERSATION_STATE_BACKEND', 'database')  # database (مشتركة بين العمليات) أو memory
+CONVERSATION_STATE_TTL_SECONDS = 1800  # تنتهي المحادثة المتروكة بعد هذه المدة من آخر رسالة فيها
+CONVERSATION_STATE_MAX_SESSIONS = 100000  # أقصى عدد للمحادثات في الذاكرة، ويحذف الأقدم استخدامًا
+
+# إعدادات موزع مهام المعسكرات
+CAMP_TASK_WINDOW_SIZE = 500  # عدد المهام القادمة المحملة في الذاكرة، وتحمل التالية عند الوصول لآخرها
+CAMP_TASK_CATCHUP_BATCH = 20  # أقصى عدد للمهام المستحقة المرسلة في كل دورة عند استكمال المتأخر بعد إعادة التشغيل
+CAMP_TASK_RELOAD_SECONDS = 300  # إعادة تحميل المهام القادمة دوريًا لالتقاط المهام المضافة من عمليات أخرى
+CAMP_TASK_RETRY_SECONDS = 60  # انتظار إعادة محاولة إرسال مهمة فشل إرسالها (حتى انتهاء مهلتها)
+CAMP_TASK_CLAIM_LEASE_SECONDS = 300  # المهمة المحجوزة دون تسجيل رسالتها بعد هذه المدة (توقف العملية أثناء الإرسال) تعاد لقائمة الانتظار
+
+# إعدادات إحصائيات المعسكرات
+CAMP_ANALYTICS_CACHE_SECONDS = 600  # أقصى عمر لإحصائيات المعسكر المحفوظة، لالتقاط تعديلات العمليات الأخرى
+
+# إعدادات قراءة الجداول الكبيرة
+STREAM_CHUNK_SIZE = 1000  # عدد الصفوف في كل دفعة عند قراءة جدول كامل بالتدريج
+
+# إعدادات التحديث اليومي
+ACTIVITY_LOG_RETENTION_DAYS = 30  # مدة الاحتفاظ بسجلات نشاط المستخدمين (بالأيام)
+ROLLOVER_DELETE_CHUNK_SIZE = 5000  # عدد السجلات القديمة المحذوفة في كل معاملة
+
+# إعدادات الرسائل الجماعية
+BROADCAST_BATCH_SIZE = 200  # عدد المستخدمين في كل دفعة، وتحفظ نقطة الاستكمال بعد اكتمال كل دفعة
+BROADCAST_BATCH_TIMEOUT = 60  # أقصى انتظار لاكتمال إرسال دفعة قبل المتابعة (بالثواني)
+BROADCAST_LEASE_SECONDS = 120  # الرسالة الجارية التي لم تحدث نقطة استكمالها خلال هذه المدة تستكملها أي عملية
+BROADCAST_PROGRESS_INTERVAL = 10  # أقل فترة بين تحديثين لرسالة التقدم في محادثة المشرف (بالثواني)
+
 # إعدادات المناطق الزمنية - تم تعديلها للتوقيت المصري الصيفي
 SCHEDULER_TIMEZONE = pytz.timezone('Africa/Cairo')
 DEFAULT_TIMEZONE = 'Africa/Cairo'
@@ -38,6 +143,10 @@ def get_current_time():
     # استخدام localize بدلاً من replace للتوافق مع pytz
     return SCHEDULER_TIMEZONE.localize(now, is_dst=None)
 
+def get_local_time():
+    """الوقت الحالي بالمنطقة الزمنية المحددة بدون منطقة زمنية، لمقارنته بالأوقات المحفوظة كما أدخلها المشرف"""
+    return datetime.now(SCHEDULER_TIMEZONE).replace(tzinfo=None)
+
 def get_timezone_object():
     """الحصول على كائن المنطقة الزمنية"""
     # استخدام pytz للتوافق مع APScheduler
@@ -46,6 +155,7 @@ def get_timezone_object():
 
 # إعدادات المجدول
 SCHEDULER_INTERVAL = 5  # بالثواني
+REMINDER_CATCHUP_MINUTES = 15  # أقصى تأخير لإرسال تذكير فائت بعد إعادة التشغيل (بالدقائق)
 
 # الرسائل التحفيزية
 MOTIVATIONAL_MESSAGES = [
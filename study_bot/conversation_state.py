@@ -0,0 +1,344 @@
+"""
+وحدة حالة المحادثات
+تحتوي على مخزن لحالة المحادثات متعددة الخطوات (اسم المحادثة والخطوة الحالية وبياناتها) بخلفيتين:
+الذاكرة (LRU مع مدة صلاحية) لعملية واحدة، وقاعدة البيانات لتبقى الحالة بعد إعادة التشغيل وتشترك فيها العمليات،
+وعلى موجه يوجه الرسالة النصية لمعالج الخطوة الحالية مباشرة
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from study_bot.config import (
+    logger, CONVERSATION_STATE_BACKEND, CONVERSATION_STATE_TTL_SECONDS, CONVERSATION_STATE_MAX_SESSIONS
+)
+
+# عدد المحادثات المنتهية المحذوفة من قاعدة البيانات في كل معاملة
+PURGE_CHUNK_SIZE = 5000
+
+# المتغيرات العامة
+_backend = None
+_backend_lock = threading.Lock()
+
+_stats = {
+    'started': 0,
+    'finished': 0,
+    'routed': 0,
+    'purged': 0
+}
+
+
+class Conversation:
+    """محادثة مستخدم: اسمها والخطوة الحالية وبيانات الخطوات السابقة"""
+
+    __slots__ = ('user_id', 'flow', 'step', 'data', 'expires_at', 'finished')
+
+    def __init__(self, user_id, flow, step, data=None, expires_at=None):
+        self.user_id = user_id
+        self.flow = flow
+        self.step = step
+        self.data = data if data is not None else {}
+        self.expires_at = expires_at
+        self.finished = False
+
+    def advance(self, step, **data):
+        """الانتقال لخطوة أخرى مع حفظ بيانات الخطوة الحالية"""
+        self.step = step
+        self.data.update(data)
+
+    def finish(self):
+        """إنهاء المحادثة وحذف حالتها"""
+        self.finished = True
+
+
+def _encode(data):
+    """تحويل بيانات المحادثة إلى JSON مع دعم التواريخ"""
+    return json.dumps(data, ensure_ascii=False, default=lambda value: {'__datetime__': value.isoformat()})
+
+
+def _decode(text):
+    """قراءة بيانات المحادثة من JSON"""
+    if not text:
+        return {}
+    return json.loads(text, object_hook=lambda d: datetime.fromisoformat(d['__datetime__']) if '__datetime__' in d else d)
+
+
+class MemoryStateBackend:
+    """حالة المحادثات في ذاكرة العملية مرتبة بآخر استخدام"""
+    # كل حفظ يمدد الصلاحية وينقل المحادثة لنهاية الترتيب، ولأن مدة الصلاحية ثابتة يكون الترتيب
+    # هو نفسه ترتيب انتهاء الصلاحية، فتحذف المنتهية من البداية دون المرور على باقي المحادثات
+
+    name = 'memory'
+
+    def __init__(self, max_sessions=CONVERSATION_STATE_MAX_SESSIONS, ttl=CONVERSATION_STATE_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, user_id):
+        """المحادثة الجارية للمستخدم أو None"""
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            flow, step, data, expires_at = item
+            if expires_at <= time.time():
+                del self._items[user_id]
+                return None
+        # نسخة من البيانات حتى لا يظهر تعديلها قبل الحفظ (كما في خلفية قاعدة البيانات)
+        return Conversation(user_id, flow, step, dict(data), expires_at)
+
+    def save(self, conversation):
+        """حفظ المحادثة وتمديد صلاحيتها"""
+        conversation.expires_at = time.time() + self.ttl
+        with self._lock:
+            self._items[conversation.user_id] = (
+                conversation.flow, conversation.step, dict(conversation.data), conversation.expires_at
+            )
+            self._items.move_to_end(conversation.user_id)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+                self.evicted += 1
+
+    def delete(self, user_id):
+        """حذف محادثة المستخدم"""
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def purge_expired(self):
+        """حذف المحادثات المنتهية وإرجاع عددها"""
+        now = time.time()
+        count = 0
+        with self._lock:
+            while self._items:
+                user_id, item = next(iter(self._items.items()))
+                if item[3] > now:
+                    break
+                del self._items[user_id]
+                count += 1
+        return count
+
+    def count(self):
+        """عدد المحادثات المحفوظة"""
+        with self._lock:
+            return len(self._items)
+
+
+class DatabaseStateBackend:
+    """حالة المحادثات في جدول conversation_state، صف لكل مستخدم بالمفتاح الأساسي"""
+
+    name = 'database'
+
+    def __init__(self, ttl=CONVERSATION_STATE_TTL_SECONDS):
+        self.ttl = ttl
+
+    def get(self, user_id):
+        """المحادثة الجارية للمستخدم أو None"""
+        from sqlalchemy import select
+        from study_bot.models import db, ConversationState
+
+        row = db.session.execute(
+            select(ConversationState.flow, ConversationState.step, ConversationState.data, ConversationState.expires_at)
+            .where(ConversationState.user_id == user_id, ConversationState.expires_at > time.time())
+        ).first()
+        if row is None:
+            return None
+        return Conversation(user_id, row.flow, row.step, _decode(row.data), row.expires_at)
+
+    def save(self, conversation):
+        """حفظ المحادثة وتمديد صلاحيتها (تحديث الصف أو إنشاؤه)"""
+        from sqlalchemy import update, insert
+        from sqlalchemy.exc import IntegrityError
+        from study_bot.models import db, ConversationState
+
+        now = time.time()
+        conversation.expires_at = now + self.ttl
+        values = {
+            'flow': conversation.flow,
+            'step': conversation.step,
+            'data': _encode(conversation.data),
+            'expires_at': conversation.expires_at,
+            'updated_at': now
+        }
+
+        try:
+            updated = db.session.execute(
+                update(ConversationState).where(ConversationState.user_id == conversation.user_id)
+                .values(**values).execution_options(synchronize_session=False)
+            ).rowcount
+            if not updated:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(ConversationState).values(user_id=conversation.user_id, **values))
+                except IntegrityError:
+                    # أنشأ طلب متزامن نفس الصف
+                    db.session.execute(
+                        update(ConversationState).where(ConversationState.user_id == conversation.user_id)
+                        .values(**values).execution_options(synchronize_session=False)
+                    )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def delete(self, user_id):
+        """حذف محادثة المستخدم"""
+        from sqlalchemy import delete
+        from study_bot.models import db, ConversationState
+
+        db.session.execute(delete(ConversationState).where(ConversationState.user_id == user_id))
+        db.session.commit()
+
+    def purge_expired(self):
+        """حذف المحادثات المنتهية على دفعات وإرجاع عددها"""
+        from sqlalchemy import select, delete
+        from study_bot.models import db, ConversationState
+
+        now = time.time()
+        count = 0
+        while True:
+            chunk = select(ConversationState.user_id).where(ConversationState.expires_at <= now).limit(PURGE_CHUNK_SIZE)
+            deleted = db.session.execute(
+                delete(ConversationState).where(ConversationState.user_id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+
+            count += deleted
+            if deleted < PURGE_CHUNK_SIZE:
+                return count
+
+    def count(self):
+        """عدد المحادثات الجارية"""
+        from sqlalchemy import select, func
+        from study_bot.models import db, ConversationState
+
+        return db.session.scalar(
+            select(func.count()).select_from(ConversationState).where(ConversationState.expires_at > time.time())
+        )
+
+
+BACKENDS = {
+    'memory': MemoryStateBackend,
+    'database': DatabaseStateBackend
+}
+
+
+def get_state_backend():
+    """الحصول على خلفية حالة المحادثات المحددة في الإعدادات"""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = BACKENDS.get(CONVERSATION_STATE_BACKEND)
+                if backend_class is None:
+                    logger.warning(f"خلفية حالة محادثات غير معروفة: {CONVERSATION_STATE_BACKEND}، سيتم استخدام قاعدة البيانات")
+                    backend_class = DatabaseStateBackend
+                _backend = backend_class()
+    return _backend
+
+
+def set_state_backend(backend):
+    """استبدال خلفية حالة المحادثات (مثل استخدام الذاكرة في بيئة عملية واحدة)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def get_conversation(user_id):
+    """المحادثة الجارية للمستخدم أو None"""
+    return get_state_backend().get(user_id)
+
+
+def end_conversation(user_id):
+    """إنهاء محادثة المستخدم الجارية أيًا كانت"""
+    get_state_backend().delete(user_id)
+    _stats['finished'] += 1
+
+
+def purge_expired_conversations():
+    """حذف المحادثات المتروكة المنتهية صلاحيتها"""
+    try:
+        count = get_state_backend().purge_expired()
+        _stats['purged'] += count
+        if count:
+            logger.info(f"تم حذف {count} محادثة متروكة منتهية")
+        return count
+    except Exception as e:
+        logger.error(f"خطأ في حذف المحادثات المنتهية: {e}")
+        return 0
+
+
+class ConversationRouter:
+    """موجه رسائل محادثة متعددة الخطوات: معالج لكل خطوة يختار مباشرة باسم الخطوة الحالية"""
+
+    def __init__(self, flow):
+        self.flow = flow
+        self._steps = {}
+
+    def step(self, name):
+        """تسجيل معالج لخطوة، ويستقبل (المحادثة، النص، ومعاملات السياق)"""
+        def decorator(func):
+            self._steps[name] = func
+            return func
+        return decorator
+
+    def start(self, user_id, step, **data):
+        """بدء المحادثة من خطوة محددة، وتحل محل أي محادثة جارية للمستخدم"""
+        conversation = Conversation(user_id, self.flow, step, data)
+        get_state_backend().save(conversation)
+        _stats['started'] += 1
+        return conversation
+
+    def get(self, user_id):
+        """محادثة المستخدم الجارية إذا كانت من هذا الموجه"""
+        conversation = get_conversation(user_id)
+        if conversation is None or conversation.flow != self.flow:
+            return None
+        return conversation
+
+    def dispatch(self, user_id, text, **context):
+        """توجيه الرسالة لمعالج الخطوة الحالية وحفظ الحالة بعده، وإرجاع False إذا لم تكن للمستخدم محادثة من هذا الموجه"""
+        conversation = self.get(user_id)
+        if conversation is None:
+            return False
+
+        handler = self._steps.get(conversation.step)
+        if handler is None:
+            # خطوة لم تعد موجودة (مثل حالة محفوظة قبل تحديث)، فتنهى المحادثة
+            logger.warning(f"خطوة غير معروفة في المحادثة {self.flow}: {conversation.step}")
+            end_conversation(user_id)
+            return False
+
+        _stats['routed'] += 1
+        result = handler(conversation, text, **context)
+
+        if conversation.finished:
+            end_conversation(user_id)
+        else:
+            get_state_backend().save(conversation)
+        return True if result is None else result
+
+    def list_steps(self):
+        """أسماء الخطوات المسجلة"""
+        return list(self._steps)
+
+
+def get_conversation_stats():
+    """الحصول على إحصائيات حالة المحادثات"""
+    backend = get_state_backend()
+    stats = dict(_stats)
+    stats['backend'] = backend.name
+    try:
+        stats['active'] = backend.count()
+    except Exception as e:
+        logger.error(f"خطأ في عد المحادثات الجارية: {e}")
+        stats['active'] = None
+    if isinstance(backend, MemoryStateBackend):
+        stats['evicted'] = backend.evicted
+    return stats
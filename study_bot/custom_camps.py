@@ -125,7 +125,7 @@ def add_camp_task(camp_id, admin_id, task_title, task_description, scheduled_tim
 def join_camp(camp_id, user_id):
     """الانضمام لمعسكر دراسة"""
     try:
-        from study_bot.models import CustomCamp, CampParticipant, User
+        from study_bot.models import CustomCamp, CampParticipant
         
         # التحقق من المعسكر
         camp = CustomCamp.query.get(camp_id)
@@ -134,7 +134,8 @@ def join_camp(camp_id, user_id):
             return None
         
         # التحقق من المستخدم
-        user = User.query.filter_by(telegram_id=user_id).first()
+        from study_bot.identity_cache import get_user
+        user = get_user(user_id)
         if not user:
             logger.error(f"المستخدم {user_id} غير موجود")
             return None
@@ -224,8 +225,9 @@ def send_camp_announcement(group_telegram_id, camp):
         announcement += f"\n\n{random.choice(MOTIVATIONAL_QUOTES)}"
         
         # إضافة زر الانضمام
+        from study_bot.custom_camps_handler import camp_join_callback
         keyboard = [
-            [{'text': '🚀 انضم للمعسكر', 'callback_data': f'join_camp:{camp.id}'}]
+            [{'text': '🚀 انضم للمعسكر', 'callback_data': camp_join_callback(camp)}]
         ]
         
         # إرسال الإعلان
@@ -416,8 +418,9 @@ def update_camp_announcement(camp_id):
         announcement += f"\n\n{random.choice(MOTIVATIONAL_QUOTES)}"
         
         # إضافة زر الانضمام
+        from study_bot.custom_camps_handler import camp_join_callback
         keyboard = [
-            [{'text': '🚀 انضم للمعسكر', 'callback_data': f'join_camp:{camp.id}'}]
+            [{'text': '🚀 انضم للمعسكر', 'callback_data': camp_join_callback(camp)}]
         ]
         
         # تحديث الإعلان
@@ -587,8 +590,8 @@ def handle_add_camp_task_command(group_id, admin_id, command_text):
 def check_scheduled_camp_tasks():
     """فحص وإرسال مهام المعسكرات المجدولة"""
     try:
-        from study_bot.camp_scheduler import check_and_send_scheduled_camp_tasks
-        return check_and_send_scheduled_camp_tasks()
+        from study_bot.camp_task_dispatcher import drain_due_tasks
+        return drain_due_tasks()
     except Exception as e:
         logger.error(f"خطأ في فحص وإرسال مهام المعسكرات المجدولة: {e}")
         logger.error(traceback.format_exc())
@@ -5,20 +5,21 @@
 
 import json
 import random
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 
-from study_bot.config import TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, logger
-from study_bot.models import User, Group, GroupParticipant, db
-from study_bot.models.camps_models import CustomCamp, CampTask, CampParticipant, CampTaskParticipation
+from sqlalchemy import select, update
+
+from study_bot.config import logger, get_local_time, SCHEDULER_TIMEZONE
+from study_bot.models import User, Group, db, CustomCamp, CampTask, CampParticipant, CampTaskParticipation
 from study_bot.group_tasks import MOTIVATIONAL_QUOTES
+from study_bot.telegram_client import get_client
+from study_bot.bot.callback_codec import encode_callback
 
 
 # إرسال رسالة إلى مجموعة
 def send_group_message(chat_id, text, reply_markup=None, parse_mode="HTML"):
     """إرسال رسالة إلى مجموعة"""
-    import requests
-    
-    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     data = {
         "chat_id": chat_id,
         "text": text,
@@ -29,23 +30,29 @@ def send_group_message(chat_id, text, reply_markup=None, parse_mode="HTML"):
         data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
     
     try:
-        response = requests.post(url, json=data, timeout=60)
-        if response.status_code == 200:
-            return response.json().get("result")
+        result = get_client().call("sendMessage", data)
+        if result and result.get("ok"):
+            return result.get("result")
         else:
-            logger.error(f"فشل في إرسال رسالة للمجموعة {chat_id}: {response.text}")
+            logger.error(f"فشل في إرسال رسالة للمجموعة {chat_id}: {result}")
             return None
     except Exception as e:
         logger.error(f"خطأ أثناء إرسال رسالة للمجموعة {chat_id}: {e}")
         return None
 
 
+# بيانات زر الانضمام للمعسكر
+def camp_join_callback(camp):
+    """ترميز بيانات زر الانضمام للمعسكر، وتنتهي صلاحيته بانتهاء آخر يوم في المعسكر"""
+    end_of_camp = datetime.combine(camp.end_date.date() + timedelta(days=1), datetime.min.time())
+    # تواريخ المعسكر بالتوقيت المحلي بدون منطقة زمنية
+    expires_at = SCHEDULER_TIMEZONE.localize(end_of_camp).astimezone(timezone.utc)
+    return encode_callback('camp_join', expires_at=expires_at, camp_id=camp.id)
+
+
 # إرسال استجابة للضغط على زر
 def answer_callback_query(callback_query_id, text=None, show_alert=False):
     """الإجابة على نداء الاستجابة"""
-    import requests
-    
-    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery"
     data = {
         "callback_query_id": callback_query_id
     }
@@ -56,7 +63,7 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
     data["show_alert"] = show_alert
     
     try:
-        response = requests.post(url, json=data, timeout=60)
+        response = get_client().post("answerCallbackQuery", data)
         if response.status_code == 200:
             return response.json()
         else:
@@ -234,7 +241,7 @@ def send_camp_announcement(group_telegram_id, camp):
             "inline_keyboard": [
                 [{
                     "text": "💪 انضم للمعسكر",
-                    "callback_data": f"camp_join:{camp.id}"
+                    "callback_data": camp_join_callback(camp)
                 }]
             ]
         }
@@ -253,29 +260,62 @@ def send_camp_announcement(group_telegram_id, camp):
 
 
 # إرسال مهمة معسكر
+def _claim_task(task_id):
+    """حجز المهمة للإرسال في تحديث واحد، فلا يرسلها موزع آخر أو عملية أخرى في نفس الوقت"""
+    claimed = db.session.execute(
+        update(CampTask)
+        .where(CampTask.id == task_id, CampTask.is_sent == False)
+        .values(is_sent=True, claimed_at=get_local_time())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def _release_task(task_id):
+    """إلغاء حجز مهمة فشل إرسالها حتى تعاد محاولتها"""
+    try:
+        db.session.rollback()
+        db.session.execute(
+            update(CampTask)
+            .where(CampTask.id == task_id, CampTask.message_id.is_(None), CampTask.skip_reason.is_(None))
+            .values(is_sent=False, claimed_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"خطأ في إلغاء حجز مهمة المعسكر {task_id}: {e}")
+        db.session.rollback()
+
+
 def send_camp_task(task_id):
     """إرسال مهمة من مهام المعسكر"""
+    claimed = False
+    message = None
     try:
+        # حجز المهمة قبل الإرسال، وإذا لم يتغير أي صف فهي مرسلة أو محجوزة بالفعل
+        claimed = _claim_task(task_id)
+        if not claimed:
+            logger.warning(f"المهمة {task_id} مرسلة أو محجوزة بالفعل")
+            return None
+
         # الحصول على المهمة
         task = CampTask.query.get(task_id)
         if not task:
             logger.error(f"لم يتم العثور على المهمة {task_id}")
             return None
-        
-        # التحقق من أن المهمة لم ترسل بعد
-        if task.is_sent:
-            logger.warning(f"المهمة {task.title} مرسلة بالفعل")
-            return None
-            
+
         # الحصول على المعسكر والمجموعة
         camp = CustomCamp.query.get(task.camp_id)
         if not camp or not camp.is_active:
             logger.error(f"المعسكر غير موجود أو غير نشط للمهمة {task_id}")
+            _release_task(task_id)
             return None
             
         group = Group.query.get(camp.group_id)
         if not group:
             logger.error(f"لم يتم العثور على المجموعة للمعسكر {camp.id}")
+            _release_task(task_id)
             return None
         
         # إعداد نص المهمة
@@ -300,24 +340,35 @@ def send_camp_task(task_id):
             "inline_keyboard": [
                 [{
                     "text": "✅ شارك في المهمة",
-                    "callback_data": f"camp_task_join:{task.id}"
+                    "callback_data": encode_callback(
+                        'camp_task_join',
+                        expires_at=time.time() + task.deadline_minutes * 60,
+                        task_id=task.id,
+                        points=task.points
+                    )
                 }]
             ]
         }
         
         # إرسال الرسالة
         message = send_group_message(group.telegram_id, full_text, keyboard)
-        if message:
-            # تحديث حالة المهمة
-            task.is_sent = True
-            task.message_id = message.get('message_id')
-            task.sent_at = datetime.utcnow()
-            db.session.commit()
-            
-            logger.info(f"تم إرسال مهمة المعسكر {task.title} إلى المجموعة {group.telegram_id}")
-            return message
+        if not message:
+            # تبقى المهمة لمسار إعادة المحاولة في الموزع
+            _release_task(task_id)
+            return None
+
+        # حفظ بيانات الإرسال (المهمة محجوزة بالفعل)
+        task.message_id = message.get('message_id')
+        task.sent_at = get_local_time()
+        db.session.commit()
+        
+        logger.info(f"تم إرسال مهمة المعسكر {task.title} إلى المجموعة {group.telegram_id}")
+        return message
     except Exception as e:
         logger.error(f"خطأ في إرسال مهمة معسكر: {e}")
+        # بعد وصول الرسالة تبقى المهمة محجوزة حتى لو فشل حفظ بياناتها، فلا ترسل مرتين
+        if claimed and not message:
+            _release_task(task_id)
         return None
 
 
@@ -332,7 +383,7 @@ def handle_camp_join(camp_id, user_id, callback_query_id):
             return False
         
         # التحقق من موعد المعسكر
-        today = datetime.utcnow().date()
+        today = get_local_time().date()
         if today < camp.start_date.date() or today > camp.end_date.date():
             answer_callback_query(callback_query_id, "❌ المعسكر ليس في الفترة النشطة")
             return False
@@ -383,7 +434,7 @@ def handle_camp_task_join(task_id, user_id, callback_query_id):
         # التحقق من المهلة الزمنية
         if task.sent_at:
             deadline = task.sent_at + timedelta(minutes=task.deadline_minutes)
-            if datetime.utcnow() > deadline:
+            if get_local_time() > deadline:
                 answer_callback_query(callback_query_id, "❌ انتهت مهلة المشاركة في هذه المهمة")
                 return False
         
@@ -438,6 +489,115 @@ def handle_camp_task_join(task_id, user_id, callback_query_id):
         return False
 
 
+# المشاركة في مهمة معسكر من زر مرمز
+def handle_camp_task_join_from_button(task_id, points, user_id, callback_query_id):
+    """المشاركة في مهمة معسكر من زر موقع: المهلة تحققت عند فك الترميز والنقاط من الزر، فلا تحمل المهمة"""
+    try:
+        from study_bot.identity_cache import get_user
+        
+        user = get_user(user_id) or User.get_or_create(user_id)
+        
+        # المشارك النشط في معسكر المهمة (والمعسكر نشط) في استعلام واحد
+        participant = db.session.scalars(
+            select(CampParticipant)
+            .join(CampTask, CampTask.camp_id == CampParticipant.camp_id)
+            .join(CustomCamp, CustomCamp.id == CampParticipant.camp_id)
+            .where(
+                CampTask.id == task_id,
+                CampParticipant.user_id == user.id,
+                CampParticipant.is_active == True,
+                CustomCamp.is_active == True
+            )
+        ).first()
+        if not participant:
+            answer_callback_query(callback_query_id, "❌ يجب أن تنضم للمعسكر أولاً")
+            return False
+        
+        # التحقق من عدم المشاركة سابقاً
+        existing_participation = db.session.scalar(
+            select(CampTaskParticipation.id).where(
+                CampTaskParticipation.task_id == task_id,
+                CampTaskParticipation.participant_id == participant.id
+            )
+        )
+        if existing_participation:
+            answer_callback_query(callback_query_id, "✅ لقد شاركت بالفعل في هذه المهمة!")
+            return True
+        
+        db.session.add(CampTaskParticipation(
+            task_id=task_id,
+            participant_id=participant.id,
+            participation_time=get_local_time(),
+            points_earned=points
+        ))
+        participant.total_points += points
+        db.session.commit()
+        
+        answer_callback_query(callback_query_id, f"✅ تم تسجيل مشاركتك في المهمة! (+{points} نقطة)")
+        logger.info(f"تم تسجيل مشاركة المستخدم {user_id} في مهمة المعسكر {task_id}")
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في معالجة طلب المشاركة في مهمة معسكر: {e}")
+        db.session.rollback()
+        answer_callback_query(callback_query_id, "❌ حدث خطأ أثناء معالجة طلبك")
+        return False
+
+
+# عرض ترتيب المستخدم في المعسكر
+def handle_camp_rank(camp_id, user_id, callback_query_id):
+    """عرض ترتيب المستخدم في المعسكر ومن حوله في تنبيه"""
+    try:
+        from study_bot.identity_cache import get_user
+        from study_bot.camp_leaderboard import get_standing
+        
+        user = get_user(user_id)
+        participant_id = user and db.session.scalar(
+            select(CampParticipant.id).where(
+                CampParticipant.camp_id == camp_id,
+                CampParticipant.user_id == user.id,
+                CampParticipant.is_active == True
+            )
+        )
+        
+        # الترتيب والنقاط ومن حوله من نفس حالة اللوحة حتى لا تتعارض مع تعديل متزامن
+        standing = get_standing(camp_id, participant_id) if participant_id else None
+        if not standing:
+            answer_callback_query(callback_query_id, "❌ أنت غير مشترك في هذا المعسكر", True)
+            return False
+        
+        rank, total, points, around = standing
+        text = f"🏅 ترتيبك: {rank} من {total}\n⭐ نقاطك: {points}"
+        
+        # الفرق عن صاحب الترتيب الأعلى
+        if rank > 1:
+            above_points = next(score for _, score, r in around if r == rank - 1)
+            text += f"\n⬆️ تحتاج {above_points - points + 1} نقطة لتتقدم"
+        
+        # المشاركون حوله (أسماؤهم في استعلام واحد)
+        neighbours = [item for item in around if item[0] != participant_id]
+        if neighbours:
+            names = dict(db.session.execute(
+                select(CampParticipant.id, User.first_name)
+                .join(User, User.id == CampParticipant.user_id)
+                .where(CampParticipant.id.in_([member for member, _, _ in neighbours]))
+            ).all())
+            
+            text += "\n"
+            for member, score, member_rank in around:
+                if member == participant_id:
+                    text += f"\n▶️ {member_rank}. أنت: {score}"
+                else:
+                    text += f"\n{member_rank}. {(names.get(member) or 'مشارك')[:20]}: {score}"
+        
+        # حد تيليجرام لنص التنبيه 200 حرف
+        answer_callback_query(callback_query_id, text[:200], True)
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في عرض ترتيب المستخدم في المعسكر: {e}")
+        answer_callback_query(callback_query_id, "❌ حدث خطأ أثناء معالجة طلبك")
+        return False
+
+
 # تحديث إعلان المعسكر
 def update_camp_announcement(camp_id):
     """تحديث إعلان المعسكر بمعلومات جديدة"""
@@ -454,8 +614,10 @@ def update_camp_announcement(camp_id):
             logger.error(f"لم يتم العثور على المجموعة للمعسكر {camp.id}")
             return None
         
-        # حساب عدد المشاركين
-        participants_count = CampParticipant.query.filter_by(camp_id=camp.id, is_active=True).count()
+        # عدد المشاركين والمهام من إحصائيات المعسكر المجمعة
+        from study_bot.camp_analytics import get_camp_analytics
+        analytics = get_camp_analytics(camp.id)
+        participants_count = analytics['total_participants']
         
         # إعداد نص الإعلان المحدث
         start_date_str = camp.start_date.strftime('%Y-%m-%d')
@@ -478,6 +640,9 @@ def update_camp_announcement(camp_id):
             if participants_count >= camp.max_participants:
                 text += "\n\n⛔ <b>المعسكر ممتلئ حالياً</b>"
         
+        if analytics['total_tasks']:
+            text += f"\n📝 المهام المرسلة: {analytics['sent_tasks']} من {analytics['total_tasks']}"
+        
         # إضافة اقتباس تحفيزي
         motivation = random.choice(MOTIVATIONAL_QUOTES)
         text += f"\n\n✨ {motivation}"
@@ -487,7 +652,7 @@ def update_camp_announcement(camp_id):
             "inline_keyboard": [
                 [{
                     "text": "💪 انضم للمعسكر",
-                    "callback_data": f"camp_join:{camp.id}"
+                    "callback_data": camp_join_callback(camp)
                 }]
             ]
         }
@@ -529,9 +694,12 @@ def send_camp_report(camp_id):
             logger.error(f"لم يتم العثور على المجموعة للمعسكر {camp.id}")
             return None
         
-        # حساب عدد المشاركين
-        participants = CampParticipant.query.filter_by(camp_id=camp.id, is_active=True).all()
-        participants_count = len(participants)
+        # أفضل المشاركين من لوحة ترتيب المعسكر، والأعداد ونسب الإكمال من الإحصائيات المجمعة
+        from study_bot.camp_leaderboard import get_top
+        from study_bot.camp_analytics import get_camp_analytics
+        top_participants = get_top(camp.id, 5)
+        analytics = get_camp_analytics(camp.id)
+        participants_count = analytics['total_participants']
         
         # إعداد نص التقرير
         today_date = datetime.utcnow().strftime('%Y-%m-%d')
@@ -543,27 +711,43 @@ def send_camp_report(camp_id):
         
         if camp.max_participants > 0:
             text += f" / {camp.max_participants}"
+        
+        text += (
+            f"\n📝 المهام المرسلة: {analytics['sent_tasks']} من {analytics['total_tasks']}"
+            f"\n✅ المشاركات في المهام: {analytics['total_completions']}"
+            f"\n📈 نسبة الإكمال: {analytics['completion_rate']}%"
+        )
             
-        # إضافة قائمة بأفضل المشاركين
-        if participants:
-            # ترتيب المشاركين حسب النقاط
-            top_participants = sorted(participants, key=lambda p: p.total_points, reverse=True)[:5]
+        # إضافة قائمة بأفضل المشاركين (أسماؤهم في استعلام واحد)
+        if top_participants:
+            users = dict(db.session.execute(
+                select(CampParticipant.id, User)
+                .join(User, User.id == CampParticipant.user_id)
+                .where(CampParticipant.id.in_([participant_id for participant_id, _, _ in top_participants]))
+            ).all())
             
-            if top_participants:
-                text += "\n\n🏆 <b>أفضل المشاركين:</b>"
-                
-                for i, p in enumerate(top_participants):
-                    user = User.query.get(p.user_id)
-                    if user:
-                        user_name = user.get_full_name() or f"المستخدم {user.telegram_id}"
-                        text += f"\n{i+1}. {user_name}: {p.total_points} نقطة"
+            text += "\n\n🏆 <b>أفضل المشاركين:</b>"
+            for participant_id, points, rank in top_participants:
+                user = users.get(participant_id)
+                if user:
+                    user_name = user.get_full_name() or f"المستخدم {user.telegram_id}"
+                    progress = analytics['participants'].get(participant_id)
+                    percentage = progress['percentage'] if progress else 0
+                    text += f"\n{rank}. {user_name}: {points} نقطة ({percentage}%)"
         
         # إضافة اقتباس تحفيزي
         motivation = random.choice(MOTIVATIONAL_QUOTES)
         text += f"\n\n✨ {motivation}"
         
+        # زر لعرض ترتيب كل مشارك
+        keyboard = {
+            "inline_keyboard": [
+                [{"text": "🏅 ترتيبي", "callback_data": encode_callback('camp_rank', camp_id=camp.id)}]
+            ]
+        }
+        
         # إرسال التقرير
-        message = send_group_message(group.telegram_id, text)
+        message = send_group_message(group.telegram_id, text, keyboard)
         if message:
             logger.info(f"تم إرسال تقرير المعسكر {camp.name} إلى المجموعة {group.telegram_id}")
             return message
@@ -737,36 +921,16 @@ def handle_add_camp_task_command(group_id, admin_id, command_text):
 
 # فحص المهام المجدولة وإرسالها
 def check_scheduled_camp_tasks():
-    """فحص وإرسال مهام المعسكرات المجدولة"""
+    """إرسال المهام المستحقة فورًا دون انتظار موزع مهام المعسكرات (بحد أقصى دفعة واحدة)"""
     try:
-        # الحصول على الوقت الحالي
-        now = datetime.utcnow()
-        
-        # البحث عن مهام معسكرات لم ترسل بعد وحان وقتها
-        tasks = CampTask.query.filter(
-            CampTask.is_sent == False,
-            CampTask.scheduled_time <= now
-        ).all()
-        
-        # إرسال كل مهمة
-        for task in tasks:
-            # التحقق من أن المعسكر نشط
-            camp = CustomCamp.query.get(task.camp_id)
-            if not camp or not camp.is_active:
-                continue
-                
-            # التحقق من أن المعسكر في الفترة النشطة
-            today = now.date()
-            if today < camp.start_date.date() or today > camp.end_date.date():
-                continue
-            
-            # إرسال المهمة
-            send_camp_task(task.id)
-        
-        # تسجيل نتيجة الفحص
-        logger.info(f"تم فحص وإرسال {len(tasks)} مهمة معسكر مجدولة")
+        from study_bot.camp_task_dispatcher import drain_due_tasks
+        count = drain_due_tasks()
+        logger.info(f"تم فحص {count} مهمة معسكر مستحقة")
+        return count
     except Exception as e:
         logger.error(f"خطأ في فحص وإرسال مهام المعسكرات المجدولة: {e}")
+        db.session.rollback()
+        return 0
 
 
 # إرسال تقارير يومية للمعسكرات
@@ -0,0 +1,213 @@
+"""
+وحدة المهام المؤجلة
+تحتوي على مخزن مهام مؤجلة محفوظ في قاعدة البيانات تنفذه سلسلة واحدة تنتظر أقرب مهمة في كومة
+بدلاً من مؤقت منفصل لكل مهمة، ويعاد تحميله عند بدء التشغيل
+"""
+
+import heapq
+import json
+import threading
+import time
+
+from sqlalchemy import select, delete
+
+from study_bot.config import logger, DELAYED_JOB_MAX_LATENESS
+
+# المتغيرات العامة
+_jobs_thread = None
+_jobs_running = False
+_jobs_cond = threading.Condition()
+
+# كومة (وقت التنفيذ، معرف المهمة)، وبيانات المهمة نفسها تقرأ من قاعدة البيانات عند التنفيذ
+# المهام الملغاة تحذف من قاعدة البيانات فقط وتتجاهل عند الوصول إليها في الكومة
+_heap = []
+
+_stats = {
+    'scheduled': 0,
+    'executed': 0,
+    'cancelled': 0,
+    'expired': 0,
+    'failed': 0
+}
+
+
+def _get_handler(job_type):
+    """الحصول على دالة تنفيذ نوع المهمة"""
+    from study_bot.notification_utils import send_confirmation_message, send_task_reminder
+
+    handlers = {
+        'confirmation_message': send_confirmation_message,
+        'task_reminder': send_task_reminder
+    }
+    return handlers.get(job_type)
+
+
+def schedule_job(job_type, chat_id, payload, delay_seconds):
+    """حفظ مهمة مؤجلة وإضافتها إلى الكومة، وإرجاع معرفها"""
+    from study_bot.models import db, DelayedJob
+
+    now = time.time()
+    job = DelayedJob(
+        job_type=job_type,
+        chat_id=chat_id,
+        payload=json.dumps(payload),
+        run_at=now + delay_seconds,
+        created_at=now
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    with _jobs_cond:
+        heapq.heappush(_heap, (job.run_at, job.id))
+        _stats['scheduled'] += 1
+        # إيقاظ السلسلة إذا أصبحت المهمة الجديدة هي الأقرب
+        if _heap[0][1] == job.id:
+            _jobs_cond.notify()
+
+    return job.id
+
+
+def cancel_jobs(chat_id, job_type=None):
+    """إلغاء المهام المؤجلة لمحادثة محددة، وإرجاع عدد المهام الملغاة"""
+    from study_bot.models import db, DelayedJob
+
+    try:
+        query = delete(DelayedJob).where(DelayedJob.chat_id == chat_id)
+        if job_type:
+            query = query.where(DelayedJob.job_type == job_type)
+
+        count = db.session.execute(query).rowcount
+        db.session.commit()
+
+        _stats['cancelled'] += count
+        return count
+    except Exception as e:
+        logger.error(f"خطأ في إلغاء المهام المؤجلة للمحادثة {chat_id}: {e}")
+        db.session.rollback()
+        return 0
+
+
+def load_jobs():
+    """تحميل المهام المؤجلة المحفوظة إلى الكومة"""
+    from study_bot.models import db, DelayedJob
+
+    rows = db.session.execute(select(DelayedJob.run_at, DelayedJob.id)).all()
+    with _jobs_cond:
+        # الدمج مع المهام المضافة أثناء التحميل، والمهمة المكررة تتجاهل عند تنفيذها الثاني
+        _heap.extend((run_at, job_id) for run_at, job_id in rows)
+        heapq.heapify(_heap)
+
+    return len(rows)
+
+
+def run_job(job_id):
+    """تنفيذ مهمة مؤجلة بعد حذفها من قاعدة البيانات حتى لا تنفذ مرتين"""
+    from study_bot.models import db, DelayedJob
+
+    # الحذف هو الحجز: تحصل عليه عملية واحدة فقط حتى لو حملت كل العمليات نفس المهام
+    job = db.session.execute(
+        delete(DelayedJob)
+        .where(DelayedJob.id == job_id)
+        .returning(DelayedJob.job_type, DelayedJob.payload, DelayedJob.run_at)
+    ).first()
+    db.session.commit()
+    if not job:
+        # تم إلغاء المهمة أو نفذتها عملية أخرى
+        return False
+
+    job_type, payload, run_at = job
+
+    if time.time() - run_at > DELAYED_JOB_MAX_LATENESS:
+        _stats['expired'] += 1
+        logger.warning(f"تم تجاهل المهمة المؤجلة {job_type} ({job_id}) لتأخرها")
+        return False
+
+    handler = _get_handler(job_type)
+    if not handler:
+        logger.error(f"نوع مهمة مؤجلة غير معروف: {job_type}")
+        _stats['failed'] += 1
+        return False
+
+    handler(**json.loads(payload or '{}'))
+    _stats['executed'] += 1
+    return True
+
+
+def jobs_thread_func(app):
+    """دالة سلسلة المهام المؤجلة"""
+    global _jobs_running
+
+    from study_bot.models import db
+
+    with app.app_context():
+        try:
+            logger.info(f"تم تحميل {load_jobs()} مهمة مؤجلة")
+
+            while _jobs_running:
+                with _jobs_cond:
+                    # الانتظار حتى أقرب مهمة أو حتى إضافة مهمة أقرب منها
+                    if not _heap:
+                        _jobs_cond.wait()
+                        continue
+
+                    run_at, job_id = _heap[0]
+                    delay = run_at - time.time()
+                    if delay > 0:
+                        _jobs_cond.wait(delay)
+                        continue
+
+                    heapq.heappop(_heap)
+
+                try:
+                    run_job(job_id)
+                except Exception as e:
+                    _stats['failed'] += 1
+                    logger.error(f"خطأ في تنفيذ المهمة المؤجلة {job_id}: {e}")
+                    db.session.rollback()
+        except Exception as e:
+            logger.error(f"حدث خطأ في سلسلة المهام المؤجلة: {e}")
+        finally:
+            _jobs_running = False
+            logger.info("تم إنهاء سلسلة المهام المؤجلة")
+
+
+def init_delayed_jobs(app):
+    """تهيئة مخزن المهام المؤجلة وبدء سلسلته"""
+    global _jobs_thread, _jobs_running
+
+    if _jobs_running:
+        logger.warning("سلسلة المهام المؤجلة تعمل بالفعل")
+        return _jobs_thread
+
+    _jobs_running = True
+    _jobs_thread = threading.Thread(target=jobs_thread_func, args=(app,))
+    _jobs_thread.daemon = True
+    _jobs_thread.start()
+
+    return _jobs_thread
+
+
+def shutdown_delayed_jobs():
+    """إيقاف سلسلة المهام المؤجلة، وتبقى المهام المعلقة محفوظة لتنفذ بعد إعادة التشغيل"""
+    global _jobs_running
+
+    if not _jobs_running:
+        return False
+
+    _jobs_running = False
+    with _jobs_cond:
+        _jobs_cond.notify()
+    if _jobs_thread:
+        _jobs_thread.join(timeout=5)
+    return True
+
+
+def get_delayed_jobs_stats():
+    """الحصول على إحصائيات المهام المؤجلة"""
+    with _jobs_cond:
+        stats = dict(_stats)
+        stats['pending'] = len(_heap)
+        stats['next_run_in'] = max(0, int(_heap[0][0] - time.time())) if _heap else None
+
+    stats['running'] = _jobs_running
+    return stats
@@ -4,21 +4,17 @@
 """
 
 import json
-import requests
-import threading
 import traceback
 from datetime import datetime, timedelta
 
-from study_bot.config import TELEGRAM_API_URL, logger, TELEGRAM_BOT_TOKEN
+from study_bot.config import logger, TELEGRAM_BOT_TOKEN
 from study_bot.models import db
-
-# قفل للتحكم في حالة الاتصال
-_connection_lock = threading.Lock()
+from study_bot.telegram_client import get_client
+from study_bot.bot.callback_router import CallbackRouter, CallbackRejected
 
 # إرسال رسالة
 def send_group_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
     """إرسال رسالة إلى مجموعة"""
-    url = f"{TELEGRAM_API_URL}/sendMessage"
     payload = {
         'chat_id': chat_id,
         'text': text,
@@ -29,34 +25,33 @@ def send_group_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
         payload['reply_markup'] = json.dumps(reply_markup)
     
     try:
-        with _connection_lock:
-            response = requests.post(url, json=payload)
-            result = response.json()
+        result = get_client().call('sendMessage', payload) or {}
+        
+        if result.get('ok'):
+            # زيادة عدد الرسائل المرسلة في الإحصائيات
+            from study_bot.stats_aggregator import increment, increment_daily
+            increment('messages_sent')
+            increment_daily('messages_sent')
+            return result['result']
+        else:
+            error_message = result.get('description', 'Unknown error')
+            logger.error(f"خطأ في إرسال الرسالة للمجموعة: {error_message}")
             
-            if response.status_code == 200 and result.get('ok'):
-                # زيادة عدد الرسائل المرسلة في الإحصائيات
-                from study_bot.models import SystemStat
-                SystemStat.increment('messages_sent')
-                return result['result']
-            else:
-                error_message = result.get('description', 'Unknown error')
-                logger.error(f"خطأ في إرسال الرسالة للمجموعة: {error_message}")
-                
-                # التحقق من أخطاء تيليجرام المعروفة
-                if 'chat not found' in error_message.lower():
-                    logger.warning(f"المجموعة {chat_id} غير موجودة أو لم يتم العثور عليها")
-                elif 'bot was blocked by the user' in error_message.lower():
-                    logger.warning(f"تم حظر البوت من قبل المستخدم")
-                elif 'bot was kicked from the group' in error_message.lower():
-                    logger.warning(f"تم طرد البوت من المجموعة {chat_id}")
-                    # تحديث حالة المجموعة في قاعدة البيانات
-                    from study_bot.models import Group
-                    group = Group.query.filter_by(telegram_id=chat_id).first()
-                    if group:
-                        group.is_active = False
-                        db.session.commit()
-                
-                return None
+            # التحقق من أخطاء تيليجرام المعروفة
+            if 'chat not found' in error_message.lower():
+                logger.warning(f"المجموعة {chat_id} غير موجودة أو لم يتم العثور عليها")
+            elif 'bot was blocked by the user' in error_message.lower():
+                logger.warning(f"تم حظر البوت من قبل المستخدم")
+            elif 'bot was kicked from the group' in error_message.lower():
+                logger.warning(f"تم طرد البوت من المجموعة {chat_id}")
+                # تحديث حالة المجموعة في قاعدة البيانات
+                from study_bot.models import Group
+                group = Group.query.filter_by(telegram_id=chat_id).first()
+                if group:
+                    group.is_active = False
+                    db.session.commit()
+            
+            return None
     except Exception as e:
         logger.error(f"استثناء عند إرسال الرسالة للمجموعة: {e}")
         logger.error(traceback.format_exc())
@@ -85,7 +80,6 @@ def edit_group_message(chat_id, message_id, text, reply_markup=None, parse_mode=
 # الرد على استعلام callback
 def answer_callback_query(query_id, text=None, show_alert=False):
     """الرد على استعلام callback"""
-    url = f"{TELEGRAM_API_URL}/answerCallbackQuery"
     payload = {
         'callback_query_id': query_id
     }
@@ -96,15 +90,14 @@ def answer_callback_query(query_id, text=None, show_alert=False):
     payload['show_alert'] = show_alert
     
     try:
-        with _connection_lock:
-            response = requests.post(url, json=payload)
-            result = response.json()
-            
-            if response.status_code == 200 and result.get('ok'):
-                return True
-            else:
-                logger.error(f"خطأ في الرد على استعلام callback: {result}")
-                return False
+        response = get_client().post('answerCallbackQuery', payload)
+        result = response.json()
+        
+        if response.status_code == 200 and result.get('ok'):
+            return True
+        else:
+            logger.error(f"خطأ في الرد على استعلام callback: {result}")
+            return False
     except Exception as e:
         logger.error(f"استثناء عند الرد على استعلام callback: {e}")
         logger.error(traceback.format_exc())
@@ -173,73 +166,13 @@ def handle_group_callback(callback_data, group_data):
         message_id = group_data.get('message_id')
         callback_query_id = group_data.get('callback_query_id')
         
-        from study_bot.models import Group, User
-        
-        # الحصول على المجموعة
-        group = Group.query.filter_by(telegram_id=chat_id).first()
-        if not group:
-            logger.error(f"لم يتم العثور على المجموعة {chat_id} في قاعدة البيانات")
-            answer_callback_query(callback_query_id, "❌ خطأ: لم يتم العثور على المجموعة", True)
-            return False
-        
-        # التحقق من نوع الاستجابة
-        if callback_data == 'group_setup_here':
-            return handle_group_setup_here(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_setup_private':
-            return handle_group_setup_private(group, chat_id, user_id, message_id, callback_query_id)
-        elif callback_data == 'group_toggle_motivation':
-            return handle_group_toggle_motivation(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_send_motivation':
-            return handle_group_send_motivation(group, chat_id, callback_query_id)
-        elif callback_data == 'group_schedule_settings':
-            return handle_group_schedule_settings(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_schedule_morning':
-            return handle_group_schedule_morning(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_schedule_evening':
-            return handle_group_schedule_evening(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_confirm_morning':
-            return handle_group_confirm_morning(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_confirm_evening':
-            return handle_group_confirm_evening(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'join_morning_schedule':
-            return handle_join_morning_schedule(group, user_id, chat_id, callback_query_id)
-        elif callback_data == 'join_evening_schedule':
-            return handle_join_evening_schedule(group, user_id, chat_id, callback_query_id)
-        elif callback_data == 'group_schedule_custom':
-            return handle_group_schedule_custom(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'group_confirm_custom':
-            return handle_group_confirm_custom(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'join_custom_schedule':
-            return handle_join_custom_schedule(group, user_id, chat_id, callback_query_id)
-        elif callback_data == 'group_schedule_reset':
-            return handle_group_schedule_reset(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'back_to_group_settings':
-            return handle_back_to_group_settings(group, chat_id, message_id, callback_query_id)
-        elif callback_data == 'back_to_group_schedule':
-            return handle_group_schedule_settings(group, chat_id, message_id, callback_query_id)
-        # معالجة مهام الجدول الصباحي
-        elif callback_data.startswith('morning_task:'):
-            task_name = callback_data.split(':')[1]
-            from study_bot.group_tasks import handle_morning_task_completion
-            return handle_morning_task_completion(group.id, user_id, task_name, callback_query_id)
-        # معالجة مهام الجدول المسائي
-        elif callback_data.startswith('evening_task:'):
-            task_name = callback_data.split(':')[1]
-            from study_bot.group_tasks import handle_evening_task_completion
-            return handle_evening_task_completion(group.id, user_id, task_name, callback_query_id)
-        # معالجة مهام المعسكر المخصص
-        elif callback_data.startswith('join_camp:'):
-            camp_id = int(callback_data.split(':')[1])
-            from study_bot.custom_camps import handle_camp_join
-            return handle_camp_join(camp_id, user_id, callback_query_id)
-        elif callback_data.startswith('complete_camp_task:'):
-            task_id = int(callback_data.split(':')[1])
-            from study_bot.custom_camps import handle_camp_task_join
-            return handle_camp_task_join(task_id, user_id, callback_query_id)
-        else:
-            logger.warning(f"استجابة غير معروفة: {callback_data}")
-            answer_callback_query(callback_query_id, "⚠️ خيار غير مدعوم", True)
-            return False
+        return group_callback_router.dispatch(
+            callback_data,
+            chat_id=chat_id,
+            user_id=user_id,
+            message_id=message_id,
+            callback_query_id=callback_query_id
+        )
     except Exception as e:
         logger.error(f"خطأ في معالجة استجابة المستخدم في المجموعة: {e}")
         logger.error(traceback.format_exc())
@@ -972,4 +905,71 @@ def get_schedule_type_text(schedule_type):
     elif schedule_type == 'custom':
         return "✏️ المعسكر المخصص"
     else:
-        return "❌ غير محدد"
\ No newline at end of file
+        return "❌ غير محدد"
+
+
+# مهام الجداول والمعسكرات المرتبطة بأزرار المجموعات
+def handle_morning_task_callback(group, user_id, task_name, callback_query_id):
+    """معالجة إكمال مهمة من الجدول الصباحي"""
+    from study_bot.group_tasks import handle_morning_task_completion
+    return handle_morning_task_completion(group.id, user_id, task_name, callback_query_id)
+
+
+def handle_evening_task_callback(group, user_id, task_name, callback_query_id):
+    """معالجة إكمال مهمة من الجدول المسائي"""
+    from study_bot.group_tasks import handle_evening_task_completion
+    return handle_evening_task_completion(group.id, user_id, task_name, callback_query_id)
+
+
+def handle_join_camp_callback(group, camp_id, user_id, callback_query_id):
+    """معالجة الانضمام لمعسكر مخصص"""
+    # طلب المجموعة يضمن أنها مسجلة قبل الانضمام
+    from study_bot.custom_camps import handle_camp_join
+    return handle_camp_join(camp_id, user_id, callback_query_id)
+
+
+def handle_complete_camp_task_callback(group, task_id, user_id, callback_query_id):
+    """معالجة الانضمام لمهمة من مهام المعسكر"""
+    # طلب المجموعة يضمن أنها مسجلة قبل الانضمام
+    from study_bot.custom_camps import handle_camp_task_join
+    return handle_camp_task_join(task_id, user_id, callback_query_id)
+
+
+# موجه استجابات المجموعات
+group_callback_router = CallbackRouter('group_handlers', answer=answer_callback_query)
+
+
+@group_callback_router.dependency('group')
+def load_group(get):
+    """تحميل المجموعة المسجلة"""
+    from study_bot.identity_cache import get_group
+    
+    chat_id = get('chat_id')
+    group = get_group(chat_id)
+    if not group:
+        logger.error(f"لم يتم العثور على المجموعة {chat_id} في قاعدة البيانات")
+        raise CallbackRejected("❌ خطأ: لم يتم العثور على المجموعة")
+    return group
+
+
+group_callback_router.add_route('group_setup_here', handle_group_setup_here)
+group_callback_router.add_route('group_setup_private', handle_group_setup_private)
+group_callback_router.add_route('group_toggle_motivation', handle_group_toggle_motivation)
+group_callback_router.add_route('group_send_motivation', handle_group_send_motivation)
+group_callback_router.add_route('group_schedule_settings', handle_group_schedule_settings)
+group_callback_router.add_route('group_schedule_morning', handle_group_schedule_morning)
+group_callback_router.add_route('group_schedule_evening', handle_group_schedule_evening)
+group_callback_router.add_route('group_confirm_morning', handle_group_confirm_morning)
+group_callback_router.add_route('group_confirm_evening', handle_group_confirm_evening)
+group_callback_router.add_route('join_morning_schedule', handle_join_morning_schedule)
+group_callback_router.add_route('join_evening_schedule', handle_join_evening_schedule)
+group_callback_router.add_route('group_schedule_custom', handle_group_schedule_custom)
+group_callback_router.add_route('group_confirm_custom', handle_group_confirm_custom)
+group_callback_router.add_route('join_custom_schedule', handle_join_custom_schedule)
+group_callback_router.add_route('group_schedule_reset', handle_group_schedule_reset)
+group_callback_router.add_route('back_to_group_settings', handle_back_to_group_settings)
+group_callback_router.add_route('back_to_group_schedule', handle_group_schedule_settings)
+group_callback_router.add_route('morning_task:{task_name}', handle_morning_task_callback)
+group_callback_router.add_route('evening_task:{task_name}', handle_evening_task_callback)
+group_callback_router.add_route('join_camp:{camp_id:int}', handle_join_camp_callback)
+group_callback_router.add_route('complete_camp_task:{task_id:int}', handle_complete_camp_task_callback)
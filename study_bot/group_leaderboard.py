@@ -0,0 +1,313 @@
+"""
+وحدة ترتيب المجموعات
+تحتوي على ترتيب محسوب مسبقًا لكل مجموعة ولكل فترة (اليوم، الأسبوع، كل الأوقات): تحدث نتيجة المستخدم
+في جدول group_leaderboard_entry مع كل مهمة يكملها داخل نفس المعاملة، وتحفظ لوحة ترتيب في الذاكرة
+لكل (مجموعة، فترة) تحدث بعد الحفظ، فتعرض الصفحات وترتيب المستخدم دون قراءة جدول المشاركين
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, select, update, insert, delete, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from study_bot.config import (
+    logger, SCHEDULER_TIMEZONE, LEADERBOARD_WEEK_START,
+    GROUP_LEADERBOARD_REFRESH_SECONDS, GROUP_LEADERBOARD_MAX_BOARDS
+)
+from study_bot.models import db, User, GroupLeaderboardEntry
+from study_bot.camp_leaderboard import Leaderboard
+
+# الفترات المدعومة وأسماؤها
+PERIODS = {
+    'day': "اليوم",
+    'week': "الأسبوع",
+    'all': "كل الأوقات"
+}
+
+# بداية ثابتة لفترة كل الأوقات
+ALL_TIME_START = date(1970, 1, 1)
+
+# عدد الصفوف المحذوفة في كل معاملة عند تنظيف الفترات القديمة
+COMPACT_CHUNK_SIZE = 5000
+
+# مفتاح التعديلات المنتظرة للحفظ في معلومات الجلسة
+_PENDING_KEY = 'group_leaderboard_changes'
+
+# المتغيرات العامة
+_boards = OrderedDict()
+_boards_lock = threading.RLock()
+
+_stats = {
+    'loads': 0,
+    'evictions': 0,
+    'updates': 0,
+    'compacted': 0
+}
+
+
+def get_period_start(period, day=None):
+    """بداية الفترة التي يقع فيها اليوم المحدد (اليوم الحالي افتراضيًا)"""
+    day = day or datetime.now(SCHEDULER_TIMEZONE).date()
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=(day.weekday() - LEADERBOARD_WEEK_START) % 7)
+    return ALL_TIME_START
+
+
+def record_completion(group_id, user_id, points, now=None):
+    """إضافة مهمة مكتملة لنتائج المستخدم في جميع الفترات داخل المعاملة الحالية (الحفظ على المستدعي)"""
+    now = now or datetime.now(SCHEDULER_TIMEZONE)
+    starts = {period: get_period_start(period, now.date()) for period in PERIODS}
+    entry = GroupLeaderboardEntry
+
+    def increment(periods):
+        """زيادة النتائج الموجودة وإرجاع {الفترة: عدد المهام الجديد}"""
+        return dict(db.session.execute(
+            update(entry)
+            .where(
+                entry.group_id == group_id,
+                entry.user_id == user_id,
+                or_(*[and_(entry.period == period, entry.period_start == starts[period]) for period in periods])
+            )
+            .values(completions=entry.completions + 1, points=entry.points + points, updated_at=now)
+            .returning(entry.period, entry.completions)
+            .execution_options(synchronize_session=False)
+        ).all())
+
+    completions = increment(PERIODS)
+    missing = [period for period in PERIODS if period not in completions]
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(entry), [{
+                    'group_id': group_id,
+                    'user_id': user_id,
+                    'period': period,
+                    'period_start': starts[period],
+                    'completions': 1,
+                    'points': points,
+                    'updated_at': now
+                } for period in missing])
+            completions.update({period: 1 for period in missing})
+        except IntegrityError:
+            # أنشأ طلب متزامن نفس النتيجة، فتزاد بدلاً من إنشائها
+            completions.update(increment(missing))
+
+    session = db.session()
+    session.info.setdefault(_PENDING_KEY, []).extend(
+        ((group_id, period, starts[period]), user_id, count) for period, count in completions.items()
+    )
+
+
+def _load_board(key):
+    """بناء لوحة ترتيب فترة من جدول النتائج"""
+    group_id, period, period_start = key
+    rows = db.session.execute(
+        select(GroupLeaderboardEntry.user_id, GroupLeaderboardEntry.completions).where(
+            GroupLeaderboardEntry.group_id == group_id,
+            GroupLeaderboardEntry.period == period,
+            GroupLeaderboardEntry.period_start == period_start
+        )
+    ).all()
+
+    _stats['loads'] += 1
+    return Leaderboard(rows)
+
+
+def _get_board(group_id, period):
+    """الحصول على لوحة ترتيب الفترة الحالية، مع حذف الأقدم استخدامًا عند تجاوز الحد"""
+    key = (group_id, period, get_period_start(period))
+    with _boards_lock:
+        board = _boards.get(key)
+        if board is None or time.monotonic() - board.loaded_at > GROUP_LEADERBOARD_REFRESH_SECONDS:
+            board = _load_board(key)
+            _boards[key] = board
+        _boards.move_to_end(key)
+
+        while len(_boards) > GROUP_LEADERBOARD_MAX_BOARDS:
+            _boards.popitem(last=False)
+            _stats['evictions'] += 1
+
+        return key, board
+
+
+def get_user_rank(group_id, user_id, period='week'):
+    """ترتيب المستخدم في المجموعة للفترة: {'rank', 'total', 'completions'} أو None"""
+    with _boards_lock:
+        _, board = _get_board(group_id, period)
+        rank = board.rank(user_id)
+        if rank is None:
+            return None
+        return {'rank': rank, 'total': len(board), 'completions': board.score(user_id)}
+
+
+def get_leaderboard_page(group_id, period='week', page=1, page_size=10):
+    """صفحة من ترتيب المجموعة للفترة مع أسماء المستخدمين ونقاطهم"""
+    with _boards_lock:
+        key, board = _get_board(group_id, period)
+        total = len(board)
+        pages = max(1, (total + page_size - 1) // page_size)
+        page = min(max(1, page), pages)
+        first = (page - 1) * page_size + 1
+        ranked = [board.at(rank) + (rank,) for rank in range(first, min(total, first + page_size - 1) + 1)]
+
+    entries = []
+    if ranked:
+        # بيانات الصفحة فقط في استعلام واحد بالمفتاح الفريد
+        rows = {
+            row.user_id: row for row in db.session.execute(
+                select(
+                    GroupLeaderboardEntry.user_id, GroupLeaderboardEntry.points,
+                    User.telegram_id, User.username, User.first_name, User.last_name
+                )
+                .join(User, User.id == GroupLeaderboardEntry.user_id)
+                .where(
+                    GroupLeaderboardEntry.group_id == group_id,
+                    GroupLeaderboardEntry.period == period,
+                    GroupLeaderboardEntry.period_start == key[2],
+                    GroupLeaderboardEntry.user_id.in_([user_id for user_id, _, _ in ranked])
+                )
+            ).all()
+        }
+
+        for user_id, completions, rank in ranked:
+            row = rows.get(user_id)
+            if row is None:
+                continue
+            name = " ".join(part for part in (row.first_name, row.last_name) if part) or row.username
+            entries.append({
+                'rank': rank,
+                'user_id': user_id,
+                'telegram_id': row.telegram_id,
+                'name': name or f"المستخدم {row.telegram_id}",
+                'completions': completions,
+                'points': row.points
+            })
+
+    return {
+        'period': period,
+        'period_start': key[2].isoformat(),
+        'total': total,
+        'page': page,
+        'pages': pages,
+        'entries': entries
+    }
+
+
+def get_period_totals(group_id, period='week'):
+    """عدد المشاركين ومجموع المهام المكتملة في الفترة"""
+    participants, completions = db.session.execute(
+        select(func.count(GroupLeaderboardEntry.id), func.coalesce(func.sum(GroupLeaderboardEntry.completions), 0)).where(
+            GroupLeaderboardEntry.group_id == group_id,
+            GroupLeaderboardEntry.period == period,
+            GroupLeaderboardEntry.period_start == get_period_start(period)
+        )
+    ).one()
+    return participants, completions
+
+
+def format_leaderboard(page_data, user_rank=None):
+    """نص صفحة الترتيب لعرضه في المجموعة"""
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    text = f"🏆 <b>ترتيب المجموعة - {PERIODS[page_data['period']]}</b>\n"
+
+    if not page_data['entries']:
+        return text + "\nلا توجد مهام مكتملة في هذه الفترة بعد."
+
+    for entry in page_data['entries']:
+        text += (
+            f"\n{medals.get(entry['rank'], str(entry['rank']) + '.')} {entry['name']}: "
+            f"{entry['completions']} مهمة ({entry['points']} نقطة)"
+        )
+
+    if page_data['pages'] > 1:
+        text += f"\n\nالصفحة {page_data['page']} من {page_data['pages']}"
+    if user_rank:
+        text += f"\n\n🏅 ترتيبك: {user_rank['rank']} من {user_rank['total']}"
+    return text
+
+
+def leaderboard_keyboard(period, page, pages):
+    """أزرار تغيير الفترة والتنقل بين صفحات الترتيب"""
+    periods_row = [
+        {"text": ("• " if key == period else "") + title, "callback_data": f"group_rank:{key}:1"}
+        for key, title in PERIODS.items()
+    ]
+
+    navigation_row = []
+    if page > 1:
+        navigation_row.append({"text": "⬅️ السابق", "callback_data": f"group_rank:{period}:{page - 1}"})
+    if page < pages:
+        navigation_row.append({"text": "التالي ➡️", "callback_data": f"group_rank:{period}:{page + 1}"})
+
+    return {"inline_keyboard": [periods_row] + ([navigation_row] if navigation_row else [])}
+
+
+def compact_group_leaderboards(today=None):
+    """حذف نتائج الأيام والأسابيع المنتهية (مع الإبقاء على الفترة السابقة للعرض)، وإرجاع عدد الصفوف المحذوفة"""
+    today = today or datetime.now(SCHEDULER_TIMEZONE).date()
+    cutoffs = {
+        'day': get_period_start('day', today) - timedelta(days=1),
+        'week': get_period_start('week', today) - timedelta(days=7)
+    }
+
+    deleted = 0
+    for period, cutoff in cutoffs.items():
+        while True:
+            chunk = select(GroupLeaderboardEntry.id).where(
+                GroupLeaderboardEntry.period == period,
+                GroupLeaderboardEntry.period_start < cutoff
+            ).limit(COMPACT_CHUNK_SIZE)
+            count = db.session.execute(
+                delete(GroupLeaderboardEntry).where(GroupLeaderboardEntry.id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+
+            deleted += count
+            if count < COMPACT_CHUNK_SIZE:
+                break
+
+    # حذف لوحات الفترات المنتهية من الذاكرة
+    with _boards_lock:
+        for key in [key for key in _boards if key[1] != 'all' and key[2] != get_period_start(key[1], today)]:
+            del _boards[key]
+        _stats['compacted'] += deleted
+
+    logger.info(f"تم حذف {deleted} نتيجة قديمة من ترتيب المجموعات")
+    return deleted
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    """تطبيق النتائج المحفوظة على لوحات الترتيب المحملة"""
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+
+    with _boards_lock:
+        for key, user_id, completions in changes:
+            board = _boards.get(key)
+            if board is not None:
+                board.set(user_id, completions)
+                _stats['updates'] += 1
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """تجاهل نتائج المعاملة الملغاة"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_group_leaderboard_stats():
+    """الحصول على إحصائيات ترتيب المجموعات"""
+    with _boards_lock:
+        stats = dict(_stats)
+        stats['boards'] = len(_boards)
+        stats['entries'] = sum(len(board) for board in _boards.values())
+    return stats
@@ -5,22 +5,21 @@
 تم تطويره ليشمل جداول صباحية ومسائية متكاملة
 """
 
-import random
 import logging
-import requests
+import time
 from datetime import datetime, timedelta
+from functools import partial
 
-from study_bot.config import logger, TELEGRAM_API_URL, get_current_time
-from study_bot.models import db, User, Group, GroupScheduleTracker, GroupTaskTracker, MotivationalMessage
+from study_bot.config import logger, SCHEDULER_TIMEZONE, get_current_time
+from study_bot.telegram_client import get_client
+from study_bot.models import db, User, Group, GroupScheduleTracker, GroupTaskTracker
 from study_bot.models.group import GroupTaskParticipant, GroupTaskParticipation
+from study_bot.message_templates import get_template, send_template, field
 
 # دالة لإرسال رسالة إلى المستخدم أو المجموعة
 def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
     """إرسال رسالة إلى مستخدم أو مجموعة"""
     try:
-        # بناء رابط API
-        url = f"{TELEGRAM_API_URL}/sendMessage"
-        
         # بناء البيانات
         data = {
             "chat_id": chat_id,
@@ -34,9 +33,8 @@ def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
         if parse_mode:
             data["parse_mode"] = parse_mode
         
-        # إرسال الطلب
-        response = requests.post(url, json=data)
-        response_data = response.json()
+        # إرسال الطلب عبر العميل المشترك
+        response_data = get_client().call("sendMessage", data) or {}
         
         if not response_data.get('ok', False):
             logger.error(f"خطأ في إرسال الرسالة: {response_data}")
@@ -51,12 +49,6 @@ def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
 def answer_callback_query(callback_query_id, text=None, show_alert=False):
     """الإجابة على نداء الاستجابة"""
     try:
-        import requests
-        from study_bot.config import TELEGRAM_API_URL
-        
-        # بناء رابط API
-        url = f"{TELEGRAM_API_URL}/answerCallbackQuery"
-        
         # بناء البيانات
         data = {
             "callback_query_id": callback_query_id,
@@ -69,8 +61,8 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
         if show_alert:
             data["show_alert"] = True
         
-        # إرسال الطلب
-        response = requests.post(url, json=data)
+        # إرسال الطلب عبر العميل المشترك
+        response = get_client().post("answerCallbackQuery", data)
         response_data = response.json()
         
         if not response_data.get('ok', False):
@@ -125,11 +117,14 @@ EVENING_POINTS = 2
 def send_group_morning_message(group_telegram_id):
     """إرسال رسالة الجدول الصباحي للمجموعة"""
     try:
-        # اختيار اقتباس تحفيزي عشوائي
-        motivation = random.choice(MOTIVATIONAL_QUOTES)
-        
-        # إنشاء رسالة الترحيب
-        welcome_text = f"""
+        # اختيار اقتباس تحفيزي من رسائل الصباح
+        from study_bot.motivation_pool import pick_message
+        motivation = pick_message(group_telegram_id, category='morning')
+        
+        def build():
+            """بناء نص رسالة الجدول الصباحي ولوحة مفاتيحها مرة واحدة"""
+            # إنشاء رسالة الترحيب
+            welcome_text = f"""
 📅 ╭──────────────────────╮
       جدول المعسكر الصباحي
 ╰──────────────────────╯
@@ -145,23 +140,26 @@ def send_group_morning_message(group_telegram_id):
 🔸 المغرب 19:39
 🔸 العشاء 21:06
 
-🔖 {motivation}
+🔖 {field('motivation')}
 
 هيا بنا نبدأ! 💪
 """
         
-        # إضافة زر للانضمام للمعسكر
-        keyboard = {
-            "inline_keyboard": [
-                [{
-                    "text": "✅ انضم للمعسكر الصباحي",
-                    "callback_data": "join_morning_camp"
-                }]
-            ]
-        }
-        
-        # إرسال الرسالة
-        result = send_message(group_telegram_id, welcome_text, reply_markup=keyboard, parse_mode="HTML")
+            # إضافة زر للانضمام للمعسكر
+            keyboard = {
+                "inline_keyboard": [
+                    [{
+                        "text": "✅ انضم للمعسكر الصباحي",
+                        "callback_data": "join_morning_camp"
+                    }]
+                ]
+            }
+        
+            return welcome_text, keyboard
+        
+        # إرسال الرسالة من القالب مع تعويض الاقتباس فقط
+        template = get_template(('group_schedule', 'morning'), build)
+        result = send_template(template, group_telegram_id, motivation=motivation)
         logger.info(f"تم إرسال رسالة الجدول الصباحي للمجموعة {group_telegram_id}")
         return result
     except Exception as e:
@@ -173,11 +171,14 @@ def send_group_morning_message(group_telegram_id):
 def send_group_evening_message(group_telegram_id):
     """إرسال رسالة الجدول المسائي للمجموعة"""
     try:
-        # اختيار اقتباس تحفيزي عشوائي
-        motivation = random.choice(MOTIVATIONAL_QUOTES)
-        
-        # إنشاء رسالة الترحيب
-        welcome_text = f"""
+        # اختيار اقتباس تحفيزي من رسائل المساء
+        from study_bot.motivation_pool import pick_message
+        motivation = pick_message(group_telegram_id, category='evening')
+        
+        def build():
+            """بناء نص رسالة الجدول المسائي ولوحة مفاتيحها مرة واحدة"""
+            # إنشاء رسالة الترحيب
+            welcome_text = f"""
 🌃 ╭──────────────────────╮
       جدول المعسكر المسائي
 ╰──────────────────────╯
@@ -194,23 +195,26 @@ def send_group_evening_message(group_telegram_id):
 🔸 تقييم 04:05
 🔸 الفجر 04:25
 
-🔖 {motivation}
+🔖 {field('motivation')}
 
 هيا بنا نبدأ! 💪
 """
         
-        # إضافة زر للانضمام للمعسكر
-        keyboard = {
-            "inline_keyboard": [
-                [{
-                    "text": "✅ انضم للمعسكر المسائي",
-                    "callback_data": "join_evening_camp"
-                }]
-            ]
-        }
-        
-        # إرسال الرسالة
-        result = send_message(group_telegram_id, welcome_text, reply_markup=keyboard, parse_mode="HTML")
+            # إضافة زر للانضمام للمعسكر
+            keyboard = {
+                "inline_keyboard": [
+                    [{
+                        "text": "✅ انضم للمعسكر المسائي",
+                        "callback_data": "join_evening_camp"
+                    }]
+                ]
+            }
+        
+            return welcome_text, keyboard
+        
+        # إرسال الرسالة من القالب مع تعويض الاقتباس فقط
+        template = get_template(('group_schedule', 'evening'), build)
+        result = send_template(template, group_telegram_id, motivation=motivation)
         logger.info(f"تم إرسال رسالة الجدول المسائي للمجموعة {group_telegram_id}")
         return result
     except Exception as e:
@@ -222,14 +226,9 @@ def send_group_evening_message(group_telegram_id):
 def send_motivation_to_group(group_telegram_id):
     """إرسال رسالة تحفيزية للمجموعة"""
     try:
-        # الحصول على رسالة تحفيزية عشوائية من قاعدة البيانات
-        motivational_message = MotivationalMessage.query.order_by(db.func.random()).first()
-        
-        # إذا لم يتم العثور على رسائل في قاعدة البيانات، استخدم الرسائل المضمنة
-        if not motivational_message:
-            motivation_text = random.choice(MOTIVATIONAL_QUOTES)
-        else:
-            motivation_text = motivational_message.message
+        # اختيار رسالة تحفيزية من المجموعة المحملة في الذاكرة
+        from study_bot.motivation_pool import pick_message
+        motivation_text = pick_message(group_telegram_id)
         
         # إنشاء رسالة تحفيزية كاملة
         full_text = f"""
@@ -296,20 +295,11 @@ def add_user_to_schedule(group_id, user_id, schedule_type):
         return False
 
 
-# إرسال رسالة مهمة مع مهلة زمنية للمشاركة
-def send_group_task_message(group_id, task_type, text, points=1, deadline_minutes=10):
-    """إرسال رسالة مهمة للمجموعة مع زر للمشاركة ومهلة زمنية"""
-    try:
-        # الحصول على المجموعة من قاعدة البيانات
-        group = Group.query.get(group_id)
-        if not group:
-            logger.error(f"لم يتم العثور على المجموعة {group_id}")
-            return None
-            
-        # الحصول على تتبع جدول المجموعة ليوم اليوم
-        schedule_type = 'morning' if group.morning_schedule_enabled else 'evening' if group.evening_schedule_enabled else 'custom'
-        schedule = GroupScheduleTracker.get_or_create_for_today(group_id, schedule_type)
-        
+# قالب رسالة المهمة وزر المشاركة
+def get_task_template(text, task_type, points=1, deadline_minutes=10):
+    """الحصول على قالب رسالة المهمة، وبيانات زر المشاركة تعوض لكل مجموعة"""
+    def build():
+        """بناء نص رسالة المهمة ولوحة مفاتيحها"""
         # إضافة زر للمشاركة في المهمة
         deadline_text = f"⏰ يمكنك الانضمام خلال {deadline_minutes} دقائق فقط"
         
@@ -324,28 +314,70 @@ def send_group_task_message(group_id, task_type, text, points=1, deadline_minute
             "inline_keyboard": [
                 [{
                     "text": "✅ انضم للمهمة",
-                    "callback_data": f"task_join:{task_type}:{schedule.id}"
+                    "callback_data": field('callback_data')
                 }]
             ]
         }
         
-        # إرسال الرسالة
-        message = send_message(group.telegram_id, full_text, reply_markup=keyboard, parse_mode="HTML")
-        if not message:
-            logger.error(f"فشل إرسال رسالة المهمة للمجموعة {group.telegram_id}")
+        return full_text, keyboard
+    
+    return get_template(('task', task_type, text, points, deadline_minutes), build)
+
+
+def task_join_callback(task_type, schedule_id, points=1, deadline_minutes=10, expires_at=None):
+    """ترميز بيانات زر المشاركة في المهمة، وتنتهي صلاحيته مع مهلة المهمة"""
+    from study_bot.bot.callback_codec import encode_callback
+    
+    return encode_callback(
+        'task_join',
+        expires_at=expires_at or time.time() + deadline_minutes * 60,
+        schedule_id=schedule_id,
+        points=points,
+        task_type=task_type
+    )
+
+
+# إرسال رسالة مهمة مع مهلة زمنية للمشاركة
+def send_group_task_message(group_id, task_type, text, points=1, deadline_minutes=10, wait=True):
+    """إرسال رسالة مهمة للمجموعة مع زر للمشاركة ومهلة زمنية (عند wait=False تضاف للطابور وتعود فورًا)"""
+    try:
+        # الحصول على المجموعة من قاعدة البيانات
+        group = Group.query.get(group_id)
+        if not group:
+            logger.error(f"لم يتم العثور على المجموعة {group_id}")
             return None
             
-        # إنشاء سجل المهمة في قاعدة البيانات
-        task = GroupTaskTracker.create_task(
-            schedule_id=schedule.id,
-            task_type=task_type,
-            message_id=message.get('message_id'),
-            deadline_minutes=deadline_minutes,
-            points=points
-        )
-        
-        logger.info(f"تم إرسال رسالة المهمة {task_type} للمجموعة {group.telegram_id}")
-        return task
+        # الحصول على تتبع جدول المجموعة ليوم اليوم
+        schedule_type = 'morning' if group.morning_schedule_enabled else 'evening' if group.evening_schedule_enabled else 'custom'
+        schedule = GroupScheduleTracker.get_or_create_for_today(group_id, schedule_type)
+        
+        # قالب الرسالة وبيانات زر المشاركة
+        template = get_task_template(text, task_type, points, deadline_minutes)
+        callback_data = task_join_callback(task_type, schedule.id, points, deadline_minutes)
+        
+        # حفظ القيم فقط لأن دالة الرد قد تعمل في سلسلة أخرى
+        chat_id = group.telegram_id
+        schedule_id = schedule.id
+        
+        def record_task(message):
+            """إنشاء سجل المهمة في قاعدة البيانات بعد إرسال الرسالة"""
+            if not message:
+                logger.error(f"فشل إرسال رسالة المهمة للمجموعة {chat_id}")
+                return None
+            
+            task = GroupTaskTracker.create_task(
+                schedule_id=schedule_id,
+                task_type=task_type,
+                message_id=message.get('message_id'),
+                deadline_minutes=deadline_minutes,
+                points=points
+            )
+            
+            logger.info(f"تم إرسال رسالة المهمة {task_type} للمجموعة {chat_id}")
+            return task
+        
+        # إرسال الرسالة، أو إضافتها لطابور الإرسال دون انتظار الرد
+        return send_template(template, chat_id, wait=wait, callback=record_task, callback_data=callback_data) or None
     except Exception as e:
         logger.error(f"خطأ في إرسال رسالة المهمة {task_type} للمجموعة {group_id}: {e}")
         return None
@@ -372,32 +404,37 @@ def handle_task_join(task_type, schedule_id, user_id, chat_id, callback_query_id
         # الحصول على بيانات المستخدم
         user = User.get_or_create(user_id)
         
-        # تحقق مما إذا كان المستخدم قد انضم بالفعل
-        if task.has_user_joined(user.id):
+        # تسجيل الانضمام ومنح النقاط في معاملة واحدة
+        points = task.join(user)
+        if points is None:
             answer_callback_query(callback_query_id, "✅ أنت منضم بالفعل لهذه المهمة!", True)
             return True
         
-        # إضافة المستخدم إلى المهمة
-        success = task.add_participant(user.id)
-        if success:
-            # حساب النقاط بناءً على نوع الجدول
-            points = task.points
-            
-            # إضافة النقاط إلى المستخدم
-            user.add_points(points)
-            
-            # زيادة عدد المهام المكتملة
-            user.increment_tasks_completed()
-            
-            # حفظ التغييرات
-            db.session.commit()
-            
-            answer_callback_query(callback_query_id, f"✅ تم تسجيل انضمامك للمهمة! +{points} نقطة", True)
-            logger.info(f"تم تسجيل انضمام المستخدم {user_id} للمهمة {task_type}")
+        answer_callback_query(callback_query_id, f"✅ تم تسجيل انضمامك للمهمة! +{points} نقطة", True)
+        logger.info(f"تم تسجيل انضمام المستخدم {user_id} للمهمة {task_type}")
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في معالجة طلب الانضمام للمهمة {task_type}: {e}")
+        answer_callback_query(callback_query_id, "❌ حدث خطأ أثناء معالجة طلبك.", True)
+        return False
+
+
+# الانضمام لمهمة من زر مرمز
+def handle_task_join_from_button(task_type, schedule_id, points, group, user, callback_query_id):
+    """الانضمام لمهمة من زر موقع: المهلة تحققت عند فك الترميز والنقاط من الزر، فلا تحمل المهمة"""
+    try:
+        points = GroupTaskTracker.join_from_button(group.id, schedule_id, task_type, user, points)
+        if points is None:
+            answer_callback_query(callback_query_id, "✅ أنت منضم بالفعل لهذه المهمة!", True)
             return True
-        else:
-            answer_callback_query(callback_query_id, "❌ حدث خطأ أثناء تسجيل انضمامك للمهمة.", True)
-            return False
+        
+        answer_callback_query(callback_query_id, f"✅ تم تسجيل انضمامك للمهمة! +{points} نقطة", True)
+        logger.info(f"تم تسجيل انضمام المستخدم {user.telegram_id} للمهمة {task_type}")
+        return True
+    except LookupError:
+        logger.error(f"لم يتم العثور على المهمة {task_type} للجدول {schedule_id}")
+        answer_callback_query(callback_query_id, "❌ لم يتم العثور على المهمة المحددة.", True)
+        return False
     except Exception as e:
         logger.error(f"خطأ في معالجة طلب الانضمام للمهمة {task_type}: {e}")
         answer_callback_query(callback_query_id, "❌ حدث خطأ أثناء معالجة طلبك.", True)
@@ -470,7 +507,7 @@ def send_task_by_type(group_id, task_type, schedule_type='morning'):
 
 
 # إرسال مهمة بناءً على وقت محدد وجدول المجموعة
-def send_scheduled_task(group_id, time_str, schedule_type='morning'):
+def send_scheduled_task(group_id, time_str, schedule_type='morning', wait=True):
     """إرسال مهمة بناءً على وقت محدد وجدول المجموعة"""
     try:
         # الحصول على المجموعة
@@ -491,7 +528,7 @@ def send_scheduled_task(group_id, time_str, schedule_type='morning'):
         sent_count = 0
         for task_item in tasks_for_time:
             time_str, task_type, text, points = task_item
-            result = send_group_task_message(group_id, task_type, text, points, deadline_minutes=15)
+            result = send_group_task_message(group_id, task_type, text, points, deadline_minutes=15, wait=wait)
             if result:
                 sent_count += 1
                 
@@ -502,61 +539,119 @@ def send_scheduled_task(group_id, time_str, schedule_type='morning'):
         return False
 
 
+# تسجيل إرسال رسالة مهمة (دالة رد طابور الإرسال)
+def mark_task_sent(message, task_id):
+    """تسجيل معرف رسالة المهمة بعد إرسالها"""
+    if message:
+        GroupTaskTracker.mark_sent(task_id, message.get('message_id'))
+    return message
+
+
+# إرسال مهام موعد واحد لكل المجموعات بعمليات مجمعة على قاعدة البيانات
+def send_schedule_tasks_bulk(schedule_type, time_str, deadline_minutes=15):
+    """إرسال مهام موعد واحد لكل المجموعات المفعل لها الجدول، مع إنشاء الجداول والمهام في استعلامات مجمعة"""
+    # البحث عن المهام المجدولة للوقت المحدد
+    schedule = MORNING_SCHEDULE if schedule_type == 'morning' else EVENING_SCHEDULE
+    tasks_for_time = [item for item in schedule if item[0] == time_str]
+    if not tasks_for_time:
+        return 0
+    
+    # الحصول على معرفات المجموعات النشطة فقط دون تحميل كائناتها
+    schedule_flag = Group.morning_schedule_enabled if schedule_type == 'morning' else Group.evening_schedule_enabled
+    groups = db.session.query(Group.id, Group.telegram_id).filter(
+        Group.is_active == True,
+        schedule_flag == True
+    ).all()
+    if not groups:
+        return 0
+    
+    # الحصول على جداول اليوم أو إنشاؤها لكل المجموعات دفعة واحدة
+    schedules = GroupScheduleTracker.get_or_create_for_today_bulk([group.id for group in groups], schedule_type)
+    
+    # إنشاء سجلات المهام لكل المجموعات في استعلام واحد قبل الإرسال
+    now = datetime.now(SCHEDULER_TIMEZONE)
+    rows = []
+    for group in groups:
+        for _, task_type, text, points in tasks_for_time:
+            rows.append({
+                'group_id': group.id,
+                'schedule_id': schedules[group.id],
+                'task_type': task_type,
+                'scheduled_time': now,
+                'deadline_minutes': deadline_minutes,
+                'is_sent': False,
+                'message': text,
+                'points': points
+            })
+    created = GroupTaskTracker.create_tasks_bulk(rows)
+    
+    # تجهيز قالب الرسالة مرة واحدة لكل مهمة، ولا يتغير بين المجموعات إلا معرف المحادثة وبيانات الزر
+    task_items = {
+        task_type: (get_task_template(text, task_type, points, deadline_minutes), points)
+        for _, task_type, text, points in tasks_for_time
+    }
+    telegram_ids = {group.id: group.telegram_id for group in groups}
+    expires_at = time.time() + deadline_minutes * 60
+    
+    # إرسال الرسائل هو العملية الوحيدة المتبقية لكل مجموعة
+    sent_count = 0
+    for task_id, group_id, task_type in created:
+        template, points = task_items[task_type]
+        callback_data = task_join_callback(task_type, schedules[group_id], points, expires_at=expires_at)
+        
+        # دالة الرد مسجلة في الطابور حتى تحفظ الرسالة معها إذا أوقف الطابور قبل إرسالها
+        if send_template(
+            template, telegram_ids[group_id], wait=False,
+            callback=partial(mark_task_sent, task_id=task_id),
+            resume=('group_task_sent', {'task_id': task_id}),
+            callback_data=callback_data
+        ):
+            sent_count += 1
+    
+    return sent_count
+
+
 # إرسال مهام الجدول الصباحي للمجموعات النشطة
-def send_morning_schedule_tasks():
-    """إرسال مهام الجدول الصباحي للمجموعات النشطة"""
+def send_morning_schedule_tasks(time_str=None):
+    """إرسال مهام الجدول الصباحي للمجموعات النشطة للوقت المحدد (الوقت الحالي افتراضيًا)"""
     try:
         # الحصول على الوقت الحالي
-        now = get_current_time()
-        time_str = now.strftime("%H:%M")
+        if not time_str:
+            time_str = get_current_time().strftime("%H:%M")
         
         # تسجيل وقت الفحص
         logger.info(f"فحص مهام الجدول الصباحي للوقت {time_str}")
         
-        # الحصول على المجموعات النشطة مع تفعيل الجدول الصباحي
-        active_groups = Group.query.filter_by(is_active=True, morning_schedule_enabled=True).all()
-        logger.info(f"تم العثور على {len(active_groups)} مجموعة نشطة مع تفعيل الجدول الصباحي")
-        
-        # إرسال المهام المجدولة للوقت الحالي
-        sent_count = 0
-        for group in active_groups:
-            result = send_scheduled_task(group.id, time_str, 'morning')
-            if result:
-                sent_count += 1
+        # إضافة المهام المجدولة للوقت المحدد إلى طابور الإرسال
+        sent_count = send_schedule_tasks_bulk('morning', time_str)
                 
         logger.info(f"تم إرسال {sent_count} مهمة صباحية للوقت {time_str}")
         return sent_count
     except Exception as e:
         logger.error(f"خطأ في إرسال مهام الجدول الصباحي: {e}")
+        db.session.rollback()
         return 0
 
 
 # إرسال مهام الجدول المسائي للمجموعات النشطة
-def send_evening_schedule_tasks():
-    """إرسال مهام الجدول المسائي للمجموعات النشطة"""
+def send_evening_schedule_tasks(time_str=None):
+    """إرسال مهام الجدول المسائي للمجموعات النشطة للوقت المحدد (الوقت الحالي افتراضيًا)"""
     try:
         # الحصول على الوقت الحالي
-        now = get_current_time()
-        time_str = now.strftime("%H:%M")
+        if not time_str:
+            time_str = get_current_time().strftime("%H:%M")
         
         # تسجيل وقت الفحص
         logger.info(f"فحص مهام الجدول المسائي للوقت {time_str}")
         
-        # الحصول على المجموعات النشطة مع تفعيل الجدول المسائي
-        active_groups = Group.query.filter_by(is_active=True, evening_schedule_enabled=True).all()
-        logger.info(f"تم العثور على {len(active_groups)} مجموعة نشطة مع تفعيل الجدول المسائي")
-        
-        # إرسال المهام المجدولة للوقت الحالي
-        sent_count = 0
-        for group in active_groups:
-            result = send_scheduled_task(group.id, time_str, 'evening')
-            if result:
-                sent_count += 1
+        # إضافة المهام المجدولة للوقت المحدد إلى طابور الإرسال
+        sent_count = send_schedule_tasks_bulk('evening', time_str)
                 
         logger.info(f"تم إرسال {sent_count} مهمة مسائية للوقت {time_str}")
         return sent_count
     except Exception as e:
         logger.error(f"خطأ في إرسال مهام الجدول المسائي: {e}")
+        db.session.rollback()
         return 0
 
 
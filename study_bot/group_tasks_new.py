@@ -7,10 +7,10 @@
 
 import random
 import logging
-import requests
 from datetime import datetime, timedelta
 
-from study_bot.config import logger, TELEGRAM_API_URL, get_current_time
+from study_bot.config import logger, get_current_time
+from study_bot.telegram_client import get_client
 from study_bot.models import (
     db, User, Group, GroupParticipant, GroupScheduleTracker,
     GroupTaskTracker, MotivationalMessage
@@ -20,9 +20,6 @@ from study_bot.models import (
 def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
     """إرسال رسالة إلى مستخدم أو مجموعة"""
     try:
-        # بناء رابط API
-        url = f"{TELEGRAM_API_URL}/sendMessage"
-        
         # بناء البيانات
         data = {
             "chat_id": chat_id,
@@ -36,8 +33,8 @@ def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
         if parse_mode:
             data["parse_mode"] = parse_mode
         
-        # إرسال الطلب
-        response = requests.post(url, json=data)
+        # إرسال الطلب عبر العميل المشترك
+        response = get_client().post("sendMessage", data)
         response_data = response.json()
         
         if not response_data.get('ok', False):
@@ -53,12 +50,6 @@ def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
 def answer_callback_query(callback_query_id, text=None, show_alert=False):
     """الإجابة على نداء الاستجابة"""
     try:
-        import requests
-        from study_bot.config import TELEGRAM_API_URL
-        
-        # بناء رابط API
-        url = f"{TELEGRAM_API_URL}/answerCallbackQuery"
-        
         # بناء البيانات
         data = {
             "callback_query_id": callback_query_id,
@@ -71,8 +62,8 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
         if show_alert:
             data["show_alert"] = True
         
-        # إرسال الطلب
-        response = requests.post(url, json=data)
+        # إرسال الطلب عبر العميل المشترك
+        response = get_client().post("answerCallbackQuery", data)
         response_data = response.json()
         
         if not response_data.get('ok', False):
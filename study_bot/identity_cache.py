@@ -0,0 +1,173 @@
+"""
+وحدة الذاكرة المؤقتة للمستخدمين والمجموعات
+تحتوي على ذاكرة قراءة بمعرف تيليجرام مع مدة صلاحية وحد أقصى للحجم
+تحفظ نسخة من قيم الأعمدة فقط، وتعيد بناء الكائن وربطه بجلسة قاعدة البيانات الحالية دون استعلام
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from study_bot.config import (
+    logger, SCHEDULER_TIMEZONE,
+    IDENTITY_CACHE_TTL, IDENTITY_CACHE_MAXSIZE, ACTIVITY_WRITE_INTERVAL_MINUTES
+)
+from study_bot.models import db, User, Group
+
+# المتغيرات العامة
+_caches = {
+    User: OrderedDict(),
+    Group: OrderedDict()
+}
+_cache_lock = threading.Lock()
+
+# وقت آخر كتابة لآخر نشاط كل مستخدم
+_activity_writes = OrderedDict()
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'invalidations': 0,
+    'activity_writes': 0,
+    'activity_skipped': 0
+}
+
+
+def _snapshot(instance):
+    """نسخ قيم أعمدة الكائن"""
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs}
+
+
+def _attach(model, values):
+    """ربط الكائن المحفوظ بالجلسة الحالية دون استعلام"""
+    key = identity_key(model, values['id'])
+    if key in db.session.identity_map:
+        return db.session.identity_map[key]
+
+    instance = model(**values)
+    make_transient_to_detached(instance)
+    db.session.add(instance)
+    return instance
+
+
+def _lookup(model, telegram_id):
+    """البحث عن سجل بمعرف تيليجرام في الذاكرة ثم في قاعدة البيانات"""
+    cache = _caches[model]
+    now = time.monotonic()
+
+    with _cache_lock:
+        entry = cache.get(telegram_id)
+        if entry and entry[0] > now:
+            cache.move_to_end(telegram_id)
+            _stats['hits'] += 1
+            values = entry[1]
+        else:
+            _stats['misses'] += 1
+            values = None
+
+    if values:
+        return _attach(model, values)
+
+    instance = model.query.filter_by(telegram_id=telegram_id).first()
+    if instance:
+        with _cache_lock:
+            cache[telegram_id] = (now + IDENTITY_CACHE_TTL, _snapshot(instance))
+            cache.move_to_end(telegram_id)
+            while len(cache) > IDENTITY_CACHE_MAXSIZE:
+                cache.popitem(last=False)
+                _stats['evictions'] += 1
+
+    return instance
+
+
+def get_user(telegram_id):
+    """الحصول على مستخدم بمعرف تيليجرام"""
+    return _lookup(User, telegram_id)
+
+
+def get_group(telegram_id):
+    """الحصول على مجموعة بمعرف تيليجرام"""
+    return _lookup(Group, telegram_id)
+
+
+def _invalidate(model, telegram_id):
+    """حذف سجل من الذاكرة"""
+    with _cache_lock:
+        if _caches[model].pop(telegram_id, None) is not None:
+            _stats['invalidations'] += 1
+
+
+def invalidate_user(telegram_id):
+    """حذف مستخدم من الذاكرة بعد تعديله خارج الجلسة"""
+    _invalidate(User, telegram_id)
+
+
+def invalidate_all_users():
+    """حذف جميع المستخدمين من الذاكرة بعد تحديث جماعي لا يمر بأحداث الجلسة"""
+    with _cache_lock:
+        _stats['invalidations'] += len(_caches[User])
+        _caches[User].clear()
+
+
+def invalidate_group(telegram_id):
+    """حذف مجموعة من الذاكرة بعد تعديلها خارج الجلسة"""
+    _invalidate(Group, telegram_id)
+
+
+# حذف السجل من الذاكرة عند تعديله أو حذفه عبر الجلسة (مثل تعطيل المجموعة أو تغيير إعداداتها)
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+@event.listens_for(Group, 'after_update')
+@event.listens_for(Group, 'after_delete')
+def _on_change(mapper, connection, target):
+    """حذف الكائن المعدل من الذاكرة"""
+    _invalidate(mapper.class_, target.telegram_id)
+
+
+def touch_user_activity(user):
+    """تحديث آخر نشاط للمستخدم مرة واحدة على الأكثر كل ACTIVITY_WRITE_INTERVAL_MINUTES دقيقة"""
+    now = time.monotonic()
+
+    with _cache_lock:
+        last_write = _activity_writes.get(user.telegram_id)
+        if last_write and now - last_write < ACTIVITY_WRITE_INTERVAL_MINUTES * 60:
+            _stats['activity_skipped'] += 1
+            return False
+
+        _activity_writes[user.telegram_id] = now
+        _activity_writes.move_to_end(user.telegram_id)
+        while len(_activity_writes) > IDENTITY_CACHE_MAXSIZE:
+            _activity_writes.popitem(last=False)
+
+    try:
+        # تحديث مباشر لا يحذف المستخدم من الذاكرة، فآخر نشاط لا يستخدم في القرارات
+        db.session.execute(
+            update(User).where(User.id == user.id).values(
+                last_activity=datetime.now(SCHEDULER_TIMEZONE)
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        _stats['activity_writes'] += 1
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في تحديث آخر نشاط للمستخدم {user.telegram_id}: {e}")
+        db.session.rollback()
+        return False
+
+
+def get_identity_cache_stats():
+    """الحصول على إحصائيات الذاكرة ونسبة الإصابة"""
+    with _cache_lock:
+        stats = dict(_stats)
+        stats['users'] = len(_caches[User])
+        stats['groups'] = len(_caches[Group])
+
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,191 @@
+"""
+وحدة كاتب سجل الرسائل
+تحتوي على كاتب غير متزامن يجمع سجلات الرسائل في الذاكرة ويكتبها دفعة واحدة
+"""
+
+import random
+import threading
+import time
+from datetime import datetime
+
+from study_bot.config import (
+    logger, SCHEDULER_TIMEZONE,
+    MESSAGE_LOG_BATCH_SIZE, MESSAGE_LOG_FLUSH_INTERVAL, MESSAGE_LOG_BUFFER_MAXSIZE,
+    MESSAGE_LOG_HIGH_VOLUME_THRESHOLD, MESSAGE_LOG_SAMPLE_RATE
+)
+
+# المتغيرات العامة
+_app = None
+_writer_thread = None
+_writer_running = False
+_buffer = []
+_buffer_lock = threading.Lock()
+_flush_event = threading.Event()
+
+# عدادات الرسائل لكل مجموعة في الدقيقة الحالية لتحديد المجموعات كثيفة الرسائل
+_chat_window_minute = None
+_chat_window_counts = {}
+
+# إحصائيات الكاتب
+_stats = {
+    'written': 0,
+    'dropped': 0,
+    'sampled_out': 0,
+    'failed': 0,
+    'flushes': 0
+}
+
+
+def _should_sample_out(chat_id):
+    """التحقق مما إذا كان يجب تجاهل السجل بسبب كثافة رسائل المجموعة"""
+    global _chat_window_minute
+
+    # أخذ العينات ينطبق على المجموعات فقط (معرفاتها سالبة)
+    if MESSAGE_LOG_SAMPLE_RATE >= 1 or chat_id is None or chat_id >= 0:
+        return False
+
+    minute = int(time.time() // 60)
+    if minute != _chat_window_minute:
+        _chat_window_minute = minute
+        _chat_window_counts.clear()
+
+    count = _chat_window_counts.get(chat_id, 0) + 1
+    _chat_window_counts[chat_id] = count
+
+    if count <= MESSAGE_LOG_HIGH_VOLUME_THRESHOLD:
+        return False
+
+    return random.random() >= MESSAGE_LOG_SAMPLE_RATE
+
+
+def log_row(chat_id, message_type, message_id=None, content=None, user_id=None, is_from_bot=False):
+    """إضافة سجل رسالة إلى الذاكرة المؤقتة ليكتب لاحقًا ضمن دفعة"""
+    row = {
+        'chat_id': chat_id,
+        'user_id': user_id,
+        'message_type': message_type,
+        'message_id': message_id,
+        'content': content,
+        'is_from_bot': is_from_bot,
+        'sent_at': datetime.now(SCHEDULER_TIMEZONE)
+    }
+
+    # الكتابة المباشرة إذا لم يكن الكاتب يعمل (مثل السكربتات المستقلة)
+    if not _writer_running:
+        return _write_rows([row])
+
+    with _buffer_lock:
+        if _should_sample_out(chat_id):
+            _stats['sampled_out'] += 1
+            return False
+
+        if len(_buffer) >= MESSAGE_LOG_BUFFER_MAXSIZE:
+            _stats['dropped'] += 1
+            return False
+
+        _buffer.append(row)
+        if len(_buffer) >= MESSAGE_LOG_BATCH_SIZE:
+            _flush_event.set()
+
+    return True
+
+
+def _write_rows(rows):
+    """كتابة مجموعة من السجلات في استعلام إدراج واحد متعدد الصفوف"""
+    from study_bot.models import db, MessageLog
+
+    if not rows:
+        return True
+
+    try:
+        db.session.execute(MessageLog.__table__.insert(), rows)
+        db.session.commit()
+
+        with _buffer_lock:
+            _stats['written'] += len(rows)
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في كتابة دفعة سجلات الرسائل ({len(rows)} سجل): {e}")
+        try:
+            db.session.rollback()
+        except:
+            pass
+
+        with _buffer_lock:
+            _stats['failed'] += len(rows)
+        return False
+
+
+def flush():
+    """كتابة جميع السجلات الموجودة في الذاكرة المؤقتة"""
+    with _buffer_lock:
+        if not _buffer:
+            return 0
+        rows = _buffer[:]
+        _buffer.clear()
+        _stats['flushes'] += 1
+
+    _write_rows(rows)
+    return len(rows)
+
+
+def writer_thread_func(app):
+    """دالة سلسلة كاتب سجل الرسائل"""
+    with app.app_context():
+        while _writer_running:
+            # الكتابة عند امتلاء الدفعة أو بعد انقضاء الفترة المحددة
+            _flush_event.wait(MESSAGE_LOG_FLUSH_INTERVAL)
+            _flush_event.clear()
+
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"خطأ في سلسلة كاتب سجل الرسائل: {e}")
+
+
+def init_message_log_writer(app):
+    """تهيئة كاتب سجل الرسائل وبدء سلسلته"""
+    global _app, _writer_thread, _writer_running
+
+    if _writer_running:
+        logger.warning("كاتب سجل الرسائل يعمل بالفعل")
+        return _writer_thread
+
+    _app = app
+    _writer_running = True
+    _writer_thread = threading.Thread(target=writer_thread_func, args=(app,))
+    _writer_thread.daemon = True
+    _writer_thread.start()
+
+    logger.info("تم بدء كاتب سجل الرسائل")
+    return _writer_thread
+
+
+def shutdown_message_log_writer():
+    """إيقاف كاتب سجل الرسائل وكتابة السجلات المتبقية"""
+    global _writer_running
+
+    if not _writer_running:
+        return False
+
+    _writer_running = False
+    _flush_event.set()
+    if _writer_thread:
+        _writer_thread.join(timeout=10)
+
+    # كتابة ما تبقى في الذاكرة المؤقتة
+    with _app.app_context():
+        count = flush()
+
+    logger.info(f"تم إيقاف كاتب سجل الرسائل بعد كتابة {count} سجل متبقٍ")
+    return True
+
+
+def get_writer_stats():
+    """الحصول على إحصائيات كاتب سجل الرسائل"""
+    with _buffer_lock:
+        stats = dict(_stats)
+        stats['buffered'] = len(_buffer)
+
+    stats['running'] = _writer_running
+    return stats
@@ -0,0 +1,137 @@
+"""
+وحدة قوالب الرسائل
+تحتوي على قوالب رسائل تُبنى مرة واحدة لكل نوع (النص ولوحة المفاتيح وجسم الطلب كاملاً بصيغة JSON)
+ثم يعوض فيها عند كل إرسال الحقول الصغيرة الخاصة بكل مجموعة فقط، مثل معرف المحادثة وبيانات الزر
+"""
+
+import json
+import threading
+
+from study_bot.config import logger
+from study_bot.telegram_client import get_client, PreparedBody
+
+# علامات الحقول داخل القالب (من منطقة الاستخدام الخاص في يونيكود فلا تظهر في النصوص العادية)
+_FIELD_START = '\ue000'
+_FIELD_END = '\ue001'
+
+# القوالب المبنية: المفتاح -> القالب
+_templates = {}
+_templates_lock = threading.Lock()
+
+_stats = {
+    'compiled': 0,
+    'rendered': 0
+}
+
+
+def field(name):
+    """علامة حقل يعوض عند الإرسال، تستخدم داخل النص أو بيانات الأزرار أو كقيمة كاملة"""
+    return f'{_FIELD_START}{name}{_FIELD_END}'
+
+
+class MessageTemplate:
+    """قالب رسالة مرمز مسبقًا إلى أجزاء ثابتة وحقول"""
+
+    def __init__(self, text, reply_markup=None, parse_mode='HTML', chat_id=None):
+        payload = {
+            'chat_id': chat_id if chat_id is not None else field('chat_id'),
+            'text': text,
+            'parse_mode': parse_mode,
+            'disable_web_page_preview': True
+        }
+        if reply_markup:
+            payload['reply_markup'] = reply_markup
+
+        encoded = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+        # تقسيم الجسم عند الحقول: الحقل الذي يشغل قيمة كاملة يعوض بقيمة JSON (رقم أو نص)
+        # والحقل داخل نص يعوض بالنص بعد تهريبه
+        self.parts = []
+        self.fields = []
+        position = 0
+        while True:
+            start = encoded.find(_FIELD_START, position)
+            if start < 0:
+                break
+            end = encoded.index(_FIELD_END, start)
+            name = encoded[start + 1:end]
+
+            whole_value = encoded[start - 1] == '"' and encoded[end + 1] == '"'
+            if whole_value:
+                self.parts.append(encoded[position:start - 1].encode('utf-8'))
+                position = end + 2
+            else:
+                self.parts.append(encoded[position:start].encode('utf-8'))
+                position = end + 1
+            self.fields.append((name, whole_value))
+
+        self.parts.append(encoded[position:].encode('utf-8'))
+        self.size = sum(len(part) for part in self.parts)
+
+    def render(self, **values):
+        """بناء جسم الطلب بتعويض الحقول"""
+        chunks = [self.parts[0]]
+        for (name, whole_value), part in zip(self.fields, self.parts[1:]):
+            value = values[name]
+            if whole_value:
+                encoded = str(value) if type(value) is int else json.dumps(value, ensure_ascii=False)
+            elif isinstance(value, str) and value.isascii() and value.isprintable() and '"' not in value and '\\' not in value:
+                # القيم البسيطة مثل بيانات الأزرار المرمزة لا تحتاج تهريبًا
+                encoded = value
+            else:
+                encoded = json.dumps(str(value), ensure_ascii=False)[1:-1]
+            chunks.append(encoded.encode('utf-8'))
+            chunks.append(part)
+
+        return PreparedBody(b''.join(chunks), values.get('chat_id'))
+
+
+def get_template(key, build):
+    """الحصول على قالب مبني مسبقًا، أو بناؤه مرة واحدة بالدالة build التي ترجع (النص، لوحة المفاتيح)"""
+    template = _templates.get(key)
+    if template is not None:
+        return template
+
+    text, reply_markup = build()
+    template = MessageTemplate(text, reply_markup)
+    with _templates_lock:
+        template = _templates.setdefault(key, template)
+        _stats['compiled'] = len(_templates)
+    return template
+
+
+def clear_templates():
+    """حذف القوالب المبنية (بعد تعديل نصوص الرسائل)"""
+    with _templates_lock:
+        _templates.clear()
+        _stats['compiled'] = 0
+
+
+def send_template(template, chat_id, wait=True, callback=None, resume=None, **values):
+    """إرسال رسالة من قالب وإرجاع الرسالة أو نتيجة دالة الرد، وعند wait=False تضاف لطابور الإرسال وتعود فورًا"""
+    body = template.render(chat_id=chat_id, **values)
+    _stats['rendered'] += 1
+
+    try:
+        if not wait:
+            from study_bot.outbound_queue import enqueue, is_queue_running
+            if is_queue_running():
+                return enqueue('sendMessage', body, callback, resume=resume)
+
+        result = get_client().call('sendMessage', body) or {}
+        message = result.get('result') if result.get('ok') else None
+        if not message:
+            logger.error(f"خطأ في إرسال رسالة القالب إلى {chat_id}: {result.get('description')}")
+
+        return callback(message) if callback else message
+    except Exception as e:
+        logger.error(f"خطأ في إرسال رسالة القالب إلى {chat_id}: {e}")
+        return None
+
+
+def get_template_stats():
+    """الحصول على إحصائيات القوالب"""
+    with _templates_lock:
+        stats = dict(_stats)
+        stats['bytes'] = sum(template.size for template in _templates.values())
+    return stats
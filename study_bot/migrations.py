@@ -0,0 +1,294 @@
+"""
+وحدة ترحيل قاعدة البيانات
+تحتوي على ترحيلات مرقمة لمخطط قاعدة البيانات تطبق مرة واحدة بالترتيب
+وعلى فحص خطط تنفيذ الاستعلامات الأكثر استخدامًا
+"""
+
+import traceback
+from datetime import datetime
+
+from sqlalchemy import inspect, literal, text
+
+from study_bot.config import logger, SCHEDULER_TIMEZONE, CHECK_QUERY_PLANS
+
+# مفتاح قفل الترحيل في PostgreSQL حتى لا تطبق عدة عمليات الترحيلات في نفس الوقت
+MIGRATION_LOCK_KEY = 7201
+
+# قائمة الترحيلات بالترتيب، لا يعدل ترحيل بعد تطبيقه بل يضاف ترحيل جديد
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'فهارس الاستعلامات الأكثر استخدامًا',
+        'statements': [
+            "CREATE INDEX IF NOT EXISTS ix_group_task_tracker_schedule_task "
+            "ON group_task_tracker (schedule_id, task_type)",
+            "CREATE INDEX IF NOT EXISTS ix_group_schedule_tracker_group_type_created "
+            "ON group_schedule_tracker (group_id, schedule_type, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_camp_task_sent_scheduled "
+            "ON camp_task (is_sent, scheduled_time)",
+            "CREATE INDEX IF NOT EXISTS ix_message_log_chat_message "
+            "ON message_log (chat_id, message_id)"
+        ]
+    },
+    {
+        'version': 2,
+        'description': 'منع تكرار المشاركة في نفس مهمة المجموعة',
+        'statements': [
+            # حذف المشاركات المكررة قبل إضافة القيد مع الإبقاء على أقدمها
+            "DELETE FROM group_task_participation WHERE id NOT IN ("
+            "SELECT MIN(id) FROM group_task_participation GROUP BY task_id, participant_id)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_group_task_participation_task_participant "
+            "ON group_task_participation (task_id, participant_id)"
+        ]
+    },
+    {
+        'version': 3,
+        'description': 'تصنيف ووزن الرسائل التحفيزية',
+        # أعمدة تضاف فقط إذا لم تكن موجودة (الجداول الجديدة تنشأ بها من create_all)
+        'columns': [
+            ('motivational_message', 'category', "VARCHAR(50) DEFAULT 'general'"),
+            ('motivational_message', 'weight', "INTEGER DEFAULT 1")
+        ],
+        'statements': []
+    },
+    {
+        'version': 4,
+        'description': 'نتائج ترتيب المجموعات لكل الأوقات من المشاركات السابقة',
+        'statements': [
+            "INSERT INTO group_leaderboard_entry "
+            "(group_id, user_id, period, period_start, completions, points, updated_at) "
+            "SELECT p.group_id, p.user_id, 'all', '1970-01-01', COUNT(*), SUM(COALESCE(t.points, 1)), CURRENT_TIMESTAMP "
+            "FROM group_task_participation gp "
+            "JOIN group_task_participant p ON p.id = gp.participant_id "
+            "JOIN group_task_tracker t ON t.id = gp.task_id "
+            "GROUP BY p.group_id, p.user_id"
+        ]
+    },
+    {
+        'version': 5,
+        'description': 'فهرس جزئي لمهام المعسكرات المنتظرة وسبب إنهاء المهمة دون إرسال',
+        'columns': [
+            ('camp_task', 'skip_reason', "VARCHAR(20)")
+        ],
+        'statements': [
+            "CREATE INDEX IF NOT EXISTS ix_camp_task_due ON camp_task (scheduled_time) WHERE is_sent = false",
+            "DROP INDEX IF EXISTS ix_camp_task_sent_scheduled"
+        ]
+    },
+    {
+        'version': 6,
+        'description': 'دمج مشاركي المجموعة المكررين وقيد فريد على (group_id, user_id)',
+        'statements': [
+            # جمع عدادات المشاركين المكررين في أقدمهم
+            "UPDATE group_task_participant SET "
+            "daily_completion_count = (SELECT SUM(COALESCE(d.daily_completion_count, 0)) FROM group_task_participant d "
+            "WHERE d.group_id = group_task_participant.group_id AND d.user_id = group_task_participant.user_id), "
+            "total_completion_count = (SELECT SUM(COALESCE(d.total_completion_count, 0)) FROM group_task_participant d "
+            "WHERE d.group_id = group_task_participant.group_id AND d.user_id = group_task_participant.user_id), "
+            "last_completion_date = (SELECT MAX(d.last_completion_date) FROM group_task_participant d "
+            "WHERE d.group_id = group_task_participant.group_id AND d.user_id = group_task_participant.user_id) "
+            "WHERE id IN (SELECT MIN(id) FROM group_task_participant GROUP BY group_id, user_id HAVING COUNT(*) > 1)",
+            # حذف مشاركات المكررين في مهمة شارك فيها مشارك أقدم لنفس المستخدم
+            "DELETE FROM group_task_participation WHERE EXISTS ("
+            "SELECT 1 FROM group_task_participant p "
+            "JOIN group_task_participant k ON k.group_id = p.group_id AND k.user_id = p.user_id AND k.id < p.id "
+            "JOIN group_task_participation kp ON kp.participant_id = k.id "
+            "WHERE p.id = group_task_participation.participant_id AND kp.task_id = group_task_participation.task_id)",
+            # نقل باقي مشاركات المكررين إلى أقدم مشارك ثم حذف المكررين قبل إضافة القيد
+            "UPDATE group_task_participation SET participant_id = ("
+            "SELECT MIN(k.id) FROM group_task_participant k "
+            "JOIN group_task_participant p ON p.group_id = k.group_id AND p.user_id = k.user_id "
+            "WHERE p.id = group_task_participation.participant_id) "
+            "WHERE participant_id NOT IN (SELECT MIN(id) FROM group_task_participant GROUP BY group_id, user_id)",
+            "DELETE FROM group_task_participant WHERE id NOT IN (SELECT MIN(id) FROM group_task_participant GROUP BY group_id, user_id)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_group_task_participant_group_user ON group_task_participant (group_id, user_id)"
+        ]
+    },
+    {
+        'version': 7,
+        'description': 'وقت حجز مهام المعسكرات لإعادة المهام المحجوزة التي لم ترسل',
+        'columns': [
+            ('camp_task', 'claimed_at', "TIMESTAMP")
+        ],
+        'statements': [
+            "CREATE INDEX IF NOT EXISTS ix_camp_task_claimed ON camp_task (claimed_at) "
+            "WHERE is_sent = true AND message_id IS NULL AND skip_reason IS NULL"
+        ]
+    }
+]
+
+# الاستعلامات الأكثر استخدامًا التي يجب أن تستخدم فهرسًا: (الاسم، الجدول، الاستعلام، المعاملات)
+HOT_QUERIES = [
+    (
+        'handle_task_join',
+        'group_task_tracker',
+        "SELECT * FROM group_task_tracker WHERE schedule_id = :schedule_id AND task_type = :task_type",
+        {'schedule_id': 1, 'task_type': 'morning_task_0'}
+    ),
+    (
+        'get_or_create_for_today',
+        'group_schedule_tracker',
+        "SELECT * FROM group_schedule_tracker WHERE group_id = :group_id AND schedule_type = :schedule_type "
+        "AND created_at >= :start AND created_at <= :end",
+        {'group_id': 1, 'schedule_type': 'morning', 'start': datetime(2025, 1, 1), 'end': datetime(2025, 1, 2)}
+    ),
+    (
+        'camp_task_dispatcher_window',
+        'camp_task',
+        "SELECT id, scheduled_time FROM camp_task WHERE is_sent = {false} ORDER BY scheduled_time LIMIT :limit",
+        {'limit': 500}
+    ),
+    (
+        'message_log_lookup',
+        'message_log',
+        "SELECT * FROM message_log WHERE chat_id = :chat_id AND message_id = :message_id",
+        {'chat_id': 1, 'message_id': 1}
+    ),
+    (
+        'daily_stats_lookup',
+        'daily_stats',
+        "SELECT * FROM daily_stats WHERE key = :key AND date = :date",
+        {'key': 'messages_sent', 'date': datetime(2025, 1, 1)}
+    ),
+    (
+        'task_participation_lookup',
+        'group_task_participation',
+        "SELECT * FROM group_task_participation WHERE task_id = :task_id AND participant_id = :participant_id",
+        {'task_id': 1, 'participant_id': 1}
+    ),
+    (
+        'group_leaderboard_load',
+        'group_leaderboard_entry',
+        "SELECT user_id, completions FROM group_leaderboard_entry "
+        "WHERE group_id = :group_id AND period = :period AND period_start = :period_start",
+        {'group_id': 1, 'period': 'week', 'period_start': datetime(2025, 1, 4).date()}
+    )
+]
+
+
+def _ensure_migrations_table(db):
+    """إنشاء جدول الترحيلات المطبقة إذا لم يكن موجودًا"""
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255), "
+        "applied_at TIMESTAMP)"
+    ))
+    db.session.commit()
+
+
+def get_applied_versions(db):
+    """الحصول على أرقام الترحيلات المطبقة"""
+    rows = db.session.execute(text("SELECT version FROM schema_migrations")).all()
+    return {row[0] for row in rows}
+
+
+def run_migrations(db, check_plans=None):
+    """تطبيق الترحيلات غير المطبقة بالترتيب، كل ترحيل في معاملة مستقلة، ثم فحص خطط التنفيذ إذا كان مفعلاً"""
+    try:
+        _ensure_migrations_table(db)
+        is_postgres = db.engine.dialect.name == 'postgresql'
+
+        applied_count = 0
+        for migration in sorted(MIGRATIONS, key=lambda m: m['version']):
+            # قفل على مستوى المعاملة ثم إعادة الفحص حتى لا يطبق الترحيل مرتين
+            if is_postgres:
+                db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+            if migration['version'] in get_applied_versions(db):
+                db.session.commit()
+                continue
+
+            logger.info(f"تطبيق ترحيل قاعدة البيانات {migration['version']}: {migration['description']}")
+            for table, column, definition in migration.get('columns', []):
+                existing = {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+                if column not in existing:
+                    db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+            for statement in migration['statements']:
+                db.session.execute(text(statement))
+
+            db.session.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                {
+                    'version': migration['version'],
+                    'description': migration['description'],
+                    'applied_at': datetime.now(SCHEDULER_TIMEZONE)
+                }
+            )
+            db.session.commit()
+            applied_count += 1
+
+        if applied_count:
+            logger.info(f"تم تطبيق {applied_count} ترحيل لقاعدة البيانات")
+    except Exception as e:
+        logger.error(f"خطأ في تطبيق ترحيلات قاعدة البيانات: {e}")
+        logger.error(traceback.format_exc())
+        db.session.rollback()
+        return 0
+
+    # فشل الفحص لا يوقف التشغيل، بل يسجل الاستعلامات التي فقدت فهرسها
+    if CHECK_QUERY_PLANS if check_plans is None else check_plans:
+        try:
+            failed = check_query_plans(db)
+            if failed:
+                logger.error(f"استعلامات بدون فهرس: {', '.join(failed)}")
+        except Exception as e:
+            logger.error(f"خطأ في فحص خطط تنفيذ الاستعلامات: {e}")
+            db.session.rollback()
+
+    return applied_count
+
+
+def check_query_plans(db):
+    """فحص خطط تنفيذ الاستعلامات الأكثر استخدامًا، وإرجاع أسماء الاستعلامات التي تقرأ الجدول كاملاً"""
+    dialect = db.engine.dialect.name
+    sequential_scans = []
+
+    # القيم المنطقية تكتب كما يكتبها ORM (false في PostgreSQL و0 في SQLite)
+    # وإلا لا يطابق الاستعلام شرط الفهرس الجزئي في SQLite
+    booleans = {
+        str(value).lower(): str(literal(value).compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        for value in (False, True)
+    }
+
+    for name, table, query, params in HOT_QUERIES:
+        query = query.format(**booleans)
+        try:
+            if dialect == 'postgresql':
+                # تعطيل القراءة التسلسلية يجعل المخطط يختار الفهرس إن وجد، حتى مع الجداول الصغيرة
+                db.session.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = "\n".join(row[0] for row in db.session.execute(text(f"EXPLAIN {query}"), params))
+                is_sequential = f"Seq Scan on {table}" in plan
+            elif dialect == 'sqlite':
+                plan = "\n".join(str(row[-1]) for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {query}"), params))
+                is_sequential = f"SCAN {table}" in plan and "USING" not in plan
+            else:
+                logger.warning(f"فحص خطط التنفيذ غير مدعوم لقاعدة البيانات {dialect}")
+                return []
+        finally:
+            db.session.rollback()
+
+        if is_sequential:
+            logger.error(f"الاستعلام {name} يقرأ الجدول {table} كاملاً:\n{plan}")
+            sequential_scans.append(name)
+
+    return sequential_scans
+
+
+if __name__ == "__main__":
+    # تطبيق الترحيلات وفحص خطط التنفيذ يدويًا: python -m study_bot.migrations
+    import sys
+    from study_bot import create_app
+    from study_bot.models import db
+
+    app = create_app()
+    with app.app_context():
+        run_migrations(db, check_plans=False)
+        failed = check_query_plans(db)
+
+    if failed:
+        print(f"استعلامات بدون فهرس: {', '.join(failed)}")
+        sys.exit(1)
+
+    print("جميع الاستعلامات الأكثر استخدامًا تستخدم فهارس")
@@ -23,12 +23,16 @@ db = SQLAlchemy(model_class=Base)
 from study_bot.models.user import User, UserActivityLog
 from study_bot.models.group import (
     Group, GroupScheduleTracker, GroupTaskTracker,
-    GroupTaskParticipant, GroupTaskParticipation, MotivationalMessage
+    GroupTaskParticipant, GroupTaskParticipation, GroupLeaderboardEntry, MotivationalMessage
 )
 from study_bot.models.stats import SystemStats, DailyStats
+from study_bot.models.jobs import DelayedJob, QueuedMessage
+from study_bot.models.broadcast import Broadcast
+from study_bot.models.conversation import ConversationState
 from study_bot.models.camps import (
     CustomCamp, CampTask, CampParticipant, CampTaskParticipation
 )
+from study_bot.models.keyset import iter_chunks, iter_rows, fetch_page
 
 # نموذج سجل رسائل
 class MessageLog(db.Model):
@@ -43,6 +47,11 @@ class MessageLog(db.Model):
     content = db.Column(db.Text, nullable=True)  # محتوى الرسالة (النص أو وصف للمحتوى الآخر)
     is_from_bot = db.Column(db.Boolean, default=False)  # هل الرسالة من البوت
     sent_at = db.Column(db.DateTime, default=datetime.now(SCHEDULER_TIMEZONE))
+    
+    # فهرس للبحث عن رسالة محددة في محادثة
+    __table_args__ = (
+        db.Index('ix_message_log_chat_message', 'chat_id', 'message_id'),
+    )
 
 def init_db(app):
     """تهيئة قاعدة البيانات"""
@@ -52,6 +61,10 @@ def init_db(app):
         # إنشاء كافة الجداول
         db.create_all()
         
+        # تطبيق ترحيلات المخطط على الجداول الموجودة مسبقًا
+        from study_bot.migrations import run_migrations
+        run_migrations(db)
+        
         # زيادة عداد بدء التشغيل
         try:
             startup_count = SystemStats.get_value("startup_count", 0)
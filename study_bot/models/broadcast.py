@@ -0,0 +1,53 @@
+"""
+نموذج الرسائل الجماعية
+يحتوي على تعريف نموذج الرسالة الجماعية وتقدم إرسالها، لاستكمالها بعد إعادة التشغيل
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Text
+
+from study_bot.models import db
+
+class Broadcast(db.Model):
+    """نموذج رسالة جماعية"""
+    __tablename__ = 'broadcast'
+    
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default='pending')  # pending, running, completed, cancelled
+    created_by = Column(BigInteger, nullable=True)  # محادثة المشرف التي تعرض فيها رسالة التقدم
+    progress_message_id = Column(Integer, nullable=True)
+    
+    # نقطة الاستكمال: آخر معرف مستخدم اكتملت دفعته
+    last_user_id = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)  # عدد المستخدمين النشطين عند البدء (تقريبي)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)  # المستخدمون الذين حظروا البوت وتم تعطيلهم
+    
+    created_at = Column(Float, nullable=False)  # بالثواني منذ بداية عصر يونكس
+    updated_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_broadcast_status', 'status'),
+    )
+    
+    def to_dict(self):
+        """تحويل الرسالة الجماعية إلى قاموس لعرض التقدم"""
+        done = self.sent + self.failed + self.blocked
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'progress': round(min(100.0, 100.0 * done / self.total), 1) if self.total else 100.0,
+            'last_user_id': self.last_user_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'finished_at': self.finished_at
+        }
+    
+    def __repr__(self):
+        return f'<Broadcast {self.id} - {self.status}>'
@@ -6,10 +6,10 @@
 from datetime import datetime, timedelta
 import pytz
 import json
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey
 from sqlalchemy.orm import relationship
 
-from study_bot.config import SCHEDULER_TIMEZONE
+from study_bot.config import SCHEDULER_TIMEZONE, get_local_time
 from study_bot.models import db
 
 class CustomCamp(db.Model):
@@ -81,51 +81,9 @@ class CustomCamp(db.Model):
         ).order_by(CampTask.scheduled_time).limit(limit).all()
     
     def get_stats(self):
-        """الحصول على إحصائيات المعسكر"""
-        total_participants = CampParticipant.query.filter_by(
-            camp_id=self.id,
-            is_active=True
-        ).count()
-        
-        total_tasks = CampTask.query.filter_by(
-            camp_id=self.id
-        ).count()
-        
-        sent_tasks = CampTask.query.filter_by(
-            camp_id=self.id,
-            is_sent=True
-        ).count()
-        
-        # إجمالي نقاط المشاركين
-        total_points = db.session.query(
-            func.sum(CampParticipant.total_points)
-        ).filter_by(
-            camp_id=self.id,
-            is_active=True
-        ).scalar() or 0
-        
-        # متوسط نقاط المشاركين
-        avg_points = total_points / total_participants if total_participants > 0 else 0
-        
-        # المدة المتبقية بالأيام
-        now = datetime.now(SCHEDULER_TIMEZONE)
-        remaining_days = (self.end_date - now).days + 1 if now < self.end_date else 0
-        
-        # نسبة التقدم
-        total_days = (self.end_date - self.start_date).days + 1
-        progress = int((total_days - remaining_days) / total_days * 100) if total_days > 0 else 0
-        
-        return {
-            'total_participants': total_participants,
-            'total_tasks': total_tasks,
-            'sent_tasks': sent_tasks,
-            'total_points': total_points,
-            'avg_points': avg_points,
-            'remaining_days': remaining_days,
-            'progress': min(100, max(0, progress)),
-            'start_date': self.start_date.strftime('%Y-%m-%d'),
-            'end_date': self.end_date.strftime('%Y-%m-%d')
-        }
+        """الحصول على إحصائيات المعسكر من الإحصائيات المجمعة"""
+        from study_bot.camp_analytics import get_camp_summary
+        return get_camp_summary(self)
     
     def __repr__(self):
         return f'<CustomCamp {self.name}>'
@@ -142,9 +100,22 @@ class CampTask(db.Model):
     scheduled_time = Column(DateTime, nullable=False)
     points = Column(Integer, default=1)
     deadline_minutes = Column(Integer, default=10)
-    is_sent = Column(Boolean, default=False)
+    is_sent = Column(Boolean, default=False)  # خرجت المهمة من قائمة الانتظار (أرسلت أو أنهيت دون إرسال)
+    claimed_at = Column(DateTime, nullable=True)  # وقت حجز المهمة للإرسال
     sent_at = Column(DateTime, nullable=True)
     message_id = Column(Integer, nullable=True)  # معرف رسالة المهمة
+    skip_reason = Column(String(20), nullable=True)  # expired, orphaned, outside_camp إذا أنهيت دون إرسال
+    
+    # فهرس جزئي للمهام المنتظرة فقط، فلا يكبر مع المهام المرسلة
+    # وفهرس جزئي للمهام المحجوزة التي لم تسجل رسالتها لإعادتها بعد انتهاء مدة الحجز
+    __table_args__ = (
+        db.Index('ix_camp_task_due', 'scheduled_time', postgresql_where=(is_sent == False), sqlite_where=(is_sent == False)),
+        db.Index(
+            'ix_camp_task_claimed', 'claimed_at',
+            postgresql_where=(is_sent == True) & message_id.is_(None) & skip_reason.is_(None),
+            sqlite_where=(is_sent == True) & message_id.is_(None) & skip_reason.is_(None)
+        ),
+    )
     
     # علاقات
     participations = relationship('CampTaskParticipation', backref='task', lazy=True)
@@ -154,7 +125,7 @@ class CampTask(db.Model):
         if not self.sent_at:
             return False
         
-        now = datetime.now(SCHEDULER_TIMEZONE)
+        now = get_local_time()
         deadline = self.sent_at + timedelta(minutes=self.deadline_minutes)
         
         return now > deadline
@@ -164,7 +135,7 @@ class CampTask(db.Model):
         if not self.sent_at or self.is_expired():
             return 0
         
-        now = datetime.now(SCHEDULER_TIMEZONE)
+        now = get_local_time()
         deadline = self.sent_at + timedelta(minutes=self.deadline_minutes)
         
         return max(0, int((deadline - now).total_seconds()))
@@ -195,40 +166,18 @@ class CampParticipant(db.Model):
     user_details = relationship('User', foreign_keys=[user_id], backref='camp_user_details', lazy=True)
     
     def get_completion_percentage(self):
-        """الحصول على نسبة إكمال المهام"""
-        camp = CustomCamp.query.get(self.camp_id)
-        if not camp:
-            return 0
-        
-        # إجمالي المهام المرسلة في المعسكر
-        total_sent_tasks = CampTask.query.filter_by(
-            camp_id=self.camp_id,
-            is_sent=True
-        ).count()
-        
-        if total_sent_tasks == 0:
-            return 0
+        """الحصول على نسبة إكمال المهام من الإحصائيات المجمعة للمعسكر"""
+        from study_bot.camp_analytics import get_participant_progress
         
-        # عدد المهام التي أكملها المشارك
-        completed_tasks = CampTaskParticipation.query.filter_by(
-            participant_id=self.id
-        ).count()
-        
-        return min(100, int(completed_tasks / total_sent_tasks * 100))
+        progress = get_participant_progress(self.camp_id, self.id)
+        return progress['percentage'] if progress else 0
     
     def get_rank(self):
-        """الحصول على ترتيب المشارك في المعسكر"""
-        # الحصول على جميع المشاركين مرتبين حسب النقاط
-        participants = CampParticipant.query.filter_by(
-            camp_id=self.camp_id,
-            is_active=True
-        ).order_by(CampParticipant.total_points.desc()).all()
-        
-        for i, participant in enumerate(participants):
-            if participant.id == self.id:
-                return i + 1
+        """الحصول على ترتيب المشارك في المعسكر من لوحة الترتيب"""
+        from study_bot.camp_leaderboard import get_rank
         
-        return 0
+        rank, _ = get_rank(self.camp_id, self.id)
+        return rank or 0
     
     def __repr__(self):
         return f'<CampParticipant {self.id}>'
@@ -0,0 +1,27 @@
+"""
+نموذج حالة المحادثات
+يحتوي على تعريف نموذج الخطوة الحالية لمحادثة متعددة الخطوات مع مستخدم (مثل معالج إنشاء المعسكر)
+"""
+
+from sqlalchemy import Column, BigInteger, String, Float, Text
+
+from study_bot.models import db
+
+class ConversationState(db.Model):
+    """نموذج حالة محادثة مستخدم"""
+    __tablename__ = 'conversation_state'
+    
+    user_id = Column(BigInteger, primary_key=True)  # معرف تيليجرام، ولكل مستخدم محادثة واحدة جارية
+    flow = Column(String(50), nullable=False)  # اسم المحادثة مثل camp_wizard
+    step = Column(String(50), nullable=False)
+    data = Column(Text, nullable=True)  # بيانات الخطوات السابقة بصيغة JSON
+    expires_at = Column(Float, nullable=False)  # بالثواني منذ بداية عصر يونكس، وتحذف المحادثة المتروكة بعده
+    updated_at = Column(Float, nullable=False)
+    
+    # فهرس لحذف المحادثات المنتهية
+    __table_args__ = (
+        db.Index('ix_conversation_state_expires', 'expires_at'),
+    )
+    
+    def __repr__(self):
+        return f'<ConversationState {self.user_id} - {self.flow}:{self.step}>'
@@ -6,7 +6,8 @@
 from datetime import datetime, timedelta
 import pytz
 import json
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Float, Text, ForeignKey, func, insert, update, select, case, or_, and_, literal
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 
 from study_bot.config import SCHEDULER_TIMEZONE
@@ -96,54 +97,22 @@ class Group(db.Model):
             CustomCamp.end_date >= now
         ).all()
     
-    def get_completion_stats(self, days=7):
-        """الحصول على إحصائيات إكمال المهام للمجموعة"""
-        from study_bot.models import GroupTaskParticipant, User
+    def get_completion_stats(self, period='week', page=1, page_size=10):
+        """الحصول على إحصائيات إكمال المهام للمجموعة في فترة (day, week, all) مع صفحة من الترتيب"""
+        from study_bot.group_leaderboard import get_leaderboard_page, get_period_totals
         
-        # تاريخ البداية
-        start_date = datetime.now(SCHEDULER_TIMEZONE) - timedelta(days=days)
+        leaderboard = get_leaderboard_page(self.id, period, page, page_size)
+        total_participants, total_completions = get_period_totals(self.id, period)
         
-        # الحصول على المشاركين النشطين
-        participants = db.session.query(
-            GroupTaskParticipant, User
-        ).join(
-            User, GroupTaskParticipant.user_id == User.id
-        ).filter(
-            GroupTaskParticipant.group_id == self.id,
-            GroupTaskParticipant.is_active == True,
-            GroupTaskParticipant.last_completion_date >= start_date
-        ).all()
-        
-        # إعداد البيانات
-        stats = {
-            'total_participants': len(participants),
-            'total_completions': 0,
-            'participants': []
+        return {
+            'period': period,
+            'period_start': leaderboard['period_start'],
+            'total_participants': total_participants,
+            'total_completions': total_completions,
+            'page': leaderboard['page'],
+            'pages': leaderboard['pages'],
+            'participants': leaderboard['entries']
         }
-        
-        for participant, user in participants:
-            stats['total_completions'] += participant.total_completion_count
-            
-            part_info = {
-                'user_id': user.id,
-                'telegram_id': user.telegram_id,
-                'name': user.get_full_name(),
-                'completions': participant.total_completion_count,
-                'streak': user.streak_days,
-                'points': user.points,
-                'last_completion': participant.last_completion_date.isoformat() if participant.last_completion_date else None
-            }
-            
-            stats['participants'].append(part_info)
-        
-        # ترتيب المشاركين حسب عدد المهام المكتملة
-        stats['participants'] = sorted(
-            stats['participants'],
-            key=lambda x: x['completions'],
-            reverse=True
-        )
-        
-        return stats
     
     def is_admin(self, user_id):
         """التحقق مما إذا كان المستخدم مشرفًا في المجموعة"""
@@ -169,6 +138,11 @@ class GroupScheduleTracker(db.Model):
     # إعدادات إضافية
     settings = Column(Text, nullable=True)  # JSON string of additional settings
     
+    # فهرس للبحث عن جدول المجموعة لليوم الحالي
+    __table_args__ = (
+        db.Index('ix_group_schedule_tracker_group_type_created', 'group_id', 'schedule_type', 'created_at'),
+    )
+    
     @classmethod
     def get_or_create_for_today(cls, group_id, schedule_type='morning'):
         """الحصول على أو إنشاء جدول للمجموعة ليوم اليوم"""
@@ -198,6 +172,50 @@ class GroupScheduleTracker(db.Model):
             db.session.commit()
             
         return schedule
+    
+    @classmethod
+    def get_or_create_for_today_bulk(cls, group_ids, schedule_type='morning'):
+        """الحصول على أو إنشاء جداول اليوم لمجموعة من المجموعات، وإرجاع قاموس {معرف المجموعة: معرف الجدول}"""
+        if not group_ids:
+            return {}
+        
+        now = datetime.now(SCHEDULER_TIMEZONE)
+        today_start = datetime(now.year, now.month, now.day, 0, 0, 0, tzinfo=SCHEDULER_TIMEZONE)
+        today_end = datetime(now.year, now.month, now.day, 23, 59, 59, tzinfo=SCHEDULER_TIMEZONE)
+        
+        # البحث عن جداول اليوم الموجودة في استعلام واحد
+        existing = db.session.query(cls.group_id, cls.id).filter(
+            cls.group_id.in_(group_ids),
+            cls.schedule_type == schedule_type,
+            cls.is_active == True,
+            cls.created_at >= today_start,
+            cls.created_at <= today_end
+        ).all()
+        
+        schedules = {}
+        for group_id, schedule_id in existing:
+            schedules.setdefault(group_id, schedule_id)
+        
+        # إنشاء الجداول الناقصة في استعلام إدراج واحد مع إرجاع المعرفات
+        missing = [group_id for group_id in group_ids if group_id not in schedules]
+        if missing:
+            rows = db.session.execute(
+                insert(cls).returning(cls.id, cls.group_id),
+                [{
+                    'group_id': group_id,
+                    'schedule_type': schedule_type,
+                    'is_active': True,
+                    'created_at': now,
+                    'updated_at': now,
+                    'start_date': today_start,
+                    'end_date': today_end
+                } for group_id in missing]
+            )
+            for schedule_id, group_id in rows:
+                schedules[group_id] = schedule_id
+            db.session.commit()
+        
+        return schedules
         
     def add_participant(self, user_id):
         """إضافة مشارك إلى الجدول"""
@@ -252,6 +270,11 @@ class GroupTaskTracker(db.Model):
     points = Column(Integer, default=1)  # النقاط المكتسبة عند إكمال المهمة
     schedule_id = Column(Integer, nullable=True)  # معرف جدول المجموعة المرتبط بالمهمة
     
+    # فهرس للبحث عن المهمة عند الضغط على زر الانضمام
+    __table_args__ = (
+        db.Index('ix_group_task_tracker_schedule_task', 'schedule_id', 'task_type'),
+    )
+    
     # علاقات
     participants = relationship('GroupTaskParticipant', secondary='group_task_participation', backref='completed_tasks', lazy=True)
     
@@ -281,6 +304,32 @@ class GroupTaskTracker(db.Model):
         db.session.commit()
         
         return task
+    
+    @classmethod
+    def create_tasks_bulk(cls, rows):
+        """إنشاء مجموعة مهام في استعلام إدراج واحد، وإرجاع قائمة (معرف المهمة، معرف المجموعة، نوع المهمة)"""
+        if not rows:
+            return []
+        
+        result = db.session.execute(
+            insert(cls).returning(cls.id, cls.group_id, cls.task_type),
+            rows
+        ).all()
+        db.session.commit()
+        
+        return result
+    
+    @classmethod
+    def mark_sent(cls, task_id, message_id):
+        """تسجيل إرسال رسالة المهمة بتحديث مباشر دون تحميل السجل"""
+        db.session.execute(
+            update(cls).where(cls.id == task_id).values(
+                is_sent=True,
+                sent_at=datetime.now(SCHEDULER_TIMEZONE),
+                message_id=message_id
+            )
+        )
+        db.session.commit()
         
     def is_active(self):
         """التحقق مما إذا كانت المهمة نشطة (لم تنتهي مهلتها)"""
@@ -341,6 +390,128 @@ class GroupTaskTracker(db.Model):
         
         return True
     
+    def join(self, user):
+        """تسجيل انضمام مستخدم للمهمة ومنحه النقاط في معاملة واحدة"""
+        # يعتمد على القيد الفريد للمشاركة بدلاً من الفحص المسبق، ويرجع النقاط الممنوحة أو None إذا كان منضمًا بالفعل
+        return GroupTaskTracker._join(self.group_id, user, self.points or 0, GroupTaskTracker.id == self.id)
+    
+    @classmethod
+    def join_from_button(cls, group_id, schedule_id, task_type, user, points):
+        """تسجيل الانضمام من زر مرمز دون تحميل المهمة، ويرفع LookupError إذا لم تكن موجودة"""
+        # المهلة والنقاط من الزر الموقع، والمهمة تحدد داخل استعلام إدراج المشاركة
+        return cls._join(group_id, user, points, and_(
+            cls.group_id == group_id,
+            cls.schedule_id == schedule_id,
+            cls.task_type == task_type
+        ))
+    
+    @classmethod
+    def _join(cls, group_id, user, points, task_filter):
+        """تسجيل المشاركة في أحدث مهمة تطابق الشرط وتحديث العدادات والنقاط"""
+        from study_bot.models import User, UserActivityLog
+        
+        now = datetime.now(SCHEDULER_TIMEZONE)
+        
+        try:
+            # الحصول على مشارك المجموعة أو إنشاؤه داخل نفس المعاملة
+            select_participant = select(GroupTaskParticipant.id).where(
+                GroupTaskParticipant.group_id == group_id,
+                GroupTaskParticipant.user_id == user.id
+            )
+            participant_id = db.session.execute(select_participant).scalar()
+            if participant_id is None:
+                # يرفض القيد الفريد إنشاء مشارك ثانٍ من ضغطة متزامنة، فيعاد قراءة المشارك الذي أنشأته
+                try:
+                    with db.session.begin_nested():
+                        participant_id = db.session.execute(
+                            insert(GroupTaskParticipant).values(
+                                group_id=group_id,
+                                user_id=user.id,
+                                join_date=now
+                            ).returning(GroupTaskParticipant.id)
+                        ).scalar_one()
+                except IntegrityError:
+                    participant_id = db.session.execute(select_participant).scalar_one()
+            
+            # تسجيل المشاركة، ويرفض القيد الفريد الضغطة المكررة
+            try:
+                with db.session.begin_nested():
+                    inserted = db.session.execute(
+                        insert(GroupTaskParticipation).from_select(
+                            ['task_id', 'participant_id', 'completion_time'],
+                            select(cls.id, literal(participant_id), literal(now))
+                            .where(task_filter).order_by(cls.id.desc()).limit(1)
+                        )
+                    ).rowcount
+            except IntegrityError:
+                db.session.rollback()
+                return None
+            
+            if not inserted:
+                db.session.rollback()
+                raise LookupError("لم يتم العثور على المهمة")
+            
+            # تحديث عدادات المشارك والمستخدم على مستوى قاعدة البيانات دون قراءتها
+            db.session.execute(
+                update(GroupTaskParticipant).where(GroupTaskParticipant.id == participant_id).values(
+                    daily_completion_count=GroupTaskParticipant.daily_completion_count + 1,
+                    total_completion_count=GroupTaskParticipant.total_completion_count + 1,
+                    last_completion_date=now
+                ).execution_options(synchronize_session=False)
+            )
+            
+            # سلسلة الأيام: تزيد إذا كان آخر تحديث بالأمس، وتبدأ من جديد إذا انقطعت
+            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            streak_broken = or_(User.last_streak_update.is_(None), User.last_streak_update < today_start - timedelta(days=1))
+            values = {'total_tasks_completed': User.total_tasks_completed + 1}
+            if points > 0:
+                values.update(
+                    points=User.points + points,
+                    streak_days=case(
+                        (streak_broken, 1),
+                        (User.last_streak_update < today_start, User.streak_days + 1),
+                        else_=User.streak_days
+                    ),
+                    streak_start_date=case((streak_broken, now), else_=User.streak_start_date),
+                    last_streak_update=now
+                )
+            
+            total_points, total_tasks = db.session.execute(
+                update(User).where(User.id == user.id).values(**values)
+                .returning(User.points, User.total_tasks_completed)
+                .execution_options(synchronize_session=False)
+            ).one()
+            
+            # تسجيل النشاط
+            activity_rows = [{
+                'user_id': user.id,
+                'activity_type': 'complete_task',
+                'details': json.dumps({'total': total_tasks}),
+                'timestamp': now
+            }]
+            if points > 0:
+                activity_rows.insert(0, {
+                    'user_id': user.id,
+                    'activity_type': 'add_points',
+                    'details': json.dumps({'points': points, 'total': total_points}),
+                    'timestamp': now
+                })
+            db.session.execute(insert(UserActivityLog), activity_rows)
+            
+            # نتائج ترتيب المجموعة لليوم والأسبوع وكل الأوقات في نفس المعاملة
+            from study_bot.group_leaderboard import record_completion
+            record_completion(group_id, user.id, points, now)
+            
+            db.session.commit()
+            
+            # النقاط عُدلت بتحديث مباشر فلا يحذف المستخدم من الذاكرة تلقائيًا
+            from study_bot.identity_cache import invalidate_user
+            invalidate_user(user.telegram_id)
+            return points
+        except Exception:
+            db.session.rollback()
+            raise
+    
     def is_expired(self):
         """التحقق مما إذا كانت المهمة منتهية الصلاحية"""
         if not self.sent_at:
@@ -386,15 +557,26 @@ class GroupTaskParticipant(db.Model):
     daily_completion_count = Column(Integer, default=0)
     total_completion_count = Column(Integer, default=0)
     
+    # مشارك واحد لكل مستخدم في المجموعة
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'user_id', name='uq_group_task_participant_group_user'),
+    )
+    
     # دالة للحصول على مشارك مجموعة أو إنشائه إذا لم يكن موجودًا
     @classmethod
     def get_or_create(cls, group_id, user_id, schedule_type='morning'):
         """الحصول على مشارك مجموعة أو إنشائه إذا لم يكن موجودًا"""
         instance = cls.query.filter_by(group_id=group_id, user_id=user_id).first()
         if not instance:
-            instance = cls(group_id=group_id, user_id=user_id, schedule_type=schedule_type)
-            db.session.add(instance)
-            db.session.commit()
+            try:
+                with db.session.begin_nested():
+                    instance = cls(group_id=group_id, user_id=user_id, schedule_type=schedule_type)
+                    db.session.add(instance)
+                db.session.commit()
+            except IntegrityError:
+                # سبق طلب متزامن بإنشاء المشارك
+                db.session.rollback()
+                instance = cls.query.filter_by(group_id=group_id, user_id=user_id).first()
         return instance
     
     # دالة لإعادة ضبط العدادات اليومية
@@ -416,10 +598,38 @@ class GroupTaskParticipation(db.Model):
     participant_id = Column(Integer, ForeignKey('group_task_participant.id'), nullable=False)
     completion_time = Column(DateTime, default=datetime.now(SCHEDULER_TIMEZONE))
     
+    # منع تسجيل نفس المشارك في نفس المهمة أكثر من مرة
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'participant_id', name='uq_group_task_participation_task_participant'),
+    )
+    
     def __repr__(self):
         return f'<GroupTaskParticipation {self.task_id} - {self.participant_id}>'
 
 
+class GroupLeaderboardEntry(db.Model):
+    """نموذج نتيجة مستخدم في ترتيب المجموعة لفترة محددة (يوم، أسبوع، كل الأوقات)"""
+    __tablename__ = 'group_leaderboard_entry'
+    
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey('group.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    period = Column(String(10), nullable=False)  # day, week, all
+    period_start = Column(Date, nullable=False)  # بداية اليوم أو الأسبوع، وتاريخ ثابت لكل الأوقات
+    completions = Column(Integer, nullable=False, default=0)
+    points = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+    
+    # نتيجة واحدة لكل مستخدم في كل فترة، والفهرس نفسه يخدم تحميل ترتيب الفترة
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'period', 'period_start', 'user_id', name='uq_group_leaderboard_entry'),
+        db.Index('ix_group_leaderboard_entry_period', 'period', 'period_start'),
+    )
+    
+    def __repr__(self):
+        return f'<GroupLeaderboardEntry {self.group_id} - {self.period} - {self.user_id}>'
+
+
 class MotivationalMessage(db.Model):
     """نموذج الرسائل التحفيزية"""
     __tablename__ = 'motivational_message'
@@ -427,6 +637,8 @@ class MotivationalMessage(db.Model):
     id = Column(Integer, primary_key=True)
     group_id = Column(Integer, ForeignKey('group.id'), nullable=False)
     message = Column(Text, nullable=False)
+    category = Column(String(50), default='general')  # general, study, morning, evening
+    weight = Column(Integer, default=1)  # وزن الرسالة عند الاختيار العشوائي
     sent_at = Column(DateTime, default=datetime.now(SCHEDULER_TIMEZONE))
     message_id = Column(Integer, nullable=True)
     
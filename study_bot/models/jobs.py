@@ -0,0 +1,44 @@
+"""
+نموذج المهام المؤجلة
+يحتوي على تعريف نموذج المهام المؤجلة التي تنفذ بعد وقت محدد
+ونموذج الرسائل الصادرة المحفوظة عند إيقاف طابور الإرسال
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Text
+
+from study_bot.models import db
+
+class DelayedJob(db.Model):
+    """نموذج مهمة مؤجلة"""
+    __tablename__ = 'delayed_job'
+    
+    id = Column(Integer, primary_key=True)
+    job_type = Column(String(50), nullable=False)  # confirmation_message, task_reminder
+    chat_id = Column(BigInteger, nullable=False)  # المحادثة المرتبطة بالمهمة لإلغاء مهامها
+    payload = Column(Text, nullable=True)  # معاملات المهمة بصيغة JSON
+    run_at = Column(Float, nullable=False)  # وقت التنفيذ بالثواني منذ بداية عصر يونكس
+    created_at = Column(Float, nullable=False)
+    
+    # فهرس لإلغاء مهام محادثة محددة
+    __table_args__ = (
+        db.Index('ix_delayed_job_chat', 'chat_id', 'job_type'),
+    )
+    
+    def __repr__(self):
+        return f'<DelayedJob {self.job_type} - {self.chat_id}>'
+
+
+class QueuedMessage(db.Model):
+    """نموذج رسالة صادرة لم ترسل قبل إيقاف الطابور، وتعاد للطابور عند بدء التشغيل"""
+    __tablename__ = 'queued_message'
+    
+    id = Column(Integer, primary_key=True)
+    method = Column(String(50), nullable=False)
+    chat_id = Column(BigInteger, nullable=True)
+    body = Column(Text, nullable=False)  # جسم الطلب بصيغة JSON
+    callback_type = Column(String(50), nullable=True)  # دالة الرد المسجلة التي تستدعى بعد الإرسال
+    callback_payload = Column(Text, nullable=True)  # معاملات دالة الرد بصيغة JSON
+    created_at = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<QueuedMessage {self.method} - {self.chat_id}>'
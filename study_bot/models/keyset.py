@@ -0,0 +1,82 @@
+"""
+وحدة القراءة المتدرجة للجداول الكبيرة
+تحتوي على قراءة الصفوف على دفعات مرتبة بالمفتاح (WHERE id > آخر معرف ORDER BY id LIMIT n)
+بدلاً من تحميل الجدول كاملاً بـ .all()، فيبقى استهلاك الذاكرة ثابتًا مهما زاد عدد الصفوف
+وكل دفعة استعلام مستقل يستخدم فهرس المفتاح الأساسي، فلا يتباطأ بعمق الصفحة كما يحدث مع OFFSET
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import DeclarativeBase
+
+from study_bot.config import STREAM_CHUNK_SIZE
+from study_bot.models import db
+
+
+def _is_model(entity):
+    """التحقق مما إذا كان الكيان نموذجًا كاملاً وليس عمودًا"""
+    return isinstance(entity, type) and issubclass(entity, DeclarativeBase)
+
+
+def _default_key(entities):
+    """المفتاح الافتراضي: المعرف الأساسي لنموذج أول كيان"""
+    model = entities[0] if _is_model(entities[0]) else entities[0].class_
+    return model.id
+
+
+def iter_chunks(*entities, where=None, after=None, chunk_size=None, key=None):
+    """قراءة الصفوف على دفعات مرتبة بالمفتاح، وإرجاع كل دفعة كقائمة"""
+    # entities إما نموذج كامل (تُرجع كائنات) أو أعمدة محددة (تُرجع صفوفًا بأسماء الأعمدة)،
+    # وwhere شرط أو قائمة شروط، وafter آخر مفتاح تمت قراءته للاستكمال منه
+    key = key if key is not None else _default_key(entities)
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+
+    if where is None:
+        conditions = []
+    elif isinstance(where, (list, tuple)):
+        conditions = list(where)
+    else:
+        conditions = [where]
+
+    # المفتاح يجب أن يكون ضمن الأعمدة المقروءة لمعرفة نقطة بداية الدفعة التالية
+    columns = list(entities)
+    whole_model = len(columns) == 1 and _is_model(columns[0])
+    if not whole_model and not any(column is key for column in columns):
+        columns.append(key)
+    key_index = next((i for i, column in enumerate(columns) if column is key), None)
+
+    last_key = after
+    while True:
+        query = select(*columns).where(*conditions)
+        if last_key is not None:
+            query = query.where(key > last_key)
+        query = query.order_by(key).limit(chunk_size)
+
+        if whole_model:
+            chunk = db.session.scalars(query).all()
+        else:
+            chunk = db.session.execute(query).all()
+
+        if not chunk:
+            return
+
+        yield chunk
+
+        if len(chunk) < chunk_size:
+            return
+        last_key = getattr(chunk[-1], key.key) if whole_model else chunk[-1][key_index]
+
+
+def iter_rows(*entities, **kwargs):
+    """قراءة الصفوف واحدًا واحدًا على دفعات مرتبة بالمفتاح (نفس معاملات iter_chunks)"""
+    for chunk in iter_chunks(*entities, **kwargs):
+        yield from chunk
+
+
+def fetch_page(*entities, where=None, after=None, limit=100, key=None):
+    """قراءة صفحة واحدة بعد المفتاح after، وإرجاع (الصفوف، مفتاح الصفحة التالية أو None)"""
+    chunk = next(iter_chunks(*entities, where=where, after=after, chunk_size=limit, key=key), [])
+    if len(chunk) < limit:
+        return chunk, None
+
+    key = key if key is not None else _default_key(entities)
+    return chunk, getattr(chunk[-1], key.key)
@@ -6,12 +6,47 @@
 from datetime import datetime, timedelta
 import pytz
 import json
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Float, Text, ForeignKey, func, update, insert, cast, case
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 
 from study_bot.config import SCHEDULER_TIMEZONE
 from study_bot.models import db
 
+
+def _upsert_counter(model, key_values, insert_values, set_values):
+    """إدراج عداد أو زيادته في استعلام واحد (INSERT ... ON CONFLICT DO UPDATE)، وإرجاع القيمة الجديدة"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        
+        stmt = dialect_insert(model).values(**key_values, **insert_values)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_values), set_=set_values)
+        return db.session.execute(stmt.returning(model.value)).scalar_one()
+    
+    # قواعد أخرى: التحديث ثم الإدراج داخل نقطة حفظ، ويعاد التحديث إذا سبق طلب متزامن بالإدراج
+    where = [getattr(model, name) == value for name, value in key_values.items()]
+    
+    def apply_update():
+        return db.session.execute(
+            update(model).where(*where).values(**set_values)
+            .returning(model.value).execution_options(synchronize_session=False)
+        ).scalar()
+    
+    new_value = apply_update()
+    if new_value is None:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model).values(**key_values, **insert_values))
+            new_value = insert_values['value']
+        except IntegrityError:
+            new_value = apply_update()
+    return new_value
+
+
 class SystemStats(db.Model):
     """نموذج إحصائيات النظام"""
     __tablename__ = 'system_stats'
@@ -62,22 +97,25 @@ class SystemStats(db.Model):
         return stat
     
     @classmethod
-    def increment(cls, key, amount=1):
-        """زيادة قيمة إحصائية عددية"""
-        stat = cls.query.filter_by(key=key).first()
-        
-        if not stat:
-            stat = cls(key=key, value=str(amount))
-            db.session.add(stat)
-        else:
-            try:
-                current_value = int(stat.value)
-                stat.value = str(current_value + amount)
-            except:
-                stat.value = str(amount)
-        
-        db.session.commit()
-        return stat
+    def increment(cls, key, amount=1, commit=True):
+        """زيادة قيمة إحصائية عددية بتحديث ذري في قاعدة البيانات، وإرجاع القيمة الجديدة"""
+        now = datetime.now(SCHEDULER_TIMEZONE)
+        
+        # القيمة نص قد يحمل قيمة غير عددية من set_value، فتعتبر صفرًا بدلاً من فشل التحويل في PostgreSQL
+        current = cast(cls.value, BigInteger)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            current = case((cls.value.op('~')(r'^\s*-?[0-9]+\s*$'), current), else_=0)
+        
+        new_value = _upsert_counter(
+            cls,
+            {'key': key},
+            {'value': str(amount), 'updated_at': now},
+            {'value': cast(current + amount, Text), 'updated_at': now}
+        )
+        
+        if commit:
+            db.session.commit()
+        return int(new_value)
     
     @classmethod
     def get_all_stats(cls):
@@ -137,23 +175,23 @@ class DailyStats(db.Model):
         return stat
     
     @classmethod
-    def increment(cls, key, amount=1, date=None):
-        """زيادة قيمة إحصائية يومية"""
+    def increment(cls, key, amount=1, date=None, commit=True):
+        """زيادة قيمة إحصائية يومية بتحديث ذري في قاعدة البيانات، وإرجاع القيمة الجديدة"""
         if not date:
             date = datetime.now(SCHEDULER_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
         else:
             date = date.replace(hour=0, minute=0, second=0, microsecond=0)
         
-        stat = cls.query.filter_by(key=key, date=date).first()
-        
-        if not stat:
-            stat = cls(key=key, value=amount, date=date)
-            db.session.add(stat)
-        else:
-            stat.value += amount
+        new_value = _upsert_counter(
+            cls,
+            {'date': date, 'key': key},
+            {'value': amount},
+            {'value': func.coalesce(cls.value, 0) + amount}
+        )
         
-        db.session.commit()
-        return stat
+        if commit:
+            db.session.commit()
+        return new_value
     
     @classmethod
     def get_daily_stats(cls, date=None):
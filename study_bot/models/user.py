@@ -6,7 +6,7 @@
 from datetime import datetime, timedelta
 import pytz
 import json
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, func, select
 from sqlalchemy.orm import relationship
 from flask_login import UserMixin
 
@@ -101,10 +101,17 @@ class User(UserMixin, db.Model):
         db.session.commit()
     
     def get_group_participation_summary(self):
-        """الحصول على ملخص مشاركة المستخدم في المجموعات"""
+        """الحصول على ملخص مشاركة المستخدم في المجموعات مع ترتيبه الأسبوعي في كل مجموعة"""
         from study_bot.models import GroupTaskParticipant
+        from study_bot.group_leaderboard import get_user_rank
         
-        participations = GroupTaskParticipant.query.filter_by(user_id=self.id, is_active=True).all()
+        participations = db.session.execute(
+            select(
+                GroupTaskParticipant.group_id, GroupTaskParticipant.schedule_type,
+                GroupTaskParticipant.total_completion_count, GroupTaskParticipant.daily_completion_count,
+                GroupTaskParticipant.last_completion_date
+            ).where(GroupTaskParticipant.user_id == self.id, GroupTaskParticipant.is_active == True)
+        ).all()
         
         summary = {
             'morning_groups': 0,
@@ -119,13 +126,15 @@ class User(UserMixin, db.Model):
             elif participation.schedule_type == 'evening':
                 summary['evening_groups'] += 1
             
-            summary['total_completions'] += participation.total_completion_count
+            summary['total_completions'] += participation.total_completion_count or 0
             
+            weekly_rank = get_user_rank(participation.group_id, self.id, 'week')
             group_info = {
                 'group_id': participation.group_id,
                 'schedule_type': participation.schedule_type,
                 'completions': participation.total_completion_count,
                 'daily_completions': participation.daily_completion_count,
+                'weekly_rank': weekly_rank['rank'] if weekly_rank else None,
                 'last_completion': participation.last_completion_date.isoformat() if participation.last_completion_date else None
             }
             
@@ -209,8 +218,9 @@ class User(UserMixin, db.Model):
         # Get user or create if not exists
         from study_bot.models import db
         from study_bot.config import logger
+        from study_bot.identity_cache import get_user
         
-        user = cls.query.filter_by(telegram_id=telegram_id).first()
+        user = get_user(telegram_id)
         
         if not user:
             user = cls(
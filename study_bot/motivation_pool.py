@@ -0,0 +1,208 @@
+"""
+وحدة مجموعة الرسائل التحفيزية
+تحتوي على نسخة في الذاكرة من الرسائل التحفيزية تحمل عند بدء التشغيل وعند تعديلها
+ويتم الاختيار منها بالوزن والتصنيف بطريقة الأسماء المستعارة (Alias) في زمن ثابت
+مع منع تكرار آخر الرسائل في نفس المحادثة، والرجوع للرسائل المضمنة إذا كانت قاعدة البيانات فارغة
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import event, select
+
+from study_bot.config import (
+    logger, MOTIVATIONAL_MESSAGES,
+    MOTIVATION_POOL_REFRESH_SECONDS, MOTIVATION_NO_REPEAT_WINDOW
+)
+from study_bot.models import db, MotivationalMessage
+
+# عدد محاولات الاختيار قبل قبول رسالة مكررة
+PICK_ATTEMPTS = 8
+
+# الحد الأقصى للمحادثات التي تحفظ آخر رسائلها
+RECENT_MAX_CHATS = 10000
+
+# المتغيرات العامة
+_pool = None
+_pool_lock = threading.Lock()
+_loaded_at = 0
+_stale = True
+
+# آخر الرسائل المرسلة لكل محادثة (نصوصها، فتبقى صالحة بعد إعادة تحميل المجموعة)
+_recent = OrderedDict()
+
+_stats = {
+    'loads': 0,
+    'picks': 0,
+    'repeats_avoided': 0
+}
+
+
+def _build_alias(weights):
+    """بناء جدول الأسماء المستعارة للاختيار بالوزن"""
+    count = len(weights)
+    total = float(sum(weights))
+    probabilities = [weight * count / total for weight in weights]
+    aliases = list(range(count))
+
+    small = [i for i, p in enumerate(probabilities) if p < 1]
+    large = [i for i, p in enumerate(probabilities) if p >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        aliases[less] = more
+        probabilities[more] -= 1 - probabilities[less]
+        (small if probabilities[more] < 1 else large).append(more)
+
+    for i in small + large:
+        probabilities[i] = 1.0
+
+    return probabilities, aliases
+
+
+def _fallback_entries():
+    """الرسائل المضمنة في الكود: (النص، التصنيف، الوزن)"""
+    from study_bot.group_tasks import MOTIVATIONAL_QUOTES
+
+    return (
+        [(text, 'study', 1) for text in MOTIVATIONAL_QUOTES] +
+        [(text, 'general', 1) for text in MOTIVATIONAL_MESSAGES]
+    )
+
+
+def _build_pool(entries, source):
+    """بناء المجموعة وجداول الاختيار لكل تصنيف"""
+    texts = [text for text, _, _ in entries]
+
+    # التصنيف None يعني جميع الرسائل
+    members = {None: list(range(len(entries)))}
+    for i, (_, category, _) in enumerate(entries):
+        members.setdefault(category, []).append(i)
+
+    tables = {}
+    for category, indexes in members.items():
+        probabilities, aliases = _build_alias([max(1, entries[i][2]) for i in indexes])
+        tables[category] = (indexes, probabilities, aliases)
+
+    return {'texts': texts, 'tables': tables, 'source': source}
+
+
+def load_pool():
+    """تحميل الرسائل من قاعدة البيانات، أو من الرسائل المضمنة إذا لم توجد رسائل"""
+    global _pool, _loaded_at, _stale
+
+    # إلغاء علامة التعديل قبل القراءة حتى لا يضيع تعديل يحدث أثناءها
+    _stale = False
+    try:
+        rows = db.session.execute(
+            select(MotivationalMessage.message, MotivationalMessage.category, MotivationalMessage.weight)
+        ).all()
+        entries = [(message, category or 'general', weight or 1) for message, category, weight in rows if message]
+        source = 'database'
+    except Exception as e:
+        logger.error(f"خطأ في تحميل الرسائل التحفيزية من قاعدة البيانات: {e}")
+        db.session.rollback()
+        entries = []
+        source = 'unavailable'
+
+        # الإبقاء على المجموعة الحالية إن وجدت، وإعادة المحاولة عند الاختيار التالي
+        if _pool:
+            _stale = True
+            return _pool
+
+    # unavailable تستخدم الرسائل المضمنة مؤقتًا وتعاد المحاولة بعد مدة التحديث
+    if not entries:
+        entries = _fallback_entries()
+        if source == 'database':
+            source = 'fallback'
+
+    pool = _build_pool(entries, source)
+    with _pool_lock:
+        _pool = pool
+        _loaded_at = time.monotonic()
+        _stats['loads'] += 1
+
+    logger.info(f"تم تحميل {len(pool['texts'])} رسالة تحفيزية ({source})")
+    return pool
+
+
+def init_motivation_pool(app):
+    """تحميل مجموعة الرسائل التحفيزية عند بدء التشغيل"""
+    with app.app_context():
+        return load_pool()
+
+
+def _get_pool():
+    """الحصول على المجموعة الحالية، وإعادة تحميلها إذا عدلت الرسائل أو انتهت مدتها"""
+    # مع جدول فارغ تستخدم الرسائل المضمنة دون إعادة تحميل دورية، وتعاد القراءة فقط بعد تعديل الرسائل
+    expired = _pool is not None and _pool['source'] != 'fallback' and \
+        time.monotonic() - _loaded_at > MOTIVATION_POOL_REFRESH_SECONDS
+    if _pool is None or _stale or expired:
+        try:
+            return load_pool()
+        except Exception as e:
+            logger.error(f"خطأ في إعادة تحميل الرسائل التحفيزية: {e}")
+            if _pool is None:
+                return _build_pool(_fallback_entries(), 'fallback')
+    return _pool
+
+
+def _sample(table):
+    """اختيار رقم رسالة بالوزن في زمن ثابت"""
+    indexes, probabilities, aliases = table
+    i = random.randrange(len(indexes))
+    return indexes[i] if random.random() < probabilities[i] else indexes[aliases[i]]
+
+
+def pick_message(chat_id=None, category=None):
+    """اختيار رسالة تحفيزية، من التصنيف المحدد إن وجد، دون تكرار آخر رسائل المحادثة"""
+    pool = _get_pool()
+    table = pool['tables'].get(category) or pool['tables'][None]
+
+    with _pool_lock:
+        _stats['picks'] += 1
+        if chat_id is None:
+            return pool['texts'][_sample(table)]
+
+        # لا يمكن منع تكرار رسائل أكثر من المتاح في التصنيف
+        window = min(MOTIVATION_NO_REPEAT_WINDOW, len(table[0]) - 1)
+        recent = _recent.get(chat_id)
+        if recent is None or recent.maxlen != max(window, 1):
+            recent = deque(recent or (), maxlen=max(window, 1))
+
+        text = pool['texts'][_sample(table)]
+        for _ in range(PICK_ATTEMPTS):
+            if window <= 0 or text not in recent:
+                break
+            _stats['repeats_avoided'] += 1
+            text = pool['texts'][_sample(table)]
+
+        recent.append(text)
+        _recent[chat_id] = recent
+        _recent.move_to_end(chat_id)
+        while len(_recent) > RECENT_MAX_CHATS:
+            _recent.popitem(last=False)
+
+        return text
+
+
+# إعادة التحميل عند أول اختيار بعد إضافة رسالة أو تعديلها أو حذفها
+@event.listens_for(MotivationalMessage, 'after_insert')
+@event.listens_for(MotivationalMessage, 'after_update')
+@event.listens_for(MotivationalMessage, 'after_delete')
+def _on_change(mapper, connection, target):
+    """تعليم المجموعة كقديمة"""
+    global _stale
+    _stale = True
+
+
+def get_motivation_pool_stats():
+    """الحصول على إحصائيات مجموعة الرسائل التحفيزية"""
+    with _pool_lock:
+        stats = dict(_stats)
+        stats['size'] = len(_pool['texts']) if _pool else 0
+        stats['source'] = _pool['source'] if _pool else None
+        stats['categories'] = sorted(c for c in _pool['tables'] if c) if _pool else []
+        stats['tracked_chats'] = len(_recent)
+    return stats
@@ -0,0 +1,453 @@
+"""
+وحدة طابور الرسائل الصادرة
+تحتوي على طابور إرسال غير متزامن مع مجموعة عمال وتحديد معدل الإرسال حسب حدود تيليجرام
+والرسائل التي لم ترسل عند الإيقاف تحفظ في قاعدة البيانات وتعاد للطابور عند بدء التشغيل
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+
+from sqlalchemy import select, delete
+
+from study_bot.config import (
+    logger, OUTBOUND_WORKERS, OUTBOUND_QUEUE_MAXSIZE, OUTBOUND_RESUME_MAX_AGE,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_GROUP_RATE_PER_MINUTE
+)
+from study_bot.telegram_client import get_client, PreparedBody
+
+# المتغيرات العامة
+_queue_cond = threading.Condition()
+_pending = []  # كومة (وقت الإرسال المسموح، التسلسل، الرسالة)
+_sequence = itertools.count()
+_workers = []
+_app = None
+_queue_running = False
+_queue_accepting = False
+_in_flight = 0
+_chat_buckets = {}
+_last_buckets_cleanup = 0
+BUCKETS_CLEANUP_INTERVAL = 60  # الفترة بين تنظيف حاويات المحادثات الخاملة (بالثواني)
+
+# إحصائيات الطابور
+_stats_lock = threading.Lock()
+_stats = {
+    'enqueued': 0,
+    'sent': 0,
+    'failed': 0,
+    'rejected': 0,
+    'saved': 0,
+    'restored': 0,
+    'expired': 0,
+    'lost': 0,
+    'last_delivery_at': None
+}
+
+
+class TokenBucket:
+    """حاوية رموز لتحديد معدل الإرسال"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)  # عدد الرموز في الثانية
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """إضافة الرموز المتراكمة منذ آخر تحديث"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        """محاولة أخذ رمز، وإرجاع 0 عند النجاح أو مدة الانتظار اللازمة بالثواني"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """أخذ رمز مع الانتظار حتى يتوفر"""
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def is_full(self):
+        """التحقق مما إذا كانت الحاوية ممتلئة (محادثة خاملة)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    """رسالة في طابور الإرسال"""
+
+    __slots__ = ('method', 'data', 'chat_id', 'callback', 'raw', 'resume', 'enqueued_at', 'created_at')
+
+    def __init__(self, method, data, callback=None, raw=False, resume=None, created_at=None):
+        self.method = method
+        self.data = data
+        self.chat_id = data.chat_id if isinstance(data, PreparedBody) else data.get('chat_id')
+        self.callback = callback
+        # دالة الرد تستقبل استجابة تيليجرام كاملة (مع رمز الخطأ) بدلاً من الرسالة فقط
+        self.raw = raw
+        # (نوع دالة الرد المسجلة، معاملاتها) لحفظ الرسالة مع دالة ردها عند الإيقاف
+        self.resume = resume
+        self.enqueued_at = time.monotonic()
+        self.created_at = created_at or time.time()
+
+    def can_persist(self):
+        """التحقق مما إذا كان يمكن حفظ الرسالة (دالة الرد غير المسجلة لا تحفظ)"""
+        return self.callback is None or self.resume is not None
+
+    def serialize_body(self):
+        """جسم الطلب بصيغة JSON للحفظ"""
+        if isinstance(self.data, PreparedBody):
+            return self.data.body.decode('utf-8')
+        return json.dumps(self.data, ensure_ascii=False)
+
+
+def _get_callback(callback_type):
+    """الحصول على دالة رد مسجلة يمكن حفظها مع الرسالة"""
+    from study_bot.group_tasks import mark_task_sent
+
+    handlers = {
+        'group_task_sent': mark_task_sent
+    }
+    return handlers.get(callback_type)
+
+
+def _save_pending(messages):
+    """حفظ الرسائل التي لم ترسل في قاعدة البيانات، وإرجاع عدد الرسائل المحفوظة"""
+    from study_bot.models import db, QueuedMessage
+
+    rows = []
+    for message in messages:
+        callback_type, payload = message.resume or (None, None)
+        rows.append(QueuedMessage(
+            method=message.method,
+            chat_id=message.chat_id,
+            body=message.serialize_body(),
+            callback_type=callback_type,
+            callback_payload=json.dumps(payload) if payload is not None else None,
+            created_at=message.created_at
+        ))
+
+    with _app.app_context():
+        try:
+            db.session.add_all(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+    return len(rows)
+
+
+def load_pending():
+    """إعادة الرسائل المحفوظة عند الإيقاف السابق إلى الطابور، وإرجاع عدد الرسائل المعادة"""
+    from study_bot.models import db, QueuedMessage
+
+    rows = db.session.scalars(select(QueuedMessage).order_by(QueuedMessage.id)).all()
+    if not rows:
+        return 0
+
+    # الحذف قبل الإرسال حتى لا ترسل الرسالة مرتين إذا توقفت العملية مرة أخرى
+    db.session.execute(delete(QueuedMessage).where(QueuedMessage.id.in_([row.id for row in rows])))
+    db.session.commit()
+
+    now = time.time()
+    restored = 0
+    for row in rows:
+        if now - row.created_at > OUTBOUND_RESUME_MAX_AGE:
+            with _stats_lock:
+                _stats['expired'] += 1
+            continue
+
+        callback = None
+        resume = None
+        if row.callback_type:
+            handler = _get_callback(row.callback_type)
+            if handler is None:
+                logger.error(f"نوع دالة رد غير معروف للرسالة المحفوظة: {row.callback_type}")
+                continue
+            payload = json.loads(row.callback_payload or '{}')
+            resume = (row.callback_type, payload)
+            callback = lambda message, handler=handler, payload=payload: handler(message, **payload)
+
+        body = PreparedBody(row.body.encode('utf-8'), row.chat_id)
+        if enqueue(row.method, body, callback, resume=resume, created_at=row.created_at):
+            restored += 1
+
+    with _stats_lock:
+        _stats['restored'] += restored
+
+    if restored < len(rows):
+        logger.warning(f"تم تجاهل {len(rows) - restored} رسالة محفوظة لتأخرها أو تعذر إعادتها للطابور")
+    return restored
+
+
+# الحاوية العامة لجميع الرسائل
+_global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+
+
+def _get_chat_bucket(chat_id):
+    """الحصول على حاوية المحادثة، أو None إذا لم يكن لها حد خاص"""
+    # حد الرسائل لكل محادثة ينطبق على المجموعات فقط (معرفاتها سالبة)
+    try:
+        if chat_id is None or int(chat_id) >= 0:
+            return None
+    except (TypeError, ValueError):
+        return None
+
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = TokenBucket(TELEGRAM_GROUP_RATE_PER_MINUTE / 60.0, TELEGRAM_GROUP_RATE_PER_MINUTE)
+        _chat_buckets[chat_id] = bucket
+    return bucket
+
+
+def _cleanup_chat_buckets(now):
+    """حذف حاويات المحادثات الخاملة لتقليل استهلاك الذاكرة"""
+    global _last_buckets_cleanup
+
+    if now - _last_buckets_cleanup < BUCKETS_CLEANUP_INTERVAL:
+        return
+
+    _last_buckets_cleanup = now
+    for chat_id in [chat_id for chat_id, bucket in _chat_buckets.items() if bucket.is_full()]:
+        del _chat_buckets[chat_id]
+
+
+def _next_message():
+    """الحصول على الرسالة التالية الجاهزة للإرسال، أو None عند إيقاف الطابور"""
+    global _in_flight
+
+    with _queue_cond:
+        while True:
+            if not _pending:
+                if not _queue_running:
+                    return None
+                _queue_cond.wait(0.5)
+                continue
+
+            now = time.monotonic()
+            not_before, _, message = _pending[0]
+            if not_before > now:
+                _queue_cond.wait(not_before - now)
+                continue
+
+            heapq.heappop(_pending)
+            _cleanup_chat_buckets(now)
+
+            # تأجيل الرسالة إذا تجاوزت المجموعة حدها دون إيقاف باقي المحادثات
+            bucket = _get_chat_bucket(message.chat_id)
+            wait = bucket.reserve() if bucket else 0
+            if wait > 0:
+                heapq.heappush(_pending, (now + wait, next(_sequence), message))
+                continue
+
+            _in_flight += 1
+            return message
+
+
+def _deliver(message):
+    """إرسال رسالة واستدعاء دالة الرد بالنتيجة"""
+    from study_bot.models import db
+
+    # انتظار الحد العام لتيليجرام
+    _global_bucket.acquire()
+
+    result = get_client().call(message.method, message.data)
+    ok = bool(result and result.get('ok'))
+
+    with _stats_lock:
+        _stats['sent' if ok else 'failed'] += 1
+        _stats['last_delivery_at'] = time.time()
+
+    if message.callback:
+        try:
+            if message.raw:
+                message.callback(result)
+            else:
+                message.callback(result.get('result') if ok else None)
+        except Exception as e:
+            logger.error(f"خطأ في دالة الرد بعد إرسال الرسالة إلى {message.chat_id}: {e}")
+            try:
+                db.session.rollback()
+            except:
+                pass
+
+
+def _worker_func(app):
+    """دالة عامل الإرسال"""
+    global _in_flight
+
+    with app.app_context():
+        while True:
+            message = _next_message()
+            if message is None:
+                break
+
+            try:
+                _deliver(message)
+            except Exception as e:
+                logger.error(f"خطأ في عامل طابور الإرسال: {e}")
+            finally:
+                with _queue_cond:
+                    _in_flight -= 1
+                    _queue_cond.notify_all()
+
+
+def init_outbound_queue(app, workers=None):
+    """تهيئة طابور الرسائل الصادرة وبدء العمال، وإعادة الرسائل المحفوظة عند الإيقاف السابق"""
+    global _app, _queue_running, _queue_accepting
+
+    if _queue_running:
+        logger.warning("طابور الرسائل الصادرة يعمل بالفعل")
+        return False
+
+    _app = app
+    _queue_running = True
+    _queue_accepting = True
+
+    for i in range(workers or OUTBOUND_WORKERS):
+        worker = threading.Thread(target=_worker_func, args=(app,), name=f"outbound-worker-{i}")
+        worker.daemon = True
+        worker.start()
+        _workers.append(worker)
+
+    logger.info(f"تم بدء طابور الرسائل الصادرة مع {len(_workers)} عامل")
+
+    from study_bot.models import db
+    with app.app_context():
+        try:
+            restored = load_pending()
+            if restored:
+                logger.info(f"تمت إعادة {restored} رسالة محفوظة إلى طابور الإرسال")
+        except Exception as e:
+            logger.error(f"خطأ في تحميل الرسائل الصادرة المحفوظة: {e}")
+            db.session.rollback()
+
+    return True
+
+
+def shutdown_outbound_queue(timeout=30):
+    """إيقاف طابور الرسائل الصادرة بعد إرسال الرسائل المتبقية، وحفظ ما لم يرسل خلال المهلة لإعادة التشغيل"""
+    global _queue_running, _queue_accepting
+
+    if not _queue_running:
+        return False
+
+    _queue_accepting = False
+
+    # انتظار تفريغ الطابور خلال المهلة المحددة
+    deadline = time.monotonic() + timeout
+    with _queue_cond:
+        while (_pending or _in_flight) and time.monotonic() < deadline:
+            _queue_cond.wait(0.5)
+
+        remaining = [message for _, _, message in sorted(_pending)]
+        _pending.clear()
+        _queue_running = False
+        _queue_cond.notify_all()
+
+    if remaining:
+        _persist_remaining(remaining)
+
+    for worker in _workers:
+        worker.join(timeout=5)
+    _workers.clear()
+
+    logger.info("تم إيقاف طابور الرسائل الصادرة")
+    return True
+
+
+def _persist_remaining(messages):
+    """حفظ الرسائل التي لم ترسل عند الإيقاف، مع تسجيل ما لا يمكن حفظه بدلاً من حذفه بصمت"""
+    durable = [message for message in messages if message.can_persist()]
+    lost = len(messages) - len(durable)
+
+    saved = 0
+    if durable:
+        try:
+            saved = _save_pending(durable)
+            logger.warning(f"تم حفظ {saved} رسالة لم ترسل قبل إيقاف الطابور، وسترسل بعد إعادة التشغيل")
+        except Exception as e:
+            lost += len(durable)
+            logger.error(f"خطأ في حفظ {len(durable)} رسالة لم ترسل قبل إيقاف الطابور: {e}")
+
+    if lost:
+        # مثل الرسائل الجماعية التي تستكمل من نقطة استكمالها عند إعادة التشغيل
+        logger.error(f"تم إيقاف طابور الرسائل الصادرة مع {lost} رسالة لم ترسل ولم تحفظ")
+
+    with _stats_lock:
+        _stats['saved'] += saved
+        _stats['lost'] += lost
+
+
+def enqueue(method, data, callback=None, raw=False, resume=None, created_at=None):
+    """إضافة طلب إلى طابور الإرسال والعودة فورًا، ومع raw=True تستقبل دالة الرد الاستجابة كاملة أو None"""
+    # resume هو (نوع دالة رد مسجلة، معاملاتها) لحفظ الرسالة مع دالة ردها إذا أوقف الطابور قبل إرسالها،
+    # والرسالة بدالة رد دون resume لا تحفظ عند الإيقاف
+    if not _queue_accepting:
+        return False
+
+    message = OutboundMessage(method, data, callback, raw, resume, created_at)
+    with _queue_cond:
+        if len(_pending) >= OUTBOUND_QUEUE_MAXSIZE:
+            with _stats_lock:
+                _stats['rejected'] += 1
+            logger.error(f"طابور الرسائل الصادرة ممتلئ، تم رفض الرسالة إلى {message.chat_id}")
+            return False
+
+        heapq.heappush(_pending, (message.enqueued_at, next(_sequence), message))
+        _queue_cond.notify()
+
+    with _stats_lock:
+        _stats['enqueued'] += 1
+
+    return True
+
+
+def enqueue_message(chat_id, text, reply_markup=None, parse_mode="HTML", callback=None):
+    """إضافة رسالة إلى طابور الإرسال، ودالة الرد تستقبل الرسالة المرسلة أو None"""
+    data = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": parse_mode
+    }
+
+    if reply_markup:
+        data["reply_markup"] = reply_markup
+
+    return enqueue("sendMessage", data, callback)
+
+
+def is_queue_running():
+    """التحقق مما إذا كان الطابور يقبل الرسائل"""
+    return _queue_accepting
+
+
+def get_queue_stats():
+    """الحصول على إحصائيات طابور الرسائل الصادرة"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    with _queue_cond:
+        stats['pending'] = len(_pending)
+        stats['in_flight'] = _in_flight
+
+    stats['workers'] = len(_workers)
+    return stats
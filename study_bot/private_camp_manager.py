@@ -1,6 +1,7 @@
 """
 إدارة المعسكرات من المحادثات الخاصة
-يحتوي على وظائف للتعامل مع إعدادات المعسكرات من المحادثة الخاصة بمشرف المجموعة
+يحتوي على وظائف للتعامل مع إعدادات المعسكرات من المحادثة الخاصة بمشرف المجموعة،
+وخطوات إنشاء المعسكر وإضافة المهام محفوظة في مخزن حالة المحادثات فتستمر بعد إعادة التشغيل
 """
 
 import json
@@ -8,14 +9,12 @@ import random
 import traceback
 from datetime import datetime, timedelta
 
-from study_bot.config import logger
+from study_bot.config import logger, get_local_time
 from study_bot.models import db
+from study_bot.conversation_state import ConversationRouter, end_conversation
 
-# ملف تخزين حالة الإعدادات المؤقتة
-_private_setup_states = {}
-
-# مخزن مؤقت لبيانات إنشاء المعسكر
-_camp_creation_data = {}
+# محادثة إنشاء المعسكرات وإضافة المهام
+camp_wizard = ConversationRouter('camp_wizard')
 
 def handle_admin_groups(user_id, chat_id, message_id=None):
     """إدارة المجموعات كمشرف"""
@@ -156,10 +155,10 @@ def handle_create_new_camp(user_id, chat_id):
         
         markup = {'inline_keyboard': keyboard}
         send_message(chat_id, message, markup)
-        
-        # تخزين حالة الإنشاء
-        _private_setup_states[user_id] = {'state': 'selecting_group_for_camp'}
-        
+
+        # بدء محادثة الإنشاء (اختيار المجموعة يتم بالأزرار)
+        camp_wizard.start(user_id, 'selecting_group_for_camp')
+
         return True
     except Exception as e:
         logger.error(f"خطأ في معالجة طلب إنشاء معسكر جديد: {e}")
@@ -167,19 +166,65 @@ def handle_create_new_camp(user_id, chat_id):
         return False
 
 
+def show_camp_management(camp, group, chat_id):
+    """عرض لوحة إدارة المعسكر مع إحصائياته والمهام القادمة"""
+    from study_bot.models import CampTask
+    from study_bot.bot import send_message
+
+    # إنشاء لوحة مفاتيح لإدارة المعسكر
+    keyboard = []
+    
+    # إضافة أزرار الإدارة
+    keyboard.append([{'text': '➕ إضافة مهمة جديدة', 'callback_data': f"add_task_to_camp:{camp.id}"}])
+    keyboard.append([{'text': '📊 عرض تقرير المعسكر', 'callback_data': f"view_camp_report:{camp.id}"}])
+    keyboard.append([{'text': '❌ إنهاء المعسكر', 'callback_data': f"end_camp:{camp.id}"}])
+    keyboard.append([{'text': '🔙 رجوع لقائمة المعسكرات', 'callback_data': 'back_to_camps'}])
+    
+    # إحصائيات المعسكر المجمعة
+    from study_bot.camp_analytics import get_camp_analytics
+    analytics = get_camp_analytics(camp.id)
+    
+    # إعداد الرسالة
+    message = f"""🏝️ <b>إدارة معسكر: {camp.name}</b>
+    
+<b>المجموعة:</b> {group.title}
+<b>تاريخ البدء:</b> {camp.start_date.strftime('%Y-%m-%d %H:%M')}
+<b>تاريخ الانتهاء:</b> {camp.end_date.strftime('%Y-%m-%d %H:%M')}
+<b>عدد المهام:</b> {analytics['total_tasks']} (المرسلة: {analytics['sent_tasks']})
+<b>عدد المشاركين:</b> {analytics['total_participants']}
+<b>نسبة الإكمال:</b> {analytics['completion_rate']}%
+"""
+    
+    # إضافة المهام القادمة (أول 5 مهام فقط)
+    upcoming_tasks = []
+    if analytics['upcoming_tasks']:
+        upcoming_tasks = CampTask.query.filter(
+            CampTask.camp_id == camp.id,
+            CampTask.is_sent == False,
+            CampTask.scheduled_time > get_local_time()
+        ).order_by(CampTask.scheduled_time).limit(5).all()
+    if upcoming_tasks:
+        message += "\n<b>المهام القادمة:</b>\n"
+        for i, task in enumerate(upcoming_tasks):
+            message += f"{i+1}. {task.title} ({task.scheduled_time.strftime('%Y-%m-%d %H:%M')})\n"
+    
+    # إرسال الرسالة مع لوحة المفاتيح
+    markup = {'inline_keyboard': keyboard}
+    send_message(chat_id, message, markup)
+
+
 def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_query_id):
     """معالجة الاستجابات للأزرار المتعلقة بالمعسكرات في المحادثة الخاصة"""
     try:
-        from study_bot.models import Group, CustomCamp, CampTask
+        from study_bot.models import Group, CustomCamp
         from study_bot.bot import send_message
         from study_bot.group_handlers import answer_callback_query
         
         # معالجة زر العودة للقائمة الرئيسية
         if callback_data == 'back_to_main':
-            # مسح حالة الإعداد
-            if user_id in _private_setup_states:
-                del _private_setup_states[user_id]
-            
+            # إنهاء أي محادثة جارية
+            end_conversation(user_id)
+
             # عرض القائمة الرئيسية
             from study_bot.bot import show_main_menu
             show_main_menu(chat_id)
@@ -202,12 +247,9 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
                 answer_callback_query(callback_query_id, "❌ يجب أن تكون مشرف المجموعة لإنشاء معسكر", True)
                 return False
             
-            # تخزين معرف المجموعة في بيانات الإنشاء
-            _camp_creation_data[user_id] = {'group_id': group_id}
-            
-            # تحديث حالة الإعداد
-            _private_setup_states[user_id] = {'state': 'entering_camp_name'}
-            
+            # حفظ المجموعة والانتقال لخطوة الاسم
+            camp_wizard.start(user_id, 'entering_camp_name', group_id=group_id)
+
             # إرسال رسالة إدخال اسم المعسكر
             message = f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
             
@@ -222,13 +264,9 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
         
         # معالجة إلغاء إنشاء المعسكر
         elif callback_data == 'cancel_camp_creation':
-            # مسح حالة الإعداد وبيانات الإنشاء
-            if user_id in _private_setup_states:
-                del _private_setup_states[user_id]
-            
-            if user_id in _camp_creation_data:
-                del _camp_creation_data[user_id]
-            
+            # إنهاء محادثة الإنشاء
+            end_conversation(user_id)
+
             # إرسال رسالة تأكيد الإلغاء
             message = """❌ <b>تم إلغاء إنشاء المعسكر</b>
             
@@ -259,38 +297,7 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
                 answer_callback_query(callback_query_id, "❌ يجب أن تكون مشرف المجموعة لإدارة المعسكر", True)
                 return False
             
-            # إنشاء لوحة مفاتيح لإدارة المعسكر
-            keyboard = []
-            
-            # إضافة أزرار الإدارة
-            keyboard.append([{'text': '➕ إضافة مهمة جديدة', 'callback_data': f"add_task_to_camp:{camp_id}"}])
-            keyboard.append([{'text': '📊 عرض تقرير المعسكر', 'callback_data': f"view_camp_report:{camp_id}"}])
-            keyboard.append([{'text': '❌ إنهاء المعسكر', 'callback_data': f"end_camp:{camp_id}"}])
-            keyboard.append([{'text': '🔙 رجوع لقائمة المعسكرات', 'callback_data': 'back_to_camps'}])
-            
-            # الحصول على مهام المعسكر
-            tasks = CampTask.query.filter_by(camp_id=camp.id).order_by(CampTask.scheduled_time).all()
-            
-            # إعداد الرسالة
-            message = f"""🏝️ <b>إدارة معسكر: {camp.name}</b>
-            
-<b>المجموعة:</b> {group.title}
-<b>تاريخ البدء:</b> {camp.start_date.strftime('%Y-%m-%d %H:%M')}
-<b>تاريخ الانتهاء:</b> {camp.end_date.strftime('%Y-%m-%d %H:%M')}
-<b>عدد المهام:</b> {len(tasks)}
-"""
-            
-            # إضافة المهام القادمة
-            now = datetime.utcnow()
-            upcoming_tasks = [task for task in tasks if task.scheduled_time > now and not task.is_sent]
-            if upcoming_tasks:
-                message += "\n<b>المهام القادمة:</b>\n"
-                for i, task in enumerate(upcoming_tasks[:5]):  # عرض أول 5 مهام فقط
-                    message += f"{i+1}. {task.title} ({task.scheduled_time.strftime('%Y-%m-%d %H:%M')})\n"
-            
-            # إرسال الرسالة مع لوحة المفاتيح
-            markup = {'inline_keyboard': keyboard}
-            send_message(chat_id, message, markup)
+            show_camp_management(camp, group, chat_id)
             answer_callback_query(callback_query_id, f"تم عرض إدارة معسكر {camp.name}")
             return True
         
@@ -322,12 +329,9 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
                 answer_callback_query(callback_query_id, "❌ يجب أن تكون مشرف المجموعة لإدارة المعسكر", True)
                 return False
             
-            # تخزين معرف المعسكر في بيانات الإنشاء
-            _camp_creation_data[user_id] = {'camp_id': camp_id}
-            
-            # تحديث حالة الإعداد
-            _private_setup_states[user_id] = {'state': 'entering_task_title'}
-            
+            # حفظ المعسكر والانتقال لخطوة العنوان
+            camp_wizard.start(user_id, 'entering_task_title', camp_id=camp_id)
+
             # إرسال رسالة إدخال عنوان المهمة
             message = f"""➕ <b>إضافة مهمة جديدة</b>
             
@@ -357,8 +361,8 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
                 return False
             
             # طلب تقرير المعسكر
-            from study_bot.camp_scheduler import send_camp_daily_report
-            result = send_camp_daily_report(camp_id)
+            from study_bot.custom_camps_handler import send_camp_report
+            result = send_camp_report(camp_id)
             
             if result:
                 answer_callback_query(callback_query_id, "✅ تم إرسال تقرير المعسكر للمجموعة", True)
@@ -450,177 +454,159 @@ def handle_private_camp_callbacks(callback_data, user_id, chat_id, callback_quer
         return False
 
 
-def handle_private_camp_message(message_text, user_id, chat_id):
-    """معالجة الرسائل المتعلقة بإعداد المعسكرات في المحادثة الخاصة"""
+
+
+def _parse_datetime(text, example, chat_id):
+    """قراءة تاريخ بالصيغة YYYY-MM-DD HH:MM أو إرسال رسالة خطأ وإرجاع None"""
+    from study_bot.bot import send_message
+
     try:
-        from study_bot.bot import send_message
-        
-        # التحقق من وجود حالة إعداد للمستخدم
-        if user_id not in _private_setup_states:
-            return False
-        
-        state = _private_setup_states[user_id]['state']
-        
-        # معالجة إدخال اسم المعسكر
-        if state == 'entering_camp_name':
-            # التحقق من صحة الاسم
-            camp_name = message_text.strip()
-            if not camp_name or len(camp_name) < 3:
-                send_message(chat_id, "❌ اسم المعسكر قصير جدًا. يجب أن يكون 3 أحرف على الأقل.")
-                return True
-            
-            # تخزين اسم المعسكر في بيانات الإنشاء
-            _camp_creation_data[user_id]['camp_name'] = camp_name
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_camp_description'
-            
-            # طلب وصف المعسكر
-            message = f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
-            
+        return datetime.strptime(text.strip(), "%Y-%m-%d %H:%M")
+    except ValueError:
+        send_message(chat_id, f"""❌ صيغة التاريخ غير صحيحة.
+
+يجب أن تكون الصيغة: YYYY-MM-DD HH:MM
+مثال: {example}""")
+        return None
+
+
+@camp_wizard.step('selecting_group_for_camp')
+def _select_group_for_camp(conversation, text, chat_id):
+    """رسالة نصية أثناء انتظار اختيار المجموعة من الأزرار"""
+    from study_bot.bot import send_message
+
+    send_message(chat_id, "👆 اختر المجموعة من الأزرار أعلاه، أو اضغط «إلغاء» لإلغاء إنشاء المعسكر.")
+
+
+@camp_wizard.step('entering_camp_name')
+def _enter_camp_name(conversation, text, chat_id):
+    """إدخال اسم المعسكر"""
+    from study_bot.bot import send_message
+
+    camp_name = text.strip()
+    if not camp_name or len(camp_name) < 3:
+        send_message(chat_id, "❌ اسم المعسكر قصير جدًا. يجب أن يكون 3 أحرف على الأقل.")
+        return
+
+    conversation.advance('entering_camp_description', camp_name=camp_name)
+
+    send_message(chat_id, f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
+
 الاسم: <b>{camp_name}</b>
 
 الخطوة 3: أدخل وصف المعسكر (مثال: معسكر مكثف لمراجعة مادة الرياضيات للاختبار النهائي):
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال وصف المعسكر
-        elif state == 'entering_camp_description':
-            # التحقق من صحة الوصف
-            camp_description = message_text.strip()
-            
-            # تخزين وصف المعسكر في بيانات الإنشاء
-            _camp_creation_data[user_id]['camp_description'] = camp_description
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_camp_start_date'
-            
-            # طلب تاريخ بدء المعسكر
-            message = f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
-            
-الاسم: <b>{_camp_creation_data[user_id]['camp_name']}</b>
+""")
+
+
+@camp_wizard.step('entering_camp_description')
+def _enter_camp_description(conversation, text, chat_id):
+    """إدخال وصف المعسكر"""
+    from study_bot.bot import send_message
+
+    camp_description = text.strip()
+    conversation.advance('entering_camp_start_date', camp_description=camp_description)
+
+    send_message(chat_id, f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
+
+الاسم: <b>{conversation.data['camp_name']}</b>
 الوصف: {camp_description}
 
 الخطوة 4: أدخل تاريخ بدء المعسكر بالصيغة التالية:
 YYYY-MM-DD HH:MM
 
 مثال: 2025-05-10 08:00
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال تاريخ بدء المعسكر
-        elif state == 'entering_camp_start_date':
-            # التحقق من صحة التاريخ
-            try:
-                start_date = datetime.strptime(message_text.strip(), "%Y-%m-%d %H:%M")
-            except ValueError:
-                send_message(chat_id, """❌ صيغة التاريخ غير صحيحة.
-                
-يجب أن تكون الصيغة: YYYY-MM-DD HH:MM
-مثال: 2025-05-10 08:00""")
-                return True
-            
-            # التحقق من أن التاريخ في المستقبل
-            if start_date <= datetime.utcnow():
-                send_message(chat_id, "❌ تاريخ البدء يجب أن يكون في المستقبل.")
-                return True
-            
-            # تخزين تاريخ البدء في بيانات الإنشاء
-            _camp_creation_data[user_id]['start_date'] = start_date
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_camp_end_date'
-            
-            # طلب تاريخ انتهاء المعسكر
-            message = f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
-            
-الاسم: <b>{_camp_creation_data[user_id]['camp_name']}</b>
+""")
+
+
+@camp_wizard.step('entering_camp_start_date')
+def _enter_camp_start_date(conversation, text, chat_id):
+    """إدخال تاريخ بدء المعسكر"""
+    from study_bot.bot import send_message
+
+    start_date = _parse_datetime(text, "2025-05-10 08:00", chat_id)
+    if start_date is None:
+        return
+
+    # تواريخ المعسكر بالتوقيت المحلي مثل باقي المواعيد
+    if start_date <= get_local_time():
+        send_message(chat_id, "❌ تاريخ البدء يجب أن يكون في المستقبل.")
+        return
+
+    conversation.advance('entering_camp_end_date', start_date=start_date)
+
+    send_message(chat_id, f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
+
+الاسم: <b>{conversation.data['camp_name']}</b>
 تاريخ البدء: {start_date.strftime('%Y-%m-%d %H:%M')}
 
 الخطوة 5: أدخل تاريخ انتهاء المعسكر بالصيغة التالية:
 YYYY-MM-DD HH:MM
 
 مثال: 2025-05-20 22:00
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال تاريخ انتهاء المعسكر
-        elif state == 'entering_camp_end_date':
-            # التحقق من صحة التاريخ
-            try:
-                end_date = datetime.strptime(message_text.strip(), "%Y-%m-%d %H:%M")
-            except ValueError:
-                send_message(chat_id, """❌ صيغة التاريخ غير صحيحة.
-                
-يجب أن تكون الصيغة: YYYY-MM-DD HH:MM
-مثال: 2025-05-20 22:00""")
-                return True
-            
-            # التحقق من أن تاريخ الانتهاء بعد تاريخ البدء
-            if end_date <= _camp_creation_data[user_id]['start_date']:
-                send_message(chat_id, "❌ تاريخ الانتهاء يجب أن يكون بعد تاريخ البدء.")
-                return True
-            
-            # تخزين تاريخ الانتهاء في بيانات الإنشاء
-            _camp_creation_data[user_id]['end_date'] = end_date
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_camp_max_participants'
-            
-            # طلب الحد الأقصى للمشاركين
-            message = f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
-            
-الاسم: <b>{_camp_creation_data[user_id]['camp_name']}</b>
-تاريخ البدء: {_camp_creation_data[user_id]['start_date'].strftime('%Y-%m-%d %H:%M')}
+""")
+
+
+@camp_wizard.step('entering_camp_end_date')
+def _enter_camp_end_date(conversation, text, chat_id):
+    """إدخال تاريخ انتهاء المعسكر"""
+    from study_bot.bot import send_message
+
+    end_date = _parse_datetime(text, "2025-05-20 22:00", chat_id)
+    if end_date is None:
+        return
+
+    start_date = conversation.data['start_date']
+    if end_date <= start_date:
+        send_message(chat_id, "❌ تاريخ الانتهاء يجب أن يكون بعد تاريخ البدء.")
+        return
+
+    conversation.advance('entering_camp_max_participants', end_date=end_date)
+
+    send_message(chat_id, f"""🏝️ <b>إنشاء معسكر دراسي جديد</b>
+
+الاسم: <b>{conversation.data['camp_name']}</b>
+تاريخ البدء: {start_date.strftime('%Y-%m-%d %H:%M')}
 تاريخ الانتهاء: {end_date.strftime('%Y-%m-%d %H:%M')}
 
 الخطوة 6: أدخل الحد الأقصى لعدد المشاركين (أدخل 0 للعدد غير المحدود):
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال الحد الأقصى للمشاركين
-        elif state == 'entering_camp_max_participants':
-            # التحقق من صحة العدد
-            try:
-                max_participants = int(message_text.strip())
-                if max_participants < 0:
-                    max_participants = 0
-            except ValueError:
-                send_message(chat_id, "❌ الرجاء إدخال رقم صحيح.")
-                return True
-            
-            # تخزين الحد الأقصى للمشاركين في بيانات الإنشاء
-            _camp_creation_data[user_id]['max_participants'] = max_participants
-            
-            # إنشاء المعسكر
-            from study_bot.custom_camps import create_custom_camp
-            
-            camp = create_custom_camp(
-                _camp_creation_data[user_id]['group_id'],
-                user_id,
-                _camp_creation_data[user_id]['camp_name'],
-                _camp_creation_data[user_id]['camp_description'],
-                _camp_creation_data[user_id]['start_date'],
-                _camp_creation_data[user_id]['end_date'],
-                max_participants
-            )
-            
-            # تنظيف حالة الإعداد وبيانات الإنشاء
-            del _private_setup_states[user_id]
-            del _camp_creation_data[user_id]
-            
-            if camp:
-                # إرسال رسالة تأكيد الإنشاء
-                message = f"""✅ <b>تم إنشاء المعسكر بنجاح</b>
-                
+""")
+
+
+@camp_wizard.step('entering_camp_max_participants')
+def _enter_camp_max_participants(conversation, text, chat_id):
+    """إدخال الحد الأقصى للمشاركين وإنشاء المعسكر"""
+    from study_bot.bot import send_message
+    from study_bot.custom_camps import create_custom_camp
+
+    try:
+        max_participants = max(0, int(text.strip()))
+    except ValueError:
+        send_message(chat_id, "❌ الرجاء إدخال رقم صحيح.")
+        return
+
+    data = conversation.data
+    camp = create_custom_camp(
+        data['group_id'],
+        conversation.user_id,
+        data['camp_name'],
+        data['camp_description'],
+        data['start_date'],
+        data['end_date'],
+        max_participants
+    )
+
+    # تنتهي المحادثة سواء نجح الإنشاء أو فشل
+    conversation.finish()
+
+    if not camp:
+        send_message(chat_id, """❌ <b>فشل إنشاء المعسكر</b>
+
+حدث خطأ أثناء إنشاء المعسكر. الرجاء المحاولة مرة أخرى.
+""")
+        return
+
+    send_message(chat_id, f"""✅ <b>تم إنشاء المعسكر بنجاح</b>
+
 تم إنشاء معسكر "{camp.name}" بنجاح.
 
 لإضافة مهام للمعسكر، استخدم الأمر /addtask في المجموعة بالصيغة التالية:
@@ -628,218 +614,160 @@ YYYY-MM-DD HH:MM
 
 مثال:
 /addtask {camp.id} | مذاكرة الفصل الأول | مراجعة الفصل الأول من كتاب الرياضيات | 2025-05-10 16:30 | 5 | 30
-"""
-                
-                send_message(chat_id, message)
-                
-                # العودة لقائمة إدارة المعسكرات
-                handle_admin_camps(user_id, chat_id)
-            else:
-                # إرسال رسالة فشل الإنشاء
-                message = """❌ <b>فشل إنشاء المعسكر</b>
-                
-حدث خطأ أثناء إنشاء المعسكر. الرجاء المحاولة مرة أخرى.
-"""
-                
-                send_message(chat_id, message)
-            
-            return True
-        
-        # معالجة إدخال عنوان المهمة
-        elif state == 'entering_task_title':
-            # التحقق من صحة العنوان
-            task_title = message_text.strip()
-            if not task_title or len(task_title) < 3:
-                send_message(chat_id, "❌ عنوان المهمة قصير جدًا. يجب أن يكون 3 أحرف على الأقل.")
-                return True
-            
-            # تخزين عنوان المهمة في بيانات الإنشاء
-            _camp_creation_data[user_id]['task_title'] = task_title
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_task_description'
-            
-            # طلب وصف المهمة
-            message = f"""➕ <b>إضافة مهمة جديدة</b>
-            
+""")
+
+    # العودة لقائمة إدارة المعسكرات
+    handle_admin_camps(conversation.user_id, chat_id)
+
+
+@camp_wizard.step('entering_task_title')
+def _enter_task_title(conversation, text, chat_id):
+    """إدخال عنوان المهمة"""
+    from study_bot.bot import send_message
+
+    task_title = text.strip()
+    if not task_title or len(task_title) < 3:
+        send_message(chat_id, "❌ عنوان المهمة قصير جدًا. يجب أن يكون 3 أحرف على الأقل.")
+        return
+
+    conversation.advance('entering_task_description', task_title=task_title)
+
+    send_message(chat_id, f"""➕ <b>إضافة مهمة جديدة</b>
+
 عنوان المهمة: <b>{task_title}</b>
 
 الخطوة 2: أدخل وصف المهمة (مثال: قراءة وفهم النظريات الأساسية في الفصل الأول):
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال وصف المهمة
-        elif state == 'entering_task_description':
-            # التحقق من صحة الوصف
-            task_description = message_text.strip()
-            
-            # تخزين وصف المهمة في بيانات الإنشاء
-            _camp_creation_data[user_id]['task_description'] = task_description
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_task_time'
-            
-            # طلب وقت المهمة
-            message = f"""➕ <b>إضافة مهمة جديدة</b>
-            
-عنوان المهمة: <b>{_camp_creation_data[user_id]['task_title']}</b>
+""")
+
+
+@camp_wizard.step('entering_task_description')
+def _enter_task_description(conversation, text, chat_id):
+    """إدخال وصف المهمة"""
+    from study_bot.bot import send_message
+
+    task_description = text.strip()
+    conversation.advance('entering_task_time', task_description=task_description)
+
+    send_message(chat_id, f"""➕ <b>إضافة مهمة جديدة</b>
+
+عنوان المهمة: <b>{conversation.data['task_title']}</b>
 الوصف: {task_description}
 
 الخطوة 3: أدخل وقت المهمة بالصيغة التالية:
 YYYY-MM-DD HH:MM
 
 مثال: 2025-05-10 16:30
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال وقت المهمة
-        elif state == 'entering_task_time':
-            # التحقق من صحة التاريخ
-            try:
-                task_time = datetime.strptime(message_text.strip(), "%Y-%m-%d %H:%M")
-            except ValueError:
-                send_message(chat_id, """❌ صيغة التاريخ غير صحيحة.
-                
-يجب أن تكون الصيغة: YYYY-MM-DD HH:MM
-مثال: 2025-05-10 16:30""")
-                return True
-            
-            # التحقق من المعسكر
-            from study_bot.models import CustomCamp
-            
-            camp = CustomCamp.query.get(_camp_creation_data[user_id]['camp_id'])
-            if not camp or not camp.is_active:
-                send_message(chat_id, "❌ المعسكر غير موجود أو غير نشط.")
-                del _private_setup_states[user_id]
-                return True
-            
-            # التحقق من أن وقت المهمة يقع ضمن فترة المعسكر
-            if task_time < camp.start_date or task_time > camp.end_date:
-                send_message(chat_id, f"❌ وقت المهمة يجب أن يكون بين {camp.start_date.strftime('%Y-%m-%d %H:%M')} و {camp.end_date.strftime('%Y-%m-%d %H:%M')}.")
-                return True
-            
-            # تخزين وقت المهمة في بيانات الإنشاء
-            _camp_creation_data[user_id]['task_time'] = task_time
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_task_points'
-            
-            # طلب نقاط المهمة
-            message = f"""➕ <b>إضافة مهمة جديدة</b>
-            
-عنوان المهمة: <b>{_camp_creation_data[user_id]['task_title']}</b>
+""")
+
+
+@camp_wizard.step('entering_task_time')
+def _enter_task_time(conversation, text, chat_id):
+    """إدخال وقت المهمة والتحقق من وقوعه ضمن فترة المعسكر"""
+    from study_bot.models import CustomCamp
+    from study_bot.bot import send_message
+
+    task_time = _parse_datetime(text, "2025-05-10 16:30", chat_id)
+    if task_time is None:
+        return
+
+    camp = CustomCamp.query.get(conversation.data['camp_id'])
+    if not camp or not camp.is_active:
+        send_message(chat_id, "❌ المعسكر غير موجود أو غير نشط.")
+        conversation.finish()
+        return
+
+    if task_time < camp.start_date or task_time > camp.end_date:
+        send_message(chat_id, f"❌ وقت المهمة يجب أن يكون بين {camp.start_date.strftime('%Y-%m-%d %H:%M')} و {camp.end_date.strftime('%Y-%m-%d %H:%M')}.")
+        return
+
+    conversation.advance('entering_task_points', task_time=task_time)
+
+    send_message(chat_id, f"""➕ <b>إضافة مهمة جديدة</b>
+
+عنوان المهمة: <b>{conversation.data['task_title']}</b>
 وقت المهمة: {task_time.strftime('%Y-%m-%d %H:%M')}
 
 الخطوة 4: أدخل عدد النقاط للمهمة (رقم صحيح بين 1 و 10):
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال نقاط المهمة
-        elif state == 'entering_task_points':
-            # التحقق من صحة النقاط
-            try:
-                task_points = int(message_text.strip())
-                if task_points < 1:
-                    task_points = 1
-                elif task_points > 10:
-                    task_points = 10
-            except ValueError:
-                send_message(chat_id, "❌ الرجاء إدخال رقم صحيح بين 1 و 10.")
-                return True
-            
-            # تخزين نقاط المهمة في بيانات الإنشاء
-            _camp_creation_data[user_id]['task_points'] = task_points
-            
-            # تحديث الحالة
-            _private_setup_states[user_id]['state'] = 'entering_task_deadline'
-            
-            # طلب مهلة المهمة
-            message = f"""➕ <b>إضافة مهمة جديدة</b>
-            
-عنوان المهمة: <b>{_camp_creation_data[user_id]['task_title']}</b>
-وقت المهمة: {_camp_creation_data[user_id]['task_time'].strftime('%Y-%m-%d %H:%M')}
+""")
+
+
+@camp_wizard.step('entering_task_points')
+def _enter_task_points(conversation, text, chat_id):
+    """إدخال نقاط المهمة"""
+    from study_bot.bot import send_message
+
+    try:
+        task_points = min(10, max(1, int(text.strip())))
+    except ValueError:
+        send_message(chat_id, "❌ الرجاء إدخال رقم صحيح بين 1 و 10.")
+        return
+
+    conversation.advance('entering_task_deadline', task_points=task_points)
+
+    send_message(chat_id, f"""➕ <b>إضافة مهمة جديدة</b>
+
+عنوان المهمة: <b>{conversation.data['task_title']}</b>
+وقت المهمة: {conversation.data['task_time'].strftime('%Y-%m-%d %H:%M')}
 النقاط: {task_points}
 
 الخطوة 5: أدخل مهلة إكمال المهمة بالدقائق (مثال: 30):
-"""
-            
-            send_message(chat_id, message)
-            return True
-        
-        # معالجة إدخال مهلة المهمة
-        elif state == 'entering_task_deadline':
-            # التحقق من صحة المهلة
-            try:
-                task_deadline = int(message_text.strip())
-                if task_deadline < 1:
-                    task_deadline = 1
-            except ValueError:
-                send_message(chat_id, "❌ الرجاء إدخال رقم صحيح أكبر من 0.")
-                return True
-            
-            # تخزين مهلة المهمة في بيانات الإنشاء
-            _camp_creation_data[user_id]['task_deadline'] = task_deadline
-            
-            # إضافة المهمة للمعسكر
-            from study_bot.custom_camps import add_camp_task
-            
-            task = add_camp_task(
-                _camp_creation_data[user_id]['camp_id'],
-                user_id,
-                _camp_creation_data[user_id]['task_title'],
-                _camp_creation_data[user_id]['task_description'],
-                _camp_creation_data[user_id]['task_time'],
-                _camp_creation_data[user_id]['task_points'],
-                task_deadline
-            )
-            
-            # تنظيف حالة الإعداد وبيانات الإنشاء
-            del _private_setup_states[user_id]
-            
-            if task:
-                # إرسال رسالة تأكيد الإضافة
-                message = f"""✅ <b>تمت إضافة المهمة بنجاح</b>
-                
+""")
+
+
+@camp_wizard.step('entering_task_deadline')
+def _enter_task_deadline(conversation, text, chat_id):
+    """إدخال مهلة المهمة وإضافتها للمعسكر"""
+    from study_bot.models import Group, CustomCamp
+    from study_bot.bot import send_message
+    from study_bot.custom_camps import add_camp_task
+
+    try:
+        task_deadline = max(1, int(text.strip()))
+    except ValueError:
+        send_message(chat_id, "❌ الرجاء إدخال رقم صحيح أكبر من 0.")
+        return
+
+    data = conversation.data
+    task = add_camp_task(
+        data['camp_id'],
+        conversation.user_id,
+        data['task_title'],
+        data['task_description'],
+        data['task_time'],
+        data['task_points'],
+        task_deadline
+    )
+
+    conversation.finish()
+
+    if not task:
+        send_message(chat_id, """❌ <b>فشل إضافة المهمة</b>
+
+حدث خطأ أثناء إضافة المهمة. الرجاء المحاولة مرة أخرى.
+""")
+        return
+
+    send_message(chat_id, f"""✅ <b>تمت إضافة المهمة بنجاح</b>
+
 تمت إضافة مهمة "{task.title}" بنجاح.
 
 سيتم إرسال المهمة تلقائيًا في الوقت المحدد: {task.scheduled_time.strftime('%Y-%m-%d %H:%M')}
-"""
-                
-                send_message(chat_id, message)
-                
-                # عرض قائمة إدارة المعسكر مرة أخرى
-                from study_bot.group_handlers import handle_group_callback
-                
-                # إعداد بيانات لاستدعاء معالج الاستجابة
-                data = {
-                    'chat_id': chat_id,
-                    'user_id': user_id,
-                    'callback_data': f"manage_camp:{_camp_creation_data[user_id]['camp_id']}",
-                    'callback_query_id': None
-                }
-                
-                handle_group_callback(data['callback_data'], data)
-            else:
-                # إرسال رسالة فشل الإضافة
-                message = """❌ <b>فشل إضافة المهمة</b>
-                
-حدث خطأ أثناء إضافة المهمة. الرجاء المحاولة مرة أخرى.
-"""
-                
-                send_message(chat_id, message)
-            
-            return True
-        
-        return False
+""")
+
+    # عرض قائمة إدارة المعسكر مرة أخرى
+    camp = CustomCamp.query.get(data['camp_id'])
+    group = Group.query.get(camp.group_id) if camp else None
+    if camp and group:
+        show_camp_management(camp, group, chat_id)
+
+
+def handle_private_camp_message(message_text, user_id, chat_id):
+    """معالجة الرسائل المتعلقة بإعداد المعسكرات في المحادثة الخاصة، وإرجاع False إذا لم تكن للمستخدم محادثة جارية"""
+    try:
+        return camp_wizard.dispatch(user_id, message_text, chat_id=chat_id)
     except Exception as e:
         logger.error(f"خطأ في معالجة الرسائل المتعلقة بإعداد المعسكرات في المحادثة الخاصة: {e}")
         logger.error(traceback.format_exc())
         from study_bot.bot import send_message
         send_message(chat_id, "❌ حدث خطأ أثناء معالجة الرسالة. الرجاء المحاولة مرة أخرى.")
-        return True
\ No newline at end of file
+        return True
@@ -0,0 +1,213 @@
+"""
+وحدة موزع التذكيرات
+تحتوي على موزع يحسب موعد التذكير التالي مسبقًا وينتظر حتى أقربها بدلاً من الفحص الدوري كل عدة دقائق
+"""
+
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+from study_bot.config import logger, SCHEDULER_TIMEZONE, REMINDER_CATCHUP_MINUTES
+
+# مفتاح العلامة المائية في جدول إحصائيات النظام (وقت آخر تذكير تم إرساله)
+WATERMARK_KEY = 'reminder_watermark'
+MAX_SLEEP_SECONDS = 60  # أقصى مدة انتظار قبل إعادة فحص الوقت (لتجنب انحراف الساعة)
+
+# المتغيرات العامة
+_dispatcher_thread = None
+_dispatcher_running = False
+_wakeup_event = threading.Event()
+_stats = {
+    'slots_fired': 0,
+    'slots_skipped': 0,
+    'tasks_enqueued': 0,
+    'next_slot': None,
+    'watermark': None
+}
+
+
+def get_reminder_slots():
+    """الحصول على أوقات التذكيرات المميزة لكل نوع جدول"""
+    from study_bot.group_tasks import MORNING_SCHEDULE, EVENING_SCHEDULE
+
+    slots = set()
+    for item in MORNING_SCHEDULE:
+        slots.add(('morning', item[0]))
+    for item in EVENING_SCHEDULE:
+        slots.add(('evening', item[0]))
+    return sorted(slots)
+
+
+def get_slot_datetime(day, time_str):
+    """تحويل يوم ووقت بتنسيق HH:MM إلى وقت بالمنطقة الزمنية المحددة"""
+    hour, minute = map(int, time_str.split(':'))
+    naive = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+    return SCHEDULER_TIMEZONE.localize(naive, is_dst=False)
+
+
+def get_next_fire_time(time_str, after):
+    """حساب أول موعد للتذكير بعد الوقت المحدد"""
+    after = after.astimezone(SCHEDULER_TIMEZONE)
+    fire_at = get_slot_datetime(after.date(), time_str)
+    if fire_at <= after:
+        fire_at = get_slot_datetime(after.date() + timedelta(days=1), time_str)
+    return fire_at
+
+
+def build_heap(after):
+    """بناء كومة مواعيد التذكيرات التالية بعد الوقت المحدد"""
+    heap = [
+        (get_next_fire_time(time_str, after), schedule_type, time_str)
+        for schedule_type, time_str in get_reminder_slots()
+    ]
+    heapq.heapify(heap)
+    return heap
+
+
+def load_watermark():
+    """تحميل وقت آخر تذكير تم إرساله من قاعدة البيانات"""
+    from study_bot.models import SystemStats
+
+    try:
+        value = SystemStats.get_value(WATERMARK_KEY)
+        if value:
+            return datetime.fromisoformat(str(value))
+    except Exception as e:
+        logger.error(f"خطأ في تحميل العلامة المائية للتذكيرات: {e}")
+    return None
+
+
+def save_watermark(fire_at):
+    """حفظ وقت آخر تذكير تم إرساله حتى لا يتكرر أو يفوت بعد إعادة التشغيل"""
+    from study_bot.models import db, SystemStats
+
+    try:
+        SystemStats.set_value(WATERMARK_KEY, fire_at.isoformat())
+        _stats['watermark'] = fire_at.isoformat()
+    except Exception as e:
+        logger.error(f"خطأ في حفظ العلامة المائية للتذكيرات: {e}")
+        db.session.rollback()
+
+
+def fire_slot(schedule_type, time_str):
+    """إرسال تذكيرات موعد واحد لكل المجموعات المفعل لها الجدول"""
+    from study_bot.group_tasks import send_morning_schedule_tasks, send_evening_schedule_tasks
+
+    if schedule_type == 'morning':
+        count = send_morning_schedule_tasks(time_str)
+    else:
+        count = send_evening_schedule_tasks(time_str)
+
+    _stats['slots_fired'] += 1
+    _stats['tasks_enqueued'] += count or 0
+    return count
+
+
+def _now():
+    """الوقت الحالي بالمنطقة الزمنية المحددة"""
+    # datetime.now مع المنطقة الزمنية لا يفشل عند تغيير التوقيت الصيفي، بخلاف localize(..., is_dst=None)
+    # الذي يرفع خطأ في الساعة غير الموجودة أو المكررة
+    return datetime.now(SCHEDULER_TIMEZONE)
+
+
+def dispatcher_thread_func(app):
+    """دالة سلسلة موزع التذكيرات"""
+    global _dispatcher_running
+
+    with app.app_context():
+        from study_bot.models import db
+
+        try:
+            now = _now()
+
+            # البدء من العلامة المائية مع تجاهل المواعيد الأقدم من فترة السماح
+            watermark = load_watermark()
+            catchup_start = now - timedelta(minutes=REMINDER_CATCHUP_MINUTES)
+            if watermark is None:
+                save_watermark(now)
+                watermark = now
+            elif watermark < catchup_start:
+                logger.warning(f"تم تجاهل التذكيرات الفائتة بين {watermark} و {catchup_start}")
+                watermark = catchup_start
+
+            heap = build_heap(watermark)
+            logger.info(f"بدء موزع التذكيرات مع {len(heap)} موعد")
+
+            while _dispatcher_running and heap:
+                # خطأ في دورة واحدة لا يوقف الموزع، ويعاد المحاولة بعد فترة الانتظار
+                try:
+                    fire_at, schedule_type, time_str = heap[0]
+                    _stats['next_slot'] = fire_at.isoformat()
+
+                    # الانتظار حتى أقرب موعد
+                    delay = (fire_at - _now()).total_seconds()
+                    if delay > 0:
+                        _wakeup_event.wait(min(delay, MAX_SLEEP_SECONDS))
+                        _wakeup_event.clear()
+                        continue
+
+                    heapq.heappop(heap)
+
+                    # جدولة الموعد نفسه في اليوم التالي قبل الإرسال حتى لا يخرج من الكومة إذا فشل
+                    heapq.heappush(heap, (get_next_fire_time(time_str, fire_at), schedule_type, time_str))
+
+                    # حفظ العلامة المائية قبل الإرسال حتى لا يتكرر الموعد إذا توقفت العملية أثناءه
+                    save_watermark(fire_at)
+
+                    # تجاهل المواعيد التي تأخرت أكثر من فترة السماح (مثل توقف طويل للعملية)
+                    if (_now() - fire_at).total_seconds() > REMINDER_CATCHUP_MINUTES * 60:
+                        _stats['slots_skipped'] += 1
+                        logger.warning(f"تم تجاهل تذكير {schedule_type} للوقت {time_str} لتأخره")
+                    else:
+                        count = fire_slot(schedule_type, time_str)
+                        logger.info(f"تم إرسال تذكير {schedule_type} للوقت {time_str} إلى {count} مجموعة")
+                except Exception as e:
+                    logger.error(f"خطأ في دورة موزع التذكيرات: {e}")
+                    db.session.rollback()
+                    _wakeup_event.wait(MAX_SLEEP_SECONDS)
+                    _wakeup_event.clear()
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"حدث خطأ في سلسلة موزع التذكيرات: {e}")
+        finally:
+            _dispatcher_running = False
+            logger.info("تم إنهاء موزع التذكيرات")
+
+
+def init_reminder_dispatcher(app):
+    """تهيئة موزع التذكيرات وبدء سلسلته"""
+    global _dispatcher_thread, _dispatcher_running
+
+    if _dispatcher_running or _dispatcher_thread and _dispatcher_thread.is_alive():
+        logger.warning("موزع التذكيرات يعمل بالفعل")
+        return _dispatcher_thread
+
+    _dispatcher_running = True
+    _wakeup_event.clear()
+    _dispatcher_thread = threading.Thread(target=dispatcher_thread_func, args=(app,))
+    _dispatcher_thread.daemon = True
+    _dispatcher_thread.start()
+
+    return _dispatcher_thread
+
+
+def shutdown_reminder_dispatcher():
+    """إيقاف موزع التذكيرات"""
+    global _dispatcher_running
+
+    if not _dispatcher_running:
+        return False
+
+    _dispatcher_running = False
+    _wakeup_event.set()
+    if _dispatcher_thread:
+        _dispatcher_thread.join(timeout=5)
+    return True
+
+
+def get_reminder_dispatcher_stats():
+    """الحصول على إحصائيات موزع التذكيرات"""
+    stats = dict(_stats)
+    stats['running'] = _dispatcher_running
+    return stats
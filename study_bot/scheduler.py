@@ -16,9 +16,14 @@ import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import update, delete, select, case, or_
 
-from study_bot.config import logger, get_current_time, get_timezone_object
+from study_bot.config import (
+    logger, get_current_time, get_timezone_object,
+    ACTIVITY_LOG_RETENTION_DAYS, ROLLOVER_DELETE_CHUNK_SIZE
+)
 from study_bot.models import db, User, Group, GroupScheduleTracker, UserActivityLog, SystemStats
+from study_bot.identity_cache import invalidate_all_users
 from study_bot.bot import send_message
 from study_bot.scheduler_group_tasks import (
     schedule_group_morning_message,
@@ -37,6 +42,9 @@ _scheduler_running = False
 # استخدام وظيفة get_timezone_object بدلاً من تعريف متغير جديد
 # تجنب استخدام zoneinfo
 
+# مفتاح آخر يوم تم فيه تحديث سلاسل الإنجاز
+ROLLOVER_MARKER_KEY = 'streak_rollover_date'
+
 # جدول المهام والتكرار
 SCHEDULER_TASKS = [
     {
@@ -63,6 +71,12 @@ SCHEDULER_TASKS = [
         'trigger': 'interval',
         'minutes': 30
     },
+    {
+        'id': 'purge_conversation_states',
+        'func': lambda: purge_conversation_states(),
+        'trigger': 'interval',
+        'minutes': 30
+    },
     {
         'id': 'reset_daily_stats',
         'func': lambda: reset_daily_stats(),
@@ -72,6 +86,11 @@ SCHEDULER_TASKS = [
     }
 ]
 
+def purge_conversation_states():
+    """حذف محادثات إنشاء المعسكرات المتروكة بعد انتهاء صلاحيتها"""
+    from study_bot.conversation_state import purge_expired_conversations
+    return purge_expired_conversations()
+
 def update_system_stats():
     """تحديث إحصائيات النظام"""
     try:
@@ -107,38 +126,87 @@ def update_system_stats():
         return False
 
 
+def _rollover_streaks(today, now):
+    """تحديث سلاسل الإنجاز لجميع المستخدمين في استعلام واحد"""
+    # من كان آخر تحديث لسلسلته بالأمس تزيد سلسلته، ومن كان قبل ذلك تعاد سلسلته للصفر،
+    # ولا يلمس من حدث اليوم أو من أعيدت سلسلته من قبل، فإعادة التشغيل في نفس اليوم لا تغير شيئًا
+    yesterday_start = datetime.combine(today - timedelta(days=1), datetime.min.time())
+    today_start = datetime.combine(today, datetime.min.time())
+    continued = User.last_streak_update >= yesterday_start
+    
+    return db.session.execute(
+        update(User)
+        .where(
+            User.is_active == True,
+            User.last_streak_update < today_start,
+            or_(continued, User.streak_days != 0, User.streak_start_date.isnot(None))
+        )
+        .values(
+            streak_days=case((continued, User.streak_days + 1), else_=0),
+            streak_start_date=case((continued, User.streak_start_date), else_=None),
+            last_streak_update=case((continued, now), else_=User.last_streak_update)
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _purge_activity_logs(cutoff):
+    """حذف سجلات النشاط الأقدم من مدة الاحتفاظ على دفعات، كل دفعة في معاملة قصيرة"""
+    deleted = 0
+    while True:
+        chunk = select(UserActivityLog.id).where(UserActivityLog.timestamp < cutoff).limit(ROLLOVER_DELETE_CHUNK_SIZE)
+        count = db.session.execute(
+            delete(UserActivityLog).where(UserActivityLog.id.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        
+        deleted += count
+        if count < ROLLOVER_DELETE_CHUNK_SIZE:
+            return deleted
+
+
 def reset_daily_stats():
-    """إعادة تعيين الإحصائيات اليومية"""
+    """إعادة تعيين الإحصائيات اليومية مرة واحدة لكل يوم، ويمكن إعادة تشغيلها بأمان بعد توقف مفاجئ"""
     try:
-        today = get_current_time().date()
-        yesterday = today - timedelta(days=1)
+        now = get_current_time()
+        today = now.date()
         
-        # إعادة تعيين سجلات النشاط التي تزيد عن 30 يوماً
-        old_activity_logs = UserActivityLog.query.filter(UserActivityLog.date < (today - timedelta(days=30))).all()
-        for activity in old_activity_logs:
-            db.session.delete(activity)
+        # حذف سجلات النشاط الأقدم من مدة الاحتفاظ (الحذف نفسه لا يتكرر أثره عند إعادة التشغيل)
+        cutoff = datetime.combine(today - timedelta(days=ACTIVITY_LOG_RETENTION_DAYS), datetime.min.time())
+        deleted = _purge_activity_logs(cutoff)
         
-        # تحديث سلاسل إنجاز المستخدمين
-        users = User.query.filter_by(is_active=True).all()
-        for user in users:
-            # تحقق من آخر تحديث للسلسلة
-            if user.last_streak_update:
-                last_update = user.last_streak_update.date()
-                
-                # إذا كان آخر تحديث بالأمس، زيادة السلسلة
-                if last_update == yesterday:
-                    user.streak_days += 1
-                    user.last_streak_update = get_current_time()
-                # إذا كان آخر تحديث قبل الأمس، إعادة تعيين السلسلة
-                elif last_update < yesterday:
-                    user.streak_days = 0
-                    user.streak_start_date = None
-            
+        # نتائج ترتيب المجموعات للأيام والأسابيع المنتهية
+        from study_bot.group_leaderboard import compact_group_leaderboards
+        compact_group_leaderboards(today)
+        
+        # قفل علامة آخر يوم تم تحديثه حتى لا تحدث عمليتان السلاسل معًا
+        marker = SystemStats.query.filter_by(key=ROLLOVER_MARKER_KEY).with_for_update().first()
+        if marker and marker.value == today.isoformat():
+            db.session.rollback()
+            logger.info(f"تم تحديث سلاسل الإنجاز لليوم {today} من قبل، حذف {deleted} سجل نشاط قديم")
+            return True
+        
+        # تحديث السلاسل وحفظ العلامة في نفس المعاملة، فإما أن يحفظا معًا أو لا يحفظ أي منهما
+        started = time.monotonic()
+        updated = _rollover_streaks(today, now)
+        if marker:
+            marker.value = today.isoformat()
+        else:
+            db.session.add(SystemStats(key=ROLLOVER_MARKER_KEY, value=today.isoformat()))
         db.session.commit()
-        logger.info(f"تم إعادة تعيين الإحصائيات اليومية")
+        
+        # التحديث الجماعي لا يمر بأحداث الجلسة
+        invalidate_all_users()
+        
+        logger.info(
+            f"تم إعادة تعيين الإحصائيات اليومية: تحديث {updated} سلسلة في "
+            f"{time.monotonic() - started:.2f} ثانية وحذف {deleted} سجل نشاط قديم"
+        )
         return True
     except Exception as e:
         logger.error(f"خطأ في إعادة تعيين الإحصائيات اليومية: {e}")
+        db.session.rollback()
         return False
 
 
@@ -202,6 +270,14 @@ def scheduler_thread_func(app):
             # التحقق من مهام المجموعات الصباحية والمسائية والمعسكرات
             reset_group_daily_stats()
             
+            # بدء موزع تذكيرات الجداول الصباحية والمسائية
+            from study_bot.reminder_dispatcher import init_reminder_dispatcher
+            init_reminder_dispatcher(app)
+            
+            # بدء موزع مهام المعسكرات
+            from study_bot.camp_task_dispatcher import init_camp_task_dispatcher
+            init_camp_task_dispatcher(app)
+            
             # الانتظار حتى يتم إيقاف المجدول
             while _scheduler_running:
                 time.sleep(1)
@@ -226,6 +302,12 @@ def shutdown_scheduler():
     logger.info("إيقاف المجدول")
     _scheduler_running = False
     
+    from study_bot.reminder_dispatcher import shutdown_reminder_dispatcher
+    shutdown_reminder_dispatcher()
+    
+    from study_bot.camp_task_dispatcher import shutdown_camp_task_dispatcher
+    shutdown_camp_task_dispatcher()
+    
     if _scheduler and _scheduler.running:
         _scheduler.shutdown()
     
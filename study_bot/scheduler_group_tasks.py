@@ -8,11 +8,10 @@ from datetime import datetime, timedelta
 import random
 
 from study_bot.config import logger, get_current_time
-from study_bot.models import db, User, Group
+from study_bot.models import db, User, Group, iter_rows
 from study_bot.group_tasks import (
     send_group_morning_message, send_group_evening_message, send_motivation_to_group,
-    send_task_by_type, send_scheduled_task, check_group_schedule_tasks,
-    send_morning_schedule_tasks, send_evening_schedule_tasks
+    send_task_by_type, send_scheduled_task, check_group_schedule_tasks
 )
 
 
@@ -25,7 +24,9 @@ def schedule_group_morning_message():
         # تحقق من الوقت المناسب لإرسال الجدول الصباحي (من 5 إلى 7 صباحاً)
         if 5 <= hour <= 7:
             # الحصول على مجموعات نشطة بجدول صباحي
-            active_groups = Group.query.filter_by(is_active=True, morning_schedule_enabled=True).all()
+            active_groups = iter_rows(
+                Group.telegram_id, where=[Group.is_active == True, Group.morning_schedule_enabled == True]
+            )
             
             sent_count = 0
             for group in active_groups:
@@ -51,7 +52,9 @@ def schedule_group_evening_message():
         # تحقق من الوقت المناسب لإرسال الجدول المسائي (من 17 إلى 18 مساءً)
         if 17 <= hour <= 18:
             # الحصول على مجموعات نشطة بجدول مسائي
-            active_groups = Group.query.filter_by(is_active=True, evening_schedule_enabled=True).all()
+            active_groups = iter_rows(
+                Group.telegram_id, where=[Group.is_active == True, Group.evening_schedule_enabled == True]
+            )
             
             sent_count = 0
             for group in active_groups:
@@ -76,17 +79,28 @@ def send_group_motivation_messages():
         # تسجيل الوقت للتشخيص
         logger.info(f"تشغيل مجدول إرسال رسائل تحفيزية للمجموعات في {now.strftime('%H:%M:%S')}")
         
-        # الحصول على مجموعات نشطة مع تفعيل الرسائل التحفيزية
-        active_groups = Group.query.filter_by(is_active=True, motivation_enabled=True).all()
-        logger.info(f"تم العثور على {len(active_groups)} مجموعة نشطة مع تفعيل الرسائل التحفيزية")
-        
         # اختيار المجموعات بشكل عشوائي لتجنب إرسال رسائل لجميع المجموعات في نفس الوقت
-        # سنختار 25% من المجموعات لإرسال رسائل تحفيزية إليها في كل ساعة
+        # يتم اختيار كل مجموعة باحتمال 25% أثناء قراءتها على دفعات، فلا تحمل جميع المجموعات في الذاكرة
         target_percentage = 0.25
         
+        groups_count = 0
+        selected_groups = []
+        fallback_group = None
+        for group in iter_rows(
+            Group.telegram_id, Group.title, where=[Group.is_active == True, Group.motivation_enabled == True]
+        ):
+            groups_count += 1
+            if random.random() < target_percentage:
+                selected_groups.append(group)
+            # مجموعة احتياطية مختارة عشوائيًا بالتساوي (عينة بحجم واحد) إذا لم تختر أي مجموعة
+            elif random.randrange(groups_count) == 0:
+                fallback_group = group
+        
+        logger.info(f"تم العثور على {groups_count} مجموعة نشطة مع تفعيل الرسائل التحفيزية")
+        
         # التأكد من اختيار على الأقل مجموعة واحدة إذا كانت هناك مجموعات نشطة
-        select_count = max(1, int(len(active_groups) * target_percentage)) if active_groups else 0
-        selected_groups = random.sample(active_groups, select_count) if select_count > 0 else []
+        if not selected_groups and fallback_group:
+            selected_groups.append(fallback_group)
         
         logger.info(f"تم اختيار {len(selected_groups)} مجموعة لإرسال رسائل تحفيزية")
         
@@ -127,7 +141,7 @@ def generate_group_daily_report():
 
 # وظيفة لإعادة تعيين إحصائيات المجموعات اليومية
 def reset_group_daily_stats():
-    """إعادة تعيين إحصائيات المجموعات اليومية وفحص المهام المجدولة"""
+    """إعادة تعيين إحصائيات المجموعات اليومية"""
     try:
         now = get_current_time()
         hour = now.hour
@@ -142,23 +156,7 @@ def reset_group_daily_stats():
             logger.info("تم إعادة تعيين إحصائيات المجموعات اليومية")
             return True
         
-        # استدعاء وظائف فحص المهام المجدولة
-        try:
-            # تسجيل وقت الفحص
-            time_str = now.strftime("%H:%M")
-            logger.info(f"فحص مهام الجدول الصباحي للوقت {time_str}")
-            
-            # فحص مهام الجدول الصباحي
-            morning_count = send_morning_schedule_tasks()
-            logger.info(f"تم إرسال {morning_count} مهمة صباحية للوقت {time_str}")
-            
-            # فحص مهام الجدول المسائي
-            logger.info(f"فحص مهام الجدول المسائي للوقت {time_str}")
-            evening_count = send_evening_schedule_tasks()
-            logger.info(f"تم إرسال {evening_count} مهمة مسائية للوقت {time_str}")
-        except Exception as inner_e:
-            logger.error(f"خطأ في إرسال مهام الجداول: {inner_e}")
-        
+        # مهام الجداول الصباحية والمسائية يرسلها موزع التذكيرات في مواعيدها بالضبط
         return False
     except Exception as e:
         logger.error(f"خطأ في إعادة تعيين إحصائيات المجموعات اليومية: {e}")
@@ -0,0 +1,215 @@
+"""
+وحدة مجمع العدادات
+تحتوي على سجل عدادات في الذاكرة يجمع الزيادات ويكتب الفروق إلى قاعدة البيانات دوريًا
+بدلاً من تحديث نفس الصف مع كل رسالة
+
+عند توقف العملية بشكل مفاجئ تفقد فقط الزيادات التي لم تكتب بعد، أي زيادات آخر STATS_FLUSH_INTERVAL ثانية،
+أما عند الإيقاف العادي فتكتب كل الفروق المتبقية
+"""
+
+import threading
+from datetime import datetime
+
+from study_bot.config import logger, SCHEDULER_TIMEZONE, STATS_FLUSH_INTERVAL, STATS_COUNTER_SHARDS
+
+# المتغيرات العامة
+_app = None
+_flush_thread = None
+_aggregator_running = False
+_stop_event = threading.Event()
+
+# أقسام الفروق غير المكتوبة، كل قسم له قفل خاص به
+# المفتاح ('system', key) لإحصائيات النظام أو ('daily', date, key) للإحصائيات اليومية
+_shards = [{'lock': threading.Lock(), 'deltas': {}} for _ in range(STATS_COUNTER_SHARDS)]
+
+# آخر قيم معروفة في قاعدة البيانات، والفروق الجاري كتابتها، لقراءة العدادات من الذاكرة
+_persisted = {}
+_in_flight = {}
+_persisted_lock = threading.Lock()
+
+_stats = {
+    'flushes': 0,
+    'rows_written': 0,
+    'failed_flushes': 0
+}
+
+
+def _get_shard(counter_key):
+    """الحصول على القسم المسؤول عن العداد"""
+    return _shards[hash(counter_key) % len(_shards)]
+
+
+def _get_day(date=None):
+    """الحصول على بداية اليوم للإحصائيات اليومية"""
+    date = date or datetime.now(SCHEDULER_TIMEZONE)
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_delta(counter_key, amount):
+    """إضافة فرق إلى العداد في الذاكرة"""
+    shard = _get_shard(counter_key)
+    with shard['lock']:
+        shard['deltas'][counter_key] = shard['deltas'].get(counter_key, 0) + amount
+
+
+def _get_delta(counter_key):
+    """الحصول على الفرق غير المكتوب للعداد"""
+    shard = _get_shard(counter_key)
+    with shard['lock']:
+        return shard['deltas'].get(counter_key, 0)
+
+
+def increment(key, amount=1):
+    """زيادة عداد من إحصائيات النظام"""
+    if not _aggregator_running:
+        from study_bot.models import SystemStats
+        return SystemStats.increment(key, amount)
+
+    _add_delta(('system', key), amount)
+    return True
+
+
+def increment_daily(key, amount=1, date=None):
+    """زيادة عداد من الإحصائيات اليومية"""
+    if not _aggregator_running:
+        from study_bot.models import DailyStats
+        return DailyStats.increment(key, amount, date)
+
+    _add_delta(('daily', _get_day(date), key), amount)
+    return True
+
+
+def _get_persisted(counter_key, loader):
+    """الحصول على آخر قيمة معروفة في قاعدة البيانات مع الفروق الجاري كتابتها، وتحميلها عند أول قراءة"""
+    with _persisted_lock:
+        if counter_key in _persisted:
+            return _persisted[counter_key] + _in_flight.get(counter_key, 0)
+
+    value = loader() or 0
+    with _persisted_lock:
+        return _persisted.setdefault(counter_key, value) + _in_flight.get(counter_key, 0)
+
+
+def get_value(key):
+    """قراءة عداد من إحصائيات النظام متضمنًا الزيادات غير المكتوبة"""
+    from study_bot.models import SystemStats
+
+    counter_key = ('system', key)
+    return _get_persisted(counter_key, lambda: SystemStats.get_value(key, 0)) + _get_delta(counter_key)
+
+
+def get_daily_value(key, date=None):
+    """قراءة عداد يومي متضمنًا الزيادات غير المكتوبة"""
+    from study_bot.models import DailyStats
+
+    day = _get_day(date)
+    counter_key = ('daily', day, key)
+    return _get_persisted(counter_key, lambda: DailyStats.get_value(key, day)) + _get_delta(counter_key)
+
+
+def flush():
+    """كتابة فروق العدادات إلى قاعدة البيانات في معاملة واحدة"""
+    from study_bot.models import db, SystemStats, DailyStats
+
+    # أخذ الفروق الحالية وتصفير الأقسام
+    pending = {}
+    for shard in _shards:
+        with shard['lock']:
+            if shard['deltas']:
+                pending.update(shard['deltas'])
+                shard['deltas'] = {}
+
+    if not pending:
+        return 0
+
+    with _persisted_lock:
+        _in_flight.update(pending)
+
+    try:
+        new_values = {}
+        for counter_key, delta in pending.items():
+            if counter_key[0] == 'system':
+                new_values[counter_key] = SystemStats.increment(counter_key[1], delta, commit=False)
+            else:
+                new_values[counter_key] = DailyStats.increment(counter_key[2], delta, counter_key[1], commit=False)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"خطأ في كتابة فروق العدادات ({len(pending)} عداد): {e}")
+        db.session.rollback()
+
+        # إعادة الفروق إلى الذاكرة لتكتب في المحاولة التالية
+        with _persisted_lock:
+            for counter_key, delta in pending.items():
+                _add_delta(counter_key, delta)
+            _in_flight.clear()
+        _stats['failed_flushes'] += 1
+        return 0
+
+    with _persisted_lock:
+        _persisted.update(new_values)
+        _in_flight.clear()
+
+    _stats['flushes'] += 1
+    _stats['rows_written'] += len(pending)
+    return len(pending)
+
+
+def flush_thread_func(app):
+    """دالة سلسلة كتابة العدادات"""
+    with app.app_context():
+        while not _stop_event.wait(STATS_FLUSH_INTERVAL):
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"خطأ في سلسلة مجمع العدادات: {e}")
+
+
+def init_stats_aggregator(app):
+    """تهيئة مجمع العدادات وبدء سلسلة الكتابة"""
+    global _app, _flush_thread, _aggregator_running
+
+    if _aggregator_running:
+        logger.warning("مجمع العدادات يعمل بالفعل")
+        return _flush_thread
+
+    _app = app
+    _aggregator_running = True
+    _stop_event.clear()
+    _flush_thread = threading.Thread(target=flush_thread_func, args=(app,))
+    _flush_thread.daemon = True
+    _flush_thread.start()
+
+    logger.info("تم بدء مجمع العدادات")
+    return _flush_thread
+
+
+def shutdown_stats_aggregator():
+    """إيقاف مجمع العدادات وكتابة الفروق المتبقية"""
+    global _aggregator_running
+
+    if not _aggregator_running:
+        return False
+
+    _aggregator_running = False
+    _stop_event.set()
+    if _flush_thread:
+        _flush_thread.join(timeout=10)
+
+    with _app.app_context():
+        count = flush()
+
+    logger.info(f"تم إيقاف مجمع العدادات بعد كتابة {count} عداد متبقٍ")
+    return True
+
+
+def get_aggregator_stats():
+    """الحصول على إحصائيات مجمع العدادات"""
+    pending = 0
+    for shard in _shards:
+        with shard['lock']:
+            pending += len(shard['deltas'])
+
+    stats = dict(_stats)
+    stats['pending_counters'] = pending
+    stats['running'] = _aggregator_running
+    return stats
@@ -0,0 +1,293 @@
+"""
+وحدة عميل تيليجرام
+تحتوي على عميل HTTP مشترك يعيد استخدام الاتصالات لجميع طلبات واجهة برمجة تطبيقات تيليجرام
+"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from study_bot.config import (
+    logger, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN,
+    TELEGRAM_POOL_CONNECTIONS, TELEGRAM_POOL_MAXSIZE,
+    TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT,
+    TELEGRAM_METHOD_TIMEOUTS, TELEGRAM_MAX_RETRIES,
+    TELEGRAM_RETRY_BUDGET, TELEGRAM_BACKOFF_BASE, TELEGRAM_BACKOFF_MAX
+)
+
+# دوال القراءة فقط: إعادتها بعد انتهاء مهلة القراءة لا تكرر أي أثر
+# أما دوال الإرسال فقد يكون تيليجرام نفذها قبل انتهاء المهلة، فتعاد فقط إذا فشل الاتصال نفسه
+READ_ONLY_METHODS = frozenset([
+    'getUpdates', 'getMe', 'getChat', 'getChatMember', 'getChatAdministrators',
+    'getChatMemberCount', 'getFile', 'getWebhookInfo', 'getMyCommands'
+])
+
+# العميل المشترك
+_client = None
+_client_lock = threading.Lock()
+
+
+class PreparedBody:
+    """جسم طلب JSON مرمز مسبقًا، مع معرف المحادثة لحدود الإرسال"""
+
+    __slots__ = ('body', 'chat_id')
+
+    def __init__(self, body, chat_id=None):
+        self.body = body
+        self.chat_id = chat_id
+
+
+class TelegramClient:
+    """عميل HTTP لواجهة تيليجرام مع جلسة مشتركة واتصالات دائمة"""
+
+    def __init__(self, token=None, api_url=None):
+        self.token = token or TELEGRAM_BOT_TOKEN
+        self.api_url = api_url or TELEGRAM_API_URL
+        self.session = self._build_session()
+        self._stats_lock = threading.Lock()
+        self._requests_count = 0
+        self._errors_count = 0
+        self._retries_count = 0
+        self._dropped_count = 0
+        self._rate_limited_count = 0
+        self._throttled_seconds = 0.0
+        self._paused_until = 0.0
+
+    def _build_session(self):
+        """إنشاء جلسة requests مع مجمع اتصالات وسياسة إعادة المحاولة"""
+        # إعادة فتح الاتصال فقط قبل إرسال الطلب، أما أخطاء الخادم فتعالجها دالة call
+        retry = Retry(
+            total=TELEGRAM_MAX_RETRIES,
+            connect=TELEGRAM_MAX_RETRIES,
+            read=0,
+            status=0,
+            allowed_methods=frozenset(['GET', 'POST']),
+            backoff_factor=0.5,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=TELEGRAM_POOL_CONNECTIONS,
+            pool_maxsize=TELEGRAM_POOL_MAXSIZE,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def method_url(self, method):
+        """بناء رابط دالة API مع توكن البوت"""
+        return f"{self.api_url}/bot{self.token}/{method}"
+
+    def get_timeout(self, method, data=None):
+        """الحصول على مهلة الطلب (اتصال، قراءة) حسب دالة API"""
+        read_timeout = TELEGRAM_METHOD_TIMEOUTS.get(method, TELEGRAM_READ_TIMEOUT)
+
+        # الاستطلاع الطويل يحتاج مهلة قراءة أطول من مهلة الانتظار على الخادم
+        if method == 'getUpdates' and data and data.get('timeout'):
+            read_timeout = max(read_timeout, int(data['timeout']) + 10)
+
+        return (TELEGRAM_CONNECT_TIMEOUT, read_timeout)
+
+    def post(self, method, data=None, timeout=None):
+        """إرسال طلب POST إلى دالة API وإرجاع كائن الاستجابة"""
+        with self._stats_lock:
+            self._requests_count += 1
+
+        try:
+            # الجسم المرمز مسبقًا من قوالب الرسائل يرسل كما هو دون ترميز JSON من جديد
+            if isinstance(data, PreparedBody):
+                return self.session.post(
+                    self.method_url(method),
+                    data=data.body,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=timeout or self.get_timeout(method)
+                )
+
+            return self.session.post(
+                self.method_url(method),
+                json=data or {},
+                timeout=timeout or self.get_timeout(method, data)
+            )
+        except Exception:
+            with self._stats_lock:
+                self._errors_count += 1
+            raise
+
+    def get(self, method, params=None, timeout=None):
+        """إرسال طلب GET إلى دالة API وإرجاع كائن الاستجابة"""
+        with self._stats_lock:
+            self._requests_count += 1
+
+        try:
+            return self.session.get(
+                self.method_url(method),
+                params=params,
+                timeout=timeout or self.get_timeout(method, params)
+            )
+        except Exception:
+            with self._stats_lock:
+                self._errors_count += 1
+            raise
+
+    def pause(self, seconds):
+        """إيقاف جميع الطلبات مؤقتًا (عند تجاوز حد الإرسال)"""
+        with self._stats_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def wait_if_paused(self):
+        """الانتظار حتى انتهاء الإيقاف المؤقت العام إن وجد"""
+        while True:
+            with self._stats_lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+            with self._stats_lock:
+                self._throttled_seconds += wait
+
+    def get_backoff(self, attempt):
+        """حساب مهلة التراجع الأسي مع تشويش عشوائي"""
+        return random.uniform(0, min(TELEGRAM_BACKOFF_MAX, TELEGRAM_BACKOFF_BASE * (2 ** attempt)))
+
+    def call(self, method, data=None, timeout=None, retries=None):
+        """استدعاء دالة API مع إعادة المحاولة، وإرجاع الاستجابة بعد تحليلها أو None في حالة الفشل"""
+        budget = TELEGRAM_RETRY_BUDGET if retries is None else retries
+        result = None
+
+        for attempt in range(budget + 1):
+            if attempt:
+                with self._stats_lock:
+                    self._retries_count += 1
+
+            self.wait_if_paused()
+
+            try:
+                response = self.post(method, data, timeout)
+            except requests.RequestException as e:
+                # خطأ في الاتصال يعاد لكل الدوال، وغيره (مثل انتهاء مهلة القراءة) لدوال القراءة فقط
+                if not isinstance(e, requests.ConnectionError) and method not in READ_ONLY_METHODS:
+                    with self._stats_lock:
+                        self._dropped_count += 1
+                    logger.error(f"خطأ في استدعاء {method} بعد إرسال الطلب، لن يعاد حتى لا يتكرر: {e}")
+                    return None
+
+                # خطأ في الشبكة: إعادة المحاولة بعد مهلة تراجع
+                logger.warning(f"خطأ في الاتصال بواجهة تيليجرام ({method})، المحاولة {attempt + 1}: {e}")
+                if attempt < budget:
+                    time.sleep(self.get_backoff(attempt))
+                continue
+
+            try:
+                result = response.json()
+            except ValueError:
+                result = {'ok': False, 'error_code': response.status_code, 'description': response.text}
+
+            # تجاوز حد الإرسال: إيقاف جميع الطلبات للمدة التي يحددها تيليجرام
+            if response.status_code == 429:
+                retry_after = (result.get('parameters') or {}).get('retry_after', 1)
+                with self._stats_lock:
+                    self._rate_limited_count += 1
+                logger.warning(f"تم تجاوز حد الإرسال في {method}، إيقاف الإرسال لمدة {retry_after} ثانية")
+                self.pause(retry_after)
+                continue
+
+            # خطأ في خادم تيليجرام: إعادة المحاولة بعد مهلة تراجع
+            if response.status_code >= 500:
+                logger.warning(f"خطأ في خادم تيليجرام ({method}): {response.status_code}، المحاولة {attempt + 1}")
+                if attempt < budget:
+                    time.sleep(self.get_backoff(attempt))
+                continue
+
+            if not result.get('ok'):
+                logger.error(f"خطأ من واجهة تيليجرام في {method}: {result.get('description')}")
+
+            return result
+
+        # استنفاد محاولات إعادة الإرسال
+        with self._stats_lock:
+            self._dropped_count += 1
+        logger.error(f"فشل استدعاء {method} بعد {budget + 1} محاولات، تم إسقاط الطلب")
+        return result
+
+    def get_stats(self):
+        """الحصول على إحصائيات العميل: إعادة استخدام الاتصالات وإعادة المحاولة والإيقاف المؤقت"""
+        connections_opened = 0
+        pool_requests = 0
+
+        # قراءة عدادات مجمعات اتصالات urllib3
+        for adapter in self.session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections_opened += pool.num_connections
+                pool_requests += pool.num_requests
+
+        with self._stats_lock:
+            requests_count = self._requests_count
+            errors_count = self._errors_count
+            retries_count = self._retries_count
+            dropped_count = self._dropped_count
+            rate_limited_count = self._rate_limited_count
+            throttled_seconds = self._throttled_seconds
+
+        return {
+            'requests': requests_count,
+            'errors': errors_count,
+            'retries': retries_count,
+            'dropped': dropped_count,
+            'rate_limited': rate_limited_count,
+            'throttled_seconds': round(throttled_seconds, 2),
+            'connections_opened': connections_opened,
+            'connections_reused': max(pool_requests - connections_opened, 0),
+            'reuse_ratio': round(1 - connections_opened / pool_requests, 3) if pool_requests else 0.0
+        }
+
+    def close(self):
+        """إغلاق الجلسة وتحرير الاتصالات"""
+        try:
+            self.session.close()
+        except Exception as e:
+            logger.error(f"خطأ في إغلاق جلسة عميل تيليجرام: {e}")
+
+
+def get_client():
+    """الحصول على عميل تيليجرام المشترك"""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TelegramClient()
+
+    return _client
+
+
+def call_api(method, data=None, timeout=None):
+    """استدعاء دالة من واجهة تيليجرام عبر العميل المشترك"""
+    return get_client().call(method, data, timeout)
+
+
+def get_client_stats():
+    """الحصول على إحصائيات العميل المشترك"""
+    if _client is None:
+        return {}
+    return _client.get_stats()
+
+
+def close_client():
+    """إغلاق العميل المشترك"""
+    global _client
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -36,8 +36,8 @@ def dashboard():
     active_camps = CustomCamp.query.filter_by(is_active=True).count()
     
     # الإحصائيات العامة
-    from study_bot.models import SystemStat
-    messages_sent = SystemStat.get('messages_sent', 0)
+    from study_bot.stats_aggregator import get_value
+    messages_sent = get_value('messages_sent')
     
     stats = {
         'total_users': total_users,
@@ -48,19 +48,34 @@ def dashboard():
     
     return render_template('dashboard.html', stats=stats)
 
+# عدد الصفوف في صفحات المستخدمين والمجموعات، والصفحة التالية تحدد بمعرف آخر صف (?after=)
+PAGE_SIZE = 100
+
 @main_bp.route('/groups')
 def groups():
     """صفحة المجموعات"""
-    from study_bot.models import Group
-    groups = Group.query.filter_by(is_active=True).all()
-    return render_template('groups.html', groups=groups)
+    from study_bot.models import Group, fetch_page
+    groups, next_after = fetch_page(
+        Group.id, Group.telegram_id, Group.title, Group.morning_schedule_enabled,
+        Group.evening_schedule_enabled, Group.motivation_enabled,
+        where=Group.is_active == True,
+        after=request.args.get('after', type=int),
+        limit=PAGE_SIZE
+    )
+    return render_template('groups.html', groups=groups, next_after=next_after)
 
 @main_bp.route('/users')
 def users():
     """صفحة المستخدمين"""
-    from study_bot.models import User
-    users = User.query.filter_by(is_active=True).all()
-    return render_template('users.html', users=users)
+    from study_bot.models import User, fetch_page
+    users, next_after = fetch_page(
+        User.id, User.telegram_id, User.username, User.first_name, User.last_name,
+        User.points, User.streak_days, User.last_activity,
+        where=User.is_active == True,
+        after=request.args.get('after', type=int),
+        limit=PAGE_SIZE
+    )
+    return render_template('users.html', users=users, next_after=next_after)
 
 @main_bp.route('/camps')
 def camps():
@@ -75,9 +90,9 @@ def send_broadcast():
     if request.method == 'POST':
         message = request.form.get('message')
         if message:
-            from study_bot.bot import send_broadcast_message
-            result = send_broadcast_message(message)
-            flash(f'تم إرسال الرسالة إلى {result} مستخدم', 'success')
+            from study_bot.broadcasts import start_broadcast
+            broadcast = start_broadcast(message)
+            flash(f'تم بدء إرسال الرسالة الجماعية #{broadcast.id} إلى {broadcast.total} مستخدم', 'success')
         else:
             flash('الرجاء إدخال نص الرسالة', 'danger')
     
@@ -87,18 +102,84 @@ def send_broadcast():
 @main_bp.route('/api/stats')
 def api_stats():
     """إحصائيات API"""
-    from study_bot.models import SystemStat, User, Group, CustomCamp
+    from study_bot.models import User, Group, CustomCamp
+    from study_bot.stats_aggregator import get_value, get_daily_value, get_aggregator_stats
+    from study_bot.telegram_client import get_client_stats
+    from study_bot.outbound_queue import get_queue_stats
+    from study_bot.bot.dispatcher import get_dispatcher_stats
+    from study_bot.message_log_writer import get_writer_stats
+    from study_bot.reminder_dispatcher import get_reminder_dispatcher_stats
+    from study_bot.delayed_jobs import get_delayed_jobs_stats
+    from study_bot.identity_cache import get_identity_cache_stats
+    from study_bot.bot.callback_codec import get_codec_stats
+    from study_bot.motivation_pool import get_motivation_pool_stats
+    from study_bot.message_templates import get_template_stats
+    from study_bot.broadcasts import get_broadcast_stats
+    from study_bot.camp_leaderboard import get_camp_leaderboard_stats
+    from study_bot.group_leaderboard import get_group_leaderboard_stats
+    from study_bot.camp_analytics import get_camp_analytics_stats
+    from study_bot.camp_task_dispatcher import get_camp_task_dispatcher_stats
+    from study_bot.conversation_state import get_conversation_stats
     
     stats = {
         'total_users': User.query.filter_by(is_active=True).count(),
         'total_groups': Group.query.filter_by(is_active=True).count(),
         'active_camps': CustomCamp.query.filter_by(is_active=True).count(),
-        'messages_sent': SystemStat.get('messages_sent', 0),
+        'messages_sent': get_value('messages_sent'),
+        'messages_sent_today': get_daily_value('messages_sent'),
+        'telegram_client': get_client_stats(),
+        'outbound_queue': get_queue_stats(),
+        'update_dispatcher': get_dispatcher_stats(),
+        'message_log_writer': get_writer_stats(),
+        'reminder_dispatcher': get_reminder_dispatcher_stats(),
+        'stats_aggregator': get_aggregator_stats(),
+        'delayed_jobs': get_delayed_jobs_stats(),
+        'identity_cache': get_identity_cache_stats(),
+        'callback_codec': get_codec_stats(),
+        'motivation_pool': get_motivation_pool_stats(),
+        'message_templates': get_template_stats(),
+        'broadcasts': get_broadcast_stats(),
+        'camp_leaderboards': get_camp_leaderboard_stats(),
+        'group_leaderboards': get_group_leaderboard_stats(),
+        'camp_analytics': get_camp_analytics_stats(),
+        'camp_task_dispatcher': get_camp_task_dispatcher_stats(),
+        'conversation_state': get_conversation_stats(),
         'updated_at': datetime.utcnow().isoformat()
     }
     
     return jsonify(stats)
 
+
+@main_bp.route('/api/callback_routes')
+def api_callback_routes():
+    """قائمة أنماط استجابات الأزرار المسجلة"""
+    from study_bot.bot.handlers.callbacks import private_router, group_router
+    from study_bot.group_handlers import group_callback_router
+
+    return jsonify({
+        router.name: router.list_routes()
+        for router in (private_router, group_router, group_callback_router)
+    })
+
+@main_bp.route('/api/broadcasts')
+def api_broadcasts():
+    """تقدم آخر الرسائل الجماعية"""
+    from study_bot.broadcasts import list_broadcasts
+
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify(list_broadcasts(limit))
+
+
+@main_bp.route('/api/broadcasts/<int:broadcast_id>')
+def api_broadcast_progress(broadcast_id):
+    """تقدم رسالة جماعية محددة"""
+    from study_bot.broadcasts import get_broadcast_progress
+
+    progress = get_broadcast_progress(broadcast_id)
+    if not progress:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(progress)
+
 # دالة لتهيئة واجهة الويب
 def init_web(app):
     """تهيئة واجهة الويب"""
@@ -109,6 +190,9 @@ def init_web(app):
         # تسجيل blueprints
         app.register_blueprint(main_bp)
         
+        from study_bot.bot.webhook import webhook_bp
+        app.register_blueprint(webhook_bp)
+        
         # تسجيل معالجات الأخطاء
         @app.errorhandler(404)
         def page_not_found(e):
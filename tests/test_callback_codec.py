@@ -0,0 +1,83 @@
+"""
+اختبارات ترميز بيانات الأزرار
+"""
+
+import base64
+
+import pytest
+
+from study_bot.bot import callback_codec
+from study_bot.bot.callback_codec import (
+    CALLBACK_DATA_LIMIT, InvalidCallback, decode_callback, encode_callback, is_packed
+)
+
+
+def _flip_byte(data, index):
+    raw = data[1:]
+    packed = bytearray(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+    packed[index] ^= 0x01
+    return '~' + base64.urlsafe_b64encode(bytes(packed)).decode('ascii').rstrip('=')
+
+
+def test_round_trip():
+    data = encode_callback('task_join', expires_at=2_000_000_000, schedule_id=123456, points=15, task_type='morning_task_0')
+
+    assert is_packed(data)
+    assert len(data) <= CALLBACK_DATA_LIMIT
+    assert decode_callback(data) == ('task_join', {
+        'schedule_id': 123456,
+        'points': 15,
+        'task_type': 'morning_task_0',
+        'expires_at': 2_000_000_000
+    })
+
+
+def test_without_expiry():
+    action, fields = decode_callback(encode_callback('camp_rank', camp_id=9))
+
+    assert action == 'camp_rank'
+    assert fields == {'camp_id': 9, 'expires_at': None}
+
+
+def test_plain_data_is_not_packed():
+    assert not is_packed('task_join:morning:12')
+    assert not is_packed('')
+
+
+def test_unknown_action():
+    with pytest.raises(ValueError):
+        encode_callback('missing', camp_id=1)
+
+
+def test_data_over_limit():
+    with pytest.raises(ValueError):
+        encode_callback('task_join', schedule_id=1, points=1, task_type='x' * 60)
+
+
+@pytest.mark.parametrize('index', [2, -1])
+def test_tampered_data_is_forged(index):
+    # البايت 2 من وقت الانتهاء في الرأس، والأخير من التوقيع نفسه
+    data = encode_callback('camp_task_join', task_id=77, points=10)
+
+    with pytest.raises(InvalidCallback) as error:
+        decode_callback(_flip_byte(data, index))
+    assert error.value.reason == 'forged'
+
+
+def test_expired(monkeypatch):
+    data = encode_callback('camp_join', expires_at=1_000_000, camp_id=3)
+
+    monkeypatch.setattr(callback_codec.time, 'time', lambda: 999_999)
+    assert decode_callback(data)[1]['camp_id'] == 3
+
+    monkeypatch.setattr(callback_codec.time, 'time', lambda: 1_000_001)
+    with pytest.raises(InvalidCallback) as error:
+        decode_callback(data)
+    assert error.value.reason == 'expired'
+
+
+@pytest.mark.parametrize('data', ['~', '~!!!', '~AAAA'])
+def test_malformed(data):
+    with pytest.raises(InvalidCallback) as error:
+        decode_callback(data)
+    assert error.value.reason == 'malformed'
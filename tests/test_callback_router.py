@@ -0,0 +1,147 @@
+"""
+اختبارات موجه استجابات الأزرار
+"""
+
+import time
+
+import pytest
+
+from study_bot.bot.callback_codec import encode_callback
+from study_bot.bot.callback_router import CallbackRejected, CallbackRouter
+
+
+@pytest.fixture
+def answers():
+    return []
+
+
+@pytest.fixture
+def router(answers):
+    return CallbackRouter('test', answer=lambda *args: answers.append(args))
+
+
+def test_exact_route(router):
+    @router.route('show_help')
+    def show_help(callback_data):
+        return callback_data
+
+    assert router.dispatch('show_help') == 'show_help'
+
+
+def test_params_are_converted(router):
+    @router.route('task_join:{task_type}:{schedule_id:int}')
+    def task_join(task_type, schedule_id):
+        return task_type, schedule_id
+
+    route, params = router.match('task_join:morning:12')
+    assert route['func'] is task_join
+    assert params == {'task_type': 'morning', 'schedule_id': 12}
+    assert router.dispatch('task_join:evening:-3') == ('evening', -3)
+
+
+def test_int_param_rejects_text(router):
+    @router.route('camp_join:{camp_id:int}')
+    def camp_join(camp_id):
+        return camp_id
+
+    assert router.match('camp_join:abc') == (None, None)
+    assert router.match('camp_join:12:extra') == (None, None)
+
+
+def test_longest_prefix_wins(router):
+    @router.route('camp_{action}:{camp_id:int}')
+    def camp_any(action, camp_id):
+        return 'any'
+
+    @router.route('camp_rank:{camp_id:int}')
+    def camp_rank(camp_id):
+        return 'rank'
+
+    assert router.dispatch('camp_rank:5') == 'rank'
+    assert router.dispatch('camp_join:5') == 'any'
+
+
+def test_unknown_route_is_answered(router, answers):
+    router.unknown_text = "⚠️ {callback_data}"
+
+    assert router.dispatch('missing:1', callback_query_id='q1') is False
+    assert answers == [('q1', "⚠️ missing:1")]
+
+
+def test_unknown_param_type():
+    with pytest.raises(ValueError):
+        CallbackRouter('test').add_route('task:{value:float}', lambda value: value)
+
+
+def test_handler_receives_only_requested_args(router):
+    @router.route('ping:{value}')
+    def ping(value):
+        return value
+
+    assert router.dispatch('ping:ok', callback_query_id='q1', chat_id=5) == 'ok'
+
+
+def test_dependency_is_loaded_lazily(router):
+    loads = []
+
+    @router.dependency('group')
+    def load_group(resolve):
+        loads.append(resolve('chat_id'))
+        return {'id': resolve('chat_id')}
+
+    @router.route('with_group')
+    def with_group(group):
+        return group['id']
+
+    @router.route('without_group')
+    def without_group(chat_id):
+        return chat_id
+
+    assert router.dispatch('without_group', chat_id=7) == 7
+    assert loads == []
+    assert router.dispatch('with_group', chat_id=7) == 7
+    assert loads == [7]
+
+
+def test_rejected_dependency_is_answered(router, answers):
+    @router.dependency('group')
+    def load_group(resolve):
+        raise CallbackRejected("❌ المجموعة غير موجودة")
+
+    @router.route('with_group')
+    def with_group(group):
+        pytest.fail("لا ينفذ المعالج عند رفض التبعية")
+
+    assert router.dispatch('with_group', callback_query_id='q1') is False
+    assert answers == [('q1', "❌ المجموعة غير موجودة", True)]
+
+
+def test_packed_route(router):
+    @router.packed('camp_join')
+    def camp_join(camp_id):
+        return camp_id
+
+    assert router.dispatch(encode_callback('camp_join', camp_id=42)) == 42
+
+
+def test_forged_packed_data_is_answered(router, answers):
+    @router.packed('camp_join')
+    def camp_join(camp_id):
+        pytest.fail("لا ينفذ المعالج لزر مزور")
+
+    data = encode_callback('camp_join', camp_id=42)
+    forged = data[:-5] + ('A' if data[-5] != 'A' else 'B') + data[-4:]
+
+    assert router.dispatch(forged, callback_query_id='q1') is False
+    assert answers[0][0] == 'q1' and answers[0][2] is True
+
+
+def test_expired_packed_data_is_answered(router, answers):
+    @router.packed('camp_join')
+    def camp_join(camp_id):
+        pytest.fail("لا ينفذ المعالج لزر منتهي")
+
+    data = encode_callback('camp_join', expires_at=time.time() - 60, camp_id=42)
+
+    assert router.dispatch(data, callback_query_id='q1') is False
+    assert answers == [('q1', "⏰ انتهت المهلة المحددة لهذا الزر.", True)]
@@ -0,0 +1,83 @@
+"""
+اختبارات لوحة ترتيب المعسكرات مقارنة بترتيب قائمة مرتبة
+"""
+
+import random
+
+import pytest
+
+from study_bot.camp_leaderboard import Leaderboard
+
+
+def _oracle(scores):
+    """الترتيب المتوقع: النقاط تنازليًا ثم المعرف تصاعديًا"""
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _assert_matches(board, scores):
+    expected = _oracle(scores)
+
+    assert len(board) == len(expected)
+    for rank, (member, score) in enumerate(expected, 1):
+        assert board.rank(member) == rank
+        assert board.at(rank) == (member, score)
+    assert board.at(0) is None
+    assert board.at(len(expected) + 1) is None
+
+
+def test_ties_are_ordered_by_id():
+    board = Leaderboard([(5, 10), (2, 10), (9, 30), (7, 0)])
+
+    assert board.top(10) == [(9, 30, 1), (2, 10, 2), (5, 10, 3), (7, 0, 4)]
+
+
+def test_negative_and_missing_scores_count_as_zero():
+    board = Leaderboard([(1, -5), (2, None)])
+
+    assert board.score(1) == 0
+    assert board.top(2) == [(1, 0, 1), (2, 0, 2)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_updates_match_sorted_list(seed):
+    rng = random.Random(seed)
+    board = Leaderboard()
+    scores = {}
+
+    for step in range(2000):
+        member = rng.randrange(300)
+        if member in scores and rng.random() < 0.2:
+            board.remove(member)
+            del scores[member]
+        else:
+            # مدى نقاط صغير لكثرة التساوي، وقفزات نادرة لتوسيع الشجرة
+            score = rng.randrange(5000) if rng.random() < 0.01 else rng.randrange(20)
+            board.set(member, score)
+            scores[member] = score
+
+        if step % 250 == 0:
+            _assert_matches(board, scores)
+
+    _assert_matches(board, scores)
+
+
+def test_top_and_around():
+    scores = {member: member % 7 for member in range(1, 41)}
+    board = Leaderboard(scores.items())
+    expected = [(member, score, rank) for rank, (member, score) in enumerate(_oracle(scores), 1)]
+
+    assert board.top(5) == expected[:5]
+    assert board.top(100) == expected
+
+    for index, (member, _, _) in enumerate(expected):
+        assert board.around(member, 2) == expected[max(0, index - 2):index + 3]
+
+    assert board.around(999) == []
+
+
+def test_remove_missing_member():
+    board = Leaderboard([(1, 3)])
+    board.remove(2)
+
+    assert 1 in board and 2 not in board
+    assert board.rank(2) is None
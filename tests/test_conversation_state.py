@@ -0,0 +1,101 @@
+"""
+اختبارات خلفية الذاكرة لحالة المحادثات: انتهاء الصلاحية وحذف الأقدم استخدامًا
+"""
+
+import pytest
+
+from study_bot import conversation_state
+from study_bot.conversation_state import Conversation, MemoryStateBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = {'now': 1000.0}
+    monkeypatch.setattr(conversation_state.time, 'time', lambda: clock['now'])
+    return clock
+
+
+def _save(backend, user_id, step='start', **data):
+    backend.save(Conversation(user_id, 'test_flow', step, data))
+
+
+def test_save_and_get(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    _save(backend, 1, 'name', title="مراجعة")
+
+    conversation = backend.get(1)
+    assert (conversation.flow, conversation.step, conversation.data) == ('test_flow', 'name', {'title': "مراجعة"})
+    assert conversation.expires_at == 1060.0
+    assert backend.get(2) is None
+
+
+def test_returned_data_is_a_copy(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    _save(backend, 1, title="أ")
+
+    backend.get(1).data['title'] = "ب"
+
+    assert backend.get(1).data == {'title': "أ"}
+
+
+def test_ttl_expiry(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    _save(backend, 1)
+
+    clock['now'] += 59
+    assert backend.get(1) is not None
+
+    clock['now'] += 1
+    assert backend.get(1) is None
+    assert backend.count() == 0
+
+
+def test_save_extends_ttl(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    _save(backend, 1)
+
+    clock['now'] += 50
+    _save(backend, 1, 'next')
+    clock['now'] += 50
+
+    assert backend.get(1).step == 'next'
+
+
+def test_lru_eviction(clock):
+    backend = MemoryStateBackend(max_sessions=3, ttl=60)
+    for user_id in (1, 2, 3):
+        _save(backend, user_id)
+
+    # حفظ المحادثة 1 يجعلها الأحدث، فتحذف 2 ثم 3 عند تجاوز الحد
+    _save(backend, 1, 'next')
+    _save(backend, 4)
+    _save(backend, 5)
+
+    assert backend.get(2) is None and backend.get(3) is None
+    assert [backend.get(user_id).step for user_id in (1, 4, 5)] == ['next', 'start', 'start']
+    assert backend.evicted == 2
+    assert backend.count() == 3
+
+
+def test_purge_expired(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    for user_id in range(5):
+        _save(backend, user_id)
+        clock['now'] += 10
+
+    # انتهت صلاحية أول محادثتين فقط (حفظتا عند 1000 و1010)
+    clock['now'] = 1070.0
+    assert backend.purge_expired() == 2
+    assert backend.count() == 3
+    assert backend.purge_expired() == 0
+    assert backend.evicted == 0
+
+
+def test_delete(clock):
+    backend = MemoryStateBackend(max_sessions=10, ttl=60)
+    _save(backend, 1)
+
+    backend.delete(1)
+    backend.delete(2)
+
+    assert backend.get(1) is None
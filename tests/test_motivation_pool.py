@@ -0,0 +1,103 @@
+"""
+اختبارات الاختيار بالوزن ومنع التكرار في مجموعة الرسائل التحفيزية
+"""
+
+import random
+from collections import Counter, OrderedDict
+
+import pytest
+
+from study_bot import motivation_pool
+from study_bot.motivation_pool import _build_alias, _build_pool, _sample, pick_message
+
+
+def _alias_probabilities(probabilities, aliases):
+    """الاحتمال الفعلي لكل عنصر في جدول الأسماء المستعارة"""
+    count = len(probabilities)
+    result = [p / count for p in probabilities]
+    for i, p in enumerate(probabilities):
+        result[aliases[i]] += (1 - p) / count
+    return result
+
+
+@pytest.mark.parametrize('weights', [
+    [1],
+    [1, 1, 1, 1],
+    [1, 2, 3, 4],
+    [10, 1, 1],
+    [1, 1, 50, 3, 7, 2],
+])
+def test_alias_table_is_exact(weights):
+    probabilities, aliases = _build_alias(weights)
+    total = sum(weights)
+
+    assert all(0 <= p <= 1 for p in probabilities)
+    assert _alias_probabilities(probabilities, aliases) == pytest.approx([w / total for w in weights])
+
+
+def test_random_weights_are_exact():
+    rng = random.Random(7)
+    for _ in range(50):
+        weights = [rng.randint(1, 100) for _ in range(rng.randint(1, 40))]
+        probabilities, aliases = _build_alias(weights)
+        expected = [w / sum(weights) for w in weights]
+        assert _alias_probabilities(probabilities, aliases) == pytest.approx(expected)
+
+
+def test_sample_follows_weights(monkeypatch):
+    monkeypatch.setattr(motivation_pool, 'random', random.Random(1))
+    pool = _build_pool([('a', 'study', 1), ('b', 'study', 3), ('c', 'general', 1)], 'database')
+
+    counts = Counter(_sample(pool['tables']['study']) for _ in range(20000))
+
+    assert set(counts) == {0, 1}
+    assert counts[1] / 20000 == pytest.approx(0.75, abs=0.02)
+
+
+def test_categories():
+    pool = _build_pool([('a', 'study', 1), ('b', 'general', 1), ('c', 'study', 2)], 'database')
+
+    assert pool['tables'][None][0] == [0, 1, 2]
+    assert pool['tables']['study'][0] == [0, 2]
+    assert pool['tables']['general'][0] == [1]
+
+
+@pytest.fixture
+def pool_holder(monkeypatch):
+    holder = {'pool': _build_pool([(f"رسالة {i}", 'general', 1) for i in range(6)], 'database')}
+    monkeypatch.setattr(motivation_pool, '_recent', OrderedDict())
+    monkeypatch.setattr(motivation_pool, '_get_pool', lambda: holder['pool'])
+    monkeypatch.setattr(motivation_pool, 'MOTIVATION_NO_REPEAT_WINDOW', 3)
+    monkeypatch.setattr(motivation_pool, 'PICK_ATTEMPTS', 1000)
+    return holder
+
+
+def _assert_no_repeat(picks, window):
+    for i, text in enumerate(picks):
+        assert text not in picks[max(0, i - window):i]
+
+
+def test_no_repeat_window(pool_holder):
+    picks = [pick_message(chat_id=1) for _ in range(200)]
+
+    _assert_no_repeat(picks, 3)
+
+
+def test_no_repeat_survives_reload(pool_holder):
+    picks = [pick_message(chat_id=1) for _ in range(10)]
+
+    # إعادة بناء المجموعة بترتيب مختلف للرسائل، كما يحدث بعد تعديلها
+    entries = [(text, 'general', 1) for text in reversed(pool_holder['pool']['texts'])]
+    pool_holder['pool'] = _build_pool(entries, 'database')
+    picks += [pick_message(chat_id=1) for _ in range(10)]
+
+    _assert_no_repeat(picks, 3)
+
+
+def test_window_is_capped_by_category_size(pool_holder):
+    pool_holder['pool'] = _build_pool([('a', 'general', 1), ('b', 'general', 1)], 'database')
+
+    picks = [pick_message(chat_id=1) for _ in range(20)]
+
+    # رسالتان فقط، فلا تتكرر الرسالة السابقة مباشرة
+    _assert_no_repeat(picks, 1)
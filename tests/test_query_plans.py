@@ -0,0 +1,30 @@
+"""
+اختبار خطط تنفيذ الاستعلامات الأكثر استخدامًا بعد تطبيق الترحيلات على SQLite
+"""
+
+import pytest
+from flask import Flask
+
+from study_bot.models import db
+from study_bot.migrations import MIGRATIONS, check_query_plans, run_migrations
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        run_migrations(db, check_plans=False)
+        yield app
+
+
+def test_migrations_are_applied(app):
+    rows = db.session.execute(db.text("SELECT version FROM schema_migrations")).all()
+    assert {row[0] for row in rows} == {migration['version'] for migration in MIGRATIONS}
+
+
+def test_hot_queries_use_indexes(app):
+    assert check_query_plans(db) == []
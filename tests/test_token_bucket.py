@@ -0,0 +1,72 @@
+"""
+اختبارات حاوية الرموز المستخدمة لتحديد معدل الإرسال
+"""
+
+import pytest
+
+from study_bot import outbound_queue
+from study_bot.outbound_queue import TokenBucket
+
+
+class FakeClock:
+    """ساعة يدوية تحل محل time.monotonic وtime.sleep"""
+    # تستخدم الاختبارات معدلات وفترات من قوى العدد 2 حتى تكون الحسابات دقيقة دون تقريب
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(outbound_queue.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(outbound_queue.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == 1.0
+
+
+def test_refill_rate(clock):
+    bucket = TokenBucket(rate=16, capacity=1)
+    assert bucket.reserve() == 0
+
+    clock.now += 1 / 32
+    assert bucket.reserve() == 1 / 32
+
+    clock.now += 1 / 32
+    assert bucket.reserve() == 0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.reserve()
+    bucket.reserve()
+    assert not bucket.is_full()
+
+    clock.now += 3600
+    assert bucket.is_full()
+    assert [bucket.reserve() for _ in range(3)][-1] > 0
+
+
+def test_acquire_waits_for_token(clock):
+    bucket = TokenBucket(rate=32, capacity=1)
+
+    for _ in range(33):
+        bucket.acquire()
+
+    # أول رمز متاح فورًا، ثم 32 رمزًا بمعدل 32 في الثانية
+    assert clock.now == 1001.0
+    assert clock.sleeps == [1 / 32] * 32